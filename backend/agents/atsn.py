@@ -48,6 +48,9 @@ import openai
 import aiohttp
 from supabase import create_client, Client
 from dotenv import load_dotenv
+from utils.conversation_context import conversation_context
+from services.connection_registry import connection_registry
+from services.carousel_generator import carousel_generator
 
 # Load environment early so RL imports see env vars
 load_dotenv()
@@ -490,14 +493,18 @@ Make this image part of a cohesive {num_images}-image carousel story."""
         }
 
 
-async def generate_carousel_images(carousel_plan: dict, business_context: dict, profile_assets: dict) -> list[str]:
+async def generate_carousel_images(carousel_plan: dict, business_context: dict, profile_assets: dict,
+                                   user_id: Optional[str] = None) -> list[str]:
     """
     Generate all carousel images from the complete plan.
 
+    Slides are generated concurrently; the logo is downloaded once and shared.
+
     Args:
         carousel_plan: JSON with title, caption, num_images, and image_prompts
         business_context: Business profile and context
         profile_assets: Brand assets
+        user_id: Owner of the carousel, for per-user limits and live slide updates
 
     Returns:
         list[str]: List of Supabase image URLs
@@ -506,9 +513,7 @@ async def generate_carousel_images(carousel_plan: dict, business_context: dict,
         num_images = carousel_plan["number_of_images_in_carousel"]
         logger.info(f"🎨 Starting carousel image generation for {num_images} images")
 
-        image_urls = []
-        previous_image_url = None
-
+        prompts = []
         for i in range(num_images):
             prompt_key = f"image_prompt_{i+1}"
             if prompt_key not in carousel_plan:
@@ -516,181 +521,27 @@ async def generate_carousel_images(carousel_plan: dict, business_context: dict,
                 continue
 
             prompt = carousel_plan[prompt_key]
-            logger.info(f"🖼️ Generating carousel image {i+1}/{num_images}")
-
-            # Enhance prompt with previous image context if available
-            enhanced_prompt = prompt
-            if previous_image_url and i > 0:
-                enhanced_prompt += f"\n\nVISUAL REFERENCE: Maintain visual consistency with the previous image in this carousel sequence. Match color scheme, style, and branding."
-
-            # Generate image using Gemini image model
-            try:
-                gemini_image_model = 'gemini-2.5-flash-image'
-                model = genai.GenerativeModel(gemini_image_model)
-
-                # Prepare generation config
-                generation_config = genai.types.GenerationConfig(
-                    temperature=0.8,
-                    top_p=0.9,
-                    max_output_tokens=2048,
-                )
+            if prompts:
+                prompt += "\n\nVISUAL REFERENCE: Maintain visual consistency with the previous image in this carousel sequence. Match color scheme, style, and branding."
+            prompts.append(prompt)
+
+        generation_config = genai.types.GenerationConfig(
+            temperature=0.8,
+            top_p=0.9,
+            max_output_tokens=2048,
+        )
 
-                # Add logo if available
-                logo_data = None
-                if profile_assets.get('logo'):
-                    try:
-                        # Download logo for use in generation
-                        import aiohttp
-                        async with aiohttp.ClientSession() as session:
-                            async with session.get(profile_assets['logo']) as response:
-                                if response.status == 200:
-                                    logo_data = await response.read()
-                                    logger.info("📎 Logo downloaded for carousel image generation")
-                    except Exception as logo_error:
-                        logger.warning(f"Could not download logo: {logo_error}")
-
-                # Generate the image using Gemini (consistent with rest of codebase)
-                logger.info(f"🎨 Generating carousel image {i+1} with Gemini...")
-
-                # Prepare contents for Gemini API (same pattern as other image generation in codebase)
-                contents = [enhanced_prompt]  # Text prompt is always first
-
-                # Add logo as reference if available
-                if logo_data:
-                    try:
-                        from PIL import Image
-                        import io
-                        logo_image = Image.open(io.BytesIO(logo_data))
-                        logo_image.thumbnail((200, 200))
-                        logo_buffer = io.BytesIO()
-                        logo_image.save(logo_buffer, format='PNG')
-                        logo_buffer.seek(0)
-                        contents.append(Image.open(logo_buffer))
-                        logger.info("📎 Added logo as reference for carousel image generation")
-                    except Exception as logo_proc_error:
-                        logger.warning(f"Could not process logo for reference: {logo_proc_error}")
+        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        safe_business_name = business_context.get('business_name', 'business').replace(' ', '_').replace('/', '_')
 
-                try:
-                    # Generate image with Gemini
-                    image_response = await model.generate_content_async(
-                        contents,
-                        generation_config=generation_config
-                    )
-
-                    logger.info(f"🎨 Gemini response received for carousel image {i+1}")
-
-                    if image_response and hasattr(image_response, 'candidates') and image_response.candidates:
-                        candidate = image_response.candidates[0]
-                        if hasattr(candidate, 'content') and candidate.content.parts:
-                            for part in candidate.content.parts:
-                                if hasattr(part, 'inline_data') and part.inline_data:
-                                    # Extract image data
-                                    image_data = part.inline_data.data
-                                    if not image_data:
-                                        logger.error(f"❌ No image data received from Gemini for carousel image {i+1}")
-                                        continue
-
-                                    # Save to Supabase storage
-                                    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-                                    safe_business_name = business_context.get('business_name', 'business').replace(' ', '_').replace('/', '_')
-                                    filename = f"carousel_{safe_business_name}_{i+1}_{timestamp}.png"
-
-                                    file_path = f"carousel-images/{filename}"
-                                    logger.info(f"📤 Uploading carousel image {i+1} to Supabase: {file_path}")
-
-                                    storage_response = supabase.storage.from_("ai-generated-images").upload(
-                                        file_path,
-                                        image_data,
-                                        file_options={"content-type": "image/png"}
-                                    )
-
-                                    if hasattr(storage_response, 'error') and storage_response.error:
-                                        logger.error(f"❌ Storage upload failed for carousel image {i+1}: {storage_response.error}")
-                                        continue
-
-                                    # Get public URL
-                                    public_url = supabase.storage.from_("ai-generated-images").get_public_url(file_path)
-                                    if not public_url:
-                                        logger.error(f"❌ No public URL returned for carousel image {i+1}")
-                                        continue
-
-                                    image_urls.append(public_url)
-                                    previous_image_url = public_url
-
-                                    logger.info(f"✅ Carousel image {i+1} generated and saved to Supabase: {public_url}")
-
-                                else:
-                                    logger.warning(f"⚠️ No inline_data found in Gemini response part for carousel image {i+1}")
-                        else:
-                            logger.error(f"❌ No content parts found in Gemini response for carousel image {i+1}")
-                    else:
-                        logger.error(f"❌ No candidates found in Gemini response for carousel image {i+1}")
-
-                except Exception as gemini_error:
-                    logger.error(f"❌ Gemini generation failed for carousel image {i+1}: {str(gemini_error)}")
-                    continue
-
-                logger.info(f"🎨 Gemini response received for image {i+1}")
-
-                if response and hasattr(response, 'candidates') and response.candidates:
-                    candidate = response.candidates[0]
-                    if hasattr(candidate, 'content') and candidate.content.parts:
-                        for part in candidate.content.parts:
-                            if hasattr(part, 'inline_data') and part.inline_data:
-                                # Save image to Supabase storage
-                                image_data = part.inline_data.data
-                                if not image_data:
-                                    logger.error(f"❌ No image data received for carousel image {i+1}")
-                                    continue
-
-                                timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-                                safe_business_name = business_context.get('business_name', 'business').replace(' ', '_').replace('/', '_')
-                                filename = f"carousel_{safe_business_name}_{i+1}_{timestamp}.png"
-
-                                try:
-                                    # Upload to Supabase
-                                    file_path = f"carousel-images/{filename}"
-                                    logger.info(f"📤 Uploading image {i+1} to Supabase: {file_path}")
-
-                                    storage_response = supabase.storage.from_("ai-generated-images").upload(
-                                        file_path,
-                                        image_data,
-                                        file_options={"content-type": "image/png"}
-                                    )
-
-                                    # Check for upload errors
-                                    if hasattr(storage_response, 'error') and storage_response.error:
-                                        logger.error(f"❌ Storage upload failed for image {i+1}: {storage_response.error}")
-                                        continue
-
-                                    # Get public URL
-                                    public_url = supabase.storage.from_("ai-generated-images").get_public_url(file_path)
-                                    if not public_url:
-                                        logger.error(f"❌ No public URL returned for image {i+1}")
-                                        continue
-
-                                    image_urls.append(public_url)
-                                    previous_image_url = public_url
-
-                                    logger.info(f"✅ Carousel image {i+1} generated and uploaded successfully: {public_url}")
-
-                                except Exception as upload_error:
-                                    logger.error(f"❌ Error uploading carousel image {i+1}: {str(upload_error)}")
-                                    continue
-                            else:
-                                logger.warning(f"⚠️ No inline_data found in response part for image {i+1}")
-                    else:
-                        logger.error(f"❌ No content parts found in Gemini response for image {i+1}")
-                else:
-                    logger.error(f"❌ No candidates found in Gemini response for image {i+1}")
-                    logger.error(f"Response object: {type(response)}")
-                    if hasattr(response, 'text'):
-                        logger.error(f"Response text: {response.text}")
-
-            except Exception as img_error:
-                logger.error(f"❌ Failed to generate carousel image {i+1}: {str(img_error)}")
-                # Continue with next image rather than failing completely
-                continue
+        image_urls = await carousel_generator.generate(
+            prompts,
+            lambda index: f"carousel-images/carousel_{safe_business_name}_{index+1}_{timestamp}.png",
+            user_id=user_id,
+            logo_url=profile_assets.get('logo'),
+            generation_config=generation_config
+        )
+        image_urls = [url for url in image_urls if url]
 
         logger.info(f"✅ Generated {len(image_urls)} carousel images successfully")
         return image_urls
@@ -2044,6 +1895,9 @@ class CreateCalendarPayload(BaseModel):
 class AgentState(BaseModel):
     user_query: str = ""  # Contains current message for intent classification
     full_conversation: str = ""  # Contains full conversation history for context
+    conversation_turns: List[str] = Field(default_factory=list)  # Raw user turns of the current task
+    context_tokens_raw: int = 0  # Tokens the unbounded conversation would cost
+    context_tokens_sent: int = 0  # Tokens of the bounded context actually sent
     conversation_history: List[str] = Field(default_factory=list)  # Deprecated: kept for compatibility, not used
     intent: Optional[str] = None
     payload: Optional[Dict[str, Any]] = Field(default_factory=dict)
@@ -3203,6 +3057,8 @@ def _extract_payload(state: AgentState, prompt: str) -> AgentState:
             
             response = model.generate_content(current_prompt)
             raw_result = response.text.strip()
+            if state.context_tokens_raw:
+                conversation_context.record_request(state.context_tokens_raw, state.context_tokens_sent)
             
             # Log raw response for debugging
             logger.info(f"Raw LLM response (attempt {attempt + 1}): {raw_result[:300]}...")
@@ -3864,12 +3720,9 @@ def check_channel_connection(user_id: str, channel_or_platform: str) -> bool:
                 # They will need to specify a platform
                 return True
 
-        # Check if user has active connection for this platform (case-insensitive)
-        response = supabase.table("platform_connections").select("*").eq(
-            "user_id", user_id
-        ).ilike("platform", platform).eq("is_active", True).execute()
-
-        return bool(response.data and len(response.data) > 0)
+        # Check if user has active OAuth connection for this platform (case-insensitive)
+        connection = connection_registry.get_connection(user_id, platform)
+        return bool(connection and connection.get("connection_type") == "oauth")
 
     except Exception as e:
         logger.error(f"Error checking channel connection: {e}")
@@ -5818,24 +5671,25 @@ class ATSNAgent:
             self.state = AgentState(
                 user_query=user_query,
                 conversation_history=[],  # Deprecated but kept for compatibility
+                conversation_turns=conversation_context.append_turn([], user_query),
                 user_id=active_user_id
             )
         else:
-            # User is responding to clarification - append to maintain context
-            # This ensures the LLM sees the full conversation flow
-            if self.state.user_query:
-                # Append with space separator, ensuring no double spaces
-                existing_query = self.state.user_query.rstrip()
-                self.state.user_query = f"{existing_query} {user_query}"
-                # Also maintain full conversation history
-                if self.state.full_conversation:
-                    existing_full = self.state.full_conversation.rstrip()
-                    self.state.full_conversation = f"{existing_full} {user_query}"
-                else:
-                    self.state.full_conversation = user_query
-            else:
-                self.state.user_query = user_query
-                self.state.full_conversation = user_query
+            # User is responding to clarification - add the turn to a bounded context
+            # Recent turns stay verbatim; older ones are summarized alongside the partial payload
+            if not self.state.conversation_turns:
+                seed = self.state.full_conversation or self.state.user_query
+                self.state.conversation_turns = [seed] if seed and seed.strip() else []
+            self.state.conversation_turns = conversation_context.append_turn(
+                self.state.conversation_turns, user_query
+            )
+            context, raw_tokens, sent_tokens = conversation_context.build(
+                self.state.conversation_turns, self.state.payload
+            )
+            self.state.user_query = context
+            self.state.full_conversation = context
+            self.state.context_tokens_raw = raw_tokens
+            self.state.context_tokens_sent = sent_tokens
             
             self.state.waiting_for_user = False
             self.state.current_step = "payload_construction"
@@ -10,8 +10,9 @@ import logging
 import base64
 import uuid
 import re
+import tempfile
 from datetime import datetime, timedelta
-from typing import Dict, List, Any, Optional, TypedDict
+from typing import Dict, List, Any, Optional, Tuple, TypedDict
 from dataclasses import dataclass
 from enum import Enum
 
@@ -28,6 +29,13 @@ from google.auth.transport.requests import Request
 from google.oauth2.credentials import Credentials
 from googleapiclient.discovery import build
 from googleapiclient.errors import HttpError
+from googleapiclient.http import MediaIoBaseDownload
+
+from services.cpu_executor import cpu_executor
+from services.http_clients import http_clients
+from services.asset_registry import asset_registry
+from services.streaming_upload import detect_media_type
+from services.image_derivatives import image_derivatives
 
 # Load environment variables
 load_dotenv()
@@ -44,6 +52,18 @@ supabase: Client = create_client(supabase_url, supabase_key)
 # Initialize OpenAI
 openai_api_key = os.getenv("OPENAI_API_KEY")
 
+# Drive media downloads are spooled to disk in chunks; videos above the limit are not uploaded
+VIDEO_UPLOAD_MAX_SIZE = 50 * 1024 * 1024  # 50MB
+DRIVE_DOWNLOAD_CHUNK_SIZE = 8 * 1024 * 1024
+# Images above this are still analysed (from a preview) but not uploaded
+DRIVE_IMAGE_MAX_SIZE = 20 * 1024 * 1024  # 20MB
+
+# Vision previews: the model downsamples large images anyway, so send at most this many pixels on the long side
+DRIVE_VISION_MAX_SIDE = int(os.getenv("DRIVE_VISION_MAX_SIDE", "1024"))
+DRIVE_VISION_CONCURRENCY = int(os.getenv("DRIVE_VISION_CONCURRENCY", "4"))
+DRIVE_DOWNLOAD_CONCURRENCY = int(os.getenv("DRIVE_DOWNLOAD_CONCURRENCY", "4"))
+VISION_MEDIA_TYPES = ("image/jpeg", "image/png", "image/webp", "image/gif")
+
 # Platform folder name mappings
 PLATFORM_FOLDER_MAPPING = {
     "instagram": "instagram",
@@ -123,6 +143,7 @@ class ContentFromDriveAgent:
     def __init__(self, openai_api_key: str):
         self.openai_api_key = openai_api_key
         self.client = openai.OpenAI(api_key=openai_api_key)
+        self.async_client = openai.AsyncOpenAI(api_key=openai_api_key)
         self.supabase = supabase
         # Initialize token tracker for usage tracking
         if supabase_url and supabase_key:
@@ -810,267 +831,29 @@ class ContentFromDriveAgent:
             files_to_process = state["files_to_process"]
             carousel_posts_to_process = state.get("carousel_posts_to_process", [])
             
-            # Build Drive service with cache disabled to ensure fresh downloads
-            service = build('drive', 'v3', credentials=credentials, cache_discovery=False)
-            analyzed_photos = []
-            
             logger.info(f"Starting photo analysis: {len(files_to_process)} regular images, {len(carousel_posts_to_process)} carousel posts")
             
-            # Process regular image files
-            for idx, file_info in enumerate(files_to_process):
-                try:
-                    state["progress_percentage"] = 60 + int((idx / len(files_to_process)) * 20)
-                    
-                    file_id = file_info["file_id"]
-                    file_name = file_info["file_name"]
-                    post_type = file_info.get("post_type", "image")
-                    
-                    if post_type == "video":
-                        logger.info(f"📹 Processing video file: {file_name}. Skipping vision analysis.")
-                        
-                        # Download video content (limit to max size for upload)
-                        request = service.files().get_media(fileId=file_id)
-                        file_content = request.execute()
-                        file_size = len(file_content)
-                        
-                        analyzed_photos.append({
-                            **file_info,
-                            "analysis": f"Video file: {file_name}. Type: {file_info.get('mime_type')}. Size: {file_size} bytes.",
-                            "image_bytes": file_content if file_size <= (50 * 1024 * 1024) else None # 50MB limit for video upload
-                        })
-                        continue
-
-                    logger.info(f"📥 Downloading image: {file_name} (ID: {file_id})")
-                    
-                    # Download file content from Google Drive
-                    request = service.files().get_media(
-                        fileId=file_id,
-                        supportsAllDrives=True
-                    )
-                    file_content = request.execute()
-                    
-                    logger.info(f"✅ Downloaded {len(file_content)} bytes for {file_name}")
-                    
-                    # Check file size (OpenAI Vision has limits - max 20MB)
-                    file_size = len(file_content)
-                    max_size = 20 * 1024 * 1024  # 20MB limit
-                    
-                    if file_size > max_size:
-                        logger.warning(f"⚠️ File {file_name} is too large ({file_size} bytes), using thumbnail for analysis")
-                        # Use thumbnail URL if available
-                        if file_info.get("thumbnail_link"):
-                            image_url = file_info.get("thumbnail_link")
-                            image_content = [{
-                                "type": "image_url",
-                                "image_url": {"url": image_url}
-                            }]
-                        else:
-                            # Skip if too large and no thumbnail
-                            analyzed_photos.append({
-                                **file_info,
-                                "analysis": "Image too large for analysis. Please use a smaller image file."
-                            })
-                            continue
-                    else:
-                        # Convert downloaded image to base64 for OpenAI Vision
-                        image_base64 = base64.b64encode(file_content).decode('utf-8')
-                        mime_type = file_info.get("mime_type", "image/jpeg")
-                        
-                        # Create data URL for OpenAI Vision API
-                        image_data_url = f"data:{mime_type};base64,{image_base64}"
-                        
-                        image_content = [{
-                            "type": "image_url",
-                            "image_url": {
-                                "url": image_data_url
-                            }
-                        }]
-                        
-                        logger.info(f"🖼️ Converted {file_name} to base64 ({len(image_base64)} chars), ready for ChatGPT analysis")
-                    
-                    # Analyze with OpenAI Vision (using gpt-4o-mini - the current vision model)
-                    response = self.client.chat.completions.create(
-                        model="gpt-4o-mini",
-                        messages=[
-                            {
-                                "role": "user",
-                                "content": [
-                                    {
-                                        "type": "text",
-                                        "text": "Analyze this image in detail. Describe what you see, the mood, colors, composition, any text visible, and suggest what kind of social media post this would be good for. Be specific and detailed."
-                                    }
-                                ] + image_content
-                            }
-                        ],
-                        max_tokens=500
-                    )
-                    
-                    analysis = response.choices[0].message.content
-                    
-                    # Track token usage (non-blocking)
-                    if self.token_tracker and state.get("user_id"):
-                        try:
-                            import asyncio
-                            asyncio.create_task(
-                                self.token_tracker.track_chat_completion_usage(
-                                    user_id=state["user_id"],
-                                    feature_type="content_generation",
-                                    model_name="gpt-4o-mini",
-                                    response=response,
-                                    request_metadata={"action": "analyze_photo", "file_name": file_name}
-                                )
-                            )
-                        except Exception as e:
-                            logger.error(f"Error tracking token usage: {str(e)}")
-                    
-                    analyzed_photos.append({
-                        **file_info,
-                        "analysis": analysis,
-                        "image_bytes": file_content if file_size <= max_size else None  # Store image bytes for later upload
-                    })
-                    
-                    logger.info(f"Analyzed photo {idx + 1}/{len(files_to_process)}: {file_info['file_name']}")
-                    
-                except Exception as e:
-                    logger.error(f"Error analyzing photo {file_info['file_name']}: {e}")
-                    # Continue with other photos even if one fails
-                    analyzed_photos.append({
-                        **file_info,
-                        "analysis": f"Error analyzing image: {str(e)}",
-                        "post_type": "image"
-                    })
-            
-            # Process carousel posts - analyze first image from each carousel
-            if carousel_posts_to_process:
-                logger.info(f"🔄 Processing {len(carousel_posts_to_process)} carousel post(s)...")
-                total_items = len(files_to_process) + len(carousel_posts_to_process)
-                carousel_start_idx = len(files_to_process)
-                
-                for idx, carousel_post in enumerate(carousel_posts_to_process):
-                    try:
-                        carousel_idx = carousel_start_idx + idx
-                        state["progress_percentage"] = 60 + int((carousel_idx / total_items) * 20) if total_items > 0 else 80
-                        
-                        if not carousel_post.get("images") or len(carousel_post["images"]) == 0:
-                            logger.warning(f"Carousel post {carousel_post.get('folder_name', 'unknown')} has no images - skipping")
-                            continue
-                        
-                        # Get first image for analysis
-                        first_image = carousel_post["images"][0]
-                        file_id = first_image["file_id"]
-                        file_name = first_image["file_name"]
-                        
-                        logger.info(f"📥 Downloading first image from carousel: {file_name} (ID: {file_id})")
-                        
-                        # Download first image for analysis
-                        request = service.files().get_media(fileId=file_id)
-                        file_content = request.execute()
-                        file_size = len(file_content)
-                        max_size = 20 * 1024 * 1024  # 20MB limit
-                        
-                        logger.info(f"✅ Downloaded {len(file_content)} bytes for first carousel image: {file_name}")
-                        
-                        if file_size > max_size:
-                            logger.warning(f"⚠️ First image in carousel {carousel_post.get('folder_name')} is too large, using thumbnail")
-                            if first_image.get("thumbnail_link"):
-                                image_url = first_image.get("thumbnail_link")
-                                image_content = [{
-                                    "type": "image_url",
-                                    "image_url": {"url": image_url}
-                                }]
-                            else:
-                                analyzed_photos.append({
-                                    **carousel_post,
-                                    "analysis": "First image too large for analysis",
-                                    "post_type": "carousel"
-                                })
-                                continue
-                        else:
-                            # Convert to base64 for OpenAI Vision
-                            image_base64 = base64.b64encode(file_content).decode('utf-8')
-                            mime_type = first_image.get("mime_type", "image/jpeg")
-                            image_data_url = f"data:{mime_type};base64,{image_base64}"
-                            image_content = [{
-                                "type": "image_url",
-                                "image_url": {"url": image_data_url}
-                            }]
-                            logger.info(f"🖼️ Converted first carousel image to base64 ({len(image_base64)} chars), ready for ChatGPT analysis")
-                        
-                        # Analyze with OpenAI Vision
-                        response = self.client.chat.completions.create(
-                            model="gpt-4o-mini",
-                            messages=[
-                                {
-                                    "role": "user",
-                                    "content": [
-                                        {
-                                            "type": "text",
-                                            "text": "Analyze this image in detail. This is the first image of a carousel post. Describe what you see, the mood, colors, composition, any text visible, and suggest what kind of social media carousel post this would be good for. Be specific and detailed, considering this is part of a multi-image sequence."
-                                        }
-                                    ] + image_content
-                                }
-                            ],
-                            max_tokens=500
-                        )
-                        
-                        analysis = response.choices[0].message.content
-                        
-                        # Track token usage (non-blocking)
-                        if self.token_tracker and state.get("user_id"):
-                            try:
-                                import asyncio
-                                asyncio.create_task(
-                                    self.token_tracker.track_chat_completion_usage(
-                                        user_id=state["user_id"],
-                                        feature_type="content_generation",
-                                        model_name="gpt-4o-mini",
-                                        response=response,
-                                        request_metadata={"action": "analyze_carousel_photo", "folder_name": carousel_post.get("folder_name")}
-                                    )
-                                )
-                            except Exception as e:
-                                logger.error(f"Error tracking token usage: {str(e)}")
-                        
-                        # Download all carousel images for later upload to Supabase
-                        carousel_image_bytes = []
-                        logger.info(f"📥 Downloading all {len(carousel_post['images'])} images for carousel post...")
-                        for img_idx, img in enumerate(carousel_post["images"]):
-                            try:
-                                img_request = service.files().get_media(fileId=img["file_id"])
-                                img_content = img_request.execute()
-                                if len(img_content) <= max_size:
-                                    carousel_image_bytes.append({
-                                        "file_id": img["file_id"],
-                                        "file_name": img["file_name"],
-                                        "bytes": img_content,
-                                        "mime_type": img.get("mime_type", "image/jpeg")
-                                    })
-                                    logger.info(f"✅ Downloaded carousel image {img_idx + 1}/{len(carousel_post['images'])}: {img['file_name']}")
-                                else:
-                                    logger.warning(f"⚠️ Carousel image {img['file_name']} is too large, skipping upload")
-                            except Exception as e:
-                                logger.error(f"Error downloading image {img['file_name']} for carousel: {e}")
-                        
-                        analyzed_photos.append({
-                            **carousel_post,
-                            "analysis": analysis,
-                            "first_image_file_id": file_id,
-                            "first_image_file_name": file_name,
-                            "carousel_image_bytes": carousel_image_bytes,  # Store all image bytes
-                            "post_type": "carousel"
-                        })
-                        
-                        logger.info(f"✅ Analyzed carousel post {idx + 1}/{len(carousel_posts_to_process)}: {carousel_post.get('folder_name')} (first image: {file_name}, total images: {len(carousel_image_bytes)})")
-                    
-                    except Exception as e:
-                        logger.error(f"Error analyzing carousel post {carousel_post.get('folder_name', 'unknown')}: {e}")
-                        analyzed_photos.append({
-                            **carousel_post,
-                            "analysis": f"Error analyzing carousel: {str(e)}",
-                            "post_type": "carousel"
-                        })
-            else:
-                logger.info("No carousel posts to process")
+            # Files are analysed concurrently; Drive downloads and vision requests have separate limits
+            # and are never held together, so carousels that download many images cannot deadlock
+            download_limit = asyncio.Semaphore(DRIVE_DOWNLOAD_CONCURRENCY)
+            vision_limit = asyncio.Semaphore(DRIVE_VISION_CONCURRENCY)
+            total_items = len(files_to_process) + len(carousel_posts_to_process)
+            completed = 0
+            
+            async def tracked(coro):
+                nonlocal completed
+                result = await coro
+                completed += 1
+                state["progress_percentage"] = 60 + int((completed / total_items) * 20)
+                return result
+            
+            results = await asyncio.gather(
+                *(tracked(self._analyze_drive_file(state, credentials, file_info, download_limit, vision_limit))
+                  for file_info in files_to_process),
+                *(tracked(self._analyze_carousel_post(state, credentials, carousel_post, download_limit, vision_limit))
+                  for carousel_post in carousel_posts_to_process)
+            )
+            analyzed_photos = [result for result in results if result is not None]
             
             state["analyzed_photos"] = analyzed_photos
             logger.info(f"✅ Photo analysis complete: {len(analyzed_photos)} items total ({len(files_to_process)} regular images + {len(carousel_posts_to_process)} carousel posts)")
@@ -1082,6 +865,231 @@ class ContentFromDriveAgent:
             state["current_step"] = ProcessingStep.ERROR
             return state
     
+    async def _analyze_drive_file(self, state: ContentFromDriveState, credentials, file_info: Dict[str, Any],
+                                  download_limit: asyncio.Semaphore, vision_limit: asyncio.Semaphore) -> Dict[str, Any]:
+        """Download and analyse one image (or spool one video) from Drive"""
+        file_id = file_info["file_id"]
+        file_name = file_info["file_name"]
+        try:
+            if file_info.get("post_type", "image") == "video":
+                logger.info(f"📹 Processing video file: {file_name}. Skipping vision analysis.")
+                
+                # Download video content to a temp file in chunks (limit to max size for upload)
+                async with download_limit:
+                    media_path, file_size = await asyncio.to_thread(
+                        self._download_drive_file_to_temp, self._drive_service(credentials), file_id, VIDEO_UPLOAD_MAX_SIZE
+                    )
+                
+                return {
+                    **file_info,
+                    "analysis": f"Video file: {file_name}. Type: {file_info.get('mime_type')}. Size: {file_size} bytes.",
+                    "media_path": media_path  # None when over the video upload limit
+                }
+            
+            # The full file is needed for upload; the vision model only needs a small preview,
+            # which usually arrives (as Drive's thumbnail) well before the full download finishes
+            logger.info(f"📥 Downloading image: {file_name} (ID: {file_id})")
+            download = asyncio.create_task(self._download_drive_bytes(credentials, file_id, download_limit))
+            try:
+                image_content = await self._vision_image_content(credentials, file_info, download)
+                
+                analysis = None
+                if image_content:
+                    analysis = await self._analyze_image(
+                        state, image_content, vision_limit,
+                        "Analyze this image in detail. Describe what you see, the mood, colors, composition, any text visible, and suggest what kind of social media post this would be good for. Be specific and detailed.",
+                        {"action": "analyze_photo", "file_name": file_name}
+                    )
+                file_content = await download
+            finally:
+                if not download.done():
+                    download.cancel()
+            
+            logger.info(f"✅ Downloaded {len(file_content)} bytes for {file_name}")
+            keep_bytes = len(file_content) <= DRIVE_IMAGE_MAX_SIZE
+            if not keep_bytes:
+                logger.warning(f"⚠️ File {file_name} is too large ({len(file_content)} bytes) to upload")
+            
+            logger.info(f"Analyzed photo: {file_name}")
+            return {
+                **file_info,
+                "analysis": analysis or "Image could not be prepared for analysis.",
+                "image_bytes": file_content if keep_bytes else None  # Store image bytes for later upload
+            }
+            
+        except Exception as e:
+            logger.error(f"Error analyzing photo {file_name}: {e}")
+            # Continue with other photos even if one fails
+            return {
+                **file_info,
+                "analysis": f"Error analyzing image: {str(e)}",
+                "post_type": "image"
+            }
+    
+    async def _analyze_carousel_post(self, state: ContentFromDriveState, credentials, carousel_post: Dict[str, Any],
+                                     download_limit: asyncio.Semaphore, vision_limit: asyncio.Semaphore) -> Optional[Dict[str, Any]]:
+        """Analyse the first image of a carousel and download all of its images for upload"""
+        try:
+            if not carousel_post.get("images") or len(carousel_post["images"]) == 0:
+                logger.warning(f"Carousel post {carousel_post.get('folder_name', 'unknown')} has no images - skipping")
+                return None
+            
+            images = carousel_post["images"]
+            first_image = images[0]
+            file_id = first_image["file_id"]
+            file_name = first_image["file_name"]
+            
+            # Every image is downloaded once, concurrently; the first also feeds the analysis
+            logger.info(f"📥 Downloading all {len(images)} images for carousel post {carousel_post.get('folder_name')}...")
+            downloads = [
+                asyncio.create_task(self._download_drive_bytes(credentials, img["file_id"], download_limit))
+                for img in images
+            ]
+            try:
+                image_content = await self._vision_image_content(credentials, first_image, downloads[0])
+                
+                analysis = "First image could not be prepared for analysis"
+                if image_content:
+                    analysis = await self._analyze_image(
+                        state, image_content, vision_limit,
+                        "Analyze this image in detail. This is the first image of a carousel post. Describe what you see, the mood, colors, composition, any text visible, and suggest what kind of social media carousel post this would be good for. Be specific and detailed, considering this is part of a multi-image sequence.",
+                        {"action": "analyze_carousel_photo", "folder_name": carousel_post.get("folder_name")}
+                    )
+                contents = await asyncio.gather(*downloads, return_exceptions=True)
+            finally:
+                for download in downloads:
+                    if not download.done():
+                        download.cancel()
+            
+            # Keep all carousel image bytes for later upload to Supabase
+            carousel_image_bytes = []
+            for img_idx, (img, img_content) in enumerate(zip(images, contents)):
+                if isinstance(img_content, BaseException):
+                    logger.error(f"Error downloading image {img['file_name']} for carousel: {img_content}")
+                elif len(img_content) <= DRIVE_IMAGE_MAX_SIZE:
+                    carousel_image_bytes.append({
+                        "file_id": img["file_id"],
+                        "file_name": img["file_name"],
+                        "bytes": img_content,
+                        "mime_type": img.get("mime_type", "image/jpeg")
+                    })
+                    logger.info(f"✅ Downloaded carousel image {img_idx + 1}/{len(images)}: {img['file_name']}")
+                else:
+                    logger.warning(f"⚠️ Carousel image {img['file_name']} is too large, skipping upload")
+            
+            logger.info(f"✅ Analyzed carousel post: {carousel_post.get('folder_name')} (first image: {file_name}, total images: {len(carousel_image_bytes)})")
+            return {
+                **carousel_post,
+                "analysis": analysis,
+                "first_image_file_id": file_id,
+                "first_image_file_name": file_name,
+                "carousel_image_bytes": carousel_image_bytes,  # Store all image bytes
+                "post_type": "carousel"
+            }
+        
+        except Exception as e:
+            logger.error(f"Error analyzing carousel post {carousel_post.get('folder_name', 'unknown')}: {e}")
+            return {
+                **carousel_post,
+                "analysis": f"Error analyzing carousel: {str(e)}",
+                "post_type": "carousel"
+            }
+    
+    @staticmethod
+    def _drive_service(credentials):
+        # httplib2 is not thread-safe, so every threaded download gets its own client
+        return build('drive', 'v3', credentials=credentials, cache_discovery=False)
+    
+    def _download_drive_file(self, credentials, file_id: str) -> bytes:
+        request = self._drive_service(credentials).files().get_media(fileId=file_id, supportsAllDrives=True)
+        return request.execute()
+    
+    async def _download_drive_bytes(self, credentials, file_id: str, download_limit: asyncio.Semaphore) -> bytes:
+        async with download_limit:
+            return await asyncio.to_thread(self._download_drive_file, credentials, file_id)
+    
+    async def _fetch_drive_thumbnail(self, credentials, thumbnail_link: str) -> Optional[bytes]:
+        """Drive's own preview rendition at the vision size, or None if it cannot be fetched"""
+        if not thumbnail_link:
+            return None
+        url = re.sub(r"=s\d+$", f"=s{DRIVE_VISION_MAX_SIDE}", thumbnail_link)
+        try:
+            response = await http_clients.get(
+                url,
+                headers={"Authorization": f"Bearer {credentials.token}"},
+                follow_redirects=True,
+                timeout=15,
+                retries=0
+            )
+            if response.status_code == 200 and detect_media_type(response.content[:64]) in VISION_MEDIA_TYPES:
+                return response.content
+            logger.info(f"Drive thumbnail unavailable (HTTP {response.status_code}); using local downscale")
+        except Exception as e:
+            logger.info(f"Drive thumbnail fetch failed ({e}); using local downscale")
+        return None
+    
+    async def _vision_image_content(self, credentials, file_info: Dict[str, Any],
+                                    download: "asyncio.Task[bytes]") -> Optional[List[Dict[str, Any]]]:
+        """
+        Image part for the vision request, sized to what the model actually looks at.
+        
+        Prefers Drive's thumbnail; otherwise waits for the full download and downscales it
+        locally with a JPEG re-encode on the CPU executor.
+        """
+        preview = await self._fetch_drive_thumbnail(credentials, file_info.get("thumbnail_link"))
+        if preview is not None:
+            mime_type = detect_media_type(preview[:64])
+        else:
+            file_content = await download
+            try:
+                preview = await cpu_executor.resize(
+                    file_content, (DRIVE_VISION_MAX_SIDE, DRIVE_VISION_MAX_SIDE), "JPEG", quality=85
+                )
+                mime_type = "image/jpeg"
+            except Exception as e:
+                logger.warning(f"Could not downscale {file_info.get('file_name')} for analysis: {e}")
+                return None
+        
+        image_base64 = base64.b64encode(preview).decode('utf-8')
+        logger.info(f"🖼️ Prepared {file_info.get('file_name')} for ChatGPT analysis ({len(preview)} bytes)")
+        return [{
+            "type": "image_url",
+            "image_url": {"url": f"data:{mime_type};base64,{image_base64}"}
+        }]
+    
+    async def _analyze_image(self, state: ContentFromDriveState, image_content: List[Dict[str, Any]],
+                             vision_limit: asyncio.Semaphore, prompt: str, request_metadata: Dict[str, Any]) -> str:
+        """Run a vision request (using gpt-4o-mini - the current vision model) under the shared limit"""
+        async with vision_limit:
+            response = await self.async_client.chat.completions.create(
+                model="gpt-4o-mini",
+                messages=[
+                    {
+                        "role": "user",
+                        "content": [{"type": "text", "text": prompt}] + image_content
+                    }
+                ],
+                max_tokens=500
+            )
+        
+        # Track token usage (non-blocking)
+        if self.token_tracker and state.get("user_id"):
+            try:
+                asyncio.create_task(
+                    self.token_tracker.track_chat_completion_usage(
+                        user_id=state["user_id"],
+                        feature_type="content_generation",
+                        model_name="gpt-4o-mini",
+                        response=response,
+                        request_metadata=request_metadata
+                    )
+                )
+            except Exception as e:
+                logger.error(f"Error tracking token usage: {str(e)}")
+        
+        return response.choices[0].message.content
+    
+
     async def generate_captions(self, state: ContentFromDriveState) -> ContentFromDriveState:
         """Generate captions for each photo based on description and analysis"""
         try:
@@ -1382,6 +1390,7 @@ CRITICAL INSTRUCTIONS:
                             "image_url": photo.get("web_view_link", ""),
                             "thumbnail_url": photo.get("thumbnail_link", ""),
                             "image_bytes": photo.get("image_bytes"),  # Include bytes for Supabase upload
+                            "media_path": photo.get("media_path"),  # Spooled video file for Supabase upload
                             "mime_type": photo.get("mime_type", "image/jpeg") if post_type == "image" else photo.get("mime_type", "video/mp4")
                         })
                     
@@ -1523,15 +1532,16 @@ CRITICAL INSTRUCTIONS:
                         # Handle regular image or video post
                         # Upload to Supabase if we have bytes
                         media_url = post_data.get("image_url", "")
-                        if post_data.get("image_bytes"):
+                        if post_data.get("image_bytes") or post_data.get("media_path"):
                             try:
                                 mime_type = post_data.get("mime_type", "image/jpeg" if post_type == "image" else "video/mp4")
                                 media_url = await self._upload_image_to_supabase(
-                                    post_data["image_bytes"],
+                                    post_data.get("image_bytes"),
                                     user_id,
                                     platform,
                                     post_data.get("file_name", "media"),
-                                    mime_type
+                                    mime_type,
+                                    media_path=post_data.get("media_path")
                                 )
                                 logger.info(f"Uploaded media to Supabase for post: {media_url}")
                             except Exception as upload_error:
@@ -1572,6 +1582,7 @@ CRITICAL INSTRUCTIONS:
                     if result.data:
                         post_id = result.data[0]["id"]
                         saved_posts.append(post_id)
+                        image_derivatives.schedule_for_content(post_id)
                         logger.info(f"Saved post {idx + 1}/{len(generated_posts)}: {post_id} to created_content")
                     
                 except Exception as e:
@@ -1588,8 +1599,41 @@ CRITICAL INSTRUCTIONS:
             state["current_step"] = ProcessingStep.ERROR
             return state
     
-    async def _upload_image_to_supabase(self, image_bytes: bytes, user_id: str, platform: str, file_name: str, mime_type: str) -> str:
-        """Upload image to Supabase storage, similar to custom content agent"""
+    def _download_drive_file_to_temp(self, service, file_id: str, max_size: int) -> Tuple[Optional[str], int]:
+        """Download a Drive file to a temp file in chunks; returns (path, size), path None if over max_size"""
+        request = service.files().get_media(fileId=file_id, supportsAllDrives=True)
+        fd, path = tempfile.mkstemp(prefix="drive_media_")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                downloader = MediaIoBaseDownload(f, request, chunksize=DRIVE_DOWNLOAD_CHUNK_SIZE)
+                done = False
+                while not done:
+                    _, done = downloader.next_chunk()
+                    if f.tell() > max_size:
+                        logger.warning(f"Drive file {file_id} exceeds {max_size} bytes; not keeping it for upload")
+                        size = f.tell()
+                        os.remove(path)
+                        return None, size
+                size = f.tell()
+            return path, size
+        except Exception:
+            if os.path.exists(path):
+                os.remove(path)
+            raise
+
+    def _cleanup_temp_media(self, state: ContentFromDriveState) -> None:
+        """Remove spooled Drive downloads once the run is over"""
+        for photo in state.get("analyzed_photos") or []:
+            media_path = photo.get("media_path")
+            if media_path and os.path.exists(media_path):
+                try:
+                    os.remove(media_path)
+                except OSError as e:
+                    logger.warning(f"Could not remove temp media file {media_path}: {e}")
+
+    async def _upload_image_to_supabase(self, image_bytes: Optional[bytes], user_id: str, platform: str, file_name: str,
+                                        mime_type: str, media_path: Optional[str] = None) -> str:
+        """Upload image (bytes) or spooled media file to Supabase storage, similar to custom content agent"""
         try:
             # Generate unique filename
             file_extension = mime_type.split("/")[1] if "/" in mime_type else "jpg"
@@ -1611,19 +1655,14 @@ CRITICAL INSTRUCTIONS:
             
             logger.info(f"Uploading image to Supabase storage: {bucket_name}/{file_path}, content_type: {mime_type}")
             
-            # Upload to Supabase storage
-            storage_response = self.supabase.storage.from_(bucket_name).upload(
-                file_path,
-                image_bytes,
-                file_options={"content-type": mime_type}
-            )
-            
-            # Check for upload errors
-            if hasattr(storage_response, 'error') and storage_response.error:
-                raise Exception(f"Storage upload failed: {storage_response.error}")
-            
-            # Get public URL
-            public_url = self.supabase.storage.from_(bucket_name).get_public_url(file_path)
+            # Stream to Supabase storage (resumable for large files); files already imported
+            # for this user resolve to the stored copy, near matches are only recorded
+            if media_path:
+                public_url = await asset_registry.upload_path(user_id, bucket_name, file_path, media_path, mime_type,
+                                                              near_duplicates=True)
+            else:
+                public_url = await asset_registry.upload_bytes(user_id, bucket_name, file_path, image_bytes, mime_type,
+                                                               near_duplicates=True)
             
             logger.info(f"Successfully uploaded image to Supabase: {public_url}")
             return public_url
@@ -1636,12 +1675,14 @@ CRITICAL INSTRUCTIONS:
         """Mark processing as complete"""
         state["current_step"] = ProcessingStep.COMPLETE
         state["progress_percentage"] = 100
+        self._cleanup_temp_media(state)
         logger.info(f"Processing complete. Saved {len(state.get('saved_posts', []))} posts")
         return state
     
     async def handle_error(self, state: ContentFromDriveState) -> ContentFromDriveState:
         """Handle errors"""
         state["current_step"] = ProcessingStep.ERROR
+        self._cleanup_temp_media(state)
         logger.error(f"Error: {state.get('error_message', 'Unknown error')}")
         return state
 
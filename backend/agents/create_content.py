@@ -741,11 +741,12 @@ Return the caption with hashtags at the end."""
                 profile_assets
             )
 
-            # Step 3: Generate all carousel images iteratively
+            # Step 3: Generate all carousel images concurrently
             carousel_image_urls = await generate_carousel_images(
                 carousel_plan,
                 business_context,
-                profile_assets
+                profile_assets,
+                user_id=state.user_id
             )
 
             if not carousel_image_urls:
@@ -1278,6 +1279,8 @@ Create a high-quality, professional image optimized for Instagram that reflects
                     content_id = result.data[0]['id']
                     state.content_id = str(content_id)
                     logger.info(f"✅ Successfully saved {content_type} content to created_content table with ID: {content_id}")
+                    from services.image_derivatives import image_derivatives
+                    image_derivatives.schedule_for_content(str(content_id))
 
                     # Log which columns were saved
                     saved_columns = list(content_data.keys())
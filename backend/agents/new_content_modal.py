@@ -13,10 +13,15 @@ from typing import Dict, Any, List, Optional
 from datetime import datetime, timedelta
 import google.generativeai as genai
 import openai
-import httpx
 from supabase import create_client, Client
 from dotenv import load_dotenv
 
+from services.asset_registry import asset_registry
+from services.carousel_generator import carousel_generator
+from services.media_asset_cache import media_asset_cache
+from services.image_derivatives import image_derivatives
+from services.image_generation_gateway import image_generation_gateway
+
 # Load environment
 load_dotenv()
 
@@ -51,19 +56,7 @@ class NewContentModalAgent:
     async def _get_image_base64(self, image_url: str) -> Optional[Dict[str, str]]:
         """Download an image from a URL and return its base64 representation and media type."""
         try:
-            async with httpx.AsyncClient() as client:
-                response = await client.get(image_url, timeout=30.0)
-                if response.status_code == 200:
-                    image_content = response.content
-                    base64_image = base64.b64encode(image_content).decode('utf-8')
-                    media_type = response.headers.get('content-type', 'image/jpeg')
-                    return {
-                        "base64": base64_image,
-                        "media_type": media_type
-                    }
-                else:
-                    logger.error(f"Failed to download image from {image_url}: Status {response.status_code}")
-                    return None
+            return await media_asset_cache.get_base64(image_url)
         except Exception as e:
             logger.error(f"Error downloading image from {image_url}: {e}")
             return None
@@ -373,7 +366,7 @@ Return a JSON object with this exact structure:
         # Generate or handle media
         if media_option == 'Generate':
             image_url = await self._generate_image_for_content(
-                content_idea, image_type, business_context, profile_assets, platform
+                content_idea, image_type, business_context, profile_assets, platform, user_id
             )
             if image_url:
                 content_data['images'] = [image_url]
@@ -524,12 +517,16 @@ Return a JSON object with this exact structure:
         # Generate carousel images only if media_option is 'Generate'
         carousel_images = []
         if media_option == 'Generate':
-            for slide in content_json.get('slides', []):
-                image_url = await self._generate_carousel_slide_image(
-                    slide['image_prompt'], business_context, profile_assets
-                )
-                if image_url:
-                    carousel_images.append(image_url)
+            prompts = [
+                self._carousel_slide_prompt(slide['image_prompt'], business_context)
+                for slide in content_json.get('slides', [])
+            ]
+            image_urls = await carousel_generator.generate(
+                prompts,
+                lambda index: f"carousel_images/{uuid.uuid4()}.png",
+                user_id=user_id
+            )
+            carousel_images = [url for url in image_urls if url]
         # If media_option is 'Without media', carousel_images will remain empty
 
         content_data = {
@@ -746,7 +743,7 @@ Example: marketing socialmedia business tips"""
         # Generate video thumbnail if needed
         if media_option == 'Generate':
             thumbnail_url = await self._generate_video_thumbnail(
-                content_idea, business_context, profile_assets
+                content_idea, business_context, profile_assets, user_id
             )
             if thumbnail_url:
                 content_data['images'] = [thumbnail_url]
@@ -815,7 +812,7 @@ Return a JSON object with this exact structure:
         # Generate thumbnail if needed
         if media_option == 'Generate':
             thumbnail_url = await self._generate_video_thumbnail(
-                content_json.get('thumbnail_concept', content_idea), business_context, profile_assets
+                content_json.get('thumbnail_concept', content_idea), business_context, profile_assets, user_id
             )
             if thumbnail_url:
                 content_data['images'] = [thumbnail_url]
@@ -884,7 +881,7 @@ Return a JSON object with this exact structure:
         # Generate featured image if needed
         if media_option == 'Generate':
             featured_image_url = await self._generate_blog_featured_image(
-                content_json.get('featured_image_prompt', content_idea), business_context, profile_assets
+                content_json.get('featured_image_prompt', content_idea), business_context, profile_assets, user_id
             )
             if featured_image_url:
                 content_data['images'] = [featured_image_url]
@@ -895,7 +892,8 @@ Return a JSON object with this exact structure:
         }
 
     async def _generate_image_for_content(self, content_idea: str, image_type: str,
-                                        business_context: Dict, profile_assets: Dict, platform: str) -> Optional[str]:
+                                        business_context: Dict, profile_assets: Dict, platform: str,
+                                        user_id: Optional[str] = None) -> Optional[str]:
         """Generate image for content using Gemini"""
         try:
             prompt = f"""Create a {image_type} image for {platform} about: {content_idea}
@@ -907,106 +905,24 @@ Logo available: {'Yes' if profile_assets.get('logo') else 'No'}
 
 Make it visually appealing and brand-consistent."""
 
-            # Add logo if available
-            contents = [prompt]
-            if profile_assets.get('logo'):
-                try:
-                    logo_url = profile_assets['logo']
-                    async with httpx.AsyncClient(follow_redirects=True) as client:
-                        logo_response = await client.get(logo_url)
-                        logo_response.raise_for_status()
-                        logo_data = logo_response.content
-
-                    contents.append({
-                        "inline_data": {
-                            "mime_type": "image/png",
-                            "data": base64.b64encode(logo_data).decode('utf-8')
-                        }
-                    })
-                except Exception as e:
-                    logger.warning(f"Failed to include logo: {e}")
-
-            # Generate image
-            gemini_image_model = 'gemini-2.5-flash-image'
-            model = genai.GenerativeModel(gemini_image_model)
-            # Wrap blocking call in asyncio.to_thread to avoid blocking the event loop
-            image_response = await asyncio.to_thread(model.generate_content, contents=contents)
-
-            if image_response.candidates and len(image_response.candidates) > 0:
-                candidate = image_response.candidates[0]
-                if candidate.content.parts:
-                    for part in candidate.content.parts:
-                        if part.inline_data and part.inline_data.data:
-                            image_data = part.inline_data.data
-                            if not isinstance(image_data, bytes):
-                                image_data = base64.b64decode(image_data)
-
-                            # Upload to Supabase
-                            filename = f"content_images/{uuid.uuid4()}.png"
-                            storage_response = supabase.storage.from_("ai-generated-images").upload(
-                                filename, image_data,
-                                file_options={"content-type": "image/png", "upsert": "false"}
-                            )
-
-                            # Check if upload was successful (Supabase storage upload doesn't return status, but we can check for errors)
-                            if storage_response:
-                                # Check if there's no error attribute or if error is None/Falsy
-                                if not hasattr(storage_response, 'error') or not storage_response.error:
-                                    image_url = supabase.storage.from_("ai-generated-images").get_public_url(filename)
-                                    logger.info(f"✅ Image generated and uploaded: {image_url}")
-                                    return image_url
-
-            logger.error("Failed to generate image")
-            return None
+            image_url = await self._generate_gemini_image(prompt, "content_images", user_id, profile_assets.get('logo'))
+            if not image_url:
+                logger.error("Failed to generate image")
+            return image_url
 
         except Exception as e:
             logger.error(f"Error generating image: {e}")
             return None
 
-    async def _generate_carousel_slide_image(self, image_prompt: str, business_context: Dict, profile_assets: Dict) -> Optional[str]:
-        """Generate carousel slide image"""
-        try:
-            prompt = f"""Create a carousel slide image: {image_prompt}
+    def _carousel_slide_prompt(self, image_prompt: str, business_context: Dict) -> str:
+        """Gemini prompt for a carousel slide image"""
+        return f"""Create a carousel slide image: {image_prompt}
 
 Business: {business_context.get('business_name', 'Business')}
 Style: Clean, professional, visually appealing for social media carousel"""
 
-            gemini_image_model = 'gemini-2.5-flash-image'
-            model = genai.GenerativeModel(gemini_image_model)
-            # Wrap blocking call in asyncio.to_thread to avoid blocking the event loop
-            image_response = await asyncio.to_thread(model.generate_content, contents=[prompt])
-
-            if image_response.candidates and len(image_response.candidates) > 0:
-                candidate = image_response.candidates[0]
-                if candidate.content.parts:
-                    for part in candidate.content.parts:
-                        if part.inline_data and part.inline_data.data:
-                            image_data = part.inline_data.data
-                            if not isinstance(image_data, bytes):
-                                image_data = base64.b64decode(image_data)
-
-                            # Upload to Supabase
-                            filename = f"carousel_images/{uuid.uuid4()}.png"
-                            storage_response = supabase.storage.from_("ai-generated-images").upload(
-                                filename, image_data,
-                                file_options={"content-type": "image/png", "upsert": "false"}
-                            )
-
-                            # Check if upload was successful (Supabase storage upload doesn't return status, but we can check for errors)
-                            if storage_response:
-                                # Check if there's no error attribute or if error is None/Falsy
-                                if not hasattr(storage_response, 'error') or not storage_response.error:
-                                    image_url = supabase.storage.from_("ai-generated-images").get_public_url(filename)
-                                    logger.info(f"✅ Image generated and uploaded: {image_url}")
-                                    return image_url
-
-            return None
-
-        except Exception as e:
-            logger.error(f"Error generating carousel slide image: {e}")
-            return None
-
-    async def _generate_video_thumbnail(self, content_idea: str, business_context: Dict, profile_assets: Dict) -> Optional[str]:
+    async def _generate_video_thumbnail(self, content_idea: str, business_context: Dict, profile_assets: Dict,
+                                        user_id: Optional[str] = None) -> Optional[str]:
         """Generate video thumbnail"""
         try:
             prompt = f"""Create an eye-catching video thumbnail for: {content_idea}
@@ -1015,42 +931,14 @@ Business: {business_context.get('business_name', 'Business')}
 Style: Click-worthy, professional, optimized for 9:16 aspect ratio
 Design: Bold text overlay, vibrant colors, compelling visuals"""
 
-            gemini_image_model = 'gemini-2.5-flash-image'
-            model = genai.GenerativeModel(gemini_image_model)
-            # Wrap blocking call in asyncio.to_thread to avoid blocking the event loop
-            image_response = await asyncio.to_thread(model.generate_content, contents=[prompt])
-
-            if image_response.candidates and len(image_response.candidates) > 0:
-                candidate = image_response.candidates[0]
-                if candidate.content.parts:
-                    for part in candidate.content.parts:
-                        if part.inline_data and part.inline_data.data:
-                            image_data = part.inline_data.data
-                            if not isinstance(image_data, bytes):
-                                image_data = base64.b64decode(image_data)
-
-                            # Upload to Supabase
-                            filename = f"video_thumbnails/{uuid.uuid4()}.png"
-                            storage_response = supabase.storage.from_("ai-generated-images").upload(
-                                filename, image_data,
-                                file_options={"content-type": "image/png", "upsert": "false"}
-                            )
-
-                            # Check if upload was successful (Supabase storage upload doesn't return status, but we can check for errors)
-                            if storage_response:
-                                # Check if there's no error attribute or if error is None/Falsy
-                                if not hasattr(storage_response, 'error') or not storage_response.error:
-                                    image_url = supabase.storage.from_("ai-generated-images").get_public_url(filename)
-                                    logger.info(f"✅ Image generated and uploaded: {image_url}")
-                                    return image_url
-
-            return None
+            return await self._generate_gemini_image(prompt, "video_thumbnails", user_id)
 
         except Exception as e:
             logger.error(f"Error generating video thumbnail: {e}")
             return None
 
-    async def _generate_blog_featured_image(self, image_prompt: str, business_context: Dict, profile_assets: Dict) -> Optional[str]:
+    async def _generate_blog_featured_image(self, image_prompt: str, business_context: Dict, profile_assets: Dict,
+                                            user_id: Optional[str] = None) -> Optional[str]:
         """Generate blog featured image"""
         try:
             prompt = f"""Create a professional blog featured image: {image_prompt}
@@ -1059,10 +947,44 @@ Business: {business_context.get('business_name', 'Business')}
 Style: High-quality, professional, suitable for blog header
 Format: Landscape, visually appealing, brand-consistent"""
 
-            gemini_image_model = 'gemini-2.5-flash-image'
+            return await self._generate_gemini_image(prompt, "blog_featured", user_id)
+
+        except Exception as e:
+            logger.error(f"Error generating blog featured image: {e}")
+            return None
+
+    async def _generate_gemini_image(self, prompt: str, folder: str, user_id: Optional[str],
+                                     logo_url: Optional[str] = None) -> Optional[str]:
+        """
+        Generate an image with Gemini and upload it to the ai-generated-images bucket.
+
+        Goes through the image generation gateway, so an identical request (same prompt
+        and logo) that is in flight or was generated recently returns the same URL. The
+        upload is recorded in the asset registry, so deleting one post that shares the
+        URL leaves the image for the others.
+        """
+        gemini_image_model = 'gemini-2.5-flash-image'
+
+        # Add logo if available
+        contents = [prompt]
+        references = []
+        if logo_url:
+            try:
+                logo = await media_asset_cache.get_base64(logo_url)
+                contents.append({
+                    "inline_data": {
+                        "mime_type": logo["media_type"],
+                        "data": logo["base64"]
+                    }
+                })
+                references.append(logo["base64"])
+            except Exception as e:
+                logger.warning(f"Failed to include logo: {e}")
+
+        async def generate_and_upload() -> Optional[str]:
             model = genai.GenerativeModel(gemini_image_model)
             # Wrap blocking call in asyncio.to_thread to avoid blocking the event loop
-            image_response = await asyncio.to_thread(model.generate_content, contents=[prompt])
+            image_response = await asyncio.to_thread(model.generate_content, contents=contents)
 
             if image_response.candidates and len(image_response.candidates) > 0:
                 candidate = image_response.candidates[0]
@@ -1074,25 +996,22 @@ Format: Landscape, visually appealing, brand-consistent"""
                                 image_data = base64.b64decode(image_data)
 
                             # Upload to Supabase
-                            filename = f"blog_featured/{uuid.uuid4()}.png"
-                            storage_response = supabase.storage.from_("ai-generated-images").upload(
-                                filename, image_data,
-                                file_options={"content-type": "image/png", "upsert": "false"}
+                            filename = f"{folder}/{uuid.uuid4()}.png"
+                            image_url = await asset_registry.upload_bytes(
+                                user_id, "ai-generated-images", filename, image_data, "image/png"
                             )
-
-                            # Check if upload was successful (Supabase storage upload doesn't return status, but we can check for errors)
-                            if storage_response:
-                                # Check if there's no error attribute or if error is None/Falsy
-                                if not hasattr(storage_response, 'error') or not storage_response.error:
-                                    image_url = supabase.storage.from_("ai-generated-images").get_public_url(filename)
-                                    logger.info(f"✅ Image generated and uploaded: {image_url}")
-                                    return image_url
-
+                            if image_url:
+                                logger.info(f"✅ Image generated and uploaded: {image_url}")
+                                return image_url
             return None
 
-        except Exception as e:
-            logger.error(f"Error generating blog featured image: {e}")
-            return None
+        return await image_generation_gateway.generate(
+            generate_and_upload,
+            model=gemini_image_model,
+            prompt=prompt,
+            user_id=user_id,
+            references=references
+        )
 
     def _parse_json_response(self, response_text: str) -> Optional[Dict[str, Any]]:
         """Parse JSON response from LLM, handling various formats"""
@@ -1196,6 +1115,7 @@ Format: Landscape, visually appealing, brand-consistent"""
 
             if response.data:
                 logger.info(f"✅ Content saved to database with ID: {content_id}")
+                image_derivatives.schedule_for_content(content_id)
                 return {
                     'success': True,
                     'content_id': content_id
@@ -9,7 +9,6 @@ import json
 from typing import Dict, List, Any, Optional, TypedDict
 from datetime import datetime
 import asyncio
-from io import BytesIO
 from dotenv import load_dotenv
 
 # Load environment variables
@@ -18,8 +17,6 @@ load_dotenv()
 import openai
 from langgraph.graph import StateGraph, END
 from langgraph.prebuilt import ToolNode
-from PIL import Image, ImageDraw, ImageFont
-import requests
 from supabase import create_client, Client
 
 # Import template manager
@@ -28,12 +25,16 @@ sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 try:
     from utils.template_manager import template_manager
     from utils.prompt_manager import prompt_manager
+    from services.media_asset_cache import media_asset_cache
+    from services.cpu_executor import cpu_executor
 except ImportError:
     # Fallback for when running from different directory
     import sys
     sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
     from utils.template_manager import template_manager
     from utils.prompt_manager import prompt_manager
+    from services.media_asset_cache import media_asset_cache
+    from services.cpu_executor import cpu_executor
 
 # OpenAI client will be initialized per request
 
@@ -1135,9 +1136,8 @@ class TemplateEditorAgent:
                 state["image_modifications"] = {"skip": True}
                 return state
             
-            # Download current image
-            response = requests.get(state["current_image_url"])
-            current_image = Image.open(BytesIO(response.content))
+            # Download current image (shared media cache)
+            current_image = await media_asset_cache.get_bytes(state["current_image_url"])
             
             # Analyze current image using OpenAI vision
             image_analysis_prompt = """
@@ -1152,10 +1152,10 @@ class TemplateEditorAgent:
             Return a JSON structure with modification suggestions.
             """
             
-            # Convert image to base64 for analysis
-            buffered = BytesIO()
-            current_image.save(buffered, format="JPEG")
-            img_base64 = base64.b64encode(buffered.getvalue()).decode()
+            # Convert image to base64 for analysis (JPEG re-encode runs in a worker process;
+            # 2048px is the largest size the vision model looks at)
+            jpeg_data = await cpu_executor.encode(current_image, "JPEG", max_size=(2048, 2048))
+            img_base64 = base64.b64encode(jpeg_data).decode()
             
             client = openai.OpenAI()
             analysis_response = client.chat.completions.create(
@@ -1350,21 +1350,17 @@ OUTPUT: A single, professionally designed image that seamlessly combines the ori
             # Add the original image as the primary image to modify
             if state.get("current_image_url"):
                 try:
-                    # Download the original image
-                    import httpx
-                    async with httpx.AsyncClient() as client:
-                        response = await client.get(state["current_image_url"])
-                        if response.status_code == 200:
-                            original_image_data = base64.b64encode(response.content).decode()
-                            contents.append({
-                                "text": "BASE IMAGE: Transform this image to match the template style."
-                            })
-                            contents.append({
-                                "inline_data": {
-                                    "mime_type": "image/jpeg",
-                                    "data": original_image_data
-                                }
-                            })
+                    # Download the original image (shared media cache)
+                    original_image = await media_asset_cache.get_base64(state["current_image_url"])
+                    contents.append({
+                        "text": "BASE IMAGE: Transform this image to match the template style."
+                    })
+                    contents.append({
+                        "inline_data": {
+                            "mime_type": original_image["media_type"],
+                            "data": original_image["base64"]
+                        }
+                    })
                 except Exception as e:
                     print(f"⚠️ Could not include original image: {e}")
                     raise Exception("Original image is required for template modification")
@@ -1389,23 +1385,17 @@ OUTPUT: A single, professionally designed image that seamlessly combines the ori
             # Add user logo if available
             if user_logo and user_logo.get("url"):
                 try:
-                    import httpx
-                    async with httpx.AsyncClient() as client:
-                        logo_response = await client.get(user_logo["url"])
-                        if logo_response.status_code == 200:
-                            logo_image_data = base64.b64encode(logo_response.content).decode()
-                            contents.append({
-                                "text": f"USER LOGO: Integrate this {user_logo.get('business_name', 'company')} logo into the design at the appropriate logo areas."
-                            })
-                            contents.append({
-                                "inline_data": {
-                                    "mime_type": "image/png",  # Assume PNG, could be enhanced to detect actual type
-                                    "data": logo_image_data
-                                }
-                            })
-                            print(f"✅ Added user logo to Gemini input: {user_logo.get('business_name', 'Company')}")
-                        else:
-                            print(f"⚠️ Could not download user logo: HTTP {logo_response.status_code}")
+                    logo_image = await media_asset_cache.get_base64(user_logo["url"])
+                    contents.append({
+                        "text": f"USER LOGO: Integrate this {user_logo.get('business_name', 'company')} logo into the design at the appropriate logo areas."
+                    })
+                    contents.append({
+                        "inline_data": {
+                            "mime_type": logo_image["media_type"],
+                            "data": logo_image["base64"]
+                        }
+                    })
+                    print(f"✅ Added user logo to Gemini input: {user_logo.get('business_name', 'Company')}")
                 except Exception as e:
                     print(f"⚠️ Error downloading user logo: {e}")
             else:
@@ -7,7 +7,6 @@ import os
 import json
 import asyncio
 import aiohttp
-import requests
 from bs4 import BeautifulSoup
 from typing import Dict, List, Optional, Any
 from dataclasses import dataclass
@@ -18,6 +17,7 @@ import re
 from textstat import flesch_reading_ease, flesch_kincaid_grade
 import hashlib
 from services.token_usage_service import TokenUsageService
+from services.http_clients import http_clients
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -127,7 +127,7 @@ class WebsiteAnalyzerAgent:
     async def _analyze_seo(self, url: str) -> Dict[str, Any]:
         """Analyze SEO aspects of the website"""
         try:
-            response = requests.get(url, timeout=30, headers={
+            response = await http_clients.get(url, timeout=30, headers={
                 'User-Agent': 'Mozilla/5.0 (compatible; WebsiteAnalyzer/1.0)'
             })
             soup = BeautifulSoup(response.content, 'html.parser')
@@ -337,7 +337,7 @@ class WebsiteAnalyzerAgent:
     async def _analyze_content(self, url: str) -> Dict[str, Any]:
         """Analyze content quality and structure"""
         try:
-            response = requests.get(url, timeout=30, headers={
+            response = await http_clients.get(url, timeout=30, headers={
                 'User-Agent': 'Mozilla/5.0 (compatible; WebsiteAnalyzer/1.0)'
             })
             soup = BeautifulSoup(response.content, 'html.parser')
@@ -398,7 +398,7 @@ class WebsiteAnalyzerAgent:
     async def _analyze_technical(self, url: str) -> Dict[str, Any]:
         """Analyze technical aspects of the website"""
         try:
-            response = requests.get(url, timeout=30, headers={
+            response = await http_clients.get(url, timeout=30, headers={
                 'User-Agent': 'Mozilla/5.0 (compatible; WebsiteAnalyzer/1.0)'
             })
             
@@ -420,7 +420,7 @@ class WebsiteAnalyzerAgent:
             # Check robots.txt
             robots_url = urljoin(url, '/robots.txt')
             try:
-                robots_response = requests.get(robots_url, timeout=10)
+                robots_response = await http_clients.get(robots_url, timeout=10)
                 robots_txt = robots_response.text if robots_response.status_code == 200 else ""
             except:
                 robots_txt = ""
@@ -436,7 +436,7 @@ class WebsiteAnalyzerAgent:
             }
             
             try:
-                sitemap_response = requests.get(sitemap_url, timeout=10)
+                sitemap_response = await http_clients.get(sitemap_url, timeout=10)
                 if sitemap_response.status_code == 200:
                     sitemap_info['exists'] = True
                     # Parse sitemap XML
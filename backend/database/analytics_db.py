@@ -7,10 +7,11 @@ All functions return data in the format expected by Orion_Analytics_query.py
 
 import os
 import logging
-import requests
 from typing import Dict, List, Any, Optional
-from datetime import datetime
+from datetime import datetime, timedelta
 from supabase import create_client, Client
+from services.http_clients import http_clients
+from services.connection_registry import connection_registry
 
 logger = logging.getLogger(__name__)
 
@@ -22,13 +23,10 @@ supabase: Client = create_client(supabase_url, supabase_key) if supabase_url and
 # Reuse decrypt_token from existing code (matches morning_scheduled_message.py pattern)
 def decrypt_token(encrypted_token: str) -> str:
     """Decrypt access token - reuses existing encryption logic"""
-    from cryptography.fernet import Fernet
-    encryption_key = os.getenv("ENCRYPTION_KEY")
-    if not encryption_key or not encrypted_token:
+    if not os.getenv("ENCRYPTION_KEY") or not encrypted_token:
         return encrypted_token or ""
     try:
-        cipher_suite = Fernet(encryption_key.encode() if isinstance(encryption_key, str) else encryption_key)
-        return cipher_suite.decrypt(encrypted_token.encode()).decode()
+        return connection_registry.decrypt_token(encrypted_token)
     except Exception:
         return encrypted_token  # Return as-is if decryption fails
 
@@ -91,54 +89,24 @@ def get_platform_connection(user_id: str, platform: str) -> Optional[Dict[str, A
         Connection dict with access_token, account_id, etc.
     """
     try:
-        if not supabase:
-            logger.warning("Supabase client not initialized")
-            return None
-        
         platform_lower = platform.lower()
         logger.info(f"🔍 Fetching connection for platform: {platform_lower}, user_id: {user_id}")
         
-        # Try OAuth connections first (platform_connections table)
-        try:
-            oauth_result = supabase.table("platform_connections").select("*").eq(
-                "user_id", user_id
-            ).eq("platform", platform_lower).eq("is_active", True).execute()
-            
-            if oauth_result.data and len(oauth_result.data) > 0:
-                connection = oauth_result.data[0]
-                # Normalize connection data
-                connection = {
-                    **connection,
-                    'access_token': connection.get('access_token_encrypted') or connection.get('access_token', ''),
-                    'account_id': connection.get('page_id') or connection.get('account_id', ''),
-                    'account_name': connection.get('page_name') or connection.get('account_name', ''),
-                    'connection_type': 'oauth'
-                }
-                logger.info(f"✅ Found OAuth connection for {platform_lower}: account_id={connection.get('account_id')}")
-                return connection
-            else:
-                logger.info(f"No OAuth connection found for {platform_lower}")
-        except Exception as e:
-            logger.error(f"Error fetching OAuth connection: {e}", exc_info=True)
-        
-        # Try token connections (social_media_connections table)
-        try:
-            token_result = supabase.table("social_media_connections").select("*").eq(
-                "user_id", user_id
-            ).eq("platform", platform_lower).eq("is_active", True).execute()
-            
-            if token_result.data and len(token_result.data) > 0:
-                connection = token_result.data[0]
-                connection['connection_type'] = 'token'
-                logger.info(f"✅ Found token connection for {platform_lower}: account_id={connection.get('account_id')}")
-                return connection
-            else:
-                logger.info(f"No token connection found for {platform_lower}")
-        except Exception as e:
-            logger.error(f"Error fetching token connection: {e}", exc_info=True)
-        
-        logger.warning(f"❌ No connection found for platform {platform_lower}")
-        return None
+        # OAuth connections (platform_connections) take precedence over token connections
+        credentials = connection_registry.get_credentials(user_id, platform_lower)
+        if not credentials:
+            logger.warning(f"❌ No connection found for platform {platform_lower}")
+            return None
+
+        # Normalize connection data; access_token is already decrypted
+        connection = {
+            **credentials['connection'],
+            'access_token': credentials['access_token'] or '',
+            'account_id': credentials['account_id'] or '',
+            'account_name': credentials['account_name'] or ''
+        }
+        logger.info(f"✅ Found {connection['connection_type']} connection for {platform_lower}: account_id={connection.get('account_id')}")
+        return connection
         
     except Exception as e:
         logger.error(f"Error getting platform connection: {e}", exc_info=True)
@@ -151,7 +119,7 @@ def fetch_instagram_post_metrics(connection: Dict[str, Any], metrics: List[str],
     This is used when user asks for "likes on my last post" or "comments on yesterday's post".
     """
     try:
-        access_token = decrypt_token(connection.get('access_token', ''))
+        access_token = connection.get('access_token', '')
         account_id = connection.get('account_id', '') or connection.get('page_id', '')
         
         if not access_token or not account_id:
@@ -161,7 +129,7 @@ def fetch_instagram_post_metrics(connection: Dict[str, Any], metrics: List[str],
         # Get Instagram Business account ID
         instagram_account_id = account_id
         if str(account_id).isdigit() and len(str(account_id)) <= 15:
-            page_resp = requests.get(
+            page_resp = http_clients.sync.get(
                 f"https://graph.facebook.com/v18.0/{account_id}",
                 params={"access_token": access_token, "fields": "instagram_business_account"},
                 timeout=10
@@ -175,7 +143,7 @@ def fetch_instagram_post_metrics(connection: Dict[str, Any], metrics: List[str],
         limit = 10 if date_range and ("week" in date_range.lower() or "month" in date_range.lower()) else 1
         
         logger.info(f"📸 Fetching latest Instagram post(s) for metrics: {metrics}")
-        response = requests.get(
+        response = http_clients.sync.get(
             f"https://graph.facebook.com/v18.0/{instagram_account_id}/media",
             params={
                 "access_token": access_token,
@@ -236,7 +204,7 @@ def fetch_instagram_insights(connection: Dict[str, Any], metrics: List[str], dat
             logger.info(f"📸 Detected post-level metrics request: {metrics}, fetching post metrics instead")
             return fetch_instagram_post_metrics(connection, metrics, date_range)
         
-        access_token = decrypt_token(connection.get('access_token', ''))
+        access_token = connection.get('access_token', '')
         account_id = connection.get('account_id', '') or connection.get('page_id', '')
         
         if not access_token or not account_id:
@@ -250,7 +218,7 @@ def fetch_instagram_insights(connection: Dict[str, Any], metrics: List[str], dat
         # Check if this is a Facebook Page ID (typically 10-15 digits) vs Instagram Business account ID (typically 15+ digits)
         if str(account_id).isdigit() and len(str(account_id)) <= 15:
             logger.info(f"🔍 account_id looks like Facebook Page ID, fetching Instagram Business account...")
-            page_resp = requests.get(
+            page_resp = http_clients.sync.get(
                 f"https://graph.facebook.com/v18.0/{account_id}",
                 params={"access_token": access_token, "fields": "instagram_business_account"},
                 timeout=10
@@ -305,7 +273,7 @@ def fetch_instagram_insights(connection: Dict[str, Any], metrics: List[str], dat
         logger.info(f"🌐 Fetching Instagram insights from: {insights_url}")
         logger.info(f"   Metrics: {api_metrics}, Period: {period}")
         
-        resp = requests.get(insights_url, params=params, timeout=15)
+        resp = http_clients.sync.get(insights_url, params=params, timeout=15)
         if resp.status_code != 200:
             error_text = resp.text
             logger.error(f"❌ Instagram API error: {resp.status_code}")
@@ -351,7 +319,7 @@ def fetch_instagram_insights(connection: Dict[str, Any], metrics: List[str], dat
         # Fetch followers count separately (not available in insights endpoint)
         if "followers" in metrics or "follower_count" in metrics:
             logger.info(f"🔍 Fetching followers count...")
-            account_resp = requests.get(
+            account_resp = http_clients.sync.get(
                 f"https://graph.facebook.com/v18.0/{instagram_account_id}",
                 params={"access_token": access_token, "fields": "followers_count"},
                 timeout=10
@@ -379,7 +347,7 @@ def fetch_instagram_insights(connection: Dict[str, Any], metrics: List[str], dat
 def fetch_facebook_post_metrics(connection: Dict[str, Any], metrics: List[str], date_range: Optional[str] = None) -> Optional[Dict[str, Any]]:
     """Fetch Facebook POST-LEVEL metrics (likes, comments, shares) from latest post"""
     try:
-        access_token = decrypt_token(connection.get('access_token', ''))
+        access_token = connection.get('access_token', '')
         account_id = connection.get('account_id', '') or connection.get('page_id', '')
         
         if not access_token or not account_id:
@@ -388,7 +356,7 @@ def fetch_facebook_post_metrics(connection: Dict[str, Any], metrics: List[str],
         limit = 10 if date_range and ("week" in date_range.lower() or "month" in date_range.lower()) else 1
         
         logger.info(f"📘 Fetching latest Facebook post(s) for metrics: {metrics}")
-        response = requests.get(
+        response = http_clients.sync.get(
             f"https://graph.facebook.com/v18.0/{account_id}/posts",
             params={
                 "access_token": access_token,
@@ -450,7 +418,7 @@ def fetch_facebook_insights(connection: Dict[str, Any], metrics: List[str], date
             logger.info(f"📘 Detected post-level metrics request: {metrics}, fetching post metrics instead")
             return fetch_facebook_post_metrics(connection, metrics, date_range)
         
-        access_token = decrypt_token(connection.get('access_token', ''))
+        access_token = connection.get('access_token', '')
         account_id = connection.get('account_id', '') or connection.get('page_id', '')
         
         if not access_token or not account_id:
@@ -469,7 +437,7 @@ def fetch_facebook_insights(connection: Dict[str, Any], metrics: List[str], date
                  "week" if date_range and "week" in date_range.lower() else "day"
         
         # Fetch insights (sync requests)
-        resp = requests.get(
+        resp = http_clients.sync.get(
             f"https://graph.facebook.com/v18.0/{account_id}/insights",
             params={"access_token": access_token, "metric": ",".join(api_metrics), "period": period},
             timeout=15
@@ -860,8 +828,6 @@ def get_analytics_summary(
         Summary dictionary with platform metrics and date ranges
     """
     try:
-        from datetime import datetime, timedelta
-
         if not supabase:
             logger.error("Supabase client not initialized")
             return {"error": "Database not available"}
@@ -1074,7 +1040,6 @@ def fetch_and_store_platform_analytics(
         result["api_fetch_success"] = True
 
         # Store each metric as a snapshot
-        from datetime import datetime
         today = datetime.now().date().isoformat()
         stored_count = 0
 
@@ -1124,16 +1089,17 @@ def test_token_decryption(user_id: str, platform: str) -> Dict[str, Any]:
         Dictionary with decryption test results
     """
     try:
-        connection = get_platform_connection(user_id, platform)
-        if not connection:
+        credentials = connection_registry.get_credentials(user_id, platform)
+        if not credentials:
             return {"success": False, "error": f"No connection found for {platform}"}
 
-        access_token = connection.get('access_token', '')
+        connection = credentials['connection']
+        access_token = connection.get('access_token_encrypted') or connection.get('access_token', '')
         if not access_token:
             return {"success": False, "error": "No access token found"}
 
-        # Test decryption
-        decrypted_token = decrypt_token(access_token)
+        # Decrypted by the registry (legacy plaintext tokens come back unchanged)
+        decrypted_token = credentials['access_token']
 
         # Don't log the actual token for security
         token_length = len(decrypted_token)
@@ -6,24 +6,93 @@ Scheduled job to automatically sync Gmail inboxes for all users
 
 import asyncio
 import logging
-from datetime import datetime, timedelta
-from typing import List, Dict, Any, Optional
+import math
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+from typing import Any, Callable, Dict, List, Optional
 import os
 import json
 
 from supabase import create_client, Client
-from cryptography.fernet import Fernet
+from services.connection_registry import connection_registry
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Scheduler tuning
+GMAIL_SYNC_CONCURRENCY = int(os.getenv("GMAIL_SYNC_CONCURRENCY", "8"))
+GMAIL_SYNC_MIN_INTERVAL_MINUTES = int(os.getenv("GMAIL_SYNC_MIN_INTERVAL_MINUTES", "10"))
+GMAIL_SYNC_JITTER_SECONDS = float(os.getenv("GMAIL_SYNC_JITTER_SECONDS", "5"))
+
+# Gmail allows 250 quota units per user per second (per-call costs live in routers.google_connections)
+GMAIL_USER_QUOTA_UNITS_PER_SECOND = float(os.getenv("GMAIL_USER_QUOTA_UNITS_PER_SECOND", "250"))
+
+# Sync arguments used by the background job
+GMAIL_SYNC_DAYS_BACK = 2
+GMAIL_SYNC_MAX_EMAILS = 50
+
+# Sync threads sleep in TokenBucket.acquire while a user's quota refills, so they get
+# their own pool instead of holding threads of the default asyncio.to_thread executor
+_gmail_executor = ThreadPoolExecutor(max_workers=GMAIL_SYNC_CONCURRENCY, thread_name_prefix="gmail-sync")
+
+
+async def _run_blocking(func, *args):
+    """Run blocking Gmail/Supabase work on the Gmail sync thread pool."""
+    return await asyncio.get_running_loop().run_in_executor(_gmail_executor, func, *args)
+
+
+class TokenBucket:
+    """
+    Per-user Gmail quota bucket (quota units, refilled continuously)
+
+    Acquired before every Gmail request from the sync worker thread. A request
+    costing more than the capacity (e.g. a 100-message batch) waits for a full
+    bucket and then leaves it in debt, so the following requests wait for the refill.
+    """
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated_at = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+
+    def acquire(self, cost: float) -> float:
+        """Block until cost units are available; returns the seconds waited"""
+        waited = 0.0
+        with self._lock:
+            self._refill()
+            needed = min(cost, self.capacity)
+            while self.tokens < needed:
+                delay = (needed - self.tokens) / self.rate
+                time.sleep(delay)
+                waited += delay
+                self._refill()
+            self.tokens -= cost
+        return waited
+
+
 class GmailSyncJob:
     """
     Job to automatically sync Gmail inboxes for all users
+
+    Due users are ordered by staleness weighted by recent mail activity and synced by
+    a bounded pool of async workers. The blocking Gmail/Supabase work for each user runs
+    on the job's own thread pool, so one slow mailbox only occupies one slot.
     """
 
-    def __init__(self):
+    def __init__(self, max_concurrency: int = GMAIL_SYNC_CONCURRENCY,
+                 min_interval_minutes: int = GMAIL_SYNC_MIN_INTERVAL_MINUTES,
+                 jitter_seconds: float = GMAIL_SYNC_JITTER_SECONDS):
         # Initialize Supabase client
         supabase_url = os.getenv("SUPABASE_URL")
         supabase_service_key = os.getenv("SUPABASE_SERVICE_ROLE_KEY")
@@ -37,49 +106,110 @@ class GmailSyncJob:
         encryption_key = os.getenv("ENCRYPTION_KEY")
         if not encryption_key:
             raise ValueError("ENCRYPTION_KEY must be set")
-        self.cipher = Fernet(encryption_key.encode())
+
+        self.max_concurrency = max(1, max_concurrency)
+        self.min_interval = timedelta(minutes=min_interval_minutes)
+        self.jitter_seconds = jitter_seconds
+
+        # Per-user state kept across runs
+        self.buckets: Dict[str, TokenBucket] = {}
+        self.user_metrics: Dict[str, Dict[str, Any]] = {}
+        self.last_run: Dict[str, Any] = {}
 
     def decrypt_token(self, encrypted_token: str) -> str:
         """Decrypt an encrypted token"""
         try:
-            return self.cipher.decrypt(encrypted_token.encode()).decode()
+            return connection_registry.decrypt_token(encrypted_token)
         except Exception as e:
             logger.error(f"Failed to decrypt token: {e}")
             raise
 
+    def _load_connections(self) -> List[Dict[str, Any]]:
+        """Get all users with active Google connections"""
+        # Note: metadata column may not exist yet - will be added by migration
+        try:
+            users_result = self.supabase.table("platform_connections").select("""
+                user_id,
+                metadata,
+                access_token_encrypted,
+                refresh_token_encrypted
+            """).eq("platform", "google").eq("is_active", True).execute()
+        except Exception as e:
+            if "does not exist" in str(e):
+                # Fallback: get connections without metadata column
+                logger.warning("📧 metadata column not found, using fallback query without Gmail sync settings")
+                users_result = self.supabase.table("platform_connections").select("""
+                    user_id,
+                    access_token_encrypted,
+                    refresh_token_encrypted
+                """).eq("platform", "google").eq("is_active", True).execute()
+
+                # Add empty metadata for all results
+                for user in users_result.data or []:
+                    user['metadata'] = {}
+            else:
+                raise e
+        return users_result.data or []
+
+    @staticmethod
+    def _parse_last_sync(metadata: Dict[str, Any]) -> Optional[datetime]:
+        last_sync = metadata.get("gmail_last_sync")
+        if not last_sync:
+            return None
+        try:
+            last_sync_datetime = datetime.fromisoformat(last_sync.replace('Z', '+00:00'))
+        except ValueError:
+            return None
+        if last_sync_datetime.tzinfo is None:
+            # gmail_last_sync is written with the server's local time
+            last_sync_datetime = last_sync_datetime.astimezone()
+        return last_sync_datetime
+
+    def _priority(self, staleness_seconds: Optional[float], metadata: Dict[str, Any]) -> float:
+        """Higher is more urgent: never-synced first, then staleness weighted by activity"""
+        if staleness_seconds is None:
+            return float("inf")
+        activity = float(metadata.get("gmail_activity_score") or 0)
+        return staleness_seconds * (1 + math.log1p(activity))
+
+    def _select_due_users(self, connections: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        now = datetime.now(timezone.utc)
+        due = []
+        for connection in connections:
+            user_id = connection["user_id"]
+            metadata = connection.get("metadata") or {}
+
+            # Check if Gmail sync is enabled for this user
+            if not metadata.get("gmail_sync_enabled", False):
+                logger.debug(f"📧 Gmail sync not enabled for user {user_id}")
+                continue
+
+            last_sync = self._parse_last_sync(metadata)
+            staleness = (now - last_sync).total_seconds() if last_sync else None
+            # Don't sync more than once per min interval (allows for scheduler variations)
+            if staleness is not None and staleness < self.min_interval.total_seconds():
+                logger.debug(f"📧 Skipping user {user_id} - last sync too recent")
+                continue
+
+            due.append({
+                "connection": connection,
+                "staleness": staleness,
+                "priority": self._priority(staleness, metadata),
+            })
+
+        due.sort(key=lambda item: item["priority"], reverse=True)
+        return due
+
     async def sync_all_users_gmail(self) -> Dict[str, Any]:
         """
         Sync Gmail for all users who have Gmail sync enabled
         """
         try:
             logger.info("🚀 Starting Gmail sync job for all users")
+            run_started = time.monotonic()
 
-            # Get all users with active Google connections
-            # Note: metadata column may not exist yet - will be added by migration
-            try:
-                users_result = self.supabase.table("platform_connections").select("""
-                    user_id,
-                    metadata,
-                    access_token_encrypted,
-                    refresh_token_encrypted
-                """).eq("platform", "google").eq("is_active", True).execute()
-            except Exception as e:
-                if "does not exist" in str(e):
-                    # Fallback: get connections without metadata column
-                    logger.warning("📧 metadata column not found, using fallback query without Gmail sync settings")
-                    users_result = self.supabase.table("platform_connections").select("""
-                        user_id,
-                        access_token_encrypted,
-                        refresh_token_encrypted
-                    """).eq("platform", "google").eq("is_active", True).execute()
-
-                    # Add empty metadata for all results
-                    for user in users_result.data or []:
-                        user['metadata'] = {}
-                else:
-                    raise e
-
-            if not users_result.data:
+            connections = await _run_blocking(self._load_connections)
+            if not connections:
                 logger.info("📧 No users found with active Google connections")
                 return {
                     "success": True,
@@ -88,81 +218,61 @@ class GmailSyncJob:
                     "emails_synced": 0
                 }
 
-            logger.info(f"📧 Found {len(users_result.data)} users with active Google connections")
-
-            total_emails_synced = 0
-            users_processed = 0
-            users_with_sync_enabled = 0
-
-            for connection in users_result.data:
-                try:
-                    user_id = connection["user_id"]
-                    metadata = connection.get("metadata") or {}
-
-                    # Check if Gmail sync is enabled for this user
-                    gmail_sync_enabled = metadata.get("gmail_sync_enabled", False) if metadata else False
-                    if not gmail_sync_enabled:
-                        logger.info(f"📧 Gmail sync not enabled for user {user_id}")
-                        continue
-
-                    users_with_sync_enabled += 1
-
-                    # Check last sync time to avoid too frequent syncing (15-minute intervals)
-                    last_sync = metadata.get("gmail_last_sync")
-                    if last_sync:
-                        last_sync_datetime = datetime.fromisoformat(last_sync.replace('Z', '+00:00'))
-                        # Don't sync more than once per 10 minutes (allows for scheduler variations)
-                        if datetime.now(last_sync_datetime.tzinfo) - last_sync_datetime < timedelta(minutes=10):
-                            logger.debug(f"📧 Skipping user {user_id} - last sync too recent")
-                            continue
-
-                    # Perform Gmail sync for this user
-                    sync_result = await self.sync_user_gmail(user_id, connection)
-
-                    if sync_result["success"]:
-                        total_emails_synced += sync_result["emails_stored"]
-                        users_processed += 1
-
-                        # Update last sync time
-                        updated_metadata = {
-                            **metadata,
-                            "gmail_last_sync": datetime.now().isoformat(),
-                            "gmail_sync_status": "completed"
-                        }
-
-                        self.supabase.table("platform_connections").update({
-                            "metadata": updated_metadata
-                        }).eq("user_id", user_id).eq("platform", "google").execute()
-
-                        logger.info(f"✅ Synced {sync_result['emails_stored']} emails for user {user_id}")
-                    else:
-                        error_msg = sync_result.get('error', 'Unknown error')
-                        logger.warning(f"❌ Failed to sync Gmail for user {user_id}: {error_msg}")
-
-                        # Update sync status with error
-                        updated_metadata = {
-                            **metadata,
-                            "gmail_last_sync": datetime.now().isoformat(),
-                            "gmail_sync_status": "failed",
-                            "gmail_sync_error": error_msg
-                        }
-
-                        self.supabase.table("platform_connections").update({
-                            "metadata": updated_metadata
-                        }).eq("user_id", user_id).eq("platform", "google").execute()
-
-                except Exception as user_error:
-                    logger.error(f"❌ Error processing user {connection['user_id']}: {user_error}")
-                    continue
-
-            logger.info(f"🎉 Gmail sync job completed: {users_processed}/{users_with_sync_enabled} users processed, {total_emails_synced} emails synced")
+            logger.info(f"📧 Found {len(connections)} users with active Google connections")
+
+            users_with_sync_enabled = sum(
+                1 for connection in connections
+                if (connection.get("metadata") or {}).get("gmail_sync_enabled", False)
+            )
+            due_users = self._select_due_users(connections)
+
+            queue: asyncio.Queue = asyncio.Queue()
+            for item in due_users:
+                queue.put_nowait(item)
+
+            totals = {"users_processed": 0, "emails_synced": 0, "failed": 0}
+
+            async def worker():
+                while True:
+                    try:
+                        item = queue.get_nowait()
+                    except asyncio.QueueEmpty:
+                        return
+                    try:
+                        await self._sync_due_user(item, totals)
+                    except Exception as user_error:
+                        totals["failed"] += 1
+                        logger.error(f"❌ Error processing user {item['connection']['user_id']}: {user_error}")
+
+            worker_count = min(self.max_concurrency, len(due_users))
+            await asyncio.gather(*(worker() for _ in range(worker_count)))
+
+            lags = sorted(
+                self.user_metrics[item["connection"]["user_id"]]["lag_seconds"]
+                for item in due_users
+                if self.user_metrics.get(item["connection"]["user_id"], {}).get("lag_seconds") is not None
+            )
+            self.last_run = {
+                "finished_at": datetime.now(timezone.utc).isoformat(),
+                "duration_seconds": round(time.monotonic() - run_started, 2),
+                "users_due": len(due_users),
+                "users_processed": totals["users_processed"],
+                "users_failed": totals["failed"],
+                "emails_synced": totals["emails_synced"],
+                "lag_p50_seconds": lags[len(lags) // 2] if lags else None,
+                "lag_max_seconds": lags[-1] if lags else None,
+            }
+
+            logger.info(f"🎉 Gmail sync job completed: {totals['users_processed']}/{len(due_users)} due users processed "
+                        f"({users_with_sync_enabled} enabled), {totals['emails_synced']} emails synced "
+                        f"in {self.last_run['duration_seconds']}s")
 
             return {
                 "success": True,
-                "message": f"Successfully synced Gmail for {users_processed} users",
-                "users_processed": users_processed,
+                "message": f"Successfully synced Gmail for {totals['users_processed']} users",
+                "users_processed": totals["users_processed"],
                 "users_with_sync_enabled": users_with_sync_enabled,
-                "emails_synced": total_emails_synced
+                "emails_synced": totals["emails_synced"]
             }
 
         except Exception as e:
@@ -174,10 +284,105 @@ class GmailSyncJob:
                 "emails_synced": 0
             }
 
-    async def sync_user_gmail(self, user_id: str, connection: Dict[str, Any]) -> Dict[str, Any]:
+    async def _sync_due_user(self, item: Dict[str, Any], totals: Dict[str, int]) -> None:
+        connection = item["connection"]
+        user_id = connection["user_id"]
+        metadata = connection.get("metadata") or {}
+
+        # Spread users out so the pool doesn't hit Google in lockstep
+        if self.jitter_seconds > 0:
+            await asyncio.sleep(random.uniform(0, self.jitter_seconds))
+
+        bucket = self.buckets.get(user_id)
+        if bucket is None:
+            bucket = self.buckets[user_id] = TokenBucket(
+                GMAIL_USER_QUOTA_UNITS_PER_SECOND, GMAIL_USER_QUOTA_UNITS_PER_SECOND
+            )
+        quota_wait = 0.0
+
+        def acquire_quota(units: float) -> None:
+            # Called from the sync thread before each Gmail request
+            nonlocal quota_wait
+            quota_wait += bucket.acquire(units)
+
+        last_sync = self._parse_last_sync(metadata)
+        started_at = datetime.now(timezone.utc)
+        lag_seconds = (started_at - last_sync).total_seconds() if last_sync else None
+        started = time.monotonic()
+
+        # Perform Gmail sync for this user
+        sync_result = await self.sync_user_gmail(user_id, connection, acquire_quota)
+        duration = time.monotonic() - started
+
+        user_metrics = self.user_metrics.setdefault(user_id, {"syncs": 0, "failures": 0})
+        user_metrics.update({
+            "lag_seconds": round(lag_seconds, 1) if lag_seconds is not None else None,
+            "last_duration_seconds": round(duration, 2),
+            "quota_wait_seconds": round(quota_wait, 2),
+            "last_attempt_at": started_at.isoformat(),
+            "priority": item["priority"] if item["priority"] != float("inf") else None,
+        })
+
+        if sync_result["success"]:
+            emails_stored = sync_result.get("emails_stored", 0)
+            totals["emails_synced"] += emails_stored
+            totals["users_processed"] += 1
+            user_metrics["syncs"] += 1
+            user_metrics["last_success_at"] = datetime.now(timezone.utc).isoformat()
+            user_metrics["emails_stored"] = emails_stored
+            user_metrics["last_status"] = "completed"
+
+            # Update last sync time (keep the historyId the sync just stored)
+            activity = float(metadata.get("gmail_activity_score") or 0)
+            updated_metadata = {
+                **(sync_result.get("metadata") or metadata),
+                "gmail_last_sync": datetime.now().isoformat(),
+                "gmail_sync_status": "completed",
+                "gmail_activity_score": round(0.7 * activity + 0.3 * emails_stored, 3)
+            }
+            await _run_blocking(self._update_metadata, user_id, updated_metadata)
+
+            logger.info(f"✅ Synced {emails_stored} emails for user {user_id} in {duration:.1f}s")
+        else:
+            totals["failed"] += 1
+            user_metrics["failures"] += 1
+            user_metrics["last_status"] = "failed"
+            error_msg = sync_result.get('error', 'Unknown error')
+            logger.warning(f"❌ Failed to sync Gmail for user {user_id}: {error_msg}")
+
+            # Update sync status with error
+            updated_metadata = {
+                **metadata,
+                "gmail_last_sync": datetime.now().isoformat(),
+                "gmail_sync_status": "failed",
+                "gmail_sync_error": error_msg
+            }
+            await _run_blocking(self._update_metadata, user_id, updated_metadata)
+
+    def _update_metadata(self, user_id: str, metadata: Dict[str, Any]) -> None:
+        self.supabase.table("platform_connections").update({
+            "metadata": metadata
+        }).eq("user_id", user_id).eq("platform", "google").execute()
+        connection_registry.invalidate(user_id, "google")
+
+    def get_metrics(self) -> Dict[str, Any]:
+        """Per-user lag/duration metrics and a summary of the last run"""
+        return {
+            "max_concurrency": self.max_concurrency,
+            "min_interval_minutes": self.min_interval.total_seconds() / 60,
+            "last_run": self.last_run,
+            "users": self.user_metrics,
+        }
+
+    async def sync_user_gmail(self, user_id: str, connection: Dict[str, Any],
+                              acquire_quota: Optional[Callable[[float], Any]] = None) -> Dict[str, Any]:
         """
-        Sync Gmail for a specific user
+        Sync Gmail for a specific user (blocking work runs on the Gmail sync thread pool)
         """
+        return await _run_blocking(self._sync_user_gmail_blocking, user_id, connection, acquire_quota)
+
+    def _sync_user_gmail_blocking(self, user_id: str, connection: Dict[str, Any],
+                                  acquire_quota: Optional[Callable[[float], Any]] = None) -> Dict[str, Any]:
         try:
             # Import the Gmail sync helper function
             from routers.google_connections import sync_gmail_inbox_for_user
@@ -201,13 +406,14 @@ class GmailSyncJob:
                     "emails_stored": 0
                 }
 
-            # Call the sync function directly
-            result = await sync_gmail_inbox_for_user(
+            # The sync helper makes blocking Gmail/Supabase calls, so it gets this thread's own loop
+            result = asyncio.run(sync_gmail_inbox_for_user(
                 user_id=user_id,
                 user_email=user_email,
-                days_back=2,  # Sync last 2 days (API-efficient)
-                max_emails=50  # Max 50 emails per sync (API-efficient)
-            )
+                days_back=GMAIL_SYNC_DAYS_BACK,  # Sync last 2 days (API-efficient)
+                max_emails=GMAIL_SYNC_MAX_EMAILS,  # Max 50 emails per sync (API-efficient)
+                acquire_quota=acquire_quota
+            ))
 
             return result
 
@@ -219,12 +425,23 @@ class GmailSyncJob:
                 "emails_stored": 0
             }
 
+
+_gmail_sync_job: Optional[GmailSyncJob] = None
+
+
+def get_gmail_sync_job() -> GmailSyncJob:
+    """Shared job instance, so quota buckets and lag metrics persist across runs"""
+    global _gmail_sync_job
+    if _gmail_sync_job is None:
+        _gmail_sync_job = GmailSyncJob()
+    return _gmail_sync_job
+
 async def run_gmail_sync_job():
     """
     Main function to run the Gmail sync job
     """
     try:
-        job = GmailSyncJob()
+        job = get_gmail_sync_job()
         result = await job.sync_all_users_gmail()
 
         if result["success"]:
@@ -0,0 +1,297 @@
+#!/usr/bin/env python3
+"""
+Token Refresh Job
+Refreshes OAuth access tokens shortly before they expire
+
+Every refreshable connection is kept in a min-heap keyed by its refresh due time
+(expiry minus a lead time minus jitter). The scheduler calls run_due() every
+minute; due tokens are refreshed in worker threads with bounded concurrency, and
+the heap is rebuilt from the database periodically to pick up new connections.
+Request handlers keep their lazy refresh as a fallback, but with tokens renewed
+ahead of time they no longer hit an expired token on the hot path.
+"""
+
+import asyncio
+import heapq
+import itertools
+import logging
+import random
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, List, Optional, Tuple
+import os
+
+from supabase import create_client, Client
+from services.connection_registry import connection_registry
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Scheduler tuning
+TOKEN_REFRESH_LEAD_SECONDS = float(os.getenv("TOKEN_REFRESH_LEAD_SECONDS", "600"))
+TOKEN_REFRESH_JITTER_SECONDS = float(os.getenv("TOKEN_REFRESH_JITTER_SECONDS", "120"))
+TOKEN_REFRESH_CONCURRENCY = int(os.getenv("TOKEN_REFRESH_CONCURRENCY", "4"))
+TOKEN_REFRESH_RESCAN_MINUTES = int(os.getenv("TOKEN_REFRESH_RESCAN_MINUTES", "10"))
+
+# Google access tokens last an hour; used when a row has no recorded expiry
+GOOGLE_ACCESS_TOKEN_LIFETIME = timedelta(hours=1)
+GOOGLE_TOKEN_URI = "https://oauth2.googleapis.com/token"
+
+MAX_RETRY_DELAY_SECONDS = 3600
+
+# Where refreshable Google tokens live: (table, filter column, filter values)
+REFRESHABLE_SOURCES = (
+    ("platform_connections", "platform", ["google", "youtube"]),
+    ("user_connections", "service", ["google_drive"]),
+)
+
+
+def _parse_timestamp(value: Optional[str]) -> Optional[datetime]:
+    if not value:
+        return None
+    try:
+        parsed = datetime.fromisoformat(str(value).replace('Z', '+00:00'))
+    except ValueError:
+        return None
+    if parsed.tzinfo is None:
+        # Timestamp columns are stored and returned in UTC
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return parsed
+
+
+class TokenRefreshJob:
+    """Min-heap scheduler that renews access tokens before they expire"""
+
+    def __init__(self, lead_seconds: float = TOKEN_REFRESH_LEAD_SECONDS,
+                 jitter_seconds: float = TOKEN_REFRESH_JITTER_SECONDS,
+                 max_concurrency: int = TOKEN_REFRESH_CONCURRENCY,
+                 rescan_minutes: int = TOKEN_REFRESH_RESCAN_MINUTES):
+        # Initialize Supabase client
+        supabase_url = os.getenv("SUPABASE_URL")
+        supabase_service_key = os.getenv("SUPABASE_SERVICE_ROLE_KEY")
+
+        if not supabase_url or not supabase_service_key:
+            raise ValueError("SUPABASE_URL and SUPABASE_SERVICE_ROLE_KEY must be set")
+
+        self.supabase: Client = create_client(supabase_url, supabase_service_key)
+
+        self.lead_seconds = lead_seconds
+        self.jitter_seconds = jitter_seconds
+        self.max_concurrency = max(1, max_concurrency)
+        self.rescan_interval = rescan_minutes * 60
+
+        # Heap of (due_ts, seq, key); entries whose seq no longer matches are stale
+        self._heap: List[Tuple[float, int, Tuple[str, str]]] = []
+        self._entries: Dict[Tuple[str, str], Dict[str, Any]] = {}
+        self._seq = itertools.count()
+        self._last_rescan = 0.0
+        # Connections whose refresh token was rejected, until they reconnect with a new one
+        self._rejected: Dict[Tuple[str, str], str] = {}
+        self._stats = {"refreshed": 0, "failed": 0, "skipped": 0}
+
+    # ── Scheduling ──────────────────────────────────────────────────────────
+
+    def _expires_at(self, row: Dict[str, Any]) -> datetime:
+        """Best known expiry of the row's access token"""
+        expires_at = _parse_timestamp(row.get("token_expires_at"))
+        last_refresh = _parse_timestamp(row.get("last_token_refresh"))
+        # Lazy refreshes record last_token_refresh without a new expiry
+        if last_refresh and (expires_at is None or last_refresh + GOOGLE_ACCESS_TOKEN_LIFETIME > expires_at):
+            expires_at = last_refresh + GOOGLE_ACCESS_TOKEN_LIFETIME
+        return expires_at or datetime.now(timezone.utc)
+
+    def _schedule(self, key: Tuple[str, str], entry: Dict[str, Any], due_ts: float) -> None:
+        seq = next(self._seq)
+        entry["due_ts"] = due_ts
+        entry["seq"] = seq
+        self._entries[key] = entry
+        heapq.heappush(self._heap, (due_ts, seq, key))
+
+    def _schedule_row(self, table: str, row: Dict[str, Any]) -> None:
+        key = (table, row["id"])
+        if self._rejected.get(key) == row.get("refresh_token_encrypted"):
+            return
+        self._rejected.pop(key, None)
+        expires_at = self._expires_at(row)
+        previous = self._entries.get(key)
+        if previous and previous["expires_at"] == expires_at.isoformat():
+            # Already scheduled for this token
+            return
+        due_ts = expires_at.timestamp() - self.lead_seconds - random.uniform(0, self.jitter_seconds)
+        if previous and previous.get("failures") and previous["due_ts"] > due_ts:
+            # Keep the backoff of a connection that failed recently
+            return
+        self._schedule(key, {
+            "table": table,
+            "id": row["id"],
+            "user_id": row.get("user_id"),
+            "refresh_token_encrypted": row.get("refresh_token_encrypted"),
+            "expires_at": expires_at.isoformat(),
+            "failures": previous.get("failures", 0) if previous else 0,
+        }, due_ts)
+
+    def _load_rows(self) -> List[Tuple[str, Dict[str, Any]]]:
+        rows = []
+        for table, column, values in REFRESHABLE_SOURCES:
+            try:
+                result = self.supabase.table(table).select("*").in_(column, values).eq("is_active", True).execute()
+            except Exception as e:
+                logger.error(f"Error loading refreshable connections from {table}: {e}")
+                continue
+            for row in result.data or []:
+                if row.get("refresh_token_encrypted"):
+                    rows.append((table, row))
+        return rows
+
+    def rescan(self) -> int:
+        """Rebuild the heap from the database; returns the number of tracked connections"""
+        rows = self._load_rows()
+        seen = set()
+        for table, row in rows:
+            seen.add((table, row["id"]))
+            self._schedule_row(table, row)
+        for key in list(self._entries):
+            if key not in seen:
+                # Disconnected or deactivated since the last scan
+                del self._entries[key]
+        for key in list(self._rejected):
+            if key not in seen:
+                del self._rejected[key]
+        self._last_rescan = time.monotonic()
+        logger.info(f"🔑 Token refresh scheduler tracking {len(self._entries)} connections")
+        return len(self._entries)
+
+    def _pop_due(self, now_ts: float) -> List[Dict[str, Any]]:
+        due = []
+        while self._heap and self._heap[0][0] <= now_ts:
+            _, seq, key = heapq.heappop(self._heap)
+            entry = self._entries.get(key)
+            if entry is None or entry["seq"] != seq:
+                continue
+            due.append(entry)
+        return due
+
+    # ── Refreshing ──────────────────────────────────────────────────────────
+
+    def _refresh_blocking(self, entry: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """Refresh one connection; returns the updated row, or None if it is gone"""
+        from google.oauth2.credentials import Credentials
+        from google.auth.transport.requests import Request
+
+        result = self.supabase.table(entry["table"]).select("*").eq("id", entry["id"]).eq("is_active", True).execute()
+        if not result.data:
+            return None
+        row = result.data[0]
+
+        # A request handler may already have refreshed this token
+        if self._expires_at(row).timestamp() - self.lead_seconds > time.time():
+            self._stats["skipped"] += 1
+            return row
+
+        refresh_token = connection_registry.decrypt_token(row["refresh_token_encrypted"])
+        credentials = Credentials(
+            token=None,
+            refresh_token=refresh_token,
+            token_uri=GOOGLE_TOKEN_URI,
+            client_id=os.getenv("GOOGLE_CLIENT_ID"),
+            client_secret=os.getenv("GOOGLE_CLIENT_SECRET"),
+        )
+        credentials.refresh(Request())
+
+        # google-auth reports expiry as naive UTC
+        expiry = credentials.expiry.replace(tzinfo=timezone.utc) if credentials.expiry else \
+            datetime.now(timezone.utc) + GOOGLE_ACCESS_TOKEN_LIFETIME
+        now_iso = datetime.now(timezone.utc).isoformat()
+        update_payload = {
+            "access_token_encrypted": connection_registry.encrypt_token(credentials.token),
+            "token_expires_at": expiry.isoformat(),
+        }
+        if entry["table"] == "platform_connections":
+            update_payload["last_token_refresh"] = now_iso
+        else:
+            update_payload["updated_at"] = now_iso
+        if credentials.refresh_token and credentials.refresh_token != refresh_token:
+            update_payload["refresh_token_encrypted"] = connection_registry.encrypt_token(credentials.refresh_token)
+
+        self.supabase.table(entry["table"]).update(update_payload).eq("id", entry["id"]).execute()
+        connection_registry.invalidate(row.get("user_id"), row.get("platform") or "google")
+        self._stats["refreshed"] += 1
+        logger.info(f"🔄 Refreshed {entry['table']} token for user {row.get('user_id')} (expires {expiry.isoformat()})")
+        return {**row, **update_payload}
+
+    async def _refresh_entry(self, entry: Dict[str, Any], semaphore: asyncio.Semaphore) -> None:
+        key = (entry["table"], entry["id"])
+        async with semaphore:
+            try:
+                row = await asyncio.to_thread(self._refresh_blocking, entry)
+            except Exception as e:
+                self._stats["failed"] += 1
+                error_str = str(e).lower()
+                if "invalid_grant" in error_str or "unauthorized" in error_str:
+                    # Revoked; the next user request deactivates it and asks for a reconnect
+                    logger.warning(f"🚫 Refresh token rejected for user {entry['user_id']}, no longer scheduling: {e}")
+                    self._entries.pop(key, None)
+                    self._rejected[key] = entry.get("refresh_token_encrypted")
+                    return
+                entry["failures"] = entry.get("failures", 0) + 1
+                delay = min(60 * (2 ** (entry["failures"] - 1)), MAX_RETRY_DELAY_SECONDS)
+                logger.error(f"❌ Token refresh failed for user {entry['user_id']} (retry in {delay}s): {e}")
+                self._schedule(key, entry, time.time() + delay + random.uniform(0, self.jitter_seconds))
+                return
+
+        if row is None:
+            self._entries.pop(key, None)
+            return
+        entry["failures"] = 0
+        self._schedule_row(entry["table"], row)
+
+    async def run_due(self) -> Dict[str, Any]:
+        """Refresh every token that is due; rescans the database when the scan is stale"""
+        if not self._entries or time.monotonic() - self._last_rescan >= self.rescan_interval:
+            await asyncio.to_thread(self.rescan)
+
+        due = self._pop_due(time.time())
+        if due:
+            semaphore = asyncio.Semaphore(self.max_concurrency)
+            await asyncio.gather(*(self._refresh_entry(entry, semaphore) for entry in due))
+        return {"success": True, "refreshed_due": len(due), "tracked": len(self._entries)}
+
+    def get_metrics(self) -> Dict[str, Any]:
+        next_due = min((entry["due_ts"] for entry in self._entries.values()), default=None)
+        return {
+            **self._stats,
+            "tracked": len(self._entries),
+            "failing": sum(1 for entry in self._entries.values() if entry.get("failures")),
+            "next_due_at": datetime.fromtimestamp(next_due, timezone.utc).isoformat() if next_due else None,
+        }
+
+
+_token_refresh_job: Optional[TokenRefreshJob] = None
+
+
+def get_token_refresh_job() -> TokenRefreshJob:
+    """Shared job instance, so the heap persists across scheduler runs"""
+    global _token_refresh_job
+    if _token_refresh_job is None:
+        _token_refresh_job = TokenRefreshJob()
+    return _token_refresh_job
+
+
+async def run_token_refresh_job():
+    """
+    Main function to run the token refresh job
+    """
+    try:
+        return await get_token_refresh_job().run_due()
+    except Exception as e:
+        logger.error(f"❌ Fatal error in token refresh job: {e}")
+        return {
+            "success": False,
+            "error": str(e)
+        }
+
+
+if __name__ == "__main__":
+    # Run the job directly for testing
+    asyncio.run(run_token_refresh_job())
@@ -48,6 +48,8 @@ from routers import document_parser
 from routers import smart_search
 from services.scheduler import start_analytics_scheduler, stop_analytics_scheduler, get_scheduler_status, trigger_analytics_collection_now
 from services.image_editor_service import image_editor_service
+from services.progress_hub import progress_hub, DEFAULT_TOPIC, PROGRESS_TOPICS
+from services.http_clients import http_clients
 from utils.daily_cache_manager import daily_cache
 
 # Load environment variables
@@ -171,11 +173,7 @@ if not openai_api_key:
 
 supabase: Client = create_client(supabase_url, supabase_key)
 
-# In-memory progress tracking
-progress_store: Dict[str, Dict[str, Any]] = {}
-progress_subscribers: Dict[str, List[asyncio.Queue]] = {}
-
-# Progress tracking functions
+# Progress tracking (fan-out hub, optionally shared across workers via PROGRESS_BROKER_URL)
 async def update_progress(user_id: str, step: str, percentage: int, details: str, current_platform: str = None):
     """Update progress for a user"""
     progress_data = {
@@ -188,36 +186,24 @@ async def update_progress(user_id: str, step: str, percentage: int, details: str
         "is_generating": True
     }
     
-    progress_store[user_id] = progress_data
-    
-    # Notify all subscribers
-    if user_id in progress_subscribers:
-        for queue in progress_subscribers[user_id]:
-            try:
-                await queue.put(progress_data)
-            except:
-                # Remove dead queues
-                progress_subscribers[user_id].remove(queue)
+    await progress_hub.publish(user_id, progress_data)
 
 async def complete_progress(user_id: str):
     """Mark progress as completed"""
-    if user_id in progress_store:
-        progress_store[user_id]["is_generating"] = False
-        progress_store[user_id]["step"] = "completed"
-        progress_store[user_id]["percentage"] = 100
-        progress_store[user_id]["details"] = "Content generation completed!"
-        
-        # Notify subscribers
-        if user_id in progress_subscribers:
-            for queue in progress_subscribers[user_id]:
-                try:
-                    await queue.put(progress_store[user_id])
-                except:
-                    progress_subscribers[user_id].remove(queue)
+    current = await progress_hub.get_latest(user_id)
+    if current:
+        await progress_hub.publish(user_id, {
+            **current,
+            "is_generating": False,
+            "step": "completed",
+            "percentage": 100,
+            "details": "Content generation completed!",
+            "timestamp": datetime.now().isoformat()
+        })
 
-def get_progress(user_id: str) -> Dict[str, Any]:
+async def get_progress(user_id: str) -> Dict[str, Any]:
     """Get current progress for a user"""
-    return progress_store.get(user_id, {"is_generating": False})
+    return await progress_hub.get_latest(user_id) or {"is_generating": False}
 
 # Content scheduler removed
 
@@ -225,7 +211,52 @@ def get_progress(user_id: str) -> Dict[str, Any]:
 @app.on_event("startup")
 async def startup_event():
     """Start services on startup"""
-    
+
+    # Start progress pub/sub hub
+    try:
+        await progress_hub.start()
+    except Exception as e:
+        logger.error(f"Failed to start progress hub: {e}")
+
+    # Bind the shared platform HTTP client pool to the app loop
+    try:
+        await http_clients.start()
+    except Exception as e:
+        logger.error(f"Failed to start HTTP client pool: {e}")
+
+    # Warm the HTML → PNG browser pool in the background so startup is not delayed
+    try:
+        from services.html_renderer import html_renderer
+        if html_renderer.available and os.getenv("HTML_RENDER_WARM_ON_STARTUP", "true").lower() == "true":
+            async def warm_html_renderer():
+                try:
+                    await html_renderer.start()
+                except Exception as e:
+                    logger.error(f"Failed to warm HTML renderer: {e}")
+            app.state.html_renderer_warmup = asyncio.create_task(warm_html_renderer())
+    except Exception as e:
+        logger.error(f"Failed to schedule HTML renderer warm-up: {e}")
+
+    # Start the image/CPU worker processes before the first request needs them
+    try:
+        from services.cpu_executor import cpu_executor
+        await cpu_executor.start()
+    except Exception as e:
+        logger.error(f"Failed to start CPU executor: {e}")
+
+    # Resume background media publish jobs left behind by stopped workers
+    try:
+        from services.media_publish_jobs import media_publish_jobs
+        media_publish_jobs.start()
+    except Exception as e:
+        logger.error(f"Failed to start media publish jobs: {e}")
+
+    # Start write-behind persistence for ATSN conversation messages
+    try:
+        from services.conversation_writer import conversation_writer
+        conversation_writer.start()
+    except Exception as e:
+        logger.error(f"Failed to start ATSN conversation writer: {e}")
 
     # Start daily conversation cache cleanup scheduler
     try:
@@ -236,6 +267,14 @@ async def startup_event():
             minute=1,  # 1 minute past midnight
             id='daily_cache_cleanup'
         )
+        # Write-behind flush of modified conversation sessions to the spill dir
+        scheduler.add_job(
+            daily_cache.flush_dirty_sessions,
+            'interval',
+            seconds=30,
+            id='daily_cache_flush',
+            max_instances=1
+        )
         scheduler.start()
         logger.info("Daily conversation cache cleanup scheduler started successfully")
     except Exception as e:
@@ -266,59 +305,52 @@ async def startup_event():
         logger.error(f"Failed to start analytics scheduler: {e}")
         logger.info("Continuing without analytics scheduler")
 
-    # Start Gmail sync scheduler (runs every 15 minutes in background thread - non-blocking)
+    # Start Gmail sync scheduler (runs every 15 minutes; users sync concurrently in a bounded worker pool)
     try:
-        from jobs.gmail_sync_job import GmailSyncJob
-        import threading
+        from jobs.gmail_sync_job import run_gmail_sync_job
 
-        def run_gmail_sync_background():
-            """Run Gmail sync in background thread to avoid blocking other requests"""
-            loop = asyncio.new_event_loop()
-            asyncio.set_event_loop(loop)
-            try:
-                job = GmailSyncJob()
-                loop.run_until_complete(job.sync_all_users_gmail())
-            except Exception as e:
-                logger.error(f"Error in background Gmail sync: {e}")
-            finally:
-                loop.close()
-
-        # Schedule to run every 15 minutes in background thread
         scheduler.add_job(
-            func=lambda: threading.Thread(target=run_gmail_sync_background).start(),
+            run_gmail_sync_job,
             trigger='interval',
             minutes=15,  # Run every 15 minutes
             id='gmail_sync_job',
-            max_instances=1  # Only one instance at a time
+            max_instances=1,  # Only one instance at a time
+            coalesce=True
         )
 
-        logger.info("Gmail sync scheduler started successfully - runs every 15 minutes in background thread")
+        logger.info("Gmail sync scheduler started successfully - runs every 15 minutes")
     except Exception as e:
         logger.error(f"Failed to start Gmail sync scheduler: {e}")
         logger.info("Continuing without Gmail sync scheduler")
 
-    # Start Google Drive monitor scheduler (runs every 5 minutes)
+    # Start token refresh scheduler (renews Google access tokens before they expire)
     try:
-        from routers.drive_monitor import scan_all_users_drive
-        import threading
+        from jobs.token_refresh_job import run_token_refresh_job
 
-        def run_drive_monitor_background():
-            """Run Drive monitor in background thread to avoid blocking other requests"""
-            loop = asyncio.new_event_loop()
-            asyncio.set_event_loop(loop)
-            try:
-                loop.run_until_complete(scan_all_users_drive())
-            except Exception as e:
-                logger.error(f"Error in background Drive monitor: {e}")
-            finally:
-                loop.close()
+        scheduler.add_job(
+            run_token_refresh_job,
+            trigger='interval',
+            minutes=1,
+            id='token_refresh_job',
+            max_instances=1,
+            coalesce=True
+        )
+        logger.info("Token refresh scheduler started successfully - checks due tokens every minute")
+    except Exception as e:
+        logger.error(f"Failed to start token refresh scheduler: {e}")
+        logger.info("Continuing without token refresh scheduler")
+
+    # Start Google Drive monitor scheduler (runs every 5 minutes; blocking Drive calls run on its own thread pool)
+    try:
+        from routers.drive_monitor import scan_all_users_drive
 
         scheduler.add_job(
-            func=lambda: threading.Thread(target=run_drive_monitor_background).start(),
+            scan_all_users_drive,
             trigger='interval',
             minutes=5,
             id='drive_monitor_job',
-            max_instances=1
+            max_instances=1,
+            coalesce=True
         )
         logger.info("Google Drive monitor scheduler started successfully - runs every 5 minutes")
     except Exception as e:
@@ -335,6 +367,60 @@ async def shutdown_event():
     
     
 
+    # Flush buffered ATSN conversation messages
+    try:
+        from services.conversation_writer import conversation_writer
+        await conversation_writer.stop()
+    except Exception as e:
+        logger.error(f"Error stopping ATSN conversation writer: {e}")
+
+    # Stop background media publish polling (unfinished jobs are resumed by another worker)
+    try:
+        from services.media_publish_jobs import media_publish_jobs
+        await media_publish_jobs.stop()
+    except Exception as e:
+        logger.error(f"Error stopping media publish jobs: {e}")
+
+    # Stop the shared image/CPU worker processes
+    try:
+        from services.cpu_executor import cpu_executor
+        cpu_executor.shutdown()
+    except Exception as e:
+        logger.error(f"Error stopping CPU executor: {e}")
+
+    # Close the HTML renderer browser
+    try:
+        from services.html_renderer import html_renderer
+        await html_renderer.stop()
+    except Exception as e:
+        logger.error(f"Error stopping HTML renderer: {e}")
+
+    # Close pooled platform HTTP connections
+    try:
+        await http_clients.aclose()
+    except Exception as e:
+        logger.error(f"Error closing HTTP client pool: {e}")
+
+    # Stop progress hub broker connection
+    try:
+        await progress_hub.stop()
+    except Exception as e:
+        logger.error(f"Error stopping progress hub: {e}")
+
+    # Close the shared session state store
+    try:
+        from utils.session_store import session_store
+        await session_store.close()
+    except Exception as e:
+        logger.error(f"Error closing session store: {e}")
+
+    # Persist any conversation sessions not yet written behind
+    try:
+        flushed = daily_cache.flush_dirty_sessions_sync()
+        logger.info(f"Flushed {flushed} daily cache sessions before shutdown")
+    except Exception as e:
+        logger.error(f"Error flushing daily cache on shutdown: {e}")
+
     # Stop daily cache cleanup scheduler
     try:
         scheduler.shutdown()
@@ -609,14 +695,16 @@ async def create_test_profile():
 @app.get("/content/progress")
 async def get_content_generation_progress(current_user: User = Depends(get_current_user)):
     """Get current content generation progress for the user"""
-    return get_progress(current_user.id)
+    return await get_progress(current_user.id)
 
 @app.get("/content/progress-stream")
-async def progress_stream(token: str = None):
-    """Server-Sent Events stream for real-time progress updates"""
+async def progress_stream(token: str = None, topic: str = DEFAULT_TOPIC):
+    """Server-Sent Events stream for real-time progress updates (content generation by default, or topic=media_publish / topic=carousel)"""
     # Authenticate user from token parameter
     if not token:
         raise HTTPException(status_code=401, detail="Token required")
+    if topic not in PROGRESS_TOPICS:
+        raise HTTPException(status_code=400, detail=f"Unknown progress topic: {topic}")
     
     try:
         response = supabase.auth.get_user(token)
@@ -627,17 +715,12 @@ async def progress_stream(token: str = None):
         raise HTTPException(status_code=401, detail="Invalid token")
     
     async def event_generator():
-        # Create a queue for this connection
-        queue = asyncio.Queue()
-        
-        # Add to subscribers
-        if user_id not in progress_subscribers:
-            progress_subscribers[user_id] = []
-        progress_subscribers[user_id].append(queue)
+        # Bounded, coalescing subscription for this connection
+        subscription = progress_hub.subscribe(user_id, topic)
         
         try:
             # Send initial progress if available
-            initial_progress = get_progress(user_id)
+            initial_progress = await progress_hub.get_latest(user_id, topic) or {"is_generating": False}
             if initial_progress.get("is_generating"):
                 yield f"data: {json.dumps(initial_progress)}\n\n"
             
@@ -645,7 +728,7 @@ async def progress_stream(token: str = None):
             while True:
                 try:
                     # Wait for progress update
-                    progress_data = await asyncio.wait_for(queue.get(), timeout=30.0)
+                    progress_data = await subscription.get(timeout=30.0)
                     yield f"data: {json.dumps(progress_data)}\n\n"
                     
                     # If generation is complete, break
@@ -658,11 +741,7 @@ async def progress_stream(token: str = None):
                     
         finally:
             # Clean up
-            if user_id in progress_subscribers:
-                if queue in progress_subscribers[user_id]:
-                    progress_subscribers[user_id].remove(queue)
-                if not progress_subscribers[user_id]:
-                    del progress_subscribers[user_id]
+            progress_hub.unsubscribe(subscription)
     
     return StreamingResponse(
         event_generator(),
@@ -1352,8 +1431,6 @@ async def get_platform_ads(
 async def fetch_ads_from_platform(platform: str, connection: Dict[str, Any]) -> List[Dict[str, Any]]:
     """Fetch ads from a specific platform using the connection data"""
     try:
-        import httpx
-        
         # Get the access token from the connection
         access_token = connection.get('access_token_encrypted')
         if not access_token:
@@ -1384,8 +1461,6 @@ async def fetch_ads_from_platform(platform: str, connection: Dict[str, Any]) ->
 async def fetch_facebook_ads(connection: Dict[str, Any], token: str) -> List[Dict[str, Any]]:
     """Fetch Facebook ads using Marketing API"""
     try:
-        import httpx
-        
         # First, get the ad accounts associated with the user
         url = "https://graph.facebook.com/v18.0/me/adaccounts"
         params = {
@@ -1394,7 +1469,7 @@ async def fetch_facebook_ads(connection: Dict[str, Any], token: str) -> List[Dic
             'limit': 50
         }
         
-        async with httpx.AsyncClient() as client:
+        async with http_clients.session() as client:
             # Get ad accounts
             response = await client.get(url, params=params)
             response.raise_for_status()
@@ -1460,8 +1535,6 @@ async def fetch_facebook_ads(connection: Dict[str, Any], token: str) -> List[Dic
 async def fetch_instagram_ads(connection: Dict[str, Any], token: str) -> List[Dict[str, Any]]:
     """Fetch Instagram ads using Business API"""
     try:
-        import httpx
-        
         # Instagram Business API endpoint for ads
         url = "https://graph.facebook.com/v18.0/me/adaccounts"
         params = {
@@ -1469,7 +1542,7 @@ async def fetch_instagram_ads(connection: Dict[str, Any], token: str) -> List[Di
             'fields': 'id,name'
         }
         
-        async with httpx.AsyncClient() as client:
+        async with http_clients.session() as client:
             response = await client.get(url, params=params)
             response.raise_for_status()
             data = response.json()
@@ -1592,6 +1665,56 @@ async def get_analytics_scheduler_status(
         )
 
 
+@app.get("/api/internal/gmail/sync-metrics")
+async def get_gmail_sync_metrics(
+    x_cron_secret: Optional[str] = None
+):
+    """
+    Get per-user lag metrics of the Gmail sync scheduler.
+    
+    Protected endpoint - requires X-Cron-Secret header.
+    """
+    verify_internal_secret(x_cron_secret)
+    
+    try:
+        from jobs.gmail_sync_job import get_gmail_sync_job
+        return {
+            "success": True,
+            "data": get_gmail_sync_job().get_metrics()
+        }
+    except Exception as e:
+        logger.error(f"Failed to get Gmail sync metrics: {e}")
+        raise HTTPException(
+            status_code=500,
+            detail=f"Failed to retrieve Gmail sync metrics: {str(e)}"
+        )
+
+
+@app.get("/api/internal/tokens/refresh-metrics")
+async def get_token_refresh_metrics(
+    x_cron_secret: Optional[str] = None
+):
+    """
+    Get state of the proactive token refresh scheduler.
+    
+    Protected endpoint - requires X-Cron-Secret header.
+    """
+    verify_internal_secret(x_cron_secret)
+    
+    try:
+        from jobs.token_refresh_job import get_token_refresh_job
+        return {
+            "success": True,
+            "data": get_token_refresh_job().get_metrics()
+        }
+    except Exception as e:
+        logger.error(f"Failed to get token refresh metrics: {e}")
+        raise HTTPException(
+            status_code=500,
+            detail=f"Failed to retrieve token refresh metrics: {str(e)}"
+        )
+
+
 @app.post("/api/internal/analytics/trigger-collection")
 async def trigger_analytics_collection(
     background_tasks: BackgroundTasks,
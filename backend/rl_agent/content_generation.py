@@ -20,6 +20,15 @@ from db import SupabaseImageManager, supabase
 import requests
 from PIL import Image
 import io
+try:
+    # Shared media cache and CPU pool are only importable when running inside the backend
+    from services.media_asset_cache import media_asset_cache
+    from services.cpu_executor import cpu_executor, resize_image
+    from services.image_generation_gateway import image_generation_gateway
+except ImportError:
+    media_asset_cache = None
+    cpu_executor = None
+    image_generation_gateway = None
 try:
     # Try to use the newer google.genai package
     import google.genai as genai
@@ -31,6 +40,9 @@ except ImportError:
 
 load_dotenv()
 
+# The logo only needs to be a recognisable reference for placement
+LOGO_REFERENCE_SIZE = (512, 512)
+
 # API Keys
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
 GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
@@ -148,15 +160,25 @@ class ContentGenerator:
             final_logo_url = self.fetch_business_logo(business_id)
 
         logo_image = None
+        logo_data = None
         if final_logo_url:
             try:
                 print(f"📥 Downloading logo from: {final_logo_url}")
-                # Download logo image
-                response = requests.get(final_logo_url, timeout=10)
-                response.raise_for_status()
+                if media_asset_cache is not None:
+                    # Shared cache: the same brand logo is downloaded once
+                    logo_data = media_asset_cache.get_bytes_sync(final_logo_url)
+                else:
+                    # Download logo image
+                    response = requests.get(final_logo_url, timeout=10)
+                    response.raise_for_status()
+                    logo_data = response.content
+
+                if cpu_executor is not None:
+                    # Decode and downscale in a worker process instead of holding the GIL here
+                    logo_data = cpu_executor.run_sync(resize_image, logo_data, LOGO_REFERENCE_SIZE, "PNG")
 
                 # Convert to PIL Image for Gemini
-                logo_image = Image.open(io.BytesIO(response.content))
+                logo_image = Image.open(io.BytesIO(logo_data))
                 print("✅ Logo downloaded and processed successfully")
 
                 # Modify prompt to include logo placement instructions
@@ -178,6 +200,21 @@ class ContentGenerator:
                 print(f"⚠️ Failed to download/process logo: {e}")
                 logo_image = None
 
+        if image_generation_gateway is None or not business_id:
+            # Without a business there is no scope to cache the image under
+            return self._generate_image_uncached(image_prompt, logo_image)
+
+        # Identical requests for the same business (prompt + logo) share one generation
+        return image_generation_gateway.generate_sync(
+            lambda: self._generate_image_uncached(image_prompt, logo_image),
+            model='gemini-2.5-flash-image',
+            prompt=image_prompt,
+            user_id=business_id,
+            references=[logo_data] if logo_image is not None else []
+        )
+
+    def _generate_image_uncached(self, image_prompt: str, logo_image: Optional[Image.Image]) -> str:
+        """Call Gemini and store the generated image (see generate_image)"""
         try:
             if USE_NEW_PACKAGE:
                 # New google.genai package API
@@ -372,10 +409,10 @@ def generate_caption(caption_prompt: str) -> str:
     return generator.generate_caption(caption_prompt)
 
 
-def generate_image(image_prompt: str) -> str:
-    """Generate an image from a prompt."""
+def generate_image(image_prompt: str, business_id: str = None) -> str:
+    """Generate an image from a prompt (cached per business when business_id is given)."""
     generator = ContentGenerator()
-    return generator.generate_image(image_prompt)
+    return generator.generate_image(image_prompt, business_id=business_id)
 
 
 def generate_content(caption_prompt: str, image_prompt: str, business_context: dict = None, logo_url: str = None, business_id: str = None) -> Dict[str, Any]:
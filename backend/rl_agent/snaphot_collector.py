@@ -33,6 +33,11 @@ logging.basicConfig(
 logger = logging.getLogger(__name__)
 
 import db
+try:
+    # Shared connection cache (one cipher, cached rows) is only importable when running inside the backend
+    from services.connection_registry import connection_registry
+except ImportError:
+    connection_registry = None
 
 # Collection intervals in hours (matching REWARD_WEIGHTS)
 COLLECTION_INTERVALS = [6, 24, 48, 72, 168]
@@ -40,6 +45,9 @@ COLLECTION_INTERVALS = [6, 24, 48, 72, 168]
 
 def decrypt_token(encrypted_token: str) -> str:
     """Decrypt encrypted access token"""
+    if connection_registry is not None:
+        return connection_registry.decrypt_token(encrypted_token)
+
     encryption_key = os.getenv("ENCRYPTION_KEY")
     if not encryption_key:
         return encrypted_token  # Fallback if not encrypted
@@ -51,24 +59,38 @@ def decrypt_token(encrypted_token: str) -> str:
 def get_platform_credentials(platform: str, business_id: str) -> Optional[Dict[str, str]]:
     """Get platform access token and page ID for a business"""
     try:
-        res = db.supabase.table("platform_connections") \
-            .select("access_token_encrypted, page_id, page_username") \
-            .eq("user_id", business_id) \
-            .eq("platform", platform) \
-            .eq("is_active", True) \
-            .eq("connection_status", "active") \
-            .execute()
-
-        if res.data and len(res.data) > 0:
-            connection = res.data[0]
-            access_token = decrypt_token(connection.get("access_token_encrypted", ""))
-            page_id = connection.get("page_id")
-
-            if access_token and page_id:
-                return {
-                    'access_token': access_token,
-                    'page_id': page_id
-                }
+        if connection_registry is not None:
+            credentials = connection_registry.get_credentials(business_id, platform)
+            connection = credentials["connection"] if credentials else {}
+            if (credentials and credentials["connection_type"] == "oauth"
+                    and connection.get("connection_status") == "active"):
+                access_token = credentials["access_token"]
+                page_id = connection.get("page_id")
+
+                if access_token and page_id:
+                    return {
+                        'access_token': access_token,
+                        'page_id': page_id
+                    }
+        else:
+            res = db.supabase.table("platform_connections") \
+                .select("access_token_encrypted, page_id, page_username") \
+                .eq("user_id", business_id) \
+                .eq("platform", platform) \
+                .eq("is_active", True) \
+                .eq("connection_status", "active") \
+                .execute()
+
+            if res.data and len(res.data) > 0:
+                connection = res.data[0]
+                access_token = decrypt_token(connection.get("access_token_encrypted", ""))
+                page_id = connection.get("page_id")
+
+                if access_token and page_id:
+                    return {
+                        'access_token': access_token,
+                        'page_id': page_id
+                    }
 
         # Fallback to environment variables for development
         env_token_key = f"{platform.upper()}_ACCESS_TOKEN"
@@ -8,6 +8,11 @@ import time
 import requests
 from datetime import datetime
 from dotenv import load_dotenv
+try:
+    # Shared connection cache (one cipher, cached rows) is only importable when running inside the backend
+    from services.connection_registry import connection_registry
+except ImportError:
+    connection_registry = None
 
 # Load environment variables
 load_dotenv()
@@ -93,17 +98,30 @@ class SocialMediaPoster:
         Get access token and user/page ID for platform from database
         """
         try:
-            # Query platform_connections table for active connections
-            from db import supabase
-            res = supabase.table("platform_connections") \
-                .select("access_token_encrypted, page_id, page_username") \
-                .eq("user_id", business_id) \
-                .eq("platform", platform) \
-                .eq("is_active", True) \
-                .eq("connection_status", "active") \
-                .execute()
-
-            if res.data and len(res.data) > 0:
+            if connection_registry is not None:
+                # Cached active connection with the token decrypted by the shared cipher
+                credentials = connection_registry.get_credentials(business_id, platform)
+                connection = credentials["connection"] if credentials else {}
+                if (credentials and credentials["connection_type"] == "oauth"
+                        and connection.get("connection_status") == "active"):
+                    return {
+                        'access_token': credentials["access_token"],
+                        'page_id': connection.get("page_id"),
+                        'page_username': connection.get("page_username")
+                    }
+                res = None
+            else:
+                # Query platform_connections table for active connections
+                from db import supabase
+                res = supabase.table("platform_connections") \
+                    .select("access_token_encrypted, page_id, page_username") \
+                    .eq("user_id", business_id) \
+                    .eq("platform", platform) \
+                    .eq("is_active", True) \
+                    .eq("connection_status", "active") \
+                    .execute()
+
+            if res and res.data and len(res.data) > 0:
                 connection = res.data[0]
                 # Decrypt the access token (assuming it's encrypted)
                 # For now, assume it's stored as plain text for development
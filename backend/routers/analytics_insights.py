@@ -10,7 +10,8 @@ from datetime import datetime, timedelta, date
 from typing import Dict, Any, List, Optional
 from fastapi import APIRouter, HTTPException, Depends
 from supabase import create_client, Client
-import httpx
+from services.http_clients import http_clients
+from services.connection_registry import connection_registry
 from dotenv import load_dotenv
 
 # Import auth utilities
@@ -35,18 +36,12 @@ router = APIRouter(prefix="/analytics-insights", tags=["analytics-insights"])
 def decrypt_token(encrypted_token: str) -> str:
     """Decrypt access token - reusing the same encryption method used in connections"""
     try:
-        from cryptography.fernet import Fernet
-        
         # Get encryption key from environment
-        encryption_key = os.getenv("ENCRYPTION_KEY")
-        if not encryption_key:
+        if not os.getenv("ENCRYPTION_KEY"):
             logger.warning("No encryption key found, returning token as-is")
             return encrypted_token
         
-        # Decrypt token
-        fernet = Fernet(encryption_key.encode())
-        decrypted = fernet.decrypt(encrypted_token.encode())
-        return decrypted.decode()
+        return connection_registry.decrypt_token(encrypted_token)
     except Exception as e:
         logger.warning(f"Failed to decrypt token: {e}, returning as-is")
         return encrypted_token
@@ -105,7 +100,7 @@ async def fetch_facebook_page_insights(
         Dictionary containing insights data
     """
     try:
-        async with httpx.AsyncClient() as client:
+        async with http_clients.session() as client:
             url = f"https://graph.facebook.com/v18.0/{page_id}/insights"
             
             params = {
@@ -163,7 +158,7 @@ async def fetch_instagram_account_insights(
         Dictionary containing insights data
     """
     try:
-        async with httpx.AsyncClient() as client:
+        async with http_clients.session() as client:
             url = f"https://graph.facebook.com/v18.0/{instagram_account_id}/insights"
             
             params = {
@@ -366,6 +361,7 @@ async def fetch_and_store_facebook_insights(
         supabase.table("social_media_connections").update({
             "last_sync_at": datetime.utcnow().isoformat()
         }).eq("id", connection["id"]).execute()
+        connection_registry.invalidate(user_id, "facebook")
         
         return {
             "success": True,
@@ -453,6 +449,7 @@ async def fetch_and_store_instagram_insights(
         supabase.table("social_media_connections").update({
             "last_sync_at": datetime.utcnow().isoformat()
         }).eq("id", connection["id"]).execute()
+        connection_registry.invalidate(user_id, "instagram")
         
         return {
             "success": True,
@@ -6,6 +6,7 @@ Handles chat interactions with the ATSN agent (Content & Lead Management)
 import os
 import sys
 import uuid
+import asyncio
 from datetime import datetime, timezone
 from fastapi import APIRouter, HTTPException, Depends, Query
 from fastapi.responses import StreamingResponse
@@ -16,10 +17,13 @@ import logging
 # Add agents directory to path
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
 
-from agents.atsn import ATSNAgent
+from agents.atsn import ATSNAgent, AgentState
 from supabase import create_client, Client
 from auth import get_current_user
 from utils.daily_cache_manager import daily_cache
+from services.conversation_writer import conversation_writer
+from utils.conversation_context import conversation_context
+from utils.session_store import session_store, ModelSessionStore, SessionVersionConflict
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -67,9 +71,12 @@ class ChatResponse(BaseModel):
     agent_name: Optional[str] = None  # Agent name for displaying appropriate icon
 
 
-# Store agent instances per user session
+# Store agent instances per user session (the graph is per process; state lives in the session store)
 user_agents = {}
 
+# Agent state shared across workers via the configured session store
+agent_state_store = ModelSessionStore(session_store, "atsn_agent_state", AgentState)
+
 # Store active conversation sessions per user
 user_conversations = {}
 
@@ -113,28 +120,50 @@ def get_or_create_conversation(user_id: str, session_id: str = None) -> dict:
         return {"id": str(uuid.uuid4()), "session_id": session_id or str(uuid.uuid4())}
 
 
-def save_message_to_conversation(conversation_id: str, user_id: str, message_data: dict) -> None:
-    """Save a message to the conversation messages table"""
-    try:
-        # Get message sequence number
-        sequence_result = supabase_client.table("atsn_conversation_messages").select("message_sequence").eq("conversation_id", conversation_id).order("message_sequence", desc=True).limit(1).execute()
+def resolve_conversation_id(user_id: str, session_id: str) -> str:
+    """Get or create the conversation row for a session, caching the id in memory"""
+    cached = user_conversations.get(session_id)
+    if cached and cached.get("user_id", user_id) == user_id:
+        return cached["id"]
 
-        sequence = 1
-        if sequence_result.data and len(sequence_result.data) > 0:
-            sequence = sequence_result.data[0]["message_sequence"] + 1
+    existing_conv = supabase_client.table("atsn_conversations").select("*").eq("session_id", session_id).eq("user_id", user_id).execute()
 
-        message_record = {
-            "conversation_id": conversation_id,
+    if existing_conv.data and len(existing_conv.data) > 0:
+        conversation = existing_conv.data[0]
+        logger.info(f"Updating existing conversation {conversation['id']}")
+    else:
+        # Create new conversation
+        today = datetime.now(timezone.utc).date()
+        conversation_data = {
             "user_id": user_id,
-            "message_sequence": sequence,
-            **message_data
+            "session_id": session_id,
+            "conversation_date": today.isoformat(),
+            "primary_agent_name": "atsn",
+            "is_active": True
         }
 
-        supabase_client.table("atsn_conversation_messages").insert(message_record).execute()
-        logger.info(f"Saved {message_data.get('message_type', 'unknown')} message to conversation {conversation_id}")
+        new_conv = supabase_client.table("atsn_conversations").insert(conversation_data).execute()
+        conversation = new_conv.data[0]
+        logger.info(f"Created new conversation {conversation['id']}")
+
+    user_conversations[session_id] = conversation
+    return conversation["id"]
 
-    except Exception as e:
-        logger.error(f"Error saving message to conversation {conversation_id}: {e}")
+
+def format_client_message(msg: dict, step_key: str = "current_step") -> dict:
+    """Map a frontend chat message onto an atsn_conversation_messages row (without sequence)"""
+    return {
+        "message_type": msg.get("sender", "user"),
+        "content": msg.get("text", ""),
+        "created_at": msg.get("timestamp", datetime.now(timezone.utc).isoformat()),
+        "intent": msg.get("intent"),
+        "agent_name": msg.get("agent_name"),
+        "current_step": msg.get(step_key),
+        "clarification_question": msg.get("clarification_question"),
+        "clarification_options": msg.get("clarification_options"),
+        "content_items": msg.get("content_items"),
+        "lead_items": msg.get("lead_items"),
+    }
 
 
 def get_user_agent(user_id: str) -> ATSNAgent:
@@ -145,6 +174,33 @@ def get_user_agent(user_id: str) -> ATSNAgent:
     return user_agents[user_id]
 
 
+async def load_user_agent(user_id: str):
+    """Get the user's agent with its state loaded from the shared session store.
+
+    Returns (agent, version); pass the version back to save_user_agent_state.
+    """
+    agent = get_user_agent(user_id)
+    try:
+        version, state = await agent_state_store.load(user_id)
+    except Exception as e:
+        logger.error(f"Error loading ATSN state for user {user_id}, using local state: {e}")
+        return agent, None
+    agent.state = state
+    return agent, version
+
+
+async def save_user_agent_state(user_id: str, agent: ATSNAgent, version) -> None:
+    """Write the agent state back if no other worker has committed a newer one"""
+    if version is None:
+        return
+    try:
+        await agent_state_store.save(user_id, agent.state, version)
+    except SessionVersionConflict:
+        logger.warning(f"ATSN state for user {user_id} was updated by another worker; keeping the newer state")
+    except Exception as e:
+        logger.error(f"Error saving ATSN state for user {user_id}: {e}")
+
+
 @router.post("/chat", response_model=ChatResponse)
 async def chat(
     chat_message: ChatMessage,
@@ -169,19 +225,19 @@ async def chat(
             "content": chat_message.message,
             "agent_name": "atsn"
         }
-        daily_cache.add_message_to_session(user_id, session_id, user_message_data)
+        await asyncio.to_thread(daily_cache.add_message_to_session, user_id, session_id, user_message_data)
         logger.info(f"Stored user message in cache for session {session_id}: {chat_message.message[:50]}...")
 
         # Get conversation history from cache for context (last 10 messages)
-        session_data = daily_cache.get_session_messages(user_id, session_id)
+        session_data = await asyncio.to_thread(daily_cache.get_session_messages, user_id, session_id)
         conversation_history = []
         if session_data and session_data["messages"]:
             # Get last 10 messages for context, excluding the current user message
             recent_messages = session_data["messages"][-11:-1]  # Last 10 before current
             conversation_history = [msg["content"] for msg in recent_messages if msg["message_type"] == "user"]
 
-        # Get user's agent instance
-        agent = get_user_agent(user_id)
+        # Get user's agent instance with the shared session state
+        agent, state_version = await load_user_agent(user_id)
         
         # Process the query
         response = await agent.process_query(
@@ -191,6 +247,7 @@ async def chat(
             media_file=chat_message.media_file,
             media_urls=chat_message.media_urls
         )
+        await save_user_agent_state(user_id, agent, state_version)
         
         # Format response - ensure we always have a valid response string
         response_text = (
@@ -251,7 +308,7 @@ async def chat(
             "lead_items": response.get('lead_items'),
             "calendar_entries": response.get('calendar_entries')
             }
-        daily_cache.add_message_to_session(user_id, session_id, bot_message_data)
+        await asyncio.to_thread(daily_cache.add_message_to_session, user_id, session_id, bot_message_data)
         
         logger.info(f"ATSN response - Intent: {chat_response.intent}, Step: {chat_response.current_step}, Waiting: {chat_response.waiting_for_user}, Session: {session_id}")
         
@@ -270,8 +327,11 @@ async def reset_agent(current_user=Depends(get_current_user)):
     try:
         user_id = current_user.id
         
+        version, state = await agent_state_store.load(user_id)
         if user_id in user_agents:
             user_agents[user_id].reset()
+        if state is not None or version:
+            await agent_state_store.save(user_id, None, version)
             logger.info(f"Reset ATSN agent for user {user_id}")
             return {"message": "Agent reset successfully"}
         else:
@@ -290,18 +350,15 @@ async def get_status(current_user=Depends(get_current_user)):
     try:
         user_id = current_user.id
         
-        if user_id in user_agents:
-            agent = user_agents[user_id]
-            state = agent.state
-            
-            if state:
-                return {
-                    "active": True,
-                    "intent": state.intent,
-                    "current_step": state.current_step,
-                    "waiting_for_user": state.waiting_for_user,
-                    "payload_complete": state.payload_complete
-                }
+        _, state = await agent_state_store.load(user_id)
+        if state:
+            return {
+                "active": True,
+                "intent": state.intent,
+                "current_step": state.current_step,
+                "waiting_for_user": state.waiting_for_user,
+                "payload_complete": state.payload_complete
+            }
         
         return {
             "active": False,
@@ -323,7 +380,9 @@ async def get_cache_stats(current_user=Depends(get_current_user)):
         stats = daily_cache.get_cache_stats()
         return {
             "cache_stats": stats,
-            "user_count": len(daily_cache.cache),
+            "user_count": stats["total_users"],
+            "write_behind": conversation_writer.get_stats(),
+            "context_metrics": conversation_context.get_metrics(),
             "current_time": datetime.now(timezone.utc).isoformat()
         }
     except Exception as e:
@@ -365,7 +424,7 @@ async def get_atsn_conversations(
         logger.info(f"Fetching today's ATSN conversations for user {user_id} from daily cache")
 
         # Get conversations from daily cache
-        cache_data = daily_cache.get_user_conversations(user_id)
+        cache_data = await asyncio.to_thread(daily_cache.get_user_conversations, user_id)
         conversations = cache_data["conversations"]
 
         logger.info(f"Found {len(conversations)} conversations with {cache_data['day_stats']['total_messages']} total messages")
@@ -440,26 +499,7 @@ async def incremental_save_conversation(
 
         logger.info(f"Incremental saving {len(new_messages)} messages for user {user_id}, session {session_id}")
 
-        # Check if conversation already exists
-        existing_conv = supabase_client.table("atsn_conversations").select("*").eq("session_id", session_id).eq("user_id", user_id).execute()
-
-        if existing_conv.data and len(existing_conv.data) > 0:
-            conversation_id = existing_conv.data[0]["id"]
-            logger.info(f"Updating existing conversation {conversation_id}")
-        else:
-            # Create new conversation
-            today = datetime.now(timezone.utc).date()
-            conversation_data = {
-                "user_id": user_id,
-                "session_id": session_id,
-                "conversation_date": today.isoformat(),
-                "primary_agent_name": "atsn",
-                "is_active": True
-            }
-
-            new_conv = supabase_client.table("atsn_conversations").insert(conversation_data).execute()
-            conversation_id = new_conv.data[0]["id"]
-            logger.info(f"Created new conversation {conversation_id}")
+        conversation_id = await asyncio.to_thread(resolve_conversation_id, user_id, session_id)
 
         # Filter only messages after last save (if timestamp provided)
         if last_saved_timestamp:
@@ -475,37 +515,11 @@ async def incremental_save_conversation(
             logger.info("No new messages to save")
             return {"status": "success", "conversation_id": conversation_id, "messages_saved": 0}
 
-        # Get current max sequence for this conversation
-        existing_msgs = supabase_client.table("atsn_conversation_messages").select("message_sequence").eq("conversation_id", conversation_id).order("message_sequence", desc=False).execute()
-
-        max_sequence = 0
-        if existing_msgs.data and len(existing_msgs.data) > 0:
-            max_sequence = max([msg["message_sequence"] for msg in existing_msgs.data])
-
-        # Prepare messages for insertion
-        messages_to_insert = []
-        for i, msg in enumerate(new_messages):
-            message_data = {
-                "conversation_id": conversation_id,
-                "user_id": user_id,
-                "message_sequence": max_sequence + i + 1,
-                "message_type": msg.get("sender", "user"),
-                "content": msg.get("text", ""),
-                "created_at": msg.get("timestamp", datetime.now(timezone.utc).isoformat()),
-                "intent": msg.get("intent"),
-                "agent_name": msg.get("agent_name"),
-                "current_step": msg.get("current_step"),
-                "clarification_question": msg.get("clarification_question"),
-                "clarification_options": msg.get("clarification_options"),
-                "content_items": msg.get("content_items"),
-                "lead_items": msg.get("lead_items"),
-            }
-            messages_to_insert.append(message_data)
-
-        # Batch insert messages
-        supabase_client.table("atsn_conversation_messages").insert(messages_to_insert).execute()
+        # Rows are written behind in batches; sequence numbers are reserved at flush time
+        messages_to_insert = [format_client_message(msg) for msg in new_messages]
+        conversation_writer.enqueue(conversation_id, user_id, messages_to_insert)
 
-        logger.info(f"Successfully saved {len(messages_to_insert)} new messages to conversation {conversation_id}")
+        logger.info(f"Queued {len(messages_to_insert)} new messages for conversation {conversation_id}")
 
         return {
             "status": "success",
@@ -535,54 +549,13 @@ async def save_complete_conversation(
 
         logger.info(f"Saving complete conversation with {len(messages)} messages for user {user_id}, session {session_id}")
 
-        # Check if conversation already exists
-        existing_conv = supabase_client.table("atsn_conversations").select("*").eq("session_id", session_id).eq("user_id", user_id).execute()
-
-        if existing_conv.data and len(existing_conv.data) > 0:
-            conversation_id = existing_conv.data[0]["id"]
-            logger.info(f"Updating existing conversation {conversation_id}")
-        else:
-            # Create new conversation
-            today = datetime.now(timezone.utc).date()
-            conversation_data = {
-                "user_id": user_id,
-                "session_id": session_id,
-                "conversation_date": today.isoformat(),
-                "primary_agent_name": "atsn",
-                "is_active": True
-            }
-
-            new_conv = supabase_client.table("atsn_conversations").insert(conversation_data).execute()
-            conversation_id = new_conv.data[0]["id"]
-            logger.info(f"Created new conversation {conversation_id}")
-
-        # Delete any existing messages for this conversation (to avoid duplicates)
-        supabase_client.table("atsn_conversation_messages").delete().eq("conversation_id", conversation_id).execute()
-
-        # Prepare messages for insertion
-        messages_to_insert = []
-        for i, msg in enumerate(messages):
-            message_data = {
-                "conversation_id": conversation_id,
-                "user_id": user_id,
-                "message_sequence": i + 1,
-                "message_type": msg.get("sender", "user"),
-                "content": msg.get("text", ""),
-                "created_at": msg.get("timestamp", datetime.now(timezone.utc).isoformat()),
-                "intent": msg.get("intent"),
-                "agent_name": msg.get("agent_name"),
-                "current_step": msg.get("step"),
-                "clarification_question": msg.get("clarification_question"),
-                "clarification_options": msg.get("clarification_options"),
-                "content_items": msg.get("content_items"),
-                "lead_items": msg.get("lead_items"),
-            }
-            messages_to_insert.append(message_data)
+        conversation_id = await asyncio.to_thread(resolve_conversation_id, user_id, session_id)
 
-        # Batch insert all messages
-        supabase_client.table("atsn_conversation_messages").insert(messages_to_insert).execute()
+        # Upsert sequences 1..n and drop any stored rows beyond n, instead of delete + re-insert
+        messages_to_insert = [format_client_message(msg, step_key="step") for msg in messages]
+        conversation_writer.replace(conversation_id, user_id, messages_to_insert)
 
-        logger.info(f"Successfully saved complete conversation with {len(messages_to_insert)} messages to conversation {conversation_id}")
+        logger.info(f"Queued complete conversation with {len(messages_to_insert)} messages for conversation {conversation_id}")
 
         return {
             "status": "success",
@@ -608,7 +581,9 @@ async def create_content(
         logger.info(f"Content creation request from user {user_id}")
 
         # Get the user's ATSN agent
-        agent = get_user_agent(user_id)
+        agent, state_version = await load_user_agent(user_id)
+        if agent.state is None:
+            agent.state = AgentState(user_id=user_id)
 
         # Set up the payload for content creation
         agent.state.payload = payload
@@ -619,6 +594,7 @@ async def create_content(
         # Import and call the content creation handler
         from agents.create_content import handle_create_content
         result = await handle_create_content(agent.state)
+        await save_user_agent_state(user_id, agent, state_version)
 
         # Format the response as if it came from the chatbot
         if hasattr(result, 'error') and result.error:
@@ -554,32 +554,15 @@ Requirements:
         content_type = "image/webp"
         
         try:
-            from PIL import Image
-            import io
-            
-            # Open the image from bytes
-            image = Image.open(io.BytesIO(image_bytes))
-            
-            # Convert RGBA to RGB if necessary (WebP supports both, but RGB is more compatible)
-            if image.mode == 'RGBA':
-                # Create a white background for transparency
-                rgb_image = Image.new('RGB', image.size, (255, 255, 255))
-                rgb_image.paste(image, mask=image.split()[3])  # Use alpha channel as mask
-                image = rgb_image
-            elif image.mode != 'RGB':
-                image = image.convert('RGB')
+            from services.cpu_executor import cpu_executor
             
-            # Convert to WebP format with high quality
-            webp_buffer = io.BytesIO()
-            image.save(webp_buffer, format='WebP', quality=90, method=6)
-            image_bytes = webp_buffer.getvalue()
+            # Flatten transparency onto white (RGB WebP is more compatible) and encode
+            # with high quality in a worker process; method=6 is slow enough to stall the loop
+            image_bytes = await cpu_executor.encode(
+                image_bytes, "WEBP", quality=90, background=(255, 255, 255), method=6
+            )
             
             logger.info(f"✅ Converted image to WebP format. Size: {len(image_bytes)} bytes")
-        except ImportError:
-            logger.warning("PIL/Pillow not available, using original PNG format")
-            # Fallback to PNG if PIL is not available
-            file_ext = "png"
-            content_type = "image/png"
         except Exception as e:
             logger.warning(f"Failed to convert to WebP: {e}, using original format")
             # Fallback to PNG if conversion fails
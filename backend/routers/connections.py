@@ -7,13 +7,12 @@ import secrets
 import string
 import hashlib
 import base64
-import time
+import asyncio
 import traceback
 import json
 import logging
 from decimal import Decimal
 from cryptography.fernet import Fernet
-import requests
 import httpx
 from supabase import create_client, Client
 
@@ -22,6 +21,10 @@ logger = logging.getLogger(__name__)
 
 from dotenv import load_dotenv
 from .meta_scopes import get_meta_oauth_scopes, get_meta_scope_string
+from services.media_publish_jobs import media_publish_jobs
+from services.http_clients import http_clients
+
+from services.connection_registry import connection_registry
 
 
 
@@ -290,9 +293,10 @@ async def whatsapp_oauth_callback(
             "redirect_uri": os.getenv('WHATSAPP_REDIRECT_URI', 'https://agent-emily.onrender.com/connections/whatsapp/callback')
         }
 
-        token_response = requests.post(WHATSAPP_TOKEN_URL, data=token_data, timeout=30)
+        # Authorization codes are single-use, so the exchange is never retried
+        token_response = await http_clients.post(WHATSAPP_TOKEN_URL, data=token_data, timeout=30, retries=0)
 
-        if not token_response.ok:
+        if not token_response.is_success:
             logger.error(f"Token exchange failed: {token_response.text}")
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
@@ -314,10 +318,10 @@ async def whatsapp_oauth_callback(
         # First, get the user's business accounts
         business_accounts_url = f"{WHATSAPP_GRAPH_URL}/me/businesses"
         logger.info(f"Getting business accounts from: {business_accounts_url}")
-        business_response = requests.get(business_accounts_url, headers=headers, timeout=30)
+        business_response = await http_clients.get(business_accounts_url, headers=headers, timeout=30)
         logger.info(f"Business accounts response status: {business_response.status_code}")
 
-        if not business_response.ok:
+        if not business_response.is_success:
             logger.error(f"Failed to get business accounts: {business_response.text}")
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
@@ -344,10 +348,10 @@ async def whatsapp_oauth_callback(
             # Get WhatsApp Business Accounts for this business
             waba_url = f"{WHATSAPP_GRAPH_URL}/{business_id}/whatsapp_business_accounts"
             logger.info(f"Getting WABA from: {waba_url}")
-            waba_response = requests.get(waba_url, headers=headers, timeout=30)
+            waba_response = await http_clients.get(waba_url, headers=headers, timeout=30)
             logger.info(f"WABA response status: {waba_response.status_code}")
 
-            if waba_response.ok:
+            if waba_response.is_success:
                 waba_data = waba_response.json()
                 wabas = waba_data.get("data", [])
                 logger.info(f"Found {len(wabas)} WhatsApp Business Accounts for business {business_id}")
@@ -359,10 +363,10 @@ async def whatsapp_oauth_callback(
                     # Get phone numbers for this WhatsApp Business Account
                     phones_url = f"{WHATSAPP_GRAPH_URL}/{waba_id}/phone_numbers"
                     logger.info(f"Getting phone numbers from: {phones_url}")
-                    phones_response = requests.get(phones_url, headers=headers, timeout=30)
+                    phones_response = await http_clients.get(phones_url, headers=headers, timeout=30)
                     logger.info(f"Phone numbers response status: {phones_response.status_code}")
 
-                    if phones_response.ok:
+                    if phones_response.is_success:
                         phones_data = phones_response.json()
                         phones = phones_data.get("data", [])
                         logger.info(f"Found {len(phones)} phone numbers for WABA {waba_id}")
@@ -396,20 +400,11 @@ async def whatsapp_oauth_callback(
         # Use the first available WhatsApp account (user can manage multiple later if needed)
         account = whatsapp_accounts[0]
 
-        # Encrypt token function
-        def encrypt_token(token: str) -> str:
-            key = os.getenv('ENCRYPTION_KEY')
-            if not key:
-                raise ValueError("ENCRYPTION_KEY not found")
-            from cryptography.fernet import Fernet
-            f = Fernet(key.encode())
-            return f.encrypt(token.encode()).decode()
-
         # Store the connection in database
         connection_data = {
             "user_id": user_id,
             "phone_number_id": account["phone_number_id"],
-            "access_token_encrypted": encrypt_token(access_token),
+            "access_token_encrypted": connection_registry.encrypt_token(access_token),
             "business_account_id": account["business_account_id"],
             "whatsapp_business_account_id": account["whatsapp_business_account_id"],
             "phone_number_display": account["phone_number"],
@@ -1022,7 +1017,7 @@ async def handle_oauth_callback(
         # Exchange code for tokens
         print(f"🔄 Exchanging {platform} code for tokens...")
 
-        tokens = exchange_code_for_tokens(platform, code, state)
+        tokens = await exchange_code_for_tokens(platform, code, state)
 
         print(f"✅ Tokens received: {tokens.keys() if tokens else 'None'}")
 
@@ -1033,7 +1028,7 @@ async def handle_oauth_callback(
             print("🔄 Instagram OAuth - using Facebook token exchange and account info...")
             print(f"🔑 Access token (first 20 chars): {tokens['access_token'][:20]}...")
 
-        account_info = get_account_info(platform, tokens['access_token'])
+        account_info = await get_account_info(platform, tokens['access_token'])
 
         print(f"📊 Account info result: {account_info}")
         
@@ -1248,6 +1243,14 @@ async def handle_oauth_callback(
         
         
         
+        connection_registry.invalidate(user_id, platform)
+
+        if platform == 'facebook':
+
+            connection_registry.invalidate(user_id, 'instagram')
+
+
+
         # Remove used state
 
         supabase_admin.table("oauth_states").delete().eq("state", state).execute()
@@ -1776,6 +1779,9 @@ async def disconnect_account(
 
         }).eq("id", connection_id).execute()
 
+
+        connection_registry.invalidate(current_user.id, connection_response.data[0].get("platform"))
+
         
         
         return {"success": True, "message": "Account disconnected successfully"}
@@ -2121,7 +2127,7 @@ def log_debug_token(access_token: str, platform: str, page_id: str):
     }
 
     try:
-        response = httpx.get(debug_url, params=params, timeout=15)
+        response = http_clients.sync.get(debug_url, params=params, timeout=15)
         response.raise_for_status()
         data = response.json().get("data", {})
         print(f"🔍 Token debug for {platform}/{page_id}: scopes={data.get('scopes')}, is_valid={data.get('is_valid')}, expires_at={data.get('expires_at')}, user_id={data.get('user_id')}, app_id={data.get('app_id')}")
@@ -2168,7 +2174,7 @@ def fetch_page_metrics(page_id: str, access_token: str) -> dict:
     }
 
     try:
-        response = httpx.get(url, params=params, timeout=15)
+        response = http_clients.sync.get(url, params=params, timeout=15)
         response.raise_for_status()
         data = response.json().get("data", [])
 
@@ -2220,31 +2226,31 @@ def store_analytics_snapshot(
         print(f"❌ Could not save analytics snapshot {metric}: {exc}")
 
 
-def exchange_code_for_tokens(platform: str, code: str, state: str = None) -> dict:
+async def exchange_code_for_tokens(platform: str, code: str, state: str = None) -> dict:
 
     """Exchange OAuth code for access tokens"""
 
     if platform == "facebook":
 
-        return exchange_facebook_code_for_tokens(code)
+        return await exchange_facebook_code_for_tokens(code)
 
     elif platform == "instagram":
         # Instagram uses Facebook OAuth, so use Facebook token exchange
         # with Instagram redirect URI
         instagram_redirect_uri = f"{os.getenv('API_BASE_URL', '').rstrip('/')}/connections/auth/instagram/callback"
-        return exchange_facebook_code_for_tokens(code, instagram_redirect_uri)
+        return await exchange_facebook_code_for_tokens(code, instagram_redirect_uri)
 
     elif platform == "linkedin":
 
-        return exchange_linkedin_code_for_tokens(code)
+        return await exchange_linkedin_code_for_tokens(code)
 
     elif platform == "twitter":
 
-        return exchange_twitter_code_for_tokens(code, state)
+        return await exchange_twitter_code_for_tokens(code, state)
 
     elif platform == "youtube":
 
-        return exchange_youtube_code_for_tokens(code)
+        return await exchange_youtube_code_for_tokens(code)
 
     else:
 
@@ -2252,11 +2258,10 @@ def exchange_code_for_tokens(platform: str, code: str, state: str = None) -> dic
 
 
 
-def exchange_facebook_code_for_tokens(code: str, redirect_uri: str = None) -> dict:
+async def exchange_facebook_code_for_tokens(code: str, redirect_uri: str = None) -> dict:
 
     """Exchange Facebook OAuth code for access tokens"""
 
-    import requests
 
     
 
@@ -2293,7 +2298,8 @@ def exchange_facebook_code_for_tokens(code: str, redirect_uri: str = None) -> di
 
     
     
-    response = requests.get(token_url, params=token_params)
+    # Authorization codes are single-use, so the exchange is never retried
+    response = await http_clients.get(token_url, params=token_params, retries=0)
 
     response.raise_for_status()
 
@@ -2321,7 +2327,7 @@ def exchange_facebook_code_for_tokens(code: str, redirect_uri: str = None) -> di
 
     
     
-    long_lived_response = requests.get(long_lived_url, params=long_lived_params)
+    long_lived_response = await http_clients.get(long_lived_url, params=long_lived_params)
 
     long_lived_response.raise_for_status()
 
@@ -2343,11 +2349,10 @@ def exchange_facebook_code_for_tokens(code: str, redirect_uri: str = None) -> di
 
 
 
-def exchange_instagram_code_for_tokens(code: str) -> dict:
+async def exchange_instagram_code_for_tokens(code: str) -> dict:
 
     """Exchange Instagram OAuth code for access tokens"""
 
-    import requests
 
     
     
@@ -2385,7 +2390,8 @@ def exchange_instagram_code_for_tokens(code: str) -> dict:
 
     
     
-    response = requests.get(token_url, params=token_params)
+    # Authorization codes are single-use, so the exchange is never retried
+    response = await http_clients.get(token_url, params=token_params, retries=0)
 
     response.raise_for_status()
 
@@ -2413,7 +2419,7 @@ def exchange_instagram_code_for_tokens(code: str) -> dict:
 
     
     
-    long_lived_response = requests.get(long_lived_url, params=long_lived_params)
+    long_lived_response = await http_clients.get(long_lived_url, params=long_lived_params)
 
     long_lived_response.raise_for_status()
 
@@ -2435,11 +2441,10 @@ def exchange_instagram_code_for_tokens(code: str) -> dict:
 
 
 
-def exchange_linkedin_code_for_tokens(code: str) -> dict:
+async def exchange_linkedin_code_for_tokens(code: str) -> dict:
 
     """Exchange LinkedIn OAuth code for access tokens"""
 
-    import requests
 
     
     
@@ -2477,7 +2482,8 @@ def exchange_linkedin_code_for_tokens(code: str) -> dict:
 
     
     
-    response = requests.post(token_url, data=token_data)
+    # Authorization codes are single-use, so the exchange is never retried
+    response = await http_clients.post(token_url, data=token_data, retries=0)
 
     response.raise_for_status()
 
@@ -2499,11 +2505,10 @@ def exchange_linkedin_code_for_tokens(code: str) -> dict:
 
 
 
-def exchange_twitter_code_for_tokens(code: str, state: str = None) -> dict:
+async def exchange_twitter_code_for_tokens(code: str, state: str = None) -> dict:
 
     """Exchange Twitter OAuth code for access tokens"""
 
-    import requests
 
     import base64
 
@@ -2557,7 +2562,8 @@ def exchange_twitter_code_for_tokens(code: str, state: str = None) -> dict:
 
     
 
-    response = requests.post(token_url, data=token_data, headers=headers)
+    # Authorization codes are single-use, so the exchange is never retried
+    response = await http_clients.post(token_url, data=token_data, headers=headers, retries=0)
 
     response.raise_for_status()
 
@@ -2579,11 +2585,10 @@ def exchange_twitter_code_for_tokens(code: str, state: str = None) -> dict:
 
 
 
-def exchange_youtube_code_for_tokens(code: str) -> dict:
+async def exchange_youtube_code_for_tokens(code: str) -> dict:
 
     """Exchange YouTube OAuth code for access tokens"""
 
-    import requests
 
     
 
@@ -2621,7 +2626,8 @@ def exchange_youtube_code_for_tokens(code: str) -> dict:
 
     
 
-    response = requests.post(token_url, data=token_data)
+    # Authorization codes are single-use, so the exchange is never retried
+    response = await http_clients.post(token_url, data=token_data, retries=0)
 
     response.raise_for_status()
 
@@ -2641,13 +2647,13 @@ def exchange_youtube_code_for_tokens(code: str) -> dict:
 
 
 
-def get_account_info(platform: str, access_token: str) -> dict:
+async def get_account_info(platform: str, access_token: str) -> dict:
 
     """Get account information from platform API"""
 
     if platform == "facebook":
 
-        return get_facebook_account_info(access_token)
+        return await get_facebook_account_info(access_token)
 
     elif platform == "instagram":
         # Instagram for Business uses Facebook OAuth but needs Instagram-specific handling
@@ -2655,7 +2661,7 @@ def get_account_info(platform: str, access_token: str) -> dict:
         print("🔄 Instagram for Business - getting account info via Facebook OAuth...")
         
         # Get Facebook account info first (this is what Instagram for Business uses)
-        facebook_info = get_facebook_account_info(access_token)
+        facebook_info = await get_facebook_account_info(access_token)
         
         if facebook_info and facebook_info.get('instagram_id'):
             print(f"✅ Found Instagram Business account via Facebook: {facebook_info.get('instagram_id')}")
@@ -2663,19 +2669,19 @@ def get_account_info(platform: str, access_token: str) -> dict:
         
         # If no Instagram found in Facebook info, try dedicated Instagram function
         print("🔄 No Instagram found in Facebook info, trying dedicated Instagram function...")
-        return get_instagram_account_info(access_token)
+        return await get_instagram_account_info(access_token)
 
     elif platform == "linkedin":
 
-        return get_linkedin_account_info(access_token)
+        return await get_linkedin_account_info(access_token)
 
     elif platform == "twitter":
 
-        return get_twitter_account_info(access_token)
+        return await get_twitter_account_info(access_token)
 
     elif platform == "youtube":
 
-        return get_youtube_account_info(access_token)
+        return await get_youtube_account_info(access_token)
 
     else:
 
@@ -2683,11 +2689,10 @@ def get_account_info(platform: str, access_token: str) -> dict:
 
 
 
-def get_facebook_account_info(access_token: str) -> dict:
+async def get_facebook_account_info(access_token: str) -> dict:
 
     """Get Facebook account information"""
 
-    import requests
 
     
     
@@ -2705,7 +2710,7 @@ def get_facebook_account_info(access_token: str) -> dict:
 
     
     
-    response = requests.get(pages_url, params=pages_params)
+    response = await http_clients.get(pages_url, params=pages_params)
 
     response.raise_for_status()
 
@@ -2751,7 +2756,7 @@ def get_facebook_account_info(access_token: str) -> dict:
 
 
 
-def get_instagram_account_info(access_token: str):
+async def get_instagram_account_info(access_token: str):
 
     """Get Instagram account information using Graph API"""
 
@@ -2767,7 +2772,7 @@ def get_instagram_account_info(access_token: str):
 
         print(f"🌐 Fetching pages from: {pages_url}")
 
-        pages_response = requests.get(pages_url)
+        pages_response = await http_clients.get(pages_url)
 
         
         
@@ -2855,7 +2860,7 @@ def get_instagram_account_info(access_token: str):
 
                     page_details_url = f"https://graph.facebook.com/v18.0/{page['id']}?fields=instagram_business_account,connected_instagram_account&access_token={access_token}"
 
-                    page_details_response = requests.get(page_details_url)
+                    page_details_response = await http_clients.get(page_details_url)
 
                     if page_details_response.status_code == 200:
                         page_details = page_details_response.json()
@@ -2888,7 +2893,7 @@ def get_instagram_account_info(access_token: str):
             try:
                 # Try to get Instagram accounts directly
                 instagram_accounts_url = f"https://graph.facebook.com/v18.0/me/accounts?fields=id,name,instagram_business_account&access_token={access_token}"
-                instagram_response = requests.get(instagram_accounts_url)
+                instagram_response = await http_clients.get(instagram_accounts_url)
                 
                 if instagram_response.status_code == 200:
                     instagram_data = instagram_response.json()
@@ -2929,7 +2934,7 @@ def get_instagram_account_info(access_token: str):
 
         print(f"🌐 Fetching Instagram details from: {instagram_url}")
 
-        instagram_response = requests.get(instagram_url)
+        instagram_response = await http_clients.get(instagram_url)
 
         
         
@@ -3001,11 +3006,10 @@ def get_instagram_account_info(access_token: str):
 
 
 
-def get_linkedin_account_info(access_token: str) -> dict:
+async def get_linkedin_account_info(access_token: str) -> dict:
 
     """Get LinkedIn account information using openid, profile, email, and w_member_social scopes"""
 
-    import requests
 
     
     
@@ -3035,7 +3039,7 @@ def get_linkedin_account_info(access_token: str) -> dict:
 
             userinfo_url = "https://api.linkedin.com/v2/userinfo"
 
-            userinfo_response = requests.get(userinfo_url, headers=headers)
+            userinfo_response = await http_clients.get(userinfo_url, headers=headers)
 
             print(f"📊 LinkedIn userinfo response status: {userinfo_response.status_code}")
 
@@ -3103,7 +3107,7 @@ def get_linkedin_account_info(access_token: str) -> dict:
 
         profile_url = "https://api.linkedin.com/v2/me"
 
-        profile_response = requests.get(profile_url, headers=headers)
+        profile_response = await http_clients.get(profile_url, headers=headers)
 
         print(f"📊 LinkedIn profile response status: {profile_response.status_code}")
 
@@ -3159,7 +3163,7 @@ def get_linkedin_account_info(access_token: str) -> dict:
 
             email_url = "https://api.linkedin.com/v2/emailAddress?q=members&projection=(elements*(handle~))"
 
-            email_response = requests.get(email_url, headers=headers)
+            email_response = await http_clients.get(email_url, headers=headers)
 
             if email_response.status_code == 200:
 
@@ -3184,7 +3188,7 @@ def get_linkedin_account_info(access_token: str) -> dict:
         try:
             print("🔄 Getting organization info for page management...")
             org_url = "https://api.linkedin.com/v2/organizationalEntityAcls?q=roleAssignee&role=ADMINISTRATOR&state=APPROVED"
-            org_response = requests.get(org_url, headers=headers)
+            org_response = await http_clients.get(org_url, headers=headers)
             print(f"📊 LinkedIn organizations response status: {org_response.status_code}")
             
             if org_response.status_code == 200:
@@ -3199,7 +3203,7 @@ def get_linkedin_account_info(access_token: str) -> dict:
                         # Get organization details
                         try:
                             org_details_url = f"https://api.linkedin.com/v2/organizations/{org_id}"
-                            org_details_response = requests.get(org_details_url, headers=headers)
+                            org_details_response = await http_clients.get(org_details_url, headers=headers)
                             
                             if org_details_response.status_code == 200:
                                 org_details = org_details_response.json()
@@ -3265,11 +3269,10 @@ def get_linkedin_account_info(access_token: str) -> dict:
 
 
 
-def get_twitter_account_info(access_token: str) -> dict:
+async def get_twitter_account_info(access_token: str) -> dict:
 
     """Get Twitter account information using Twitter API v2"""
 
-    import requests
 
     
 
@@ -3301,7 +3304,7 @@ def get_twitter_account_info(access_token: str) -> dict:
 
         
 
-        user_response = requests.get(user_url, headers=headers, params=user_params)
+        user_response = await http_clients.get(user_url, headers=headers, params=user_params)
 
         print(f"📊 Twitter user response status: {user_response.status_code}")
 
@@ -3367,11 +3370,10 @@ def get_twitter_account_info(access_token: str) -> dict:
 
 
 
-def get_youtube_account_info(access_token: str) -> dict:
+async def get_youtube_account_info(access_token: str) -> dict:
 
     """Get YouTube account information using YouTube Data API v3"""
 
-    import requests
 
     
 
@@ -3405,7 +3407,7 @@ def get_youtube_account_info(access_token: str) -> dict:
 
         
 
-        channel_response = requests.get(channel_url, headers=headers, params=channel_params)
+        channel_response = await http_clients.get(channel_url, headers=headers, params=channel_params)
 
         
 
@@ -3829,7 +3831,7 @@ async def post_to_facebook(
 
             
             
-            validate_response = requests.get(validate_url)
+            validate_response = await http_clients.get(validate_url)
 
             print(f"🔍 Token validation response: {validate_response.status_code}")
 
@@ -3892,7 +3894,7 @@ async def post_to_facebook(
                         "access_token": access_token
                     }
                     
-                    photo_response = requests.post(photo_url, data=photo_payload)
+                    photo_response = await http_clients.post(photo_url, data=photo_payload)
                     if photo_response.status_code == 200:
                         photo_data = photo_response.json()
                         photo_id = photo_data.get('id')
@@ -3932,7 +3934,7 @@ async def post_to_facebook(
             }
             
             print(f"🎠 Posting carousel to feed endpoint with {len(photo_ids)} photos")
-            response = requests.post(facebook_url, data=payload)
+            response = await http_clients.post(facebook_url, data=payload)
             
             if response.status_code == 200:
                 result = response.json()
@@ -4078,18 +4080,18 @@ async def post_to_facebook(
         if image_url:
             if is_video:
                 # For videos, use file_url and description
-                response = requests.post(facebook_url_with_token, data={
+                response = await http_clients.post(facebook_url_with_token, data={
                     "file_url": image_url,
                     "description": full_message
                 })
             else:
                 # For photos, send URL parameter separately
-                response = requests.post(facebook_url_with_token, data={
+                response = await http_clients.post(facebook_url_with_token, data={
                     "message": full_message,
                     "url": image_url
                 })
         else:
-            response = requests.post(facebook_url_with_token, data={"message": full_message})
+            response = await http_clients.post(facebook_url_with_token, data={"message": full_message})
         
         
         
@@ -4099,7 +4101,7 @@ async def post_to_facebook(
 
             # Fallback to form data method
 
-            response = requests.post(facebook_url, data=payload)
+            response = await http_clients.post(facebook_url, data=payload)
         
         
         
@@ -4514,7 +4516,7 @@ async def get_linkedin_organizations(
         
         # Get organization data
         org_url = "https://api.linkedin.com/v2/organizationalEntityAcls?q=roleAssignee&role=ADMINISTRATOR&state=APPROVED"
-        org_response = requests.get(org_url, headers=headers)
+        org_response = await http_clients.get(org_url, headers=headers)
         
         if org_response.status_code != 200:
             raise HTTPException(
@@ -4533,7 +4535,7 @@ async def get_linkedin_organizations(
                 try:
                     # Get organization details
                     org_details_url = f"https://api.linkedin.com/v2/organizations/{org_id}"
-                    org_details_response = requests.get(org_details_url, headers=headers)
+                    org_details_response = await http_clients.get(org_details_url, headers=headers)
                     
                     if org_details_response.status_code == 200:
                         org_details = org_details_response.json()
@@ -4624,9 +4626,9 @@ async def upload_linkedin_image(
         }
         
         print(f"🔄 Registering image upload...")
-        register_response = requests.post(register_url, headers=headers, json=register_payload)
+        register_response = await http_clients.post(register_url, headers=headers, json=register_payload)
         
-        if not register_response.ok:
+        if not register_response.is_success:
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
                 detail=f"Failed to register image upload: {register_response.text}"
@@ -4936,7 +4938,7 @@ async def post_to_linkedin(
 
         
         
-        response = requests.post(linkedin_url, headers=headers, json=ugc_payload)
+        response = await http_clients.post(linkedin_url, headers=headers, json=ugc_payload)
 
         
         
@@ -4962,6 +4964,8 @@ async def post_to_linkedin(
 
                 }).eq("id", connection['id']).execute()
 
+                connection_registry.invalidate(current_user.id, 'linkedin')
+
             except Exception as e:
 
                 print(f"⚠️  Error updating last_posted_at: {e}")
@@ -5406,6 +5410,239 @@ async def test_instagram_pages(
 
 
 
+def _publish_instagram_media(instagram_id: str, media_id: str, access_token: str, post_data: dict,
+                             user_id: str, is_video: bool) -> dict:
+    """Publish a ready Instagram media container and record the post on the content (blocking)"""
+
+    # Publish the media
+
+    publish_url = f"https://graph.facebook.com/v18.0/{instagram_id}/media_publish"
+
+    publish_data = {
+
+        "creation_id": media_id,
+
+        "access_token": access_token
+
+    }
+
+
+
+    print(f"🌐 Publishing Instagram media: {publish_url}")
+
+    publish_response = http_clients.sync.post(publish_url, data=publish_data)
+
+
+
+    if publish_response.status_code != 200:
+
+        try:
+
+            error_data = publish_response.json()
+
+            print(f"❌ Instagram publish error (JSON): {publish_response.status_code} - {error_data}")
+
+        except:
+
+            error_text = publish_response.text
+
+            print(f"❌ Instagram publish error (Text): {publish_response.status_code} - {error_text}")
+
+            error_data = {"error": {"message": error_text}}
+
+        error_message = error_data.get('error', {}).get('message', 'Unknown error')
+
+        # Provide more helpful error messages
+        if 'Media ID is not available' in error_message or 'media id is not available' in error_message.lower():
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"Instagram cannot access the media. This usually means the image URL is not publicly accessible. Please ensure the image URL is publicly accessible (not behind authentication). Original error: {error_message}"
+            )
+
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Instagram publish error: {error_message}"
+        )
+
+
+
+    publish_result = publish_response.json()
+
+    post_id = publish_result.get('id')
+
+
+
+    print(f"✅ Instagram post published: {post_id}")
+
+
+
+    # Update content status in both created_content and content_posts tables
+
+    try:
+        content_id = post_data.get('content_id')
+
+        if content_id:
+            published_at = datetime.now().isoformat()
+
+            # Update created_content table with platform-specific post ID in metadata
+            try:
+                # Get existing metadata first
+                existing_content = supabase_admin.table("created_content").select("metadata").eq("id", content_id).eq("user_id", user_id).execute()
+                existing_metadata = existing_content.data[0].get("metadata", {}) if existing_content.data else {}
+
+                # Add the post ID to metadata
+                existing_metadata["instagram_post_id"] = post_id
+
+                created_content_update = {
+                    "status": "published",
+                    "metadata": existing_metadata,
+                    "updated_at": published_at
+                }
+                supabase_admin.table("created_content").update(created_content_update).eq("id", content_id).eq("user_id", user_id).execute()
+                print(f"✅ Updated created_content table metadata with instagram_post_id: {post_id}")
+            except Exception as e:
+                print(f"⚠️ Failed to update created_content table: {e}")
+
+            # Also update content_posts table for backward compatibility
+            try:
+                # Get existing metadata first
+                existing_post = supabase_admin.table("content_posts").select("metadata").eq("id", content_id).execute()
+                existing_metadata = existing_post.data[0].get("metadata", {}) if existing_post.data else {}
+
+                # Update metadata with post ID
+                existing_metadata["instagram_post_id"] = post_id
+
+                update_data = {
+                    "status": "published",
+                    "published_at": published_at,
+                    "metadata": existing_metadata
+                }
+
+                print(f"🔄 Updating content_posts {content_id} status to published...")
+                print(f"📝 Update data: {update_data}")
+
+                update_response = supabase_admin.table("content_posts").update(update_data).eq("id", content_id).execute()
+
+                if update_response.data:
+                    print(f"✅ Successfully updated content_posts table: {update_response.data}")
+                else:
+                    print(f"⚠️ Update response has no data: {update_response}")
+                    # Try to get the current content to verify
+                    check_response = supabase_admin.table("content_posts").select("id, status").eq("id", content_id).execute()
+                    print(f"🔍 Current content_posts status: {check_response.data}")
+            except Exception as e:
+                print(f"⚠️ Failed to update content_posts table: {e}")
+
+        else:
+            print("⚠️ No content_id provided, skipping database update")
+
+    except Exception as e:
+        print(f"❌ Error updating content status in database: {e}")
+        import traceback
+        print(f"📋 Traceback: {traceback.format_exc()}")
+
+        # Don't fail the whole request if database update fails
+
+
+
+    # Try to get permalink from Instagram API, fallback to constructed URL
+    post_url = None
+    if post_id:
+        try:
+            # Fetch the media object to get permalink
+            media_url = f"https://graph.facebook.com/v18.0/{post_id}?fields=permalink&access_token={access_token}"
+            media_response = http_clients.sync.get(media_url, timeout=10)
+            if media_response.status_code == 200:
+                media_data = media_response.json()
+                post_url = media_data.get('permalink')
+                print(f"✅ Got Instagram permalink: {post_url}")
+        except Exception as e:
+            print(f"⚠️ Could not fetch permalink, using constructed URL: {e}")
+
+        # Fallback to constructed URL if permalink not available
+        if not post_url:
+            # Determine URL format based on media type (reels use different URL format)
+            if is_video:
+                # For reels, use the reel URL format
+                post_url = f"https://www.instagram.com/reel/{post_id}/"
+            else:
+                # For regular posts, use the post URL format
+                post_url = f"https://www.instagram.com/p/{post_id}/"
+
+    return {
+
+        "success": True,
+
+        "platform": "instagram",
+
+        "post_id": post_id,
+
+        "message": "Content posted to Instagram successfully!",
+
+        "url": post_url,
+        "post_url": post_url  # Also include post_url for consistency with frontend
+
+    }
+
+
+def _instagram_publish_calls(instagram_id: str, media_id: str, access_token: str, post_data: dict, user_id: str):
+    """Status check and publish coroutines for a processing Instagram reel container"""
+    status_url = f"https://graph.facebook.com/v18.0/{media_id}"
+
+    async def check_status():
+        status_response = await http_clients.get(
+            status_url, params={"fields": "status_code", "access_token": access_token}, timeout=10
+        )
+        if status_response.status_code != 200:
+            print(f"⚠️  Could not check video status (HTTP {status_response.status_code})")
+            return None
+        return status_response.json().get('status_code')
+
+    async def publish():
+        return await asyncio.to_thread(
+            _publish_instagram_media, instagram_id, media_id, access_token,
+            post_data, user_id, True
+        )
+
+    return check_status, publish
+
+
+async def _resume_instagram_publish(job: dict):
+    """Rebuild the publish calls for a stored job (another worker stopped polling it)"""
+    response = await asyncio.to_thread(
+        lambda: supabase_admin.table("platform_connections").select("access_token_encrypted").eq(
+            "user_id", job["user_id"]
+        ).eq("platform", "instagram").eq("is_active", True).execute()
+    )
+    if not response.data:
+        raise RuntimeError("No active Instagram connection found")
+    encrypted_token = response.data[0]['access_token_encrypted']
+    try:
+        access_token = decrypt_token(encrypted_token)
+    except Exception:
+        if not encrypted_token.startswith('EAAB'):
+            raise
+        access_token = encrypted_token
+    return _instagram_publish_calls(
+        job["account_id"], job["container_id"], access_token, {"content_id": job.get("content_id")}, job["user_id"]
+    )
+
+
+media_publish_jobs.register("instagram", _resume_instagram_publish)
+
+
+@router.get("/instagram/publish-jobs/{job_id}")
+async def get_instagram_publish_job(
+    job_id: str,
+    current_user: User = Depends(get_current_user)
+):
+    """Status of a background Instagram publish (reels)"""
+    job = await media_publish_jobs.get(job_id, current_user.id)
+    if not job:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Publish job not found")
+    return {"success": True, **job}
+
+
 @router.post("/instagram/post")
 
 async def post_to_instagram(
@@ -5546,7 +5783,7 @@ async def post_to_instagram(
                 print(f"⚠️  Warning: Image URL is from Supabase storage. Ensure the bucket is public and the URL is accessible.")
                 # Try to verify URL is accessible (quick check)
                 try:
-                    head_response = requests.head(image_url, timeout=5, allow_redirects=True)
+                    head_response = await http_clients.head(image_url, timeout=5, allow_redirects=True)
                     if head_response.status_code not in [200, 301, 302]:
                         print(f"⚠️  Warning: Image URL returned status {head_response.status_code}. Instagram may not be able to access it.")
                 except Exception as e:
@@ -5588,7 +5825,7 @@ async def post_to_instagram(
                         "access_token": access_token
                     }
                     
-                    container_response = requests.post(container_url, data=container_data)
+                    container_response = await http_clients.post(container_url, data=container_data)
                     if container_response.status_code == 200:
                         container_result = container_response.json()
                         container_id = container_result.get('id')
@@ -5629,7 +5866,7 @@ async def post_to_instagram(
             }
             
             print(f"🎠 Creating Instagram carousel container with {len(container_ids)} children")
-            carousel_response = requests.post(carousel_url, data=carousel_data)
+            carousel_response = await http_clients.post(carousel_url, data=carousel_data)
             
             if carousel_response.status_code != 200:
                 error_data = carousel_response.json() if carousel_response.headers.get('content-type', '').startswith('application/json') else {"error": carousel_response.text}
@@ -5656,7 +5893,7 @@ async def post_to_instagram(
             }
             
             print(f"🎠 Publishing Instagram carousel: {creation_id}")
-            publish_response = requests.post(publish_url, data=publish_data)
+            publish_response = await http_clients.post(publish_url, data=publish_data)
             
             if publish_response.status_code == 200:
                 publish_result = publish_response.json()
@@ -5712,7 +5949,7 @@ async def post_to_instagram(
                 try:
                     # Fetch the media object to get permalink
                     media_url = f"https://graph.facebook.com/v18.0/{post_id}?fields=permalink&access_token={access_token}"
-                    media_response = requests.get(media_url, timeout=10)
+                    media_response = await http_clients.get(media_url, timeout=10)
                     if media_response.status_code == 200:
                         media_data = media_response.json()
                         post_url = media_data.get('permalink')
@@ -5811,7 +6048,7 @@ async def post_to_instagram(
         
         # Create the media container
 
-        media_response = requests.post(create_media_url, data=media_data)
+        media_response = await http_clients.post(create_media_url, data=media_data)
 
         
         
@@ -5869,219 +6106,31 @@ async def post_to_instagram(
 
         
         
-        # For videos/reels, wait for processing before publishing (with shorter timeout for better UX)
         if is_video:
-            max_wait_time = 120  # 2 minutes max wait (reduced from 5 minutes)
-            wait_interval = 3  # Check every 3 seconds (reduced from 5)
-            elapsed_time = 0
-            
-            print(f"⏳ Waiting for video to be processed...")
-            while elapsed_time < max_wait_time:
-                # Check media status
-                status_url = f"https://graph.facebook.com/v18.0/{media_id}?fields=status_code&access_token={access_token}"
-                try:
-                    status_response = requests.get(status_url, timeout=10)
-                    
-                    if status_response.status_code == 200:
-                        status_data = status_response.json()
-                        status_code = status_data.get('status_code')
-                        
-                        if status_code == 'FINISHED':
-                            print(f"✅ Video processing completed")
-                            break
-                        elif status_code == 'ERROR':
-                            raise HTTPException(
-                                status_code=status.HTTP_400_BAD_REQUEST,
-                                detail="Video processing failed. Please check your video file and try again."
-                            )
-                        else:
-                            print(f"⏳ Video processing status: {status_code}, waiting... ({elapsed_time}s/{max_wait_time}s)")
-                            time.sleep(wait_interval)
-                            elapsed_time += wait_interval
-                    else:
-                        # If status check fails, try to publish anyway (might be ready)
-                        print(f"⚠️  Could not check video status (HTTP {status_response.status_code}), attempting to publish...")
-                        break
-                except requests.exceptions.Timeout:
-                    print(f"⚠️  Status check timeout, attempting to publish...")
-                    break
-                except Exception as e:
-                    print(f"⚠️  Error checking status: {e}, attempting to publish...")
-                    break
-            
-            if elapsed_time >= max_wait_time:
-                print(f"⚠️  Video processing timeout after {max_wait_time}s, attempting to publish anyway...")
-        
-        
-        # Publish the media
-
-        publish_url = f"https://graph.facebook.com/v18.0/{instagram_id}/media_publish"
-
-        publish_data = {
-
-            "creation_id": media_id,
-
-            "access_token": access_token
-
-        }
-
-        
-        
-        print(f"🌐 Publishing Instagram media: {publish_url}")
-
-        publish_response = requests.post(publish_url, data=publish_data)
-
-        
-        
-        if publish_response.status_code != 200:
-
-            try:
-
-                error_data = publish_response.json()
-
-                print(f"❌ Instagram publish error (JSON): {publish_response.status_code} - {error_data}")
-
-            except:
-
-                error_text = publish_response.text
-
-                print(f"❌ Instagram publish error (Text): {publish_response.status_code} - {error_text}")
-
-                error_data = {"error": {"message": error_text}}
-            
-            error_message = error_data.get('error', {}).get('message', 'Unknown error')
-            
-            # Provide more helpful error messages
-            if 'Media ID is not available' in error_message or 'media id is not available' in error_message.lower():
-                raise HTTPException(
-                    status_code=status.HTTP_400_BAD_REQUEST,
-                    detail=f"Instagram cannot access the media. This usually means the image URL is not publicly accessible. Please ensure the image URL is publicly accessible (not behind authentication). Original error: {error_message}"
-                )
-            
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail=f"Instagram publish error: {error_message}"
+            # Reels need server-side processing: poll and publish in the background instead
+            # of holding this request open; the client polls the job until it is published
+            check_status, publish = _instagram_publish_calls(
+                instagram_id, media_id, access_token, post_data, current_user.id
             )
-        
-        
-        
-        publish_result = publish_response.json()
-
-        post_id = publish_result.get('id')
-
-        
-        
-        print(f"✅ Instagram post published: {post_id}")
-
-        
-        
-        # Update content status in both created_content and content_posts tables
-
-        try:
-            content_id = post_data.get('content_id')
-
-            if content_id:
-                published_at = datetime.now().isoformat()
-
-                # Update created_content table with platform-specific post ID in metadata
-                try:
-                    # Get existing metadata first
-                    existing_content = supabase_admin.table("created_content").select("metadata").eq("id", content_id).eq("user_id", current_user.id).execute()
-                    existing_metadata = existing_content.data[0].get("metadata", {}) if existing_content.data else {}
-
-                    # Add the post ID to metadata
-                    existing_metadata["instagram_post_id"] = post_id
-
-                    created_content_update = {
-                        "status": "published",
-                        "metadata": existing_metadata,
-                        "updated_at": published_at
-                    }
-                    supabase_admin.table("created_content").update(created_content_update).eq("id", content_id).eq("user_id", current_user.id).execute()
-                    print(f"✅ Updated created_content table metadata with instagram_post_id: {post_id}")
-                except Exception as e:
-                    print(f"⚠️ Failed to update created_content table: {e}")
-
-                # Also update content_posts table for backward compatibility
-                try:
-                    # Get existing metadata first
-                    existing_post = supabase_admin.table("content_posts").select("metadata").eq("id", content_id).execute()
-                    existing_metadata = existing_post.data[0].get("metadata", {}) if existing_post.data else {}
-
-                    # Update metadata with post ID
-                    existing_metadata["instagram_post_id"] = post_id
-
-                    update_data = {
-                        "status": "published",
-                        "published_at": published_at,
-                        "metadata": existing_metadata
-                    }
-
-                    print(f"🔄 Updating content_posts {content_id} status to published...")
-                    print(f"📝 Update data: {update_data}")
-
-                    update_response = supabase_admin.table("content_posts").update(update_data).eq("id", content_id).execute()
-
-                    if update_response.data:
-                        print(f"✅ Successfully updated content_posts table: {update_response.data}")
-                    else:
-                        print(f"⚠️ Update response has no data: {update_response}")
-                        # Try to get the current content to verify
-                        check_response = supabase_admin.table("content_posts").select("id, status").eq("id", content_id).execute()
-                        print(f"🔍 Current content_posts status: {check_response.data}")
-                except Exception as e:
-                    print(f"⚠️ Failed to update content_posts table: {e}")
-
-            else:
-                print("⚠️ No content_id provided, skipping database update")
-
-        except Exception as e:
-            print(f"❌ Error updating content status in database: {e}")
-            import traceback
-            print(f"📋 Traceback: {traceback.format_exc()}")
-
-            # Don't fail the whole request if database update fails
-        
-        
-        
-        # Try to get permalink from Instagram API, fallback to constructed URL
-        post_url = None
-        if post_id:
-            try:
-                # Fetch the media object to get permalink
-                media_url = f"https://graph.facebook.com/v18.0/{post_id}?fields=permalink&access_token={access_token}"
-                media_response = requests.get(media_url, timeout=10)
-                if media_response.status_code == 200:
-                    media_data = media_response.json()
-                    post_url = media_data.get('permalink')
-                    print(f"✅ Got Instagram permalink: {post_url}")
-            except Exception as e:
-                print(f"⚠️ Could not fetch permalink, using constructed URL: {e}")
-            
-            # Fallback to constructed URL if permalink not available
-            if not post_url:
-                # Determine URL format based on media type (reels use different URL format)
-                if is_video:
-                    # For reels, use the reel URL format
-                    post_url = f"https://www.instagram.com/reel/{post_id}/"
-                else:
-                    # For regular posts, use the post URL format
-                    post_url = f"https://www.instagram.com/p/{post_id}/"
-        
-        return {
-
-            "success": True,
-
-            "platform": "instagram",
-
-            "post_id": post_id,
-
-            "message": "Content posted to Instagram successfully!",
+            job = await media_publish_jobs.submit(
+                current_user.id, "instagram", media_id, check_status, publish,
+                account_id=instagram_id, content_id=content_id
+            )
+            print(f"⏳ Instagram reel {media_id} is processing, publishing in background (job {job['job_id']})")
 
-            "url": post_url,
-            "post_url": post_url  # Also include post_url for consistency with frontend
+            return {
+                "success": True,
+                "platform": "instagram",
+                "status": "processing",
+                "job_id": job["job_id"],
+                "container_id": media_id,
+                "message": "Your reel is being processed by Instagram and will be published automatically."
+            }
 
-        }
+        return await asyncio.to_thread(
+            _publish_instagram_media, instagram_id, media_id, access_token,
+            post_data, current_user.id, is_video
+        )
         
         
         
@@ -6216,9 +6265,6 @@ async def create_wordpress_connection(
         print(f"🔍 Testing WordPress connection with REST API endpoints")
         
         try:
-            import requests
-            session = requests.Session()
-            session.cookies.clear()
             
             # Test WordPress REST API authentication with multiple endpoints
             response = None
@@ -6227,7 +6273,7 @@ async def create_wordpress_connection(
             for rest_url in rest_urls:
                 print(f"🔍 Trying endpoint: {rest_url}")
                 try:
-                    response = session.get(
+                    response = await http_clients.get(
                         rest_url,
                         auth=(connection_data.username, connection_data.password),
                         headers={
@@ -6251,7 +6297,7 @@ async def create_wordpress_connection(
                         print(f"⚠️ Error with {rest_url}: {response.status_code}")
                         continue
                         
-                except requests.exceptions.RequestException as e:
+                except httpx.HTTPError as e:
                     print(f"⚠️ Request failed for {rest_url}: {e}")
                     continue
             
@@ -6268,7 +6314,7 @@ async def create_wordpress_connection(
             print(f"🔍 User: {user_info.get('name', 'Unknown')}")
             print(f"🔍 Email: {user_info.get('email', 'Unknown')}")
             
-        except requests.exceptions.RequestException as e:
+        except httpx.HTTPError as e:
             print(f"❌ WordPress REST API request failed: {e}")
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
@@ -6378,7 +6424,7 @@ async def create_wordpress_connection(
 
         raise
 
-    except requests.exceptions.RequestException as e:
+    except httpx.HTTPError as e:
 
         print(f"❌ WordPress connection error: {e}")
 
@@ -6561,7 +6607,7 @@ async def update_wordpress_connection(
 
         raise
 
-    except requests.exceptions.RequestException as e:
+    except httpx.HTTPError as e:
 
         print(f"❌ WordPress connection error: {e}")
 
@@ -6728,12 +6774,9 @@ async def test_wordpress_connection(
         print(f"🔍 Testing WordPress connection with REST API: {rest_url}")
         
         try:
-            import requests
-            session = requests.Session()
-            session.cookies.clear()
             
             # Test WordPress REST API authentication
-            response = session.get(
+            response = await http_clients.get(
                 rest_url,
                 auth=(connection['username'], password),
                 headers={
@@ -6792,7 +6835,7 @@ async def test_wordpress_connection(
             print(f"🔍 User: {user_info.get('name', 'Unknown')}")
             print(f"🔍 Email: {user_info.get('email', 'Unknown')}")
             
-        except requests.exceptions.RequestException as e:
+        except httpx.HTTPError as e:
             print(f"❌ WordPress REST API request failed: {e}")
             # Update last_checked_at even if test failed
             supabase_admin.table("wordpress_connections").update({
@@ -6879,7 +6922,7 @@ async def test_wordpress_connection(
 
         raise
 
-    except requests.exceptions.RequestException as e:
+    except httpx.HTTPError as e:
 
         print(f"❌ WordPress connection test error: {e}")
 
@@ -6927,7 +6970,7 @@ async def delete_from_facebook(post_id: str, connection: dict) -> bool:
         }
 
         print(f"🌐 Deleting from Facebook URL: {delete_url}")
-        response = requests.delete(delete_url, params=params)
+        response = await http_clients.delete(delete_url, params=params)
 
         if response.status_code == 200:
             result = response.json()
@@ -6967,7 +7010,7 @@ async def delete_from_instagram(post_id: str, connection: dict) -> bool:
         }
 
         print(f"🌐 Deleting from Instagram URL: {delete_url}")
-        response = requests.delete(delete_url, params=params)
+        response = await http_clients.delete(delete_url, params=params)
 
         if response.status_code == 200:
             result = response.json()
@@ -7014,7 +7057,7 @@ async def delete_from_linkedin(post_id: str, connection: dict) -> bool:
         delete_url = f"https://api.linkedin.com/v2/shares/{share_id}"
 
         print(f"🌐 Deleting from LinkedIn URL: {delete_url}")
-        response = requests.delete(delete_url, headers=headers)
+        response = await http_clients.delete(delete_url, headers=headers)
 
         if response.status_code == 204:
             print(f"✅ Successfully deleted LinkedIn post: {post_id}")
@@ -7048,7 +7091,7 @@ async def delete_from_twitter(post_id: str, connection: dict) -> bool:
         delete_url = f"https://api.twitter.com/2/tweets/{post_id}"
 
         print(f"🌐 Deleting from Twitter URL: {delete_url}")
-        response = requests.delete(delete_url, headers=headers)
+        response = await http_clients.delete(delete_url, headers=headers)
 
         if response.status_code == 200:
             result = response.json()
@@ -11,7 +11,7 @@ from pydantic import BaseModel
 import smtplib
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
-import httpx
+from services.http_clients import http_clients
 
 logger = logging.getLogger(__name__)
 
@@ -30,7 +30,7 @@ async def send_via_resend(recipient_email: str, sender_email: str, subject: str,
         if not api_key:
             return False
         
-        async with httpx.AsyncClient() as client:
+        async with http_clients.session() as client:
             response = await client.post(
                 "https://api.resend.com/emails",
                 headers={
@@ -61,7 +61,7 @@ async def send_via_sendgrid(recipient_email: str, sender_email: str, subject: st
         if not api_key:
             return False
         
-        async with httpx.AsyncClient() as client:
+        async with http_clients.session() as client:
             response = await client.post(
                 "https://api.sendgrid.com/v3/mail/send",
                 headers={
@@ -103,7 +103,7 @@ async def send_via_mailgun(recipient_email: str, sender_email: str, subject: str
         if not api_key or not domain:
             return False
         
-        async with httpx.AsyncClient() as client:
+        async with http_clients.session() as client:
             response = await client.post(
                 f"https://api.mailgun.net/v3/{domain}/messages",
                 auth=("api", api_key),
@@ -8,6 +8,8 @@ from dotenv import load_dotenv
 from pydantic import BaseModel
 import openai
 from .connections import delete_from_social_media
+from services.image_derivatives import image_derivatives, thumbnail_for, content_image_urls
+from services.asset_registry import asset_registry
 
 logger = logging.getLogger(__name__)
 
@@ -31,6 +33,9 @@ if supabase_service_key:
 else:
     supabase_admin = supabase  # Fallback to anon client
 
+# Rows without derivatives queued for generation per /created request
+DERIVATIVE_BACKFILL_PER_REQUEST = int(os.getenv("IMAGE_DERIVATIVE_BACKFILL_PER_REQUEST", "10"))
+
 # User model
 class User(BaseModel):
     id: str
@@ -335,6 +340,8 @@ async def get_created_content(
                 "call_to_action": item.get("call_to_action"),
                 "engagement_question": item.get("engagement_question"),
                 "media_url": item.get("media_url") or (item.get("images", [])[0] if item.get("images") and len(item.get("images", [])) > 0 else None),
+                "thumbnail_url": thumbnail_for(item),
+                "medium_url": thumbnail_for(item, "medium"),
                 # Mock campaign data for compatibility
                 "content_campaigns": {
                     "platform": normalized_platform,
@@ -343,6 +350,13 @@ async def get_created_content(
             }
             transformed_items.append(transformed_item)
 
+        # Backfill derivatives for older rows in the background; they get thumbnails on a later load
+        backfill = [
+            item["id"] for item in content_items if image_derivatives.needs_derivatives(item)
+        ][:DERIVATIVE_BACKFILL_PER_REQUEST]
+        for content_id in backfill:
+            image_derivatives.schedule_for_content(content_id)
+
         return transformed_items
 
     except Exception as e:
@@ -350,6 +364,17 @@ async def get_created_content(
         raise HTTPException(status_code=500, detail=str(e))
 
 
+def _collect_unreferenced_media(released_urls):
+    """Release media references held by purged content, then delete stored files nothing uses"""
+    try:
+        if released_urls:
+            released = asset_registry.release(released_urls)
+            logger.info(f"🔗 Released {released} media asset references from deleted content")
+        asset_registry.collect_garbage()
+    except Exception as e:
+        logger.warning(f"Media asset cleanup skipped: {e}")
+
+
 def cleanup_deleted_content_monthly():
     """
     Monthly cleanup job to permanently delete rows with status='deleted'
@@ -373,25 +398,29 @@ def cleanup_deleted_content_monthly():
         # This ensures we only delete posts from previous months
         
         # First, fetch rows created before current month
-        fetch_response_created = supabase_admin.table("created_content").select("id, created_at, updated_at").eq("status", "deleted").lt("created_at", current_month_start_str).execute()
+        fetch_response_created = supabase_admin.table("created_content").select("id, created_at, updated_at, media_url, images, carousel_images").eq("status", "deleted").lt("created_at", current_month_start_str).execute()
         
         # Also fetch rows that were created this month but updated/deleted in previous months
         # (This shouldn't happen often, but covers edge cases)
-        fetch_response_updated = supabase_admin.table("created_content").select("id, created_at, updated_at").eq("status", "deleted").lt("updated_at", current_month_start_str).gte("created_at", current_month_start_str).execute()
+        fetch_response_updated = supabase_admin.table("created_content").select("id, created_at, updated_at, media_url, images, carousel_images").eq("status", "deleted").lt("updated_at", current_month_start_str).gte("created_at", current_month_start_str).execute()
         
         # Combine and deduplicate IDs
         ids_to_delete = set()
+        rows_by_id = {}
         if fetch_response_created.data:
             for row in fetch_response_created.data:
                 ids_to_delete.add(row["id"])
+                rows_by_id[row["id"]] = row
         if fetch_response_updated.data:
             for row in fetch_response_updated.data:
                 ids_to_delete.add(row["id"])
+                rows_by_id[row["id"]] = row
         
         rows_to_delete = len(ids_to_delete)
         
         if rows_to_delete == 0:
             logger.info("✅ No deleted content found from previous months to clean up")
+            _collect_unreferenced_media([])
             return {
                 "success": True,
                 "deleted_count": 0,
@@ -403,6 +432,7 @@ def cleanup_deleted_content_monthly():
         
         # Delete rows in batches (Supabase has limits)
         deleted_count = 0
+        released_urls = []
         ids_list = list(ids_to_delete)
         batch_size = 100
         
@@ -416,6 +446,7 @@ def cleanup_deleted_content_monthly():
                         delete_response = supabase_admin.table("created_content").delete().eq("id", content_id).execute()
                         if delete_response.data:
                             deleted_count += 1
+                            released_urls.extend(content_image_urls(rows_by_id[content_id], include_videos=True))
                     except Exception as e:
                         logger.warning(f"Failed to delete content {content_id}: {e}")
             except Exception as e:
@@ -423,6 +454,8 @@ def cleanup_deleted_content_monthly():
         
         logger.info(f"✅ Successfully deleted {deleted_count} rows from created_content table")
         
+        _collect_unreferenced_media(released_urls)
+        
         return {
             "success": True,
             "deleted_count": deleted_count,
@@ -879,6 +912,9 @@ async def update_created_content(
 
         updated_content = update_response.data[0]
 
+        if "images" in update_fields:
+            image_derivatives.schedule_for_content(content_id)
+
         return {
             "success": True,
             "message": "Content updated successfully",
@@ -942,9 +978,9 @@ async def delete_created_content(
                         file_path = image_url.split("ai-generated-images/")[-1]
                         if file_path:
                             try:
-                                # Delete from Supabase storage
-                                supabase_admin.storage.from_("ai-generated-images").remove([file_path])
-                                print(f"🗑️ Deleted image from storage: {file_path}")
+                                # Shared uploads stay until the monthly purge releases this row
+                                if asset_registry.discard("ai-generated-images", file_path, image_url, release=False):
+                                    print(f"🗑️ Deleted image from storage: {file_path}")
                             except Exception as storage_error:
                                 # Continue even if storage deletion fails
                                 print(f"⚠️ Could not delete image {file_path} from storage: {storage_error}")
@@ -1794,9 +1830,16 @@ async def discard_post_content(
                     
                     logger.info(f"Deleting image from storage: bucket={bucket_name}, path={file_path}")
                     
-                    # Delete from Supabase Storage
-                    storage_response = supabase_admin.storage.from_(bucket_name).remove([file_path])
-                    logger.info(f"Storage deletion response: {storage_response}")
+                    # Cached generations can give several posts the same image, so keep it while another uses it
+                    shared = supabase_admin.table("post_contents").select("id").eq(
+                        "generated_image_url", image_url
+                    ).neq("id", post_id).limit(1).execute()
+                    if shared.data:
+                        logger.info(f"Kept {file_path}: another post content still uses it")
+                    else:
+                        # Delete from Supabase Storage unless other content shares the upload
+                        removed = asset_registry.discard(bucket_name, file_path, image_url)
+                        logger.info(f"Storage deletion for {file_path}: {'removed' if removed else 'kept'}")
             except Exception as img_error:
                 logger.warning(f"Failed to delete image from storage (continuing with DB deletion): {str(img_error)}")
                 # Continue with database deletion even if image deletion fails
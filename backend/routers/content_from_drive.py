@@ -144,7 +144,7 @@ async def get_drive_processing_status(current_user = Depends(get_current_user)):
         from google.auth.transport.requests import Request
         from google.oauth2.credentials import Credentials
         from googleapiclient.discovery import build
-        from cryptography.fernet import Fernet
+        from services.connection_registry import connection_registry
         
         supabase_url = os.getenv("SUPABASE_URL")
         supabase_key = os.getenv("SUPABASE_SERVICE_ROLE_KEY")
@@ -173,9 +173,8 @@ async def get_drive_processing_status(current_user = Depends(get_current_user)):
                 "message": "Encryption key not configured"
             }
         
-        f = Fernet(encryption_key.encode())
-        access_token = f.decrypt(conn['access_token_encrypted'].encode()).decode()
-        refresh_token = f.decrypt(conn['refresh_token_encrypted'].encode()).decode() if conn.get('refresh_token_encrypted') else None
+        access_token = connection_registry.decrypt_token(conn['access_token_encrypted'])
+        refresh_token = connection_registry.decrypt_token(conn['refresh_token_encrypted']) if conn.get('refresh_token_encrypted') else None
         
         # Create credentials
         credentials = Credentials(
@@ -17,15 +17,19 @@ Folder structure Emily understands:
 
 import os
 import re
+import asyncio
 import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta, timezone
-from typing import Optional, List, Tuple
+from typing import Dict, Optional, List, Set, Tuple
 
 from fastapi import APIRouter, Depends, HTTPException, Header
 from pydantic import BaseModel
 from supabase import create_client, Client
 from dotenv import load_dotenv
-from cryptography.fernet import Fernet
+
+from services.connection_registry import connection_registry
 
 load_dotenv()
 
@@ -82,19 +86,19 @@ MONTHS = {
 
 # ── Crypt helpers ─────────────────────────────────────────────────────────────
 
-def _get_fernet() -> Fernet:
-    key = os.getenv("ENCRYPTION_KEY")
-    if not key:
+def _require_key() -> None:
+    if not os.getenv("ENCRYPTION_KEY"):
         raise HTTPException(status_code=500, detail="ENCRYPTION_KEY not configured")
-    return Fernet(key.encode())
 
 
 def _encrypt(value: str) -> str:
-    return _get_fernet().encrypt(value.encode()).decode()
+    _require_key()
+    return connection_registry.encrypt_token(value)
 
 
 def _decrypt(value: str) -> str:
-    return _get_fernet().decrypt(value.encode()).decode()
+    _require_key()
+    return connection_registry.decrypt_token(value)
 
 
 # ── Auth ──────────────────────────────────────────────────────────────────────
@@ -171,8 +175,9 @@ def _refresh_credentials(conn: dict, user_id: str):
     if creds.expired and creds.refresh_token:
         try:
             creds.refresh(Request())
+            conn["access_token_encrypted"] = _encrypt(creds.token)
             update_payload = {
-                "access_token_encrypted": _encrypt(creds.token),
+                "access_token_encrypted": conn["access_token_encrypted"],
                 "token_expires_at": creds.expiry.isoformat() if creds.expiry else None,
                 "updated_at": datetime.now(timezone.utc).isoformat(),
             }
@@ -183,6 +188,7 @@ def _refresh_credentials(conn: dict, user_id: str):
                 supabase_admin.table("platform_connections").update(update_payload).eq("id", conn["id"]).execute()
             else:
                 supabase_admin.table("user_connections").update(update_payload).eq("id", conn["id"]).execute()
+            connection_registry.invalidate(user_id, "google")
             logger.info(f"Drive tokens refreshed for user {user_id}")
         except Exception as e:
             logger.error(f"Token refresh failed for user {user_id}: {e}")
@@ -204,6 +210,63 @@ def _build_drive_service(creds):
     return build("drive", "v3", credentials=creds, cache_discovery=False)
 
 
+# ── Drive service cache / scan executor ───────────────────────────────────────
+#
+# Built services (and the credentials behind them) are cached per user until
+# shortly before the access token expires, and keyed on the stored token so a
+# reconnect or an external refresh builds a fresh one. googleapiclient services
+# are not thread-safe, so a scan checks its entry out and returns it when done.
+
+DRIVE_SCAN_WORKERS        = int(os.getenv("DRIVE_SCAN_WORKERS", "8"))
+DRIVE_SCAN_CONCURRENCY    = int(os.getenv("DRIVE_SCAN_CONCURRENCY", "8"))
+DRIVE_SERVICE_CACHE_TTL   = int(os.getenv("DRIVE_SERVICE_CACHE_TTL_SECONDS", "2700"))
+DRIVE_SERVICE_EXPIRY_SKEW = timedelta(minutes=5)
+
+_drive_executor = ThreadPoolExecutor(max_workers=DRIVE_SCAN_WORKERS, thread_name_prefix="drive-scan")
+_service_cache: Dict[str, dict] = {}
+_service_cache_lock = threading.Lock()
+
+
+def _checkout_drive_service(conn: dict, user_id: str):
+    """Return (creds, service) for a user, reusing a cached service while its token is valid."""
+    now = datetime.now(timezone.utc)
+    with _service_cache_lock:
+        entry = _service_cache.pop(user_id, None)
+    if entry and entry["token_key"] == conn.get("access_token_encrypted") and entry["expires_at"] - DRIVE_SERVICE_EXPIRY_SKEW > now:
+        return entry["creds"], entry["service"]
+
+    creds   = _refresh_credentials(conn, user_id)
+    service = _build_drive_service(creds)
+    return creds, service
+
+
+def _checkin_drive_service(conn: dict, user_id: str, creds, service):
+    if creds.expiry:
+        # google-auth keeps expiry as naive UTC
+        expires_at = creds.expiry.replace(tzinfo=timezone.utc)
+    else:
+        expires_at = datetime.now(timezone.utc) + timedelta(seconds=DRIVE_SERVICE_CACHE_TTL)
+    with _service_cache_lock:
+        _service_cache[user_id] = {
+            "token_key": conn.get("access_token_encrypted"),
+            "creds": creds,
+            "service": service,
+            "expires_at": expires_at,
+        }
+
+
+def _evict_expired_services():
+    now = datetime.now(timezone.utc)
+    with _service_cache_lock:
+        for user_id in [uid for uid, entry in _service_cache.items() if entry["expires_at"] - DRIVE_SERVICE_EXPIRY_SKEW <= now]:
+            del _service_cache[user_id]
+
+
+async def _run_blocking(func, *args):
+    """Run blocking Drive/Supabase work on the bounded scan thread pool."""
+    return await asyncio.get_running_loop().run_in_executor(_drive_executor, func, *args)
+
+
 def _find_emily_folder(service) -> Optional[str]:
     for name in ("Emily", "emily", "EMILY"):
         q = f"name='{name}' and mimeType='application/vnd.google-apps.folder' and trashed=false"
@@ -428,13 +491,183 @@ def _list_files_in_folder(service, folder_id: str) -> List[dict]:
     return results
 
 
-def _is_processed(user_id: str, file_id: str) -> bool:
-    r = supabase_admin.table("drive_processed_files") \
-        .select("drive_file_id") \
-        .eq("user_id", user_id) \
-        .eq("drive_file_id", file_id) \
-        .execute()
-    return bool(r.data)
+# ── Change feed state ────────────────────────────────────────────────────────
+#
+# Per user we remember the Emily folder ID, its subfolders ({id: name}) and the
+# Drive changes.list page token. Dedicated drive connections also persist this in
+# user_connections.metadata so a restart resumes from the stored token; google
+# platform_connections fallbacks keep it in process only (their metadata is owned
+# by the Gmail sync). Without state the scan falls back to a full folder walk.
+
+DRIVE_STATE_KEYS = ("drive_emily_folder_id", "drive_subfolders", "drive_page_token")
+CHANGE_FIELDS = (
+    "nextPageToken,newStartPageToken,"
+    "changes(fileId,removed,file(id,name,mimeType,parents,trashed,webContentLink,webViewLink,thumbnailLink))"
+)
+FOLDER_MIME_TYPE = "application/vnd.google-apps.folder"
+
+_drive_state_cache: Dict[str, dict] = {}
+_drive_state_lock = threading.Lock()
+
+
+def _load_drive_state(user_id: str, conn: dict) -> dict:
+    with _drive_state_lock:
+        state = _drive_state_cache.get(user_id)
+    if state is None:
+        meta = conn.get("metadata") or {}
+        state = {key: meta.get(key) for key in DRIVE_STATE_KEYS}
+        state["drive_subfolders"] = dict(state.get("drive_subfolders") or {})
+    return dict(state, drive_subfolders=dict(state.get("drive_subfolders") or {}))
+
+
+def _store_drive_state(user_id: str, state: dict):
+    with _drive_state_lock:
+        _drive_state_cache[user_id] = state
+
+
+def _reset_drive_state(user_id: str, conn: Optional[dict] = None):
+    """Forget the cached state, and the stored copy on a dedicated drive connection."""
+    with _drive_state_lock:
+        _drive_state_cache.pop(user_id, None)
+    if not conn or conn.get("_source") == "platform_connections":
+        return
+    meta = conn.get("metadata") or {}
+    if not any(meta.get(key) for key in DRIVE_STATE_KEYS):
+        return
+    # Otherwise a restart would resume from the stale folder ID and page token
+    conn["metadata"] = {key: value for key, value in meta.items() if key not in DRIVE_STATE_KEYS}
+    supabase_admin.table("user_connections").update({
+        "metadata": conn["metadata"],
+        "updated_at": datetime.now(timezone.utc).isoformat(),
+    }).eq("id", conn["id"]).execute()
+
+
+def _get_start_page_token(service) -> str:
+    return service.changes().getStartPageToken(supportsAllDrives=True).execute()["startPageToken"]
+
+
+def _list_changes(service, page_token: str) -> Tuple[List[dict], str]:
+    """Return (changes, new_start_page_token) since page_token."""
+    changes = []
+    while True:
+        resp = service.changes().list(
+            pageToken=page_token,
+            fields=CHANGE_FIELDS,
+            pageSize=1000,
+            includeRemoved=True,
+            supportsAllDrives=True,
+            includeItemsFromAllDrives=True
+        ).execute()
+        changes.extend(resp.get("changes", []))
+        if resp.get("newStartPageToken"):
+            return changes, resp["newStartPageToken"]
+        page_token = resp["nextPageToken"]
+
+
+def _apply_changes(service, state: dict, changes: List[dict]) -> Optional[Dict[str, List[dict]]]:
+    """
+    Fold a change batch into the cached folder map and return new candidate files
+    grouped by parent folder ID. Returns None when the Emily folder itself went away.
+    """
+    emily_folder_id = state["drive_emily_folder_id"]
+    subfolders = state["drive_subfolders"]
+    by_folder: Dict[str, Dict[str, dict]] = {}
+    new_subfolders = []
+
+    for change in changes:
+        file_id = change.get("fileId")
+        f = change.get("file") or {}
+        gone = change.get("removed") or f.get("trashed")
+
+        if file_id == emily_folder_id:
+            if gone:
+                return None
+            continue
+
+        if f.get("mimeType") == FOLDER_MIME_TYPE or file_id in subfolders:
+            if gone or emily_folder_id not in (f.get("parents") or []):
+                subfolders.pop(file_id, None)
+            else:
+                if file_id not in subfolders:
+                    new_subfolders.append(file_id)
+                subfolders[file_id] = f.get("name", subfolders.get(file_id, ""))
+            continue
+
+        if gone or f.get("mimeType", "") not in SUPPORTED_MIME_TYPES:
+            continue
+        for parent in f.get("parents") or []:
+            if parent == emily_folder_id or parent in subfolders:
+                by_folder.setdefault(parent, {})[file_id] = f
+                break
+
+    # Folders moved into Emily bring existing files that never show up as changes
+    for folder_id in new_subfolders:
+        if folder_id in subfolders:
+            for f in _list_files_in_folder(service, folder_id):
+                by_folder.setdefault(folder_id, {})[f["id"]] = f
+
+    return {folder_id: list(files.values()) for folder_id, files in by_folder.items()}
+
+
+def _full_walk(service, state: dict) -> Optional[Dict[str, List[dict]]]:
+    """Locate the Emily folder and list every supported file in it and its subfolders."""
+    emily_folder_id = _find_emily_folder(service)
+    if not emily_folder_id:
+        return None
+    subfolders = _list_subfolders(service, emily_folder_id)
+    state["drive_emily_folder_id"] = emily_folder_id
+    state["drive_subfolders"] = {sub["id"]: sub["name"] for sub in subfolders}
+
+    files_by_folder = {emily_folder_id: _list_files_in_folder(service, emily_folder_id)}
+    for sub in subfolders:
+        files_by_folder[sub["id"]] = _list_files_in_folder(service, sub["id"])
+    return files_by_folder
+
+
+def _collect_candidate_files(service, user_id: str, conn: dict) -> Tuple[dict, Optional[Dict[str, List[dict]]]]:
+    """
+    Return (state, files_by_folder) for this tick: only changed files when a page
+    token is stored, otherwise everything under the Emily folder.
+    """
+    state = _load_drive_state(user_id, conn)
+
+    if state.get("drive_page_token") and state.get("drive_emily_folder_id"):
+        try:
+            changes, new_token = _list_changes(service, state["drive_page_token"])
+            files_by_folder = _apply_changes(service, state, changes)
+            if files_by_folder is not None:
+                state["drive_page_token"] = new_token
+                logger.info(f"Drive changes for user {user_id}: {len(changes)} change(s)")
+                return state, files_by_folder
+            logger.info(f"Emily folder changed for user {user_id}, rescanning")
+        except Exception as e:
+            # Expired/invalid token or folder access issue: fall back to a full walk
+            logger.warning(f"Drive change feed unavailable for user {user_id}, rescanning: {e}")
+
+    # Take the token before walking so changes made during the walk are not missed
+    state["drive_page_token"] = _get_start_page_token(service)
+    return state, _full_walk(service, state)
+
+
+def _get_processed_ids(user_id: str, file_ids: List[str], chunk_size: int = 200) -> Set[str]:
+    """Return the subset of file_ids already recorded in drive_processed_files (one query per chunk)."""
+    processed: Set[str] = set()
+    for start in range(0, len(file_ids), chunk_size):
+        chunk = file_ids[start:start + chunk_size]
+        r = supabase_admin.table("drive_processed_files") \
+            .select("drive_file_id") \
+            .eq("user_id", user_id) \
+            .in_("drive_file_id", chunk) \
+            .execute()
+        processed.update(row["drive_file_id"] for row in (r.data or []))
+    return processed
+
+
+def _filter_unprocessed(user_id: str, files: List[dict]) -> List[dict]:
+    if not files:
+        return []
+    processed = _get_processed_ids(user_id, [f["id"] for f in files])
+    return [f for f in files if f["id"] not in processed]
 
 
 def _mark_processed(user_id: str, file_id: str, file_name: str, mime_type: str,
@@ -572,6 +805,11 @@ def _queue_file(
 # ── Core scan logic ───────────────────────────────────────────────────────────
 
 async def scan_drive_for_user(user_id: str) -> dict:
+    """Scan one user's Drive on the scan thread pool (see _scan_drive_for_user_sync)."""
+    return await _run_blocking(_scan_drive_for_user_sync, user_id)
+
+
+def _scan_drive_for_user_sync(user_id: str) -> dict:
     """
     Core scan:
     1. Walk Emily folder
@@ -585,12 +823,14 @@ async def scan_drive_for_user(user_id: str) -> dict:
         return {"skipped": True, "reason": "no active google connection"}
 
     try:
-        creds   = _refresh_credentials(conn, user_id)
-        service = _build_drive_service(creds)
+        creds, service = _checkout_drive_service(conn, user_id)
 
-        emily_folder_id = _find_emily_folder(service)
-        if not emily_folder_id:
+        state, files_by_folder = _collect_candidate_files(service, user_id, conn)
+        _checkin_drive_service(conn, user_id, creds, service)
+        if files_by_folder is None:
+            _reset_drive_state(user_id, conn)
             return {"found_files": 0, "queued": 0, "reason": "Emily folder not found"}
+        emily_folder_id = state["drive_emily_folder_id"]
 
         platforms         = _get_connected_platforms(user_id) or ["facebook"]
         auto_post         = (conn.get("metadata") or {}).get("auto_post", False)
@@ -598,9 +838,13 @@ async def scan_drive_for_user(user_id: str) -> dict:
         queued_count      = 0
         total_found       = 0
 
+        # One set-based processed lookup for everything this tick touched
+        candidates = [f for files in files_by_folder.values() for f in files]
+        unprocessed_ids = {f["id"] for f in _filter_unprocessed(user_id, candidates)}
+
         # ── 1. Direct files in Emily root ─────────────────────────────────────
-        root_files = _list_files_in_folder(service, emily_folder_id)
-        new_root_files = [f for f in root_files if not _is_processed(user_id, f["id"])]
+        root_files = files_by_folder.get(emily_folder_id, [])
+        new_root_files = [f for f in root_files if f["id"] in unprocessed_ids]
         total_found += len(new_root_files)
 
         for platform in platforms:
@@ -617,8 +861,12 @@ async def scan_drive_for_user(user_id: str) -> dict:
             _mark_processed(user_id, f["id"], f["name"], f.get("mimeType", ""), "processed")
 
         # ── 2. Subfolders ──────────────────────────────────────────────────────
-        subfolders = _list_subfolders(service, emily_folder_id)
-        logger.info(f"Emily folder has {len(subfolders)} subfolder(s): {[s['name'] for s in subfolders]}")
+        subfolders = [
+            {"id": folder_id, "name": name}
+            for folder_id, name in state["drive_subfolders"].items()
+            if folder_id in files_by_folder
+        ]
+        logger.info(f"Emily folder has {len(state['drive_subfolders'])} subfolder(s), {len(subfolders)} with changes: {[s['name'] for s in subfolders]}")
 
         for subfolder in subfolders:
             folder_name = subfolder["name"]
@@ -634,9 +882,8 @@ async def scan_drive_for_user(user_id: str) -> dict:
                 "pinterest", "youtube", "wordpress", "whatsapp",
             }
 
-            # Get files inside this subfolder
-            all_files = _list_files_in_folder(service, folder_id)
-            new_files = [f for f in all_files if not _is_processed(user_id, f["id"])]
+            # Changed files inside this subfolder
+            new_files = [f for f in files_by_folder[folder_id] if f["id"] in unprocessed_ids]
 
             if not new_files:
                 logger.info(f"Subfolder '{folder_name}': no new files, skipping")
@@ -683,8 +930,10 @@ async def scan_drive_for_user(user_id: str) -> dict:
             for f in new_files:
                 _mark_processed(user_id, f["id"], f["name"], f.get("mimeType", ""), "processed")
 
-        # Update last_scan_at
-        meta = {**(conn.get("metadata") or {}), "last_scan_at": datetime.now(timezone.utc).isoformat()}
+        _store_drive_state(user_id, state)
+
+        # Update last_scan_at (and the change feed position)
+        meta = {**(conn.get("metadata") or {}), **state, "last_scan_at": datetime.now(timezone.utc).isoformat()}
         if conn.get("_source") != "platform_connections":
             supabase_admin.table("user_connections").update({
                 "metadata": meta,
@@ -747,6 +996,17 @@ async def save_drive_connection(
         raise HTTPException(status_code=500, detail=str(e))
 
 
+def _lookup_emily_folder(conn: dict, user_id: str) -> Tuple[Optional[str], List[str]]:
+    creds, service = _checkout_drive_service(conn, user_id)
+    emily_folder_id = _find_emily_folder(service)
+    subfolder_names = []
+    if emily_folder_id:
+        subs = _list_subfolders(service, emily_folder_id)
+        subfolder_names = [s["name"] for s in subs]
+    _checkin_drive_service(conn, user_id, creds, service)
+    return emily_folder_id, subfolder_names
+
+
 @router.get("/status")
 async def get_drive_status(current_user: dict = Depends(_get_current_user)):
     user_id = current_user["id"]
@@ -756,15 +1016,14 @@ async def get_drive_status(current_user: dict = Depends(_get_current_user)):
         return {"connected": False, "emily_folder_found": False, "last_scan_at": None, "auto_post": False, "account_email": None}
 
     try:
-        creds   = _refresh_credentials(conn, user_id)
-        service = _build_drive_service(creds)
-        emily_folder_id = _find_emily_folder(service)
+        state = _load_drive_state(user_id, conn)
+        emily_folder_id = state.get("drive_emily_folder_id")
 
-        # Get subfolder names as extra info
-        subfolder_names = []
+        # Get subfolder names as extra info (cached folder map when the monitor has one)
         if emily_folder_id:
-            subs = _list_subfolders(service, emily_folder_id)
-            subfolder_names = [s["name"] for s in subs]
+            subfolder_names = list(state["drive_subfolders"].values())
+        else:
+            emily_folder_id, subfolder_names = await _run_blocking(_lookup_emily_folder, conn, user_id)
 
         meta = conn.get("metadata") or {}
         return {
@@ -871,39 +1130,51 @@ async def disconnect_drive(current_user: dict = Depends(_get_current_user)):
 
 # ── Scheduler job ─────────────────────────────────────────────────────────────
 
+def _list_drive_user_ids() -> Set[str]:
+    # Scan users with dedicated drive connection
+    result = (
+        supabase_admin.table("user_connections")
+        .select("user_id")
+        .eq("service", "google_drive")
+        .eq("is_active", True)
+        .execute()
+    )
+    user_ids = {row["user_id"] for row in (result.data or [])}
+
+    # Also scan users with google platform_connections (fallback)
+    result2 = (
+        supabase_admin.table("platform_connections")
+        .select("user_id")
+        .eq("platform", "google")
+        .eq("is_active", True)
+        .execute()
+    )
+    user_ids.update(row["user_id"] for row in (result2.data or []))
+    return user_ids
+
+
 async def scan_all_users_drive():
     """
     Background job: scan every user who has an active google connection.
-    Runs every 5 minutes via APScheduler (registered in main.py).
+    Runs every 5 minutes via APScheduler (registered in main.py); users are
+    scanned concurrently, at most DRIVE_SCAN_CONCURRENCY at a time.
     """
     try:
-        # Scan users with dedicated drive connection
-        result = (
-            supabase_admin.table("user_connections")
-            .select("user_id")
-            .eq("service", "google_drive")
-            .eq("is_active", True)
-            .execute()
-        )
-        user_ids = {row["user_id"] for row in (result.data or [])}
-
-        # Also scan users with google platform_connections (fallback)
-        result2 = (
-            supabase_admin.table("platform_connections")
-            .select("user_id")
-            .eq("platform", "google")
-            .eq("is_active", True)
-            .execute()
-        )
-        user_ids.update(row["user_id"] for row in (result2.data or []))
+        _evict_expired_services()
+        user_ids = await _run_blocking(_list_drive_user_ids)
 
         logger.info(f"Drive monitor: scanning {len(user_ids)} user(s)")
-        for uid in user_ids:
-            try:
-                res = await scan_drive_for_user(uid)
-                if res.get("queued", 0):
-                    logger.info(f"Drive monitor: queued {res['queued']} item(s) for user {uid}")
-            except Exception as user_err:
-                logger.error(f"Drive monitor error for user {uid}: {user_err}")
+        semaphore = asyncio.Semaphore(DRIVE_SCAN_CONCURRENCY)
+
+        async def scan_one(uid: str):
+            async with semaphore:
+                try:
+                    res = await scan_drive_for_user(uid)
+                    if res.get("queued", 0):
+                        logger.info(f"Drive monitor: queued {res['queued']} item(s) for user {uid}")
+                except Exception as user_err:
+                    logger.error(f"Drive monitor error for user {uid}: {user_err}")
+
+        await asyncio.gather(*(scan_one(uid) for uid in user_ids))
     except Exception as e:
         logger.error(f"Drive monitor scheduled job failed: {e}")
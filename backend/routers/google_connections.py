@@ -5,19 +5,21 @@ from google.oauth2.credentials import Credentials
 from google_auth_oauthlib.flow import Flow
 from googleapiclient.discovery import build
 from googleapiclient.errors import HttpError
-from cryptography.fernet import Fernet
 import secrets
 import string
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Callable, Optional, Tuple
 import os
 import json
 import base64
 import uuid
+import hashlib
 import logging
 from datetime import datetime, timedelta
+from email.utils import parseaddr
 from supabase import create_client, Client
 from dotenv import load_dotenv
 from pydantic import BaseModel
+from services.connection_registry import connection_registry
 
 # Load environment variables
 load_dotenv()
@@ -123,21 +125,11 @@ def generate_oauth_state():
 
 def encrypt_token(token: str) -> str:
     """Encrypt token for storage"""
-    key = os.getenv('ENCRYPTION_KEY')
-    if not key:
-        raise ValueError("ENCRYPTION_KEY not found")
-    
-    f = Fernet(key.encode())
-    return f.encrypt(token.encode()).decode()
+    return connection_registry.encrypt_token(token)
 
 def decrypt_token(encrypted_token: str) -> str:
     """Decrypt token for use"""
-    key = os.getenv('ENCRYPTION_KEY')
-    if not key:
-        raise ValueError("ENCRYPTION_KEY not found")
-    
-    f = Fernet(key.encode())
-    return f.decrypt(encrypted_token.encode()).decode()
+    return connection_registry.decrypt_token(encrypted_token)
 
 def get_google_credentials_from_token(access_token: str, refresh_token: str = None) -> Credentials:
     """Create Google credentials from stored tokens"""
@@ -182,6 +174,7 @@ def refresh_and_update_tokens(user_id: str, credentials: Credentials) -> bool:
                 update_data = {k: v for k, v in update_data.items() if v is not None}
                 
                 result = supabase_admin.table('platform_connections').update(update_data).eq('user_id', user_id).eq('platform', 'google').execute()
+                connection_registry.invalidate(user_id, 'google')
                 print(f"✅ Database updated with new tokens: {result.data}")
             except Exception as db_error:
                 print(f"❌ Database update failed: {str(db_error)}")
@@ -614,6 +607,7 @@ async def handle_google_callback(code: str = None, state: str = None, error: str
                     update_data['page_name'] = name
                 
                 result = supabase_admin.table('platform_connections').update(update_data).eq('user_id', user_id).eq('platform', 'google').execute()
+                connection_registry.invalidate(user_id, 'google')
                 print(f"✅ Updated Google connection: {result.data}")
             except Exception as e:
                 print(f"❌ Error updating connection: {str(e)}")
@@ -650,6 +644,7 @@ async def handle_google_callback(code: str = None, state: str = None, error: str
                 
                 print(f"   Connection data keys: {list(connection_data.keys())}")
                 result = supabase_admin.table('platform_connections').insert(connection_data).execute()
+                connection_registry.invalidate(user_id, 'google')
                 print(f"✅ Created Google connection: {result.data}")
             except Exception as e:
                 print(f"❌ Error creating connection: {str(e)}")
@@ -773,6 +768,7 @@ async def get_gmail_messages(limit: int = 10, current_user: User = Depends(get_c
                     'access_token_encrypted': encrypted_new_token,
                     'last_token_refresh': datetime.now().isoformat()
                 }).eq('id', conn['id']).execute()
+                connection_registry.invalidate(current_user.id, 'google')
 
         except Exception as token_error:
             print(f"⚠️ Token refresh needed for user {current_user.id}: {token_error}")
@@ -787,6 +783,7 @@ async def get_gmail_messages(limit: int = 10, current_user: User = Depends(get_c
                     'access_token_encrypted': encrypted_new_token,
                     'last_token_refresh': datetime.now().isoformat()
                 }).eq('id', conn['id']).execute()
+                connection_registry.invalidate(current_user.id, 'google')
 
                 print(f"✅ Token manually refreshed for user {current_user.id}")
 
@@ -1009,6 +1006,7 @@ async def send_gmail_message(
                     'access_token_encrypted': encrypted_new_token,
                     'last_token_refresh': datetime.now().isoformat()
                 }).eq('id', conn['id']).execute()
+                connection_registry.invalidate(current_user.id, 'google')
 
         except Exception as token_error:
             logger.warning(f"⚠️ Token refresh needed for user {current_user.id}: {token_error}")
@@ -1023,6 +1021,7 @@ async def send_gmail_message(
                     'access_token_encrypted': encrypted_new_token,
                     'last_token_refresh': datetime.now().isoformat()
                 }).eq('id', conn['id']).execute()
+                connection_registry.invalidate(current_user.id, 'google')
 
                 logger.info(f"✅ Token manually refreshed for user {current_user.id}")
 
@@ -1063,7 +1062,6 @@ async def send_gmail_message(
                 clean_body = clean_body.strip()
 
                 # Parse JSON and extract body content
-                import json
                 json_data = json.loads(clean_body)
                 extracted_body = json_data.get('body', '')
 
@@ -1227,6 +1225,7 @@ async def reconnect_google_account(current_user: User = Depends(get_current_user
                 'connection_status': 'reconnect_required',
                 'updated_at': datetime.now().isoformat()
             }).eq('platform', 'google').eq('user_id', current_user.id).execute()
+            connection_registry.invalidate(current_user.id, 'google')
             print(f"✅ Marked existing connection as inactive: {update_result.data}")
         except Exception as update_error:
             print(f"⚠️  Warning: Could not mark connection as inactive (may not exist): {str(update_error)}")
@@ -1376,13 +1375,96 @@ async def google_router_test():
         ]
     }
 
+# Upper bound on messages taken from one incremental history read
+GMAIL_HISTORY_MAX_MESSAGES = 500
+
+# Gmail batch endpoint accepts up to 100 calls per HTTP request
+GMAIL_BATCH_SIZE = 100
+
+# Gmail per-user quota units charged for each call
+GMAIL_PROFILE_UNITS = 1
+GMAIL_HISTORY_LIST_UNITS = 2
+GMAIL_MESSAGES_LIST_UNITS = 5
+GMAIL_MESSAGE_GET_UNITS = 5
+
+# Called with a quota cost before each Gmail request; blocks until the units are available
+QuotaAcquirer = Callable[[float], Any]
+
+# Rows per lead_conversations insert
+LEAD_CONVERSATION_INSERT_BATCH = 100
+
+# Messages whose fetch failed are retried on later syncs, up to this many times and ids
+GMAIL_RETRY_MAX_ATTEMPTS = 5
+GMAIL_RETRY_MAX_IDS = 500
+
+
+class GmailHistoryExpired(Exception):
+    """The stored startHistoryId is too old for users.history.list (HTTP 404)"""
+
+
+def list_added_inbox_messages(service, start_history_id: str, max_messages: int = GMAIL_HISTORY_MAX_MESSAGES,
+                              acquire_quota: Optional[QuotaAcquirer] = None) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+    """List inbound messages added to the mailbox since start_history_id.
+
+    Returns (message stubs, resume_history_id). Stubs ({'id', 'threadId'}) have the
+    same shape as messages().list. When max_messages is reached before the end of
+    the history, resume_history_id is the id of the last history record taken, so
+    the next sync continues from there; it is None when the history was read to the end.
+    Raises GmailHistoryExpired when Gmail no longer has history for that id.
+    """
+    messages = []
+    seen_ids = set()
+    page_token = None
+
+    while True:
+        if acquire_quota:
+            acquire_quota(GMAIL_HISTORY_LIST_UNITS)
+        try:
+            response = service.users().history().list(
+                userId='me',
+                startHistoryId=start_history_id,
+                historyTypes=['messageAdded'],
+                labelId='INBOX',
+                pageToken=page_token
+            ).execute()
+        except HttpError as e:
+            if getattr(e, 'resp', None) is not None and e.resp.status == 404:
+                raise GmailHistoryExpired(str(e))
+            raise
+
+        records = response.get('history', [])
+        page_token = response.get('nextPageToken')
+        for index, record in enumerate(records):
+            for added in record.get('messagesAdded', []):
+                message = added.get('message', {})
+                message_id = message.get('id')
+                labels = message.get('labelIds', [])
+                # Skip our own outgoing mail and drafts
+                if not message_id or message_id in seen_ids or 'SENT' in labels or 'DRAFT' in labels:
+                    continue
+                seen_ids.add(message_id)
+                messages.append({'id': message_id, 'threadId': message.get('threadId')})
+
+            # Stop on a record boundary so the remaining history is picked up by the next sync
+            if len(messages) >= max_messages and (page_token or index < len(records) - 1):
+                return messages, record.get('id')
+
+        if not page_token:
+            return messages, None
+
+
 async def sync_gmail_inbox_for_user(
     user_id: str,
     user_email: str,
     days_back: int = 2,
-    max_emails: int = 50
+    max_emails: int = 50,
+    acquire_quota: Optional[QuotaAcquirer] = None
 ) -> Dict[str, Any]:
-    """Sync Gmail inbox for a specific user (used by both API and background job)"""
+    """Sync Gmail inbox for a specific user (used by both API and background job)
+
+    acquire_quota, if given, is called with the quota cost of every Gmail request
+    before it is made (the background job uses it for per-user rate limiting).
+    """
     try:
         logger.info(f"🔄 Starting Gmail inbox sync for user: {user_id}")
 
@@ -1419,12 +1501,18 @@ async def sync_gmail_inbox_for_user(
         # Create credentials
         credentials = get_google_credentials_from_token(access_token, refresh_token)
 
+        # Mailbox historyId at the start of this sync (saved as the next incremental starting point)
+        profile_history_id = None
+
         # Check if access token needs refresh and handle it
         try:
             # Test if token works by making a small API call
             test_service = build('gmail', 'v1', credentials=credentials)
             # This will trigger token refresh if needed
+            if acquire_quota:
+                acquire_quota(GMAIL_PROFILE_UNITS)
             test_call = test_service.users().getProfile(userId='me').execute()
+            profile_history_id = test_call.get('historyId')
 
             # If token was refreshed, save the new access token
             if hasattr(credentials, 'token') and credentials.token != access_token:
@@ -1435,6 +1523,7 @@ async def sync_gmail_inbox_for_user(
                     'access_token_encrypted': encrypted_new_token,
                     'last_token_refresh': datetime.now().isoformat()
                 }).eq('id', conn['id']).execute()
+                connection_registry.invalidate(user_id, 'google')
 
         except Exception as token_error:
             error_str = str(token_error).lower()
@@ -1463,6 +1552,7 @@ async def sync_gmail_inbox_for_user(
                             'access_token_encrypted': encrypted_new_token,
                             'last_token_refresh': datetime.now().isoformat()
                         }).eq('id', conn['id']).execute()
+                        connection_registry.invalidate(user_id, 'google')
 
                         logger.info(f"✅ Token manually refreshed for user {user_id}")
 
@@ -1481,6 +1571,7 @@ async def sync_gmail_inbox_for_user(
                                     'deactivated_at': datetime.now().isoformat()
                                 }
                             }).eq('id', conn['id']).execute()
+                            connection_registry.invalidate(user_id, 'google')
 
                         return {
                             "success": False,
@@ -1499,6 +1590,7 @@ async def sync_gmail_inbox_for_user(
                             'deactivated_at': datetime.now().isoformat()
                         }
                     }).eq('id', conn['id']).execute()
+                    connection_registry.invalidate(user_id, 'google')
 
                     return {
                         "success": False,
@@ -1515,117 +1607,188 @@ async def sync_gmail_inbox_for_user(
 
         # User email is passed as parameter (from JWT token)
 
-        # Calculate date filter (emails from the last N days)
-        days_ago = datetime.now() - timedelta(days=days_back)
-        date_filter = days_ago.strftime('%Y/%m/%d')
+        # One query per run: normalized email (primary + additional) -> lead
+        lead_index = build_lead_email_index(user_id)
+        logger.info(f"📧 User has {len(lead_index)} lead email addresses indexed")
+        lead_fingerprint = hashlib.sha256("\n".join(sorted(lead_index)).encode()).hexdigest()[:16]
+
+        # Messages whose fetch failed on an earlier sync: message id -> attempts so far
+        retry_attempts = dict(metadata.get('gmail_retry_message_ids') or {})
+
+        # Incremental sync: only ask Gmail for messages added since the last stored historyId
+        messages = None
+        sync_mode = "incremental"
+        last_history_id = metadata.get('gmail_history_id')
+        if last_history_id and metadata.get('gmail_lead_fingerprint') != lead_fingerprint:
+            # History already moved past mail from leads (or lead emails) added since the last
+            # sync, so rescan the window once to pick it up
+            logger.info(f"📧 Lead emails changed since the last Gmail sync for user {user_id}, rescanning the window")
+            last_history_id = None
+        if last_history_id:
+            try:
+                messages, resume_history_id = list_added_inbox_messages(
+                    service, last_history_id, max_messages=GMAIL_HISTORY_MAX_MESSAGES, acquire_quota=acquire_quota
+                )
+                logger.info(f"📧 Gmail history since {last_history_id} has {len(messages)} new inbound messages for user {user_id}")
+                if resume_history_id:
+                    # More history than one sync takes: resume after the last message handled here
+                    logger.info(f"📧 Gmail history capped at {GMAIL_HISTORY_MAX_MESSAGES} messages for user {user_id}, resuming from {resume_history_id} next sync")
+                    profile_history_id = resume_history_id
+            except GmailHistoryExpired:
+                logger.info(f"📧 Gmail history {last_history_id} expired for user {user_id}, falling back to full window scan")
+            except Exception as history_error:
+                error_str = str(history_error).lower()
+                if '401' in error_str or 'unauthorized' in error_str:
+                    logger.error(f"🚫 401 error during Gmail history call for user {user_id}: {history_error}")
+                    supabase_admin.table('platform_connections').update({
+                        'is_active': False,
+                        'metadata': {
+                            **metadata,
+                            'deactivation_reason': '401 during API call',
+                            'deactivated_at': datetime.now().isoformat()
+                        }
+                    }).eq('id', conn['id']).execute()
+                    connection_registry.invalidate(user_id, 'google')
+                    return {
+                        "success": False,
+                        "error": f"Gmail API authentication failed: {str(history_error)}",
+                        "emails_processed": 0,
+                        "emails_stored": 0
+                    }
+                logger.warning(f"⚠️ Gmail history call failed for user {user_id}, falling back to full window scan: {history_error}")
+
+        if messages is None:
+            sync_mode = "full"
+            # Calculate date filter (emails from the last N days)
+            days_ago = datetime.now() - timedelta(days=days_back)
+            date_filter = days_ago.strftime('%Y/%m/%d')
+
+            # Query for inbound emails (exclude sent emails)
+            query = f"after:{date_filter}"
+            if user_email:
+                query += f" -from:{user_email}"
+            logger.info(f"📧 Gmail query for user {user_id}: {query}")
+            logger.info(f"📧 Searching for emails from last {days_back} days, excluding emails from {user_email}")
+
+            # Get messages
+            try:
+                if acquire_quota:
+                    acquire_quota(GMAIL_MESSAGES_LIST_UNITS)
+                results = service.users().messages().list(
+                    userId='me',
+                    q=query,
+                    maxResults=max_emails
+                ).execute()
+            except Exception as api_error:
+                error_str = str(api_error).lower()
+                if '401' in error_str or 'unauthorized' in error_str:
+                    logger.error(f"🚫 401 error during Gmail API call for user {user_id}: {api_error}")
+                    # Mark connection as inactive due to auth issues
+                    supabase_admin.table('platform_connections').update({
+                        'is_active': False,
+                        'metadata': {
+                            **metadata,
+                            'deactivation_reason': '401 during API call',
+                            'deactivated_at': datetime.now().isoformat()
+                        }
+                    }).eq('id', conn['id']).execute()
+                    connection_registry.invalidate(user_id, 'google')
+                    return {
+                        "success": False,
+                        "error": f"Gmail API authentication failed: {str(api_error)}",
+                        "emails_processed": 0,
+                        "emails_stored": 0
+                    }
+                else:
+                    raise api_error
 
-        # Query for inbound emails (exclude sent emails)
-        query = f"after:{date_filter}"
-        if user_email:
-            query += f" -from:{user_email}"
-        logger.info(f"📧 Gmail query for user {user_id}: {query}")
-        logger.info(f"📧 Searching for emails from last {days_back} days, excluding emails from {user_email}")
+            messages = results.get('messages', [])
+            logger.info(f"📧 Found {len(messages)} inbound emails to process for user {user_id}")
 
-        # Get messages
-        try:
-            results = service.users().messages().list(
-                userId='me',
-                q=query,
-                maxResults=max_emails
-            ).execute()
-        except Exception as api_error:
-            error_str = str(api_error).lower()
+        processed_count = 0
+        stored_count = 0
+
+        message_ids = [message['id'] for message in messages]
+        listed_ids = set(message_ids)
+        message_ids += [message_id for message_id in retry_attempts if message_id not in listed_ids]
+        if lead_index and message_ids:
+            # Skip messages already stored for this user's leads (single set query)
+            lead_ids = {lead['id'] for lead in lead_index.values()}
+            already_stored = get_stored_gmail_message_ids(message_ids, lead_ids)
+            pending_ids = [message_id for message_id in message_ids if message_id not in already_stored]
+            if already_stored:
+                logger.info(f"📧 {len(already_stored)} emails already stored for user {user_id}, fetching {len(pending_ids)}")
+        else:
+            # Without leads there is nothing to attach emails to, so don't fetch them at all
+            pending_ids = []
+
+        # Fetch full messages through Gmail's batch endpoint (up to 100 gets per HTTP request)
+        fetched_messages, fetch_errors = fetch_gmail_messages_batch(service, pending_ids, acquire_quota=acquire_quota)
+        for message_id, msg_api_error in fetch_errors.items():
+            error_str = str(msg_api_error).lower()
             if '401' in error_str or 'unauthorized' in error_str:
-                logger.error(f"🚫 401 error during Gmail API call for user {user_id}: {api_error}")
-                # Mark connection as inactive due to auth issues
+                logger.error(f"🚫 401 error getting message {message_id} for user {user_id}: {msg_api_error}")
+                # Stop processing this user due to auth issues
                 supabase_admin.table('platform_connections').update({
                     'is_active': False,
                     'metadata': {
                         **metadata,
-                        'deactivation_reason': '401 during API call',
+                        'deactivation_reason': '401 during message retrieval',
                         'deactivated_at': datetime.now().isoformat()
                     }
                 }).eq('id', conn['id']).execute()
+                connection_registry.invalidate(user_id, 'google')
                 return {
                     "success": False,
-                    "error": f"Gmail API authentication failed: {str(api_error)}",
-                    "emails_processed": 0,
-                    "emails_stored": 0
+                    "error": f"Gmail API authentication failed during message retrieval: {str(msg_api_error)}",
+                    "emails_processed": processed_count,
+                    "emails_stored": stored_count
                 }
-            else:
-                raise api_error
-
-        messages = results.get('messages', [])
-        logger.info(f"📧 Found {len(messages)} inbound emails to process for user {user_id}")
-
-        # Get user's leads for email matching
-        leads_result = supabase_admin.table('leads').select('id, email, name').eq('user_id', user_id).execute()
-        user_leads = leads_result.data or []
-        lead_emails = [lead['email'] for lead in user_leads if lead.get('email')]
-        logger.info(f"📧 User has {len(user_leads)} leads with {len(lead_emails)} email addresses: {lead_emails[:5]}{'...' if len(lead_emails) > 5 else ''}")
+            logger.warning(f"⚠️ Error getting message {message_id} for user {user_id}: {msg_api_error}")
+
+        # Keep failed messages for the next sync, since history moves past them; deleted
+        # messages (404) and ones that keep failing are given up on
+        next_retry_attempts = {}
+        for message_id, msg_api_error in fetch_errors.items():
+            error_str = str(msg_api_error).lower()
+            attempts = retry_attempts.get(message_id, 0) + 1
+            if '404' in error_str or 'not found' in error_str:
+                continue
+            if attempts >= GMAIL_RETRY_MAX_ATTEMPTS:
+                logger.error(f"❌ Giving up on Gmail message {message_id} for user {user_id} after {attempts} attempts: {msg_api_error}")
+                continue
+            next_retry_attempts[message_id] = attempts
+        if len(next_retry_attempts) > GMAIL_RETRY_MAX_IDS:
+            logger.error(f"❌ {len(next_retry_attempts)} Gmail messages failed for user {user_id}, retrying only the first {GMAIL_RETRY_MAX_IDS}")
+            next_retry_attempts = dict(list(next_retry_attempts.items())[:GMAIL_RETRY_MAX_IDS])
 
-        processed_count = 0
-        stored_count = 0
+        conversations_to_insert = []
 
-        # Process each message
-        for message in messages:
+        # Process each fetched message
+        for message_id in pending_ids:
+            msg = fetched_messages.get(message_id)
+            if msg is None:
+                continue
             try:
-                # Get full message details
-                try:
-                    msg = service.users().messages().get(
-                        userId='me',
-                        id=message['id'],
-                        format='full'
-                    ).execute()
-                except Exception as msg_api_error:
-                    error_str = str(msg_api_error).lower()
-                    if '401' in error_str or 'unauthorized' in error_str:
-                        logger.error(f"🚫 401 error getting message {message['id']} for user {user_id}: {msg_api_error}")
-                        # Stop processing this user due to auth issues
-                        supabase_admin.table('platform_connections').update({
-                            'is_active': False,
-                            'metadata': {
-                                **metadata,
-                                'deactivation_reason': '401 during message retrieval',
-                                'deactivated_at': datetime.now().isoformat()
-                            }
-                        }).eq('id', conn['id']).execute()
-                        return {
-                            "success": False,
-                            "error": f"Gmail API authentication failed during message retrieval: {str(msg_api_error)}",
-                            "emails_processed": processed_count,
-                            "emails_stored": stored_count
-                        }
-                    else:
-                        logger.warning(f"⚠️ Error getting message {message['id']} for user {user_id}: {msg_api_error}")
-                        continue
-
                 # Extract email data
                 email_data = extract_email_data(msg)
                 if not email_data:
                     continue
 
                 # Check if this email is from a lead
-                lead = find_lead_by_email(email_data['from'], user_id)
+                lead = lead_index.get(normalize_email(email_data['from']))
                 if not lead:
                     logger.info(f"📧 Email from '{email_data['from']}' not associated with any lead for user {user_id}, skipping. Subject: '{email_data.get('subject', 'No subject')}'")
                     continue
 
-                # Check if this email is already stored (avoid duplicates)
-                # Check both by message_id and by lead_id + message_id combination
-                existing_conversation = supabase_admin.table('lead_conversations').select('id').eq('lead_id', lead['id']).eq('message_id', message['id']).execute()
-                if existing_conversation.data:
-                    logger.debug(f"📧 Email {message['id']} already stored for lead {lead['id']}, skipping")
-                    continue
-
                 # Store email in lead conversations
-                conversation_data = {
+                conversations_to_insert.append({
                     'lead_id': lead['id'],
                     'message_type': 'email',
                     'content': email_data['body'],
                     'sender': email_data['from'],
                     'direction': 'inbound',
-                    'message_id': message['id'],
+                    'message_id': message_id,
                     'status': 'received',
                     'metadata': {
                         'subject': email_data['subject'],
@@ -1636,34 +1799,46 @@ async def sync_gmail_inbox_for_user(
                         'cc': email_data.get('cc', []),
                         'bcc': email_data.get('bcc', [])
                     }
-                }
-
-                supabase_admin.table('lead_conversations').insert(conversation_data).execute()
-                stored_count += 1
-                logger.info(f"📧 Stored email from {email_data['from']} for lead {lead['id']} (user {user_id})")
+                })
+                logger.info(f"📧 Matched email from {email_data['from']} to lead {lead['id']} (user {user_id})")
 
             except Exception as msg_error:
-                logger.error(f"❌ Error processing message {message['id']} for user {user_id}: {msg_error}")
+                logger.error(f"❌ Error processing message {message_id} for user {user_id}: {msg_error}")
                 continue
 
             processed_count += 1
 
-        # Update last sync timestamp
+        # Store all matched emails in batched inserts
+        for start in range(0, len(conversations_to_insert), LEAD_CONVERSATION_INSERT_BATCH):
+            batch = conversations_to_insert[start:start + LEAD_CONVERSATION_INSERT_BATCH]
+            supabase_admin.table('lead_conversations').insert(batch).execute()
+            stored_count += len(batch)
+
+        # Update last sync timestamp and the historyId the next incremental sync starts from
+        updated_metadata = {
+            **metadata,
+            'gmail_last_sync': datetime.now().isoformat(),
+            'gmail_sync_status': 'completed',
+            'gmail_sync_mode': sync_mode,
+            'gmail_lead_fingerprint': lead_fingerprint,
+            'gmail_retry_message_ids': next_retry_attempts
+        }
+        if profile_history_id:
+            updated_metadata['gmail_history_id'] = str(profile_history_id)
         supabase_admin.table("platform_connections").update({
-            'metadata': {
-                **metadata,
-                'gmail_last_sync': datetime.now().isoformat(),
-                'gmail_sync_status': 'completed'
-            }
+            'metadata': updated_metadata
         }).eq('id', conn['id']).execute()
+        connection_registry.invalidate(user_id, 'google')
 
-        logger.info(f"✅ Gmail inbox sync completed for user {user_id}: {processed_count} processed, {stored_count} stored")
+        logger.info(f"✅ Gmail inbox sync ({sync_mode}) completed for user {user_id}: {processed_count} processed, {stored_count} stored")
 
         return {
             "success": True,
             "emails_processed": processed_count,
             "emails_stored": stored_count,
-            "total_emails_found": len(messages)
+            "total_emails_found": len(messages),
+            "sync_mode": sync_mode,
+            "metadata": updated_metadata
         }
 
     except Exception as e:
@@ -1696,7 +1871,8 @@ async def sync_gmail_inbox(
         "stats": {
             "emails_processed": result["emails_processed"],
             "emails_stored": result["emails_stored"],
-            "total_emails_found": result["total_emails_found"]
+            "total_emails_found": result["total_emails_found"],
+            "sync_mode": result.get("sync_mode")
         }
     }
 
@@ -1823,32 +1999,71 @@ def get_email_body(payload):
         logger.error(f"❌ Error extracting email body: {e}")
         return "Error extracting content"
 
-def find_lead_by_email(email, user_id):
-    """Find a lead by email address"""
-    try:
-        # Search for lead with matching email
-        lead = supabase_admin.table('leads').select('*').eq('user_id', user_id).eq('email', email).execute()
-
-        if lead.data:
-            return lead.data[0]
+def normalize_email(email) -> str:
+    """Normalize an email address for lookups ('Name <a@b.com>' -> 'a@b.com')"""
+    return parseaddr(email or '')[1].strip().lower()
 
-        # Also check if email is in lead metadata or additional emails
+def build_lead_email_index(user_id) -> Dict[str, Dict[str, Any]]:
+    """Load the user's leads once and index them by normalized email (primary and additional)"""
+    index = {}
+    try:
         leads = supabase_admin.table('leads').select('*').eq('user_id', user_id).execute()
 
         for lead in leads.data or []:
-            # Check metadata for additional emails
-            if lead.get('metadata'):
-                metadata = lead['metadata']
-                if isinstance(metadata, dict):
-                    additional_emails = metadata.get('additional_emails', [])
-                    if email in additional_emails:
-                        return lead
-
-        return None
+            metadata = lead.get('metadata')
+            if isinstance(metadata, dict):
+                for additional_email in metadata.get('additional_emails', []) or []:
+                    if normalize_email(additional_email):
+                        index.setdefault(normalize_email(additional_email), lead)
+            # Primary emails take precedence over additional emails
+            if normalize_email(lead.get('email')):
+                index[normalize_email(lead['email'])] = lead
 
     except Exception as e:
-        logger.error(f"❌ Error finding lead by email {email}: {e}")
-        return None
+        logger.error(f"❌ Error building lead email index for user {user_id}: {e}")
+
+    return index
+
+def get_stored_gmail_message_ids(message_ids, lead_ids, chunk_size: int = 200) -> set:
+    """Return the Gmail message ids already stored as conversations for the given leads"""
+    stored = set()
+    for start in range(0, len(message_ids), chunk_size):
+        chunk = message_ids[start:start + chunk_size]
+        result = supabase_admin.table('lead_conversations').select('message_id, lead_id').in_('message_id', chunk).execute()
+        for row in result.data or []:
+            if row.get('lead_id') in lead_ids:
+                stored.add(row['message_id'])
+    return stored
+
+def fetch_gmail_messages_batch(service, message_ids, batch_size: int = GMAIL_BATCH_SIZE, message_format: str = 'full',
+                               acquire_quota: Optional[QuotaAcquirer] = None):
+    """Fetch messages via Gmail's batch HTTP endpoint.
+
+    Returns (messages_by_id, errors_by_id). Quota is acquired per batch request
+    (every get inside a batch is charged individually).
+    """
+    fetched = {}
+    errors = {}
+
+    def _collect(request_id, response, exception):
+        if exception is not None:
+            errors[request_id] = exception
+        else:
+            fetched[request_id] = response
+
+    for start in range(0, len(message_ids), batch_size):
+        chunk = message_ids[start:start + batch_size]
+        if acquire_quota:
+            acquire_quota(len(chunk) * GMAIL_MESSAGE_GET_UNITS)
+        batch = service.new_batch_http_request(callback=_collect)
+        for message_id in chunk:
+            batch.add(
+                service.users().messages().get(userId='me', id=message_id, format=message_format),
+                request_id=message_id
+            )
+        batch.execute()
+
+    return fetched, errors
 
 @router.get("/gmail/sync-status")
 async def get_gmail_sync_status(current_user: User = Depends(get_current_user)):
@@ -1944,6 +2159,7 @@ async def enable_gmail_sync(current_user: User = Depends(get_current_user)):
             supabase_admin.table('platform_connections').update({
                 'metadata': updated_metadata
             }).eq('id', conn['id']).execute()
+            connection_registry.invalidate(current_user.id, 'google')
         except Exception as e:
             if "does not exist" in str(e):
                 logger.warning(f"📧 metadata column doesn't exist yet, skipping enable sync for user {current_user.id}")
@@ -1957,6 +2173,7 @@ async def enable_gmail_sync(current_user: User = Depends(get_current_user)):
         supabase_admin.table('platform_connections').update({
             'metadata': updated_metadata
         }).eq('id', conn['id']).execute()
+        connection_registry.invalidate(current_user.id, 'google')
 
         logger.info(f"✅ Enabled Gmail sync for user {current_user.id}")
 
@@ -2001,6 +2218,7 @@ async def disable_gmail_sync(current_user: User = Depends(get_current_user)):
             supabase_admin.table('platform_connections').update({
                 'metadata': updated_metadata
             }).eq('id', conn['id']).execute()
+            connection_registry.invalidate(current_user.id, 'google')
         except Exception as e:
             if "does not exist" in str(e):
                 logger.warning(f"📧 metadata column doesn't exist yet, skipping disable sync for user {current_user.id}")
@@ -2069,6 +2287,7 @@ async def disconnect_google(current_user: User = Depends(get_current_user)):
             'disconnected_at': datetime.now().isoformat(),
             'updated_at': datetime.now().isoformat()
         }).eq('platform', 'google').eq('user_id', current_user.id).execute()
+        connection_registry.invalidate(current_user.id, 'google')
         
         return {
             "success": True,
@@ -2116,7 +2116,7 @@ async def send_whatsapp_authkey_to_lead(
 
         # Decide text vs template flow
         if request.template_id:
-            result = service.send_template(
+            result = await service.send_template(
                 phone_number=phone_number,
                 template_id=request.template_id,
                 body_values=request.body_values,
@@ -2126,7 +2126,7 @@ async def send_whatsapp_authkey_to_lead(
             )
             content_logged = f"TEMPLATE {request.template_id} | vars={request.body_values or {}}"
         else:
-            result = service.send_text(phone_number=phone_number, message=request.message)
+            result = await service.send_text(phone_number=phone_number, message=request.message)
             content_logged = request.message
 
         # Record conversation
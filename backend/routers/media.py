@@ -11,7 +11,10 @@ from pydantic import BaseModel, Field
 from supabase import create_client, Client
 
 from routers.connections import get_current_user, User
-from services.color_extraction_service import ColorExtractionService
+from services.color_extraction_service import color_extraction_service
+from services.streaming_upload import streaming_uploader, UploadValidationError
+from services.image_derivatives import image_derivatives
+from services.asset_registry import asset_registry
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -41,6 +44,12 @@ gemini_api_key = os.getenv("GEMINI_API_KEY")
 if not gemini_api_key:
     logger.warning("Gemini API key not found in environment variables")
 
+# Upload size limits per media kind
+UPLOAD_MAX_SIZES = {
+    "image": 10 * 1024 * 1024,  # 10MB
+    "video": 50 * 1024 * 1024,  # 50MB
+}
+
 class ImageGenerationRequest(BaseModel):
     post_id: str = Field(..., description="ID of the post to generate image for")
     style: Optional[str] = Field(None, description="Image style preference")
@@ -305,10 +314,10 @@ async def delete_uploaded_media(
             file_path = image_url.split("user-uploads/")[1]
             logger.info(f"Extracted file path: {file_path}")
             
-            # Delete from Supabase storage
+            # Delete from Supabase storage unless other content shares the upload
             try:
-                storage_response = supabase_admin.storage.from_("user-uploads").remove([file_path])
-                logger.info(f"Storage delete response: {storage_response}")
+                removed = asset_registry.discard("user-uploads", file_path, image_url)
+                logger.info(f"Storage delete for {file_path}: {'removed' if removed else 'kept'}")
             except Exception as storage_error:
                 logger.warning(f"Storage delete failed (file may not exist): {storage_error}")
         
@@ -427,10 +436,12 @@ async def upload_logo(
         if file.content_type not in allowed_types:
             raise HTTPException(status_code=400, detail="Invalid file type. Please upload a JPEG, PNG, GIF, or WebP image.")
         
-        # Validate file size (max 5MB)
+        # Validate file size (max 5MB) and content before reading the file into memory
+        try:
+            await streaming_uploader.inspect(file.file, file.content_type, {"image": 5 * 1024 * 1024})
+        except UploadValidationError as e:
+            raise HTTPException(status_code=400, detail=str(e))
         file_content = await file.read()
-        if len(file_content) > 5 * 1024 * 1024:  # 5MB
-            raise HTTPException(status_code=400, detail="File size too large. Please upload an image smaller than 5MB.")
         
         logger.info(f"File content read - size: {len(file_content)} bytes")
         
@@ -441,20 +452,20 @@ async def upload_logo(
         file_path = f"logos/{filename}"
         logger.info(f"Generated file path: {file_path}")
         
-        # Upload to Logo bucket using admin client
-        storage_response = supabase_admin.storage.from_("Logo").upload(
-            file_path,
-            file_content,
-            file_options={"content-type": file.content_type}
+        # Upload to Logo bucket (re-uploading the same logo reuses the stored copy)
+        public_url = await asset_registry.upload_bytes(
+            current_user.id, "Logo", file_path, file_content, file.content_type
         )
-        
-        if hasattr(storage_response, 'error') and storage_response.error:
-            raise HTTPException(status_code=400, detail=f"Storage upload failed: {storage_response.error}")
-        
-        # Get public URL
-        public_url = supabase_admin.storage.from_("Logo").get_public_url(file_path)
         logger.info(f"Logo uploaded successfully: {public_url}")
         
+        # Extract the palette now so /extract-colors-from-logo for this URL is a cache hit
+        try:
+            await color_extraction_service.extract_colors_from_bytes_async(
+                file_content, 4, public_url
+            )
+        except Exception as e:
+            logger.warning(f"Could not pre-extract logo colors: {e}")
+        
         return {
             "success": True,
             "url": public_url,
@@ -477,11 +488,10 @@ async def extract_colors_from_logo(
     try:
         logger.info(f"Color extraction request received - logo_url: {logo_url}, user: {current_user.id}")
         
-        # Initialize color extraction service
-        color_service = ColorExtractionService()
-        
-        # Extract colors from logo URL
-        colors = color_service.extract_colors_from_url(logo_url, num_colors=4)
+        # Extract colors from logo URL (cached by content; analysed in a worker process)
+        colors = await color_extraction_service.extract_colors_from_url_async(
+            logo_url, 4
+        )
         
         logger.info(f"Extracted {len(colors)} colors: {colors}")
         
@@ -517,21 +527,13 @@ async def upload_files(
                     detail="Invalid file type. Please upload an image (JPEG, PNG, GIF, WebP) or video (MP4, MOV, AVI, WebM)."
                 )
 
-            # Read file content
-            file_content = await file.read()
-            file_size = len(file_content)
-            logger.info(f"File content read - {file.filename}: {file_size} bytes")
-
-            # Validate file size (max 50MB for videos, 10MB for images)
+            # Validate size and magic bytes from the spooled upload without reading it into memory
+            try:
+                file_size, _ = await streaming_uploader.inspect(file.file, file.content_type, UPLOAD_MAX_SIZES)
+            except UploadValidationError as e:
+                raise HTTPException(status_code=400, detail=str(e))
+            logger.info(f"File validated - {file.filename}: {file_size} bytes")
             is_video = file.content_type in allowed_video_types
-            max_size = 50 * 1024 * 1024 if is_video else 10 * 1024 * 1024  # 50MB for videos, 10MB for images
-
-            if file_size > max_size:
-                size_limit_mb = 50 if is_video else 10
-                raise HTTPException(
-                    status_code=400,
-                    detail=f"File size too large. Maximum size is {size_limit_mb}MB for {'videos' if is_video else 'images'}."
-                )
 
             # Generate filename
             import uuid
@@ -544,19 +546,14 @@ async def upload_files(
             bucket_name = "user-uploads"
             logger.info(f"Using bucket: {bucket_name} for upload")
 
-            # Upload using admin client (bypasses RLS)
-            storage_response = supabase_admin.storage.from_(bucket_name).upload(
-                file_path,
-                file_content,
-                file_options={"content-type": file.content_type}
+            # Stream to storage (resumable for large files, service role bypasses RLS);
+            # a file this user already uploaded resolves to the stored copy
+            public_url = await asset_registry.upload(
+                current_user.id, bucket_name, file_path, file.file, file.content_type, file_size
             )
-
-            if hasattr(storage_response, 'error') and storage_response.error:
-                raise HTTPException(status_code=400, detail=f"Storage upload failed: {storage_response.error}")
-
-            # Get public URL
-            public_url = supabase_admin.storage.from_(bucket_name).get_public_url(file_path)
             logger.info(f"File uploaded successfully: {public_url}")
+            if not is_video:
+                _schedule_derivatives(public_url, file_size)
 
             urls.append(public_url)
 
@@ -568,6 +565,13 @@ async def upload_files(
         logger.error(f"Error uploading files: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Error uploading files: {str(e)}")
 
+def _schedule_derivatives(public_url: str, file_size: int) -> None:
+    """Queue thumbnail/WebP variants for an uploaded image; the worker reads it back from storage"""
+    try:
+        image_derivatives.schedule(public_url, file_size)
+    except Exception as e:
+        logger.warning(f"Could not queue derivatives for {public_url}: {e}")
+
 @router.post("/upload-media")
 async def upload_media(
     file: UploadFile = File(...),
@@ -588,21 +592,13 @@ async def upload_media(
                 detail="Invalid file type. Please upload an image (JPEG, PNG, GIF, WebP) or video (MP4, MOV, AVI, WebM)."
             )
 
-        # Read file content
-        file_content = await file.read()
-        file_size = len(file_content)
-        logger.info(f"File content read - size: {file_size} bytes")
-
-        # Validate file size (max 50MB for videos, 10MB for images)
+        # Validate size and magic bytes from the spooled upload without reading it into memory
+        try:
+            file_size, _ = await streaming_uploader.inspect(file.file, file.content_type, UPLOAD_MAX_SIZES)
+        except UploadValidationError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        logger.info(f"File validated - size: {file_size} bytes")
         is_video = file.content_type in allowed_video_types
-        max_size = 50 * 1024 * 1024 if is_video else 10 * 1024 * 1024  # 50MB for videos, 10MB for images
-        size_limit_mb = 50 if is_video else 10
-
-        if file_size > max_size:
-            raise HTTPException(
-                status_code=400,
-                detail=f"File size too large. Maximum size is {size_limit_mb}MB for {'videos' if is_video else 'images'}."
-            )
 
         # Generate filename
         import uuid
@@ -615,19 +611,14 @@ async def upload_media(
         bucket_name = "user-uploads"
         logger.info(f"Using bucket: {bucket_name} for media upload")
 
-        # Upload using admin client (bypasses RLS)
-        storage_response = supabase_admin.storage.from_(bucket_name).upload(
-            file_path,
-            file_content,
-            file_options={"content-type": file.content_type}
+        # Stream to storage (resumable for large files, service role bypasses RLS);
+        # a file this user already uploaded resolves to the stored copy
+        public_url = await asset_registry.upload(
+            current_user.id, bucket_name, file_path, file.file, file.content_type, file_size
         )
-
-        if hasattr(storage_response, 'error') and storage_response.error:
-            raise HTTPException(status_code=400, detail=f"Storage upload failed: {storage_response.error}")
-
-        # Get public URL
-        public_url = supabase_admin.storage.from_(bucket_name).get_public_url(file_path)
         logger.info(f"Media uploaded successfully: {public_url}")
+        if not is_video:
+            _schedule_derivatives(public_url, file_size)
 
         return {
             "success": True,
@@ -653,9 +644,8 @@ async def upload_image(
     try:
         logger.info(f"Upload request received - post_id: {post_id}, filename: {file.filename}")
         
-        # Read file content
-        file_content = await file.read()
-        logger.info(f"File content read - size: {len(file_content)} bytes")
+        # Spooled to a temp file by the framework; streamed to storage below instead of read into memory
+        logger.info(f"File received - size: {file.size} bytes")
         
         # Generate filename
         import uuid
@@ -702,318 +692,8 @@ async def upload_image(
         bucket_name = "user-uploads"
         logger.info(f"Using bucket: {bucket_name} for uploads")
         
-        # Upload using admin client (bypasses RLS)
-        storage_response = supabase_admin.storage.from_(bucket_name).upload(
-            file_path,
-            file_content,
-            file_options={"content-type": content_type}
-        )
-        
-        if hasattr(storage_response, 'error') and storage_response.error:
-            raise HTTPException(status_code=400, detail=f"Storage upload failed: {storage_response.error}")
-        
-        # Get public URL
-        public_url = supabase_admin.storage.from_(bucket_name).get_public_url(file_path)
-        
-        # Update database using admin client
-        is_video = content_type.startswith('video/')
-        image_prompt = "User uploaded video" if is_video else "User uploaded image"
-        media_data = {
-            "post_id": post_id,
-            "image_url": public_url,  # Keep using image_url field for compatibility
-            "image_prompt": image_prompt,
-            "image_style": "user_upload",
-            "image_size": "custom",
-            "image_quality": "custom",
-            "generation_model": "user_upload",
-            "generation_cost": 0,
-            "generation_time": 0,
-            "is_approved": True
-        }
-        
-        # Check if image already exists
-        existing_images = supabase_admin.table("content_images").select("id").eq("post_id", post_id).order("created_at", desc=True).limit(1).execute()
-        
-        if existing_images.data and len(existing_images.data) > 0:
-            # Update existing image
-            supabase_admin.table("content_images").update({
-                "image_url": public_url,
-                "is_approved": True
-            }).eq("id", existing_images.data[0]["id"]).execute()
-        else:
-            # Create new image record
-            supabase_admin.table("content_images").insert(media_data).execute()
-        
-        # Update content_posts with primary image (user uploads are auto-approved)
-        supabase_admin.table("content_posts").update({
-            "primary_image_url": public_url,
-            "primary_image_prompt": image_prompt,
-            "primary_image_approved": True
-        }).eq("id", post_id).execute()
-        logger.info(f"Updated content_posts.primary_image_url for post {post_id} (uploaded image)")
-        
-        return {
-            "success": True,
-            "image_url": public_url,
-            "message": "Video uploaded successfully" if is_video else "Image uploaded successfully"
-        }
-        
-    except Exception as e:
-        logger.error(f"Error uploading image: {str(e)}")
-        raise HTTPException(status_code=500, detail=f"Error uploading image: {str(e)}")
-
-        
-        # Determine content type based on file type
-        if file.content_type and file.content_type.startswith('video/'):
-            content_type = file.content_type
-        elif file_ext.lower() in ['mp4', 'avi', 'mov', 'wmv', 'webm']:
-            content_type = f"video/{file_ext}"
-        else:
-            content_type = f"image/{file_ext}"
-        
-        logger.info(f"Determined content type: {content_type}")
-        
-        # Use user-uploads bucket for all uploads (now public, supports both images and videos)
-        bucket_name = "user-uploads"
-        logger.info(f"Using bucket: {bucket_name} for uploads")
-        
-        # Upload using admin client (bypasses RLS)
-        storage_response = supabase_admin.storage.from_(bucket_name).upload(
-            file_path,
-            file_content,
-            file_options={"content-type": content_type}
-        )
-        
-        if hasattr(storage_response, 'error') and storage_response.error:
-            raise HTTPException(status_code=400, detail=f"Storage upload failed: {storage_response.error}")
-        
-        # Get public URL
-        public_url = supabase_admin.storage.from_(bucket_name).get_public_url(file_path)
-        
-        # Update database using admin client
-        is_video = content_type.startswith('video/')
-        image_prompt = "User uploaded video" if is_video else "User uploaded image"
-        media_data = {
-            "post_id": post_id,
-            "image_url": public_url,  # Keep using image_url field for compatibility
-            "image_prompt": image_prompt,
-            "image_style": "user_upload",
-            "image_size": "custom",
-            "image_quality": "custom",
-            "generation_model": "user_upload",
-            "generation_cost": 0,
-            "generation_time": 0,
-            "is_approved": True
-        }
-        
-        # Check if image already exists
-        existing_images = supabase_admin.table("content_images").select("id").eq("post_id", post_id).order("created_at", desc=True).limit(1).execute()
-        
-        if existing_images.data and len(existing_images.data) > 0:
-            # Update existing image
-            supabase_admin.table("content_images").update({
-                "image_url": public_url,
-                "is_approved": True
-            }).eq("id", existing_images.data[0]["id"]).execute()
-        else:
-            # Create new image record
-            supabase_admin.table("content_images").insert(media_data).execute()
-        
-        # Update content_posts with primary image (user uploads are auto-approved)
-        supabase_admin.table("content_posts").update({
-            "primary_image_url": public_url,
-            "primary_image_prompt": image_prompt,
-            "primary_image_approved": True
-        }).eq("id", post_id).execute()
-        logger.info(f"Updated content_posts.primary_image_url for post {post_id} (uploaded image)")
-        
-        return {
-            "success": True,
-            "image_url": public_url,
-            "message": "Video uploaded successfully" if is_video else "Image uploaded successfully"
-        }
-        
-    except Exception as e:
-        logger.error(f"Error uploading image: {str(e)}")
-        raise HTTPException(status_code=500, detail=f"Error uploading image: {str(e)}")
-
-        
-        # Determine content type based on file type
-        if file.content_type and file.content_type.startswith('video/'):
-            content_type = file.content_type
-        elif file_ext.lower() in ['mp4', 'avi', 'mov', 'wmv', 'webm']:
-            content_type = f"video/{file_ext}"
-        else:
-            content_type = f"image/{file_ext}"
-        
-        logger.info(f"Determined content type: {content_type}")
-        
-        # Use user-uploads bucket for all uploads (now public, supports both images and videos)
-        bucket_name = "user-uploads"
-        logger.info(f"Using bucket: {bucket_name} for uploads")
-        
-        # Upload using admin client (bypasses RLS)
-        storage_response = supabase_admin.storage.from_(bucket_name).upload(
-            file_path,
-            file_content,
-            file_options={"content-type": content_type}
-        )
-        
-        if hasattr(storage_response, 'error') and storage_response.error:
-            raise HTTPException(status_code=400, detail=f"Storage upload failed: {storage_response.error}")
-        
-        # Get public URL
-        public_url = supabase_admin.storage.from_(bucket_name).get_public_url(file_path)
-        
-        # Update database using admin client
-        is_video = content_type.startswith('video/')
-        image_prompt = "User uploaded video" if is_video else "User uploaded image"
-        media_data = {
-            "post_id": post_id,
-            "image_url": public_url,  # Keep using image_url field for compatibility
-            "image_prompt": image_prompt,
-            "image_style": "user_upload",
-            "image_size": "custom",
-            "image_quality": "custom",
-            "generation_model": "user_upload",
-            "generation_cost": 0,
-            "generation_time": 0,
-            "is_approved": True
-        }
-        
-        # Check if image already exists
-        existing_images = supabase_admin.table("content_images").select("id").eq("post_id", post_id).order("created_at", desc=True).limit(1).execute()
-        
-        if existing_images.data and len(existing_images.data) > 0:
-            # Update existing image
-            supabase_admin.table("content_images").update({
-                "image_url": public_url,
-                "is_approved": True
-            }).eq("id", existing_images.data[0]["id"]).execute()
-        else:
-            # Create new image record
-            supabase_admin.table("content_images").insert(media_data).execute()
-        
-        # Update content_posts with primary image (user uploads are auto-approved)
-        supabase_admin.table("content_posts").update({
-            "primary_image_url": public_url,
-            "primary_image_prompt": image_prompt,
-            "primary_image_approved": True
-        }).eq("id", post_id).execute()
-        logger.info(f"Updated content_posts.primary_image_url for post {post_id} (uploaded image)")
-        
-        return {
-            "success": True,
-            "image_url": public_url,
-            "message": "Video uploaded successfully" if is_video else "Image uploaded successfully"
-        }
-        
-    except Exception as e:
-        logger.error(f"Error uploading image: {str(e)}")
-        raise HTTPException(status_code=500, detail=f"Error uploading image: {str(e)}")
-
-        
-        # Determine content type based on file type
-        if file.content_type and file.content_type.startswith('video/'):
-            content_type = file.content_type
-        elif file_ext.lower() in ['mp4', 'avi', 'mov', 'wmv', 'webm']:
-            content_type = f"video/{file_ext}"
-        else:
-            content_type = f"image/{file_ext}"
-        
-        logger.info(f"Determined content type: {content_type}")
-        
-        # Use user-uploads bucket for all uploads (now public, supports both images and videos)
-        bucket_name = "user-uploads"
-        logger.info(f"Using bucket: {bucket_name} for uploads")
-        
-        # Upload using admin client (bypasses RLS)
-        storage_response = supabase_admin.storage.from_(bucket_name).upload(
-            file_path,
-            file_content,
-            file_options={"content-type": content_type}
-        )
-        
-        if hasattr(storage_response, 'error') and storage_response.error:
-            raise HTTPException(status_code=400, detail=f"Storage upload failed: {storage_response.error}")
-        
-        # Get public URL
-        public_url = supabase_admin.storage.from_(bucket_name).get_public_url(file_path)
-        
-        # Update database using admin client
-        is_video = content_type.startswith('video/')
-        image_prompt = "User uploaded video" if is_video else "User uploaded image"
-        media_data = {
-            "post_id": post_id,
-            "image_url": public_url,  # Keep using image_url field for compatibility
-            "image_prompt": image_prompt,
-            "image_style": "user_upload",
-            "image_size": "custom",
-            "image_quality": "custom",
-            "generation_model": "user_upload",
-            "generation_cost": 0,
-            "generation_time": 0,
-            "is_approved": True
-        }
-        
-        # Check if image already exists
-        existing_images = supabase_admin.table("content_images").select("id").eq("post_id", post_id).order("created_at", desc=True).limit(1).execute()
-        
-        if existing_images.data and len(existing_images.data) > 0:
-            # Update existing image
-            supabase_admin.table("content_images").update({
-                "image_url": public_url,
-                "is_approved": True
-            }).eq("id", existing_images.data[0]["id"]).execute()
-        else:
-            # Create new image record
-            supabase_admin.table("content_images").insert(media_data).execute()
-        
-        # Update content_posts with primary image (user uploads are auto-approved)
-        supabase_admin.table("content_posts").update({
-            "primary_image_url": public_url,
-            "primary_image_prompt": image_prompt,
-            "primary_image_approved": True
-        }).eq("id", post_id).execute()
-        logger.info(f"Updated content_posts.primary_image_url for post {post_id} (uploaded image)")
-        
-        return {
-            "success": True,
-            "image_url": public_url,
-            "message": "Video uploaded successfully" if is_video else "Image uploaded successfully"
-        }
-        
-    except Exception as e:
-        logger.error(f"Error uploading image: {str(e)}")
-        raise HTTPException(status_code=500, detail=f"Error uploading image: {str(e)}")
-
-        
-        # Determine content type based on file type
-        if file.content_type and file.content_type.startswith('video/'):
-            content_type = file.content_type
-        elif file_ext.lower() in ['mp4', 'avi', 'mov', 'wmv', 'webm']:
-            content_type = f"video/{file_ext}"
-        else:
-            content_type = f"image/{file_ext}"
-        
-        logger.info(f"Determined content type: {content_type}")
-        
-        # Use user-uploads bucket for all uploads (now public, supports both images and videos)
-        bucket_name = "user-uploads"
-        logger.info(f"Using bucket: {bucket_name} for uploads")
-        
-        # Upload using admin client (bypasses RLS)
-        storage_response = supabase_admin.storage.from_(bucket_name).upload(
-            file_path,
-            file_content,
-            file_options={"content-type": content_type}
-        )
-        
-        if hasattr(storage_response, 'error') and storage_response.error:
-            raise HTTPException(status_code=400, detail=f"Storage upload failed: {storage_response.error}")
-        
-        # Get public URL
-        public_url = supabase_admin.storage.from_(bucket_name).get_public_url(file_path)
+        # Stream to storage (resumable for large files, service role bypasses RLS)
+        public_url = await asset_registry.upload(current_user.id, bucket_name, file_path, file.file, content_type)
         
         # Update database using admin client
         is_video = content_type.startswith('video/')
@@ -6,7 +6,10 @@ from datetime import datetime
 from supabase import create_client
 from pydantic import BaseModel
 import logging
+import httpx
 from cryptography.fernet import Fernet
+from services.http_clients import http_clients
+from services.connection_registry import connection_registry
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -126,7 +129,6 @@ async def create_wordpress_connection(
         logger.info(f"Creating WordPress connection for user: {current_user.id}")
         
         # Test the WordPress connection first
-        import requests
         
         # Try multiple WordPress REST API endpoints for better compatibility
         endpoints_to_try = [
@@ -140,7 +142,7 @@ async def create_wordpress_connection(
         
         for endpoint in endpoints_to_try:
             try:
-                response = requests.get(
+                response = await http_clients.get(
                     endpoint,
                     auth=(connection_data.username, connection_data.password),
                     headers={
@@ -199,7 +201,7 @@ async def create_wordpress_connection(
             except HTTPException:
                 # Re-raise HTTP exceptions (401, 403, 404)
                 raise
-            except requests.exceptions.RequestException as e:
+            except httpx.HTTPError as e:
                 logger.warning(f"Request failed for {endpoint}: {e}")
                 # Check if this is a domain resolution error
                 error_str = str(e).lower()
@@ -266,6 +268,7 @@ async def create_wordpress_connection(
                 detail="Failed to create WordPress connection"
             )
         
+        connection_registry.invalidate(current_user.id, "wordpress")
         logger.info(f"WordPress connection created: {response.data[0]['id']}")
         
         return {
@@ -283,7 +286,7 @@ async def create_wordpress_connection(
     except HTTPException:
         # Re-raise HTTP exceptions (401, 403, 404) that we specifically created
         raise
-    except requests.exceptions.RequestException as e:
+    except httpx.HTTPError as e:
         logger.error(f"WordPress REST API request failed: {e}")
         raise HTTPException(
             status_code=400,
@@ -341,6 +344,7 @@ async def delete_wordpress_connection(
                 detail="Failed to delete WordPress connection"
             )
         
+        connection_registry.invalidate(current_user.id, "wordpress")
         logger.info(f"WordPress connection deleted: {connection_id}")
         
         return {
@@ -393,9 +397,7 @@ async def test_wordpress_connection(
         logger.info(f"Testing WordPress connection with REST API: {rest_url}")
         
         try:
-            import requests
-            
-            response = requests.get(
+            response = await http_clients.get(
                 rest_url,
                 auth=(connection['wordpress_username'], password),
                 headers={
@@ -414,6 +416,7 @@ async def test_wordpress_connection(
                 supabase_admin.table("platform_connections").update({
                     "wordpress_last_checked_at": datetime.now().isoformat()
                 }).eq("id", connection_id).execute()
+                connection_registry.invalidate(current_user.id, "wordpress")
                 
                 return {
                     "success": True,
@@ -431,7 +434,7 @@ async def test_wordpress_connection(
                     detail=f"WordPress connection test failed with status {response.status_code}: {response.text}"
                 )
                 
-        except requests.exceptions.RequestException as e:
+        except httpx.HTTPError as e:
             logger.error(f"WordPress REST API test failed: {e}")
             raise HTTPException(
                 status_code=400,
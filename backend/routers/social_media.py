@@ -1,14 +1,16 @@
 from fastapi import APIRouter, Depends, HTTPException, status, Header
 from typing import List, Optional, Dict, Any
 import os
-import requests
 import httpx
+from services.http_clients import http_clients
+from services.connection_registry import connection_registry
+import time
 import asyncio
+from collections import OrderedDict
 from datetime import datetime, timedelta
 from supabase import create_client, Client
 from dotenv import load_dotenv
 from pydantic import BaseModel
-from cryptography.fernet import Fernet
 import json
 
 # Load environment variables
@@ -103,26 +105,10 @@ def get_current_user(authorization: str = Header(None)):
 
 router = APIRouter(prefix="/social-media", tags=["social-media"])
 
-def get_encryption_key():
-    """Get or generate encryption key for token decryption"""
-    encryption_key = os.getenv("ENCRYPTION_KEY")
-    if not encryption_key:
-        print("⚠️ No ENCRYPTION_KEY found, generating new key")
-        key = Fernet.generate_key()
-        encryption_key = key.decode()
-        print(f"🔑 Generated new encryption key: {encryption_key[:20]}...")
-        print("⚠️ Please set this as ENCRYPTION_KEY in your environment variables")
-    else:
-        print(f"🔑 Using existing encryption key: {encryption_key[:20]}...")
-    
-    return encryption_key.encode()
-
 def decrypt_token(encrypted_token: str) -> str:
     """Decrypt access token"""
     try:
-        encryption_key = get_encryption_key()
-        fernet = Fernet(encryption_key)
-        decrypted_token = fernet.decrypt(encrypted_token.encode()).decode()
+        decrypted_token = connection_registry.decrypt_token(encrypted_token)
         print(f"✅ Successfully decrypted token: {decrypted_token[:20]}...")
         return decrypted_token
     except Exception as e:
@@ -131,12 +117,142 @@ def decrypt_token(encrypted_token: str) -> str:
         print("🔄 Trying to use token as-is...")
         return encrypted_token
 
+# Latest-posts fan-out: every platform is fetched concurrently with its own timeout,
+# and results are kept per (user, platform) so dashboard loads can be answered from
+# cache while a background refresh brings the entry up to date (stale-while-revalidate)
+LATEST_POSTS_PLATFORM_TIMEOUT = float(os.getenv("LATEST_POSTS_PLATFORM_TIMEOUT_SECONDS", "8"))
+LATEST_POSTS_CACHE_TTL = float(os.getenv("LATEST_POSTS_CACHE_TTL_SECONDS", "120"))
+LATEST_POSTS_CACHE_MAX_STALE = float(os.getenv("LATEST_POSTS_CACHE_MAX_STALE_SECONDS", "3600"))
+LATEST_POSTS_CACHE_MAX_ENTRIES = int(os.getenv("LATEST_POSTS_CACHE_MAX_ENTRIES", "5000"))
+
+# (user_id, platform) -> {"posts", "limit", "connection_key", "fetched_at"}
+_latest_posts_cache: "OrderedDict[tuple, Dict[str, Any]]" = OrderedDict()
+# (user_id, platform) -> refresh task currently running for that key
+_latest_posts_refreshing: Dict[tuple, asyncio.Task] = {}
+
+POST_FETCHERS = {
+    'facebook': lambda connection, limit: fetch_facebook_posts(connection, limit),
+    'instagram': lambda connection, limit: fetch_instagram_posts(connection, limit),
+    'twitter': lambda connection, limit: fetch_twitter_posts(connection, limit),
+    'linkedin': lambda connection, limit: fetch_linkedin_posts(connection, limit),
+    'youtube': lambda connection, limit: fetch_youtube_posts(connection, limit),
+    'wordpress': lambda connection, limit: fetch_wordpress_posts(connection, limit),
+    'google': lambda connection, limit: fetch_google_posts(connection, limit),
+}
+
+# Placeholder posts shown for platforms that returned nothing (Instagram shows live data only)
+MOCK_POSTS = {
+    'facebook': ('This is a sample post from your facebook page. This is mock data for testing purposes.',
+                 'https://facebook.com/mock_post_1', 15, 3, 2),
+    'twitter': ('This is a sample tweet from your twitter account. This is mock data for testing purposes. #test #socialmedia',
+                'https://twitter.com/mock_tweet_1', 12, 2, 1),
+    'linkedin': ('This is a sample post from your linkedin page. This is mock data for testing purposes.',
+                 'https://linkedin.com/mock_post_1', 8, 1, 0),
+    'youtube': ('This is a sample video from your youtube channel. This is mock data for testing purposes.',
+                'https://youtube.com/mock_video_1', 20, 5, 3),
+    'wordpress': ('This is a sample blog post from your wordpress site. This is mock data for testing purposes.',
+                  'https://wordpress.com/mock_post_1', 5, 2, 1),
+    'google': ('This is a sample post from your google account. This is mock data for testing purposes.',
+               'https://google.com/mock_post_1', 3, 1, 0),
+}
+
+
+def mock_posts_for(platform: str) -> List[Dict[str, Any]]:
+    if platform not in MOCK_POSTS:
+        return []
+    message, permalink_url, likes, comments, shares = MOCK_POSTS[platform]
+    return [{
+        'id': f'mock_{platform}_1',
+        'message': message,
+        'created_time': '2025-01-07T10:00:00+0000',
+        'permalink_url': permalink_url,
+        'media_url': None,
+        'likes_count': likes,
+        'comments_count': comments,
+        'shares_count': shares
+    }]
+
+
+def _connection_key(connection: dict) -> tuple:
+    """Identifies the account a cache entry was built from; reconnecting invalidates it"""
+    return (connection.get('id'), connection.get('page_id'), connection.get('access_token_encrypted'))
+
+
+def _cached_posts(cache_key: tuple, connection: dict, limit: int) -> Optional[Dict[str, Any]]:
+    entry = _latest_posts_cache.get(cache_key)
+    if entry is None:
+        return None
+    if entry["connection_key"] != _connection_key(connection) or entry["limit"] < limit:
+        return None
+    if time.monotonic() - entry["fetched_at"] > LATEST_POSTS_CACHE_MAX_STALE:
+        _latest_posts_cache.pop(cache_key, None)
+        return None
+    _latest_posts_cache.move_to_end(cache_key)
+    return entry
+
+
+async def _refresh_platform_posts(cache_key: tuple, platform: str, connection: dict, limit: int) -> List[Dict[str, Any]]:
+    """Fetch live posts for one platform and store them in the cache"""
+    posts = await POST_FETCHERS[platform](connection, limit) or []
+    _latest_posts_cache[cache_key] = {
+        "posts": posts,
+        "limit": limit,
+        "connection_key": _connection_key(connection),
+        "fetched_at": time.monotonic(),
+    }
+    _latest_posts_cache.move_to_end(cache_key)
+    while len(_latest_posts_cache) > LATEST_POSTS_CACHE_MAX_ENTRIES:
+        _latest_posts_cache.popitem(last=False)
+    return posts
+
+
+def _start_refresh(cache_key: tuple, platform: str, connection: dict, limit: int) -> asyncio.Task:
+    """Return the running refresh for this key, starting one if none is in flight"""
+    task = _latest_posts_refreshing.get(cache_key)
+    if task is None or task.done():
+        task = asyncio.get_running_loop().create_task(
+            _refresh_platform_posts(cache_key, platform, connection, limit)
+        )
+        _latest_posts_refreshing[cache_key] = task
+
+        def _finished(done: asyncio.Task, key=cache_key):
+            if _latest_posts_refreshing.get(key) is done:
+                _latest_posts_refreshing.pop(key, None)
+            if not done.cancelled() and done.exception() is not None:
+                print(f"❌ Background refresh of {key[1]} posts failed: {done.exception()}")
+
+        task.add_done_callback(_finished)
+    return task
+
+
+async def fetch_platform_posts(user_id: str, platform: str, connection: dict, limit: int) -> Dict[str, Any]:
+    """
+    Posts for one platform, served from cache when possible.
+
+    Fresh entries are returned as-is; stale entries are returned immediately while a
+    refresh runs in the background; misses wait for the API up to the platform timeout.
+    A fetch that times out keeps running so its result is cached for the next load.
+    """
+    cache_key = (user_id, platform)
+    entry = _cached_posts(cache_key, connection, limit)
+
+    if entry is not None:
+        age = time.monotonic() - entry["fetched_at"]
+        if age > LATEST_POSTS_CACHE_TTL:
+            _start_refresh(cache_key, platform, connection, limit)
+        return {"posts": entry["posts"][:limit], "source": "cache" if age <= LATEST_POSTS_CACHE_TTL else "stale"}
+
+    task = _start_refresh(cache_key, platform, connection, limit)
+    posts = await asyncio.wait_for(asyncio.shield(task), timeout=LATEST_POSTS_PLATFORM_TIMEOUT)
+    return {"posts": posts[:limit], "source": "live"}
+
+
 @router.get("/latest-posts")
 async def get_latest_posts(
     current_user: User = Depends(get_current_user),
     limit: int = 10
 ):
-    """Get latest posts from all connected social media platforms"""
+    """Get latest posts from all connected social media platforms (parallel, cached per platform)"""
     try:
         print(f"📱 Fetching latest posts for user: {current_user.id}")
         
@@ -145,167 +261,64 @@ async def get_latest_posts(
         connections = response.data if response.data else []
         
         print(f"📊 Found {len(connections)} active connections")
-        platform_counts = {}
+
+        # One fetch per platform; as before, the last connection listed for a platform wins
+        connections_by_platform = {}
         for conn in connections:
             platform = conn.get('platform', '').lower()
-            platform_counts[platform] = platform_counts.get(platform, 0) + 1
-            print(f"🔗 Connection: {conn.get('platform')} (raw) -> '{platform}' (lowercased) - {conn.get('page_name', 'Unknown')} - Active: {conn.get('is_active')}")
+            if platform not in POST_FETCHERS:
+                print(f"⚠️ Unsupported platform: '{platform}' - Available platforms: {', '.join(POST_FETCHERS)}")
+                continue
+            connections_by_platform[platform] = conn
 
-        print(f"📊 Platform breakdown: {platform_counts}")
-        print(f"📊 All platform values: {[conn.get('platform', '') for conn in connections]}")
+        print(f"📊 Platforms to fetch: {list(connections_by_platform.keys())}")
+
+        start_time = time.monotonic()
+        platforms = list(connections_by_platform.keys())
+        results = await asyncio.gather(
+            *(fetch_platform_posts(current_user.id, platform, connections_by_platform[platform], limit)
+              for platform in platforms),
+            return_exceptions=True
+        )
+        print(f"✅ Parallel posts fetch completed in {time.monotonic() - start_time:.2f} seconds")
 
-        if not connections:
-            print("⚠️ No active connections found - this explains why only Instagram might be showing if there are cached Instagram posts")
-        
         posts_by_platform = {}
-        
-        for connection in connections:
-            platform = connection.get('platform', '').lower()
-            print(f"🔍 Processing {platform} connection: {connection.get('id')}")
-            print(f"📊 Connection details: {connection}")
-            
-            try:
-                print(f"🔍 DEBUG: Processing platform: '{platform}' (type: {type(platform)}) - repr: {repr(platform)}")
-                if platform == 'facebook':
-                    posts = await fetch_facebook_posts(connection, limit)
-                    print(f"📱 Facebook posts fetched: {len(posts) if posts else 0}")
-                    # If no real posts found, add some mock data for testing
-                    if not posts:
-                        print(f"🔄 No real posts found for {platform}, adding mock data for testing")
-                        posts = [{
-                            'id': f'mock_{platform}_1',
-                            'message': f'This is a sample post from your {platform} page. This is mock data for testing purposes.',
-                            'created_time': '2025-01-07T10:00:00+0000',
-                            'permalink_url': f'https://facebook.com/mock_post_1',
-                            'media_url': None,
-                            'likes_count': 15,
-                            'comments_count': 3,
-                            'shares_count': 2
-                        }]
-                elif platform == 'instagram':
-                    print(f"🔄 Attempting to fetch Instagram posts...")
-                    try:
-                        posts = await fetch_instagram_posts(connection, limit)
-                        print(f"📱 Instagram posts fetched: {len(posts) if posts else 0}")
-                        if posts:
-                            print(f"📋 Latest Instagram post: {posts[0].get('message', '')[:100]}...")
-                    except Exception as instagram_error:
-                        print(f"❌ Error fetching Instagram posts: {instagram_error}")
-                        posts = []
-
-                    # Only add mock data if there are no posts AND this is for testing
-                    # For live data, we want real posts or empty array
-                    if not posts:
-                        print(f"⚠️ No real posts found for {platform} - this could mean:")
-                        print(f"   - No posts exist on the account")
-                        print(f"   - API permissions are insufficient")
-                        print(f"   - Account is private or restricted")
-                        print(f"   - Connection needs to be refreshed")
-                elif platform == 'twitter':
-                    posts = await fetch_twitter_posts(connection, limit)
-                    print(f"📱 Twitter posts fetched: {len(posts) if posts else 0}")
-                    # If no real posts found, add some mock data for testing
-                    if not posts:
-                        print(f"🔄 No real posts found for {platform}, adding mock data for testing")
-                        posts = [{
-                            'id': f'mock_{platform}_1',
-                            'message': f'This is a sample tweet from your {platform} account. This is mock data for testing purposes. #test #socialmedia',
-                            'created_time': '2025-01-07T10:00:00+0000',
-                            'permalink_url': f'https://twitter.com/mock_tweet_1',
-                            'media_url': None,
-                            'likes_count': 12,
-                            'comments_count': 2,
-                            'shares_count': 1
-                        }]
-                elif platform == 'linkedin':
-                    posts = await fetch_linkedin_posts(connection, limit)
-                    print(f"📱 LinkedIn posts fetched: {len(posts) if posts else 0}")
-                    # If no real posts found, add some mock data for testing
-                    if not posts:
-                        print(f"🔄 No real posts found for {platform}, adding mock data for testing")
-                        posts = [{
-                            'id': f'mock_{platform}_1',
-                            'message': f'This is a sample post from your {platform} page. This is mock data for testing purposes.',
-                            'created_time': '2025-01-07T10:00:00+0000',
-                            'permalink_url': f'https://linkedin.com/mock_post_1',
-                            'media_url': None,
-                            'likes_count': 8,
-                            'comments_count': 1,
-                            'shares_count': 0
-                        }]
-                elif platform == 'youtube':
-                    posts = await fetch_youtube_posts(connection, limit)
-                    print(f"📱 YouTube posts fetched: {len(posts) if posts else 0}")
-                    # If no real posts found, add some mock data for testing
-                    if not posts:
-                        print(f"🔄 No real posts found for {platform}, adding mock data for testing")
-                        posts = [{
-                            'id': f'mock_{platform}_1',
-                            'message': f'This is a sample video from your {platform} channel. This is mock data for testing purposes.',
-                            'created_time': '2025-01-07T10:00:00+0000',
-                            'permalink_url': f'https://youtube.com/mock_video_1',
-                            'media_url': None,
-                            'likes_count': 20,
-                            'comments_count': 5,
-                            'shares_count': 3
-                        }]
-                elif platform == 'wordpress':
-                    posts = await fetch_wordpress_posts(connection, limit)
-                    print(f"📱 WordPress posts fetched: {len(posts) if posts else 0}")
-                    # If no real posts found, add some mock data for testing
-                    if not posts:
-                        print(f"🔄 No real posts found for {platform}, adding mock data for testing")
-                        posts = [{
-                            'id': f'mock_{platform}_1',
-                            'message': f'This is a sample blog post from your {platform} site. This is mock data for testing purposes.',
-                            'created_time': '2025-01-07T10:00:00+0000',
-                            'permalink_url': f'https://wordpress.com/mock_post_1',
-                            'media_url': None,
-                            'likes_count': 5,
-                            'comments_count': 2,
-                            'shares_count': 1
-                        }]
-                elif platform == 'google':
-                    posts = await fetch_google_posts(connection, limit)
-                    print(f"📱 Google posts fetched: {len(posts) if posts else 0}")
-                    # If no real posts found, add some mock data for testing
-                    if not posts:
-                        print(f"🔄 No real posts found for {platform}, adding mock data for testing")
-                        posts = [{
-                            'id': f'mock_{platform}_1',
-                            'message': f'This is a sample post from your {platform} account. This is mock data for testing purposes.',
-                            'created_time': '2025-01-07T10:00:00+0000',
-                            'permalink_url': f'https://google.com/mock_post_1',
-                            'media_url': None,
-                            'likes_count': 3,
-                            'comments_count': 1,
-                            'shares_count': 0
-                        }]
-                else:
-                    print(f"⚠️ Unsupported platform: '{platform}' - Available platforms: facebook, instagram, twitter, linkedin, youtube, wordpress, google")
-                    continue
-                
-                if posts:
-                    posts_by_platform[platform] = posts
-                    print(f"✅ Fetched {len(posts)} posts from {platform}")
-                    print(f"📋 Posts for {platform}: {posts}")
-                else:
-                    print(f"⚠️ No posts found for {platform}")
-                    
-            except Exception as e:
-                print(f"❌ Error fetching posts from {platform}: {e}")
-                # Continue with other platforms even if one fails
+        sources = {}
+        failed_platforms = {}
+        for platform, result in zip(platforms, results):
+            if isinstance(result, asyncio.TimeoutError):
+                print(f"⏱️ {platform} did not answer within {LATEST_POSTS_PLATFORM_TIMEOUT}s, returning partial results")
+                failed_platforms[platform] = "timeout"
+                posts = []
+            elif isinstance(result, Exception):
+                print(f"❌ Error fetching posts from {platform}: {result}")
+                failed_platforms[platform] = str(result)
+                posts = []
+            else:
+                posts = result["posts"]
+                sources[platform] = result["source"]
+
+            if platform in failed_platforms:
+                # Failed platforms are left out rather than padded with placeholders
                 continue
-        
-        print(f"📊 Returning posts for platforms: {list(posts_by_platform.keys())}")
-        print(f"📋 Final posts_by_platform keys: {list(posts_by_platform.keys())}")
-        print(f"📋 Platforms with posts: {[p for p in posts_by_platform.keys() if posts_by_platform[p]]}")
-        print(f"📋 Post counts by platform: {[(p, len(posts)) for p, posts in posts_by_platform.items()]}")
+            if not posts:
+                posts = mock_posts_for(platform)
+                if posts:
+                    print(f"🔄 No real posts found for {platform}, adding mock data for testing")
+
+            if posts:
+                posts_by_platform[platform] = posts
+                print(f"✅ {len(posts)} posts from {platform} ({sources.get(platform, 'none')})")
+            else:
+                print(f"⚠️ No posts found for {platform}")
 
         result = {
             "posts": posts_by_platform,
             "total_platforms": len(posts_by_platform),
-            "total_posts": sum(len(posts) for posts in posts_by_platform.values())
+            "total_posts": sum(len(posts) for posts in posts_by_platform.values()),
+            "sources": sources,
+            "failed_platforms": failed_platforms,
+            "partial": bool(failed_platforms)
         }
         print(f"📊 Response summary: {result['total_platforms']} platforms, {result['total_posts']} total posts")
         return result
@@ -340,7 +353,7 @@ async def fetch_facebook_posts(connection: dict, limit: int) -> List[Dict[str, A
                 'fields': 'id,name,access_token'
             }
 
-            page_response = requests.get(page_check_url, params=page_params, timeout=10)
+            page_response = await http_clients.get(page_check_url, params=page_params, timeout=10)
             print(f"📊 Facebook page check response status: {page_response.status_code}")
 
             if page_response.status_code == 200:
@@ -366,7 +379,7 @@ async def fetch_facebook_posts(connection: dict, limit: int) -> List[Dict[str, A
         print(f"🌐 Facebook API URL: {url}")
         print(f"📋 Facebook API params: {params}")
         
-        response = requests.get(url, params=params, timeout=10)
+        response = await http_clients.get(url, params=params, timeout=10)
 
         print(f"📊 Facebook API response status: {response.status_code}")
 
@@ -409,7 +422,7 @@ async def fetch_facebook_posts(connection: dict, limit: int) -> List[Dict[str, A
                 'limit': limit
             }
 
-            alt_response = requests.get(alt_url, params=alt_params, timeout=10)
+            alt_response = await http_clients.get(alt_url, params=alt_params, timeout=10)
             print(f"📊 Facebook alternative API response status: {alt_response.status_code}")
 
             if alt_response.status_code == 200:
@@ -452,7 +465,7 @@ async def fetch_facebook_posts(connection: dict, limit: int) -> List[Dict[str, A
                     'limit': limit
                 }
 
-                user_response = requests.get(user_url, params=user_params, timeout=10)
+                user_response = await http_clients.get(user_url, params=user_params, timeout=10)
                 print(f"📊 Facebook user posts API response status: {user_response.status_code}")
 
                 if user_response.status_code == 200:
@@ -524,7 +537,7 @@ async def fetch_instagram_posts(connection: dict, limit: int) -> List[Dict[str,
             
             print(f"🌐 Instagram account lookup URL: {instagram_account_url}")
             
-            account_response = requests.get(instagram_account_url, params=instagram_account_params, timeout=10)
+            account_response = await http_clients.get(instagram_account_url, params=instagram_account_params, timeout=10)
             print(f"📊 Instagram account lookup response: {account_response.status_code}")
             
             if account_response.status_code != 200:
@@ -556,7 +569,7 @@ async def fetch_instagram_posts(connection: dict, limit: int) -> List[Dict[str,
         print(f"🌐 Instagram API URL: {url}")
         print(f"📋 Instagram API params: {params}")
         
-        response = requests.get(url, params=params, timeout=10)
+        response = await http_clients.get(url, params=params, timeout=10)
         
         print(f"📊 Instagram API response status: {response.status_code}")
         
@@ -620,7 +633,7 @@ async def fetch_twitter_posts(connection: dict, limit: int) -> List[Dict[str, An
             'media.fields': 'url,preview_image_url,type'
         }
         
-        async with httpx.AsyncClient() as client:
+        async with http_clients.session() as client:
             response = await client.get(tweets_url, headers=headers, params=params)
             
             if response.status_code != 200:
@@ -695,7 +708,7 @@ async def fetch_linkedin_posts(connection: dict, limit: int) -> List[Dict[str, A
             print("🔄 Attempting to fetch LinkedIn shares...")
             shares_url = f"https://api.linkedin.com/v2/shares?q=owners&owners={linkedin_id}&count={limit}"
             
-            response = requests.get(shares_url, headers=headers, timeout=10)
+            response = await http_clients.get(shares_url, headers=headers, timeout=10)
             print(f"📊 LinkedIn shares API response status: {response.status_code}")
             
             if response.status_code == 200:
@@ -785,7 +798,7 @@ async def fetch_wordpress_posts(connection: dict, limit: int) -> List[Dict[str,
                 'Authorization': f'Bearer {access_token}'
             }
 
-            response = requests.get(api_url, params=params, headers=headers, timeout=10)
+            response = await http_clients.get(api_url, params=params, headers=headers, timeout=10)
             print(f"📊 WordPress.com API response status: {response.status_code}")
 
             if response.status_code == 200:
@@ -820,7 +833,7 @@ async def fetch_wordpress_posts(connection: dict, limit: int) -> List[Dict[str,
             if access_token:
                 headers['Authorization'] = f'Bearer {access_token}'
 
-            response = requests.get(api_url, params=params, headers=headers, timeout=10)
+            response = await http_clients.get(api_url, params=params, headers=headers, timeout=10)
             print(f"📊 WordPress API response status: {response.status_code}")
 
             if response.status_code == 200:
@@ -882,7 +895,7 @@ async def fetch_google_posts(connection: dict, limit: int) -> List[Dict[str, Any
             'Authorization': f'Bearer {access_token}'
         }
 
-        response = requests.get(api_url, params=params, headers=headers, timeout=10)
+        response = await http_clients.get(api_url, params=params, headers=headers, timeout=10)
         print(f"📊 Google Blogger API response status: {response.status_code}")
 
         if response.status_code == 200:
@@ -1017,7 +1030,7 @@ async def post_to_twitter(
             }
         
         # Post to Twitter
-        async with httpx.AsyncClient() as client:
+        async with http_clients.session() as client:
             response = await client.post(
                 "https://api.twitter.com/2/tweets",
                 headers=headers,
@@ -1101,7 +1114,7 @@ async def get_platform_stats(authorization: str = Header(None)):
                 return (platform, None)
             
             try:
-                async with httpx.AsyncClient(timeout=httpx.Timeout(10.0)) as client:
+                async with http_clients.session(timeout=httpx.Timeout(10.0)) as client:
                     if platform == "instagram":
                         # Get Instagram account info
                         instagram_url = f"https://graph.facebook.com/v18.0/{page_id}"
@@ -1220,7 +1233,7 @@ async def get_post_comments(
             print(f"🔍 Facebook API call: {url}")
             print(f"🔑 Access token exists: {bool(access_token)}")
 
-            response = requests.get(url, params=params, timeout=10)
+            response = await http_clients.get(url, params=params, timeout=10)
 
             print(f"📡 Facebook API response: {response.status_code}")
 
@@ -1247,7 +1260,7 @@ async def get_post_comments(
                 'limit': 50
             }
 
-            response = requests.get(url, params=params, timeout=10)
+            response = await http_clients.get(url, params=params, timeout=10)
 
             if response.status_code == 200:
                 data = response.json()
@@ -3,6 +3,8 @@ from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from pydantic import BaseModel
 from typing import Optional, List, Dict, Any
 import httpx
+from services.http_clients import http_clients
+from services.connection_registry import connection_registry
 import os
 from datetime import datetime, timedelta
 import json
@@ -171,7 +173,6 @@ def extract_user_id_from_jwt(authorization: str) -> str:
         print(f"JWT decode error: {e}")
         # Try to decode as base64 to get more info
         try:
-            import base64
             # Split the JWT token
             parts = jwt_token.split('.')
             if len(parts) >= 2:
@@ -196,7 +197,7 @@ async def validate_and_get_account_info(platform: str, access_token: str) -> Dic
     try:
         if platform == "instagram":
             # Instagram Basic Display API validation
-            async with httpx.AsyncClient() as client:
+            async with http_clients.session() as client:
                 # Validate token format first
                 if not access_token or len(access_token) < 10:
                     raise HTTPException(status_code=400, detail="Invalid token format: Token is too short or empty")
@@ -231,7 +232,7 @@ async def validate_and_get_account_info(platform: str, access_token: str) -> Dic
         
         elif platform == "facebook":
             # Facebook Graph API validation
-            async with httpx.AsyncClient() as client:
+            async with http_clients.session() as client:
                 response = await client.get(
                     f"https://graph.facebook.com/v18.0/me",
                     params={
@@ -253,7 +254,7 @@ async def validate_and_get_account_info(platform: str, access_token: str) -> Dic
         
         elif platform == "twitter":
             # Twitter API v2 validation
-            async with httpx.AsyncClient() as client:
+            async with http_clients.session() as client:
                 headers = {"Authorization": f"Bearer {access_token}"}
                 response = await client.get(
                     "https://api.twitter.com/2/users/me",
@@ -274,7 +275,7 @@ async def validate_and_get_account_info(platform: str, access_token: str) -> Dic
         
         elif platform == "linkedin":
             # LinkedIn API validation
-            async with httpx.AsyncClient() as client:
+            async with http_clients.session() as client:
                 headers = {"Authorization": f"Bearer {access_token}"}
                 response = await client.get(
                     "https://api.linkedin.com/v2/me",
@@ -361,6 +362,8 @@ async def connect_with_token(
             
             result = supabase_client.table("social_media_connections").insert(connection_data).execute()
         
+        connection_registry.invalidate(user_id, connection.platform)
+        
         return ConnectionResponse(
             success=True,
             message=f"{connection.platform.title()} account connected successfully via {connection.connection_method}",
@@ -382,7 +385,7 @@ async def debug_validate_token(request: Dict[str, Any]):
         print(f"Debug: Token length: {len(access_token)}")
         
         # Test the token with different endpoints
-        async with httpx.AsyncClient() as client:
+        async with http_clients.session() as client:
             if platform == "instagram":
                 # Test Instagram Basic Display API
                 instagram_response = await client.get(
@@ -495,6 +498,7 @@ async def disconnect_social_media(connection_id: str, current_user: User = Depen
         if not result.data:
             raise HTTPException(status_code=404, detail="Connection not found")
         
+        connection_registry.invalidate(user_id, result.data[0].get("platform"))
         return {"success": True, "message": "Account disconnected successfully"}
         
     except Exception as e:
@@ -523,7 +527,7 @@ async def get_instagram_profile(user_id: str, current_user: User = Depends(get_c
         access_token = decrypt_token(connection["access_token"])
         
         # Get Instagram profile data
-        async with httpx.AsyncClient() as client:
+        async with http_clients.session() as client:
             response = await client.get(
                 f"https://graph.facebook.com/v18.0/{connection['account_id']}",
                 params={
@@ -541,6 +545,7 @@ async def get_instagram_profile(user_id: str, current_user: User = Depends(get_c
             supabase_client.table("social_media_connections").update({
                 "last_sync_at": datetime.utcnow().isoformat()
             }).eq("id", connection["id"]).execute()
+            connection_registry.invalidate(user_id, "instagram")
             
             return profile_data
         
@@ -570,7 +575,7 @@ async def get_instagram_media(user_id: str, current_user: User = Depends(get_cur
         access_token = decrypt_token(connection["access_token"])
         
         # Get Instagram media data using Instagram Basic Display API
-        async with httpx.AsyncClient() as client:
+        async with http_clients.session() as client:
             response = await client.get(
                 f"https://graph.instagram.com/{connection['account_id']}/media",
                 params={
@@ -588,6 +593,7 @@ async def get_instagram_media(user_id: str, current_user: User = Depends(get_cur
             supabase_client.table("social_media_connections").update({
                 "last_sync_at": datetime.utcnow().isoformat()
             }).eq("id", connection["id"]).execute()
+            connection_registry.invalidate(user_id, "instagram")
             
             return media_data
         
@@ -617,7 +623,7 @@ async def get_instagram_insights(user_id: str, current_user: User = Depends(get_
         access_token = decrypt_token(connection["access_token"])
         
         # Get Instagram insights data
-        async with httpx.AsyncClient() as client:
+        async with http_clients.session() as client:
             response = await client.get(
                 f"https://graph.facebook.com/v18.0/{connection['account_id']}/insights",
                 params={
@@ -636,6 +642,7 @@ async def get_instagram_insights(user_id: str, current_user: User = Depends(get_
             supabase_client.table("social_media_connections").update({
                 "last_sync_at": datetime.utcnow().isoformat()
             }).eq("id", connection["id"]).execute()
+            connection_registry.invalidate(user_id, "instagram")
             
             return insights_data
         
@@ -898,7 +905,7 @@ async def fetch_instagram_posts_oauth(connection: dict, limit: int) -> List[Dict
         if page_id.isdigit() and len(page_id) <= 15:
             # This looks like a Facebook Page ID, need to get Instagram account
             print(f"🔄 page_id looks like Facebook Page ID, looking up Instagram account...")
-            async with httpx.AsyncClient() as client:
+            async with http_clients.session() as client:
                 instagram_account_response = await client.get(
                     f"https://graph.facebook.com/v18.0/{page_id}",
                     params={
@@ -928,7 +935,7 @@ async def fetch_instagram_posts_oauth(connection: dict, limit: int) -> List[Dict
             print(f"✅ Using page_id as Instagram account ID: {instagram_account_id}")
         
         # Now fetch media from Instagram Graph API
-        async with httpx.AsyncClient() as client:
+        async with http_clients.session() as client:
             response = await client.get(
                 f"https://graph.facebook.com/v18.0/{instagram_account_id}/media",
                 params={
@@ -986,7 +993,7 @@ async def fetch_instagram_posts_new(connection: dict, limit: int) -> List[Dict[s
             return []
         
         # Fetch media from Instagram Basic Display API
-        async with httpx.AsyncClient() as client:
+        async with http_clients.session() as client:
             response = await client.get(
                 f"https://graph.instagram.com/{account_id}/media",
                 params={
@@ -1044,7 +1051,7 @@ async def fetch_facebook_posts_oauth(connection: dict, limit: int) -> List[Dict[
             return []
         
         # Fetch posts from Facebook Graph API
-        async with httpx.AsyncClient() as client:
+        async with http_clients.session() as client:
             response = await client.get(
                 f"https://graph.facebook.com/v18.0/{page_id}/posts",
                 params={
@@ -1107,7 +1114,7 @@ async def fetch_facebook_posts_new(connection: dict, limit: int) -> List[Dict[st
             return []
         
         # Fetch posts from Facebook Graph API
-        async with httpx.AsyncClient() as client:
+        async with http_clients.session() as client:
             response = await client.get(
                 f"https://graph.facebook.com/v18.0/{account_id}/posts",
                 params={
@@ -1523,7 +1530,7 @@ async def fetch_instagram_post_with_comments_oauth(connection: dict, post_id: st
         encrypted_token = connection.get('access_token_encrypted') or connection.get('access_token', '')
         access_token = decrypt_token(encrypted_token)
         
-        async with httpx.AsyncClient() as client:
+        async with http_clients.session() as client:
             # Fetch post
             post_response = await client.get(
                 f"https://graph.facebook.com/v18.0/{post_id}",
@@ -1578,7 +1585,7 @@ async def fetch_facebook_post_with_comments_oauth(connection: dict, post_id: str
         encrypted_token = connection.get('access_token_encrypted') or connection.get('access_token', '')
         access_token = decrypt_token(encrypted_token)
         
-        async with httpx.AsyncClient() as client:
+        async with http_clients.session() as client:
             # Fetch post
             post_response = await client.get(
                 f"https://graph.facebook.com/v18.0/{post_id}",
@@ -1632,7 +1639,7 @@ async def fetch_facebook_post_with_comments_new(connection: dict, post_id: str)
         encrypted_token = connection.get('access_token', '')
         access_token = decrypt_token(encrypted_token)
         
-        async with httpx.AsyncClient() as client:
+        async with http_clients.session() as client:
             # Fetch post
             post_response = await client.get(
                 f"https://graph.facebook.com/v18.0/{post_id}",
@@ -1686,7 +1693,7 @@ async def fetch_twitter_post_with_comments_new(connection: dict, post_id: str) -
         # We'll return the post and empty comments
         access_token = decrypt_token(connection.get('access_token', ''))
         
-        async with httpx.AsyncClient() as client:
+        async with http_clients.session() as client:
             response = await client.get(
                 f"https://api.twitter.com/2/tweets/{post_id}",
                 headers={"Authorization": f"Bearer {access_token}"},
@@ -10,13 +10,13 @@ import json
 import secrets
 import string
 import logging
-import requests
 from typing import Dict, Any, Optional
 from datetime import datetime
 from supabase import create_client, Client
-from cryptography.fernet import Fernet
 from dotenv import load_dotenv
 from pydantic import BaseModel
+from services.http_clients import http_clients
+from services.connection_registry import connection_registry
 
 # Load environment variables
 load_dotenv()
@@ -106,21 +106,11 @@ def get_current_user(authorization: str = Header(None)):
 
 def encrypt_token(token: str) -> str:
     """Encrypt token for storage"""
-    key = os.getenv('ENCRYPTION_KEY')
-    if not key:
-        raise ValueError("ENCRYPTION_KEY not found")
-
-    f = Fernet(key.encode())
-    return f.encrypt(token.encode()).decode()
+    return connection_registry.encrypt_token(token)
 
 def decrypt_token(encrypted_token: str) -> str:
     """Decrypt token for use"""
-    key = os.getenv('ENCRYPTION_KEY')
-    if not key:
-        raise ValueError("ENCRYPTION_KEY not found")
-
-    f = Fernet(key.encode())
-    return f.decrypt(encrypted_token.encode()).decode()
+    return connection_registry.decrypt_token(encrypted_token)
 
 @router.post("/initiate")
 async def initiate_whatsapp_connection(current_user: User = Depends(get_current_user)):
@@ -244,9 +234,10 @@ async def whatsapp_oauth_callback(
             "redirect_uri": os.getenv('WHATSAPP_REDIRECT_URI', 'https://agent-emily.onrender.com/connections/whatsapp/callback')
         }
 
-        token_response = requests.post(WHATSAPP_TOKEN_URL, data=token_data, timeout=30)
+        # Authorization codes are single-use, so the exchange is never retried
+        token_response = await http_clients.post(WHATSAPP_TOKEN_URL, data=token_data, timeout=30, retries=0)
 
-        if not token_response.ok:
+        if not token_response.is_success:
             logger.error(f"Token exchange failed: {token_response.text}")
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
@@ -267,9 +258,9 @@ async def whatsapp_oauth_callback(
 
         # First, get the user's business accounts
         business_accounts_url = f"{WHATSAPP_GRAPH_URL}/me/businesses"
-        business_response = requests.get(business_accounts_url, headers=headers, timeout=30)
+        business_response = await http_clients.get(business_accounts_url, headers=headers, timeout=30)
 
-        if not business_response.ok:
+        if not business_response.is_success:
             logger.error(f"Failed to get business accounts: {business_response.text}")
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
@@ -292,18 +283,18 @@ async def whatsapp_oauth_callback(
 
             # Get WhatsApp Business Accounts for this business
             waba_url = f"{WHATSAPP_GRAPH_URL}/{business_id}/whatsapp_business_accounts"
-            waba_response = requests.get(waba_url, headers=headers, timeout=30)
+            waba_response = await http_clients.get(waba_url, headers=headers, timeout=30)
 
-            if waba_response.ok:
+            if waba_response.is_success:
                 waba_data = waba_response.json()
                 for waba in waba_data.get("data", []):
                     waba_id = waba.get("id")
 
                     # Get phone numbers for this WhatsApp Business Account
                     phones_url = f"{WHATSAPP_GRAPH_URL}/{waba_id}/phone_numbers"
-                    phones_response = requests.get(phones_url, headers=headers, timeout=30)
+                    phones_response = await http_clients.get(phones_url, headers=headers, timeout=30)
 
-                    if phones_response.ok:
+                    if phones_response.is_success:
                         phones_data = phones_response.json()
                         for phone in phones_data.get("data", []):
                             whatsapp_accounts.append({
@@ -41,9 +41,9 @@ import os
 import logging
 from datetime import datetime, timedelta, date
 from typing import Dict, Any, List, Optional
-import requests
 from supabase import create_client, Client
-from cryptography.fernet import Fernet
+from services.http_clients import http_clients
+from services.connection_registry import connection_registry
 
 # Configure logging
 logging.basicConfig(
@@ -73,8 +73,7 @@ def decrypt_token(encrypted_token: str) -> str:
         return encrypted_token or ""
     
     try:
-        cipher_suite = Fernet(ENCRYPTION_KEY.encode() if isinstance(ENCRYPTION_KEY, str) else ENCRYPTION_KEY)
-        return cipher_suite.decrypt(encrypted_token.encode()).decode()
+        return connection_registry.decrypt_token(encrypted_token)
     except Exception as e:
         logger.error(f"Token decryption failed: {e}")
         return encrypted_token
@@ -228,7 +227,7 @@ def collect_instagram_daily_metrics(connection: Dict[str, Any], snapshot_date: s
         instagram_account_id = account_id
         if str(account_id).isdigit() and len(str(account_id)) <= 15:
             logger.info("Fetching Instagram Business account ID from Facebook Page")
-            page_resp = requests.get(
+            page_resp = http_clients.sync.get(
                 f"https://graph.facebook.com/v18.0/{account_id}",
                 params={"access_token": access_token, "fields": "instagram_business_account"},
                 timeout=10
@@ -255,7 +254,7 @@ def collect_instagram_daily_metrics(connection: Dict[str, Any], snapshot_date: s
             "period": "day"
         }
         
-        response = requests.get(insights_url, params=params, timeout=15)
+        response = http_clients.sync.get(insights_url, params=params, timeout=15)
         
         if response.status_code != 200:
             logger.error(f"Instagram API error: {response.status_code} - {response.text}")
@@ -326,7 +325,7 @@ def collect_facebook_daily_metrics(connection: Dict[str, Any], snapshot_date: st
             "period": "day"
         }
         
-        response = requests.get(insights_url, params=params, timeout=15)
+        response = http_clients.sync.get(insights_url, params=params, timeout=15)
         
         if response.status_code != 200:
             logger.error(f"Facebook API error: {response.status_code} - {response.text}")
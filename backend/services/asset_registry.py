@@ -0,0 +1,419 @@
+"""
+Asset Registry
+Deduplicates uploaded media per user by content hash, flagging perceptual near duplicates
+
+Every upload that goes through the registry is hashed with SHA-256 before it
+is stored. If the user already has the same bytes in the same bucket, the
+existing public URL is returned and the asset's reference count goes up
+instead of a new object being written.
+
+Callers that store user originals can also opt in to near-duplicate detection
+(near_duplicates=True): images then get a 64-bit pHash (DCT of a 32×32
+grayscale) and dHash (9×8 gradient) computed with NumPy on the CPU executor,
+and the closest earlier opted-in image in the same bucket within a small
+Hamming distance on both hashes is recorded as near_duplicate_of. The new
+bytes are always stored, since a near match may be an edited re-export.
+
+Rows live in the media_assets table. Deleting content releases its references
+(see cleanup_deleted_content_monthly) and never removes a registered object
+directly (see discard). collect_garbage() recounts the live content references
+of assets whose count has dropped to zero and removes only those nothing uses,
+together with their derivatives.
+"""
+
+import io
+import os
+import time
+import asyncio
+import hashlib
+import logging
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
+from typing import Any, BinaryIO, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+from PIL import Image, ImageOps
+from supabase import create_client, Client
+
+from services.cpu_executor import cpu_executor
+from services.image_derivatives import DERIVATIVE_SPECS, ENCODERS
+from services.streaming_upload import streaming_uploader
+
+logger = logging.getLogger(__name__)
+
+HASH_READ_CHUNK = 1024 * 1024
+_DCT_SIZE = 32
+
+
+def _dct_matrix(n: int) -> np.ndarray:
+    """Orthonormal DCT-II basis, so a 2-D DCT is two matrix products"""
+    k = np.arange(n)[:, None]
+    i = np.arange(n)[None, :]
+    matrix = np.sqrt(2 / n) * np.cos(np.pi * (2 * i + 1) * k / (2 * n))
+    matrix[0] /= np.sqrt(2)
+    return matrix
+
+
+_DCT = _dct_matrix(_DCT_SIZE)
+
+
+def _pack(bits: np.ndarray) -> str:
+    return np.packbits(bits.astype(np.uint8)).tobytes().hex()
+
+
+def perceptual_hashes(data: bytes) -> Dict[str, Any]:
+    """pHash, dHash and dimensions of an image (runs in a CPU executor worker process)"""
+    image = Image.open(io.BytesIO(data))
+    width, height = image.size
+    if image.format == "JPEG":
+        image.draft("L", (_DCT_SIZE * 2, _DCT_SIZE * 2))
+    gray = ImageOps.exif_transpose(image).convert("L")
+
+    pixels = np.asarray(gray.resize((_DCT_SIZE, _DCT_SIZE), Image.Resampling.LANCZOS), dtype=np.float64)
+    low = (_DCT @ pixels @ _DCT.T)[:8, :8].ravel()
+    # The DC term only encodes overall brightness, so it is left out of the median
+    phash = low > np.median(low[1:])
+
+    gradient = np.asarray(gray.resize((9, 8), Image.Resampling.LANCZOS), dtype=np.int16)
+    dhash = (gradient[:, 1:] > gradient[:, :-1]).ravel()
+
+    return {"phash": _pack(phash), "dhash": _pack(dhash), "width": width, "height": height}
+
+
+def hamming_distances(hashes: np.ndarray, target: str) -> np.ndarray:
+    """Bit distance from a hex hash to each row of an (n, 8) uint8 hash array"""
+    target_bytes = np.frombuffer(bytes.fromhex(target), dtype=np.uint8)
+    return np.unpackbits(np.bitwise_xor(hashes, target_bytes), axis=1).sum(axis=1)
+
+
+def _sha256_file(fileobj: BinaryIO) -> Tuple[str, int]:
+    digest = hashlib.sha256()
+    fileobj.seek(0)
+    size = 0
+    while True:
+        chunk = fileobj.read(HASH_READ_CHUNK)
+        if not chunk:
+            break
+        digest.update(chunk)
+        size += len(chunk)
+    fileobj.seek(0)
+    return digest.hexdigest(), size
+
+
+def _read_all(fileobj: BinaryIO) -> bytes:
+    fileobj.seek(0)
+    data = fileobj.read()
+    fileobj.seek(0)
+    return data
+
+
+class _UserIndex:
+    """Perceptual hashes of one user's images in one bucket as arrays for vectorized matching"""
+
+    def __init__(self, rows: List[Dict[str, Any]]):
+        rows = [row for row in rows if row.get("phash") and row.get("dhash")]
+        self.loaded_at = time.monotonic()
+        self.ids = [row["id"] for row in rows]
+        self.phash = self._hash_array([row["phash"] for row in rows])
+        self.dhash = self._hash_array([row["dhash"] for row in rows])
+
+    @staticmethod
+    def _hash_array(values: List[str]) -> np.ndarray:
+        if not values:
+            return np.zeros((0, 8), dtype=np.uint8)
+        return np.frombuffer(bytes.fromhex("".join(values)), dtype=np.uint8).reshape(-1, 8)
+
+    def add(self, row: Dict[str, Any]) -> None:
+        self.ids.append(row["id"])
+        self.phash = np.vstack([self.phash, self._hash_array([row["phash"]])])
+        self.dhash = np.vstack([self.dhash, self._hash_array([row["dhash"]])])
+
+    def nearest(self, hashes: Dict[str, Any], max_distance: int) -> Optional[str]:
+        """Asset id of the closest image within max_distance on both hashes"""
+        if not self.ids:
+            return None
+        phash_distance = hamming_distances(self.phash, hashes["phash"])
+        dhash_distance = hamming_distances(self.dhash, hashes["dhash"])
+        candidates = (phash_distance <= max_distance) & (dhash_distance <= max_distance)
+        if not candidates.any():
+            return None
+        score = np.where(candidates, phash_distance + dhash_distance, np.iinfo(np.int64).max)
+        return self.ids[int(np.argmin(score))]
+
+
+class AssetRegistry:
+    """Hash-based upload deduplication with reference counting"""
+
+    def __init__(self, near_duplicate_distance: int = 4, max_hash_bytes: int = 25 * 1024 * 1024,
+                 index_ttl_seconds: int = 600, max_indexed_users: int = 256, gc_grace_days: int = 7):
+        self.near_duplicate_distance = near_duplicate_distance
+        self.max_hash_bytes = max_hash_bytes
+        self.index_ttl_seconds = index_ttl_seconds
+        self.max_indexed_users = max_indexed_users
+        self.gc_grace_days = gc_grace_days
+
+        self._supabase: Optional[Client] = None
+        # (user_id, bucket) -> perceptual hash index
+        self._indexes: "OrderedDict[Tuple[str, str], _UserIndex]" = OrderedDict()
+        # (user_id, bucket, sha256) -> [lock, holders]; concurrent uploads of the same file wait for the first
+        self._locks: Dict[Tuple[str, str, str], List[Any]] = {}
+        self._stats = {"uploads": 0, "exact_hits": 0, "near_matches": 0, "bytes_saved": 0,
+                       "registry_errors": 0, "released": 0, "collected": 0}
+
+    def _get_supabase(self) -> Client:
+        if self._supabase is None:
+            supabase_url = os.getenv("SUPABASE_URL")
+            supabase_key = os.getenv("SUPABASE_SERVICE_ROLE_KEY") or os.getenv("SUPABASE_ANON_KEY")
+            if not supabase_url or not supabase_key:
+                raise ValueError("SUPABASE_URL and SUPABASE_SERVICE_ROLE_KEY must be set")
+            self._supabase = create_client(supabase_url, supabase_key)
+        return self._supabase
+
+    # ── Upload ──────────────────────────────────────────────────────────────
+
+    async def upload(self, user_id: Optional[str], bucket: str, object_path: str, fileobj: BinaryIO,
+                     content_type: str, size: Optional[int] = None, near_duplicates: bool = False) -> str:
+        """
+        Store a file for a user unless they already have it; returns the public URL to use.
+
+        Falls back to a plain upload when there is no user or the registry is unavailable.
+
+        Args:
+            near_duplicates: Record the closest visually near-identical image from
+                earlier opted-in uploads (only for user originals, never for generated images)
+        """
+        self._stats["uploads"] += 1
+        if not user_id:
+            return await streaming_uploader.upload(bucket, object_path, fileobj, content_type, size)
+
+        try:
+            content_hash, size = await asyncio.to_thread(_sha256_file, fileobj)
+        except Exception as e:
+            logger.warning(f"Could not hash upload {object_path}: {e}")
+            return await streaming_uploader.upload(bucket, object_path, fileobj, content_type, size)
+
+        key = (user_id, bucket, content_hash)
+        entry = self._locks.get(key)
+        if entry is None:
+            entry = self._locks[key] = [asyncio.Lock(), 0]
+        entry[1] += 1
+        try:
+            async with entry[0]:
+                return await self._upload_once(user_id, bucket, object_path, fileobj, content_type,
+                                               size, content_hash, near_duplicates)
+        finally:
+            entry[1] -= 1
+            if entry[1] <= 0:
+                self._locks.pop(key, None)
+
+    async def upload_bytes(self, user_id: Optional[str], bucket: str, object_path: str, data: bytes,
+                           content_type: str, near_duplicates: bool = False) -> str:
+        return await self.upload(user_id, bucket, object_path, io.BytesIO(data), content_type, len(data),
+                                 near_duplicates)
+
+    async def upload_path(self, user_id: Optional[str], bucket: str, object_path: str, file_path: str,
+                          content_type: str, near_duplicates: bool = False) -> str:
+        with open(file_path, "rb") as fileobj:
+            return await self.upload(user_id, bucket, object_path, fileobj, content_type,
+                                     near_duplicates=near_duplicates)
+
+    async def _upload_once(self, user_id: str, bucket: str, object_path: str, fileobj: BinaryIO,
+                           content_type: str, size: int, content_hash: str, near_duplicates: bool) -> str:
+        hashes = None
+        near_duplicate_of = None
+        try:
+            existing = await asyncio.to_thread(self._find_exact, user_id, bucket, content_hash)
+            if existing:
+                await asyncio.to_thread(self._reference, existing["id"])
+                self._stats["exact_hits"] += 1
+                self._stats["bytes_saved"] += size
+                logger.info(f"♻️ Reusing existing upload for {object_path}: {existing['public_url']}")
+                return existing["public_url"]
+
+            if near_duplicates and self.near_duplicate_distance > 0:
+                hashes = await self._perceptual_hashes(fileobj, content_type, size)
+            if hashes:
+                index = await asyncio.to_thread(self._user_index, user_id, bucket)
+                near_duplicate_of = index.nearest(hashes, self.near_duplicate_distance)
+                if near_duplicate_of:
+                    self._stats["near_matches"] += 1
+                    logger.info(f"🔍 {object_path} is a near duplicate of asset {near_duplicate_of}; storing it anyway")
+        except Exception as e:
+            # A missing table or a transient database error must not block uploads
+            self._stats["registry_errors"] += 1
+            logger.warning(f"Asset registry lookup failed for {object_path}: {e}")
+            return await streaming_uploader.upload(bucket, object_path, fileobj, content_type, size)
+
+        public_url = await streaming_uploader.upload(bucket, object_path, fileobj, content_type, size)
+        row = {
+            "user_id": user_id,
+            "bucket": bucket,
+            "object_path": object_path,
+            "public_url": public_url,
+            "content_hash": content_hash,
+            "media_type": content_type,
+            "size_bytes": size,
+            **(hashes or {}),
+        }
+        if near_duplicate_of:
+            row["near_duplicate_of"] = near_duplicate_of
+        try:
+            return await asyncio.to_thread(self._record, row)
+        except Exception as e:
+            self._stats["registry_errors"] += 1
+            logger.warning(f"Could not record asset {object_path}: {e}")
+            return public_url
+
+    async def _perceptual_hashes(self, fileobj: BinaryIO, content_type: str, size: int) -> Optional[Dict[str, Any]]:
+        if not (content_type or "").startswith("image/") or size > self.max_hash_bytes:
+            return None
+        try:
+            data = await asyncio.to_thread(_read_all, fileobj)
+            return await cpu_executor.run(perceptual_hashes, data)
+        except Exception as e:
+            logger.info(f"No perceptual hash for upload ({e}); exact matching only")
+            return None
+
+    # ── Database ────────────────────────────────────────────────────────────
+
+    def _find_exact(self, user_id: str, bucket: str, content_hash: str) -> Optional[Dict[str, Any]]:
+        result = self._get_supabase().table("media_assets").select("id, public_url").eq(
+            "user_id", user_id
+        ).eq("bucket", bucket).eq("content_hash", content_hash).limit(1).execute()
+        return result.data[0] if result.data else None
+
+    def _reference(self, asset_id: str) -> None:
+        self._get_supabase().rpc("reference_media_asset", {"asset_id": asset_id}).execute()
+
+    def _record(self, row: Dict[str, Any]) -> str:
+        supabase = self._get_supabase()
+        try:
+            result = supabase.table("media_assets").insert(row).execute()
+        except Exception:
+            # Another worker stored the same file first: keep theirs and drop ours
+            existing = self._find_exact(row["user_id"], row["bucket"], row["content_hash"])
+            if not existing:
+                raise
+            self._reference(existing["id"])
+            supabase.storage.from_(row["bucket"]).remove([row["object_path"]])
+            return existing["public_url"]
+
+        stored = result.data[0] if result.data else row
+        index = self._indexes.get((row["user_id"], row["bucket"]))
+        if index is not None and stored.get("id") and row.get("phash"):
+            index.add({**row, "id": stored["id"]})
+        return row["public_url"]
+
+    def _user_index(self, user_id: str, bucket: str) -> _UserIndex:
+        key = (user_id, bucket)
+        index = self._indexes.get(key)
+        if index is not None and time.monotonic() - index.loaded_at < self.index_ttl_seconds:
+            self._indexes.move_to_end(key)
+            return index
+
+        result = self._get_supabase().table("media_assets").select(
+            "id, phash, dhash"
+        ).eq("user_id", user_id).eq("bucket", bucket).gt("ref_count", 0).not_.is_("phash", "null").execute()
+        index = _UserIndex(result.data or [])
+        self._indexes[key] = index
+        self._indexes.move_to_end(key)
+        while len(self._indexes) > self.max_indexed_users:
+            self._indexes.popitem(last=False)
+        return index
+
+    # ── Reference counting and cleanup (called from the scheduler thread) ───
+
+    def release(self, urls: Iterable[str]) -> int:
+        """Drop one reference per URL occurrence (e.g. for each deleted content row using it)"""
+        urls = [url for url in urls if url]
+        if not urls:
+            return 0
+        result = self._get_supabase().rpc("release_media_assets", {"urls": urls}).execute()
+        released = int(result.data or 0)
+        self._stats["released"] += released
+        return released
+
+    def is_registered(self, url: str) -> bool:
+        result = self._get_supabase().table("media_assets").select("id").eq("public_url", url).limit(1).execute()
+        return bool(result.data)
+
+    def discard(self, bucket: str, object_path: str, url: str, release: bool = True) -> bool:
+        """
+        Delete a stored object for a removed content row unless the registry tracks it.
+
+        Registered objects can back several uploads and content rows, so they are only
+        released (when the row is gone for good) and left to collect_garbage(). Returns
+        True when the object itself was removed.
+
+        Args:
+            release: Drop the row's reference now; soft deletes pass False because the
+                monthly purge releases the row's URLs when it removes it
+        """
+        try:
+            registered = self.is_registered(url)
+        except Exception as e:
+            # Without the registry we cannot tell whether other content shares the object
+            logger.warning(f"Kept {object_path}: asset registry unavailable ({e})")
+            return False
+        if registered:
+            if release:
+                self.release([url])
+            logger.info(f"🔗 Left shared upload {object_path} to asset garbage collection")
+            return False
+        self._get_supabase().storage.from_(bucket).remove([object_path])
+        return True
+
+    def collect_garbage(self, limit: int = 500) -> int:
+        """Delete stored objects (and their derivatives) that no content references any more"""
+        supabase = self._get_supabase()
+        cutoff = (datetime.now(timezone.utc) - timedelta(days=self.gc_grace_days)).isoformat()
+        result = supabase.table("media_assets").select("id, user_id, bucket, object_path").lte(
+            "ref_count", 0
+        ).lt("last_referenced_at", cutoff).limit(limit).execute()
+        candidates = result.data or []
+        if not candidates:
+            return 0
+
+        # ref_count counts uploads, and one upload can back several content rows, so
+        # recount live references and keep anything still in use
+        recount = supabase.rpc("recount_media_asset_references", {
+            "asset_ids": [asset["id"] for asset in candidates]
+        }).execute()
+        unreferenced = {row["id"] for row in recount.data or []}
+        orphans = [asset for asset in candidates if asset["id"] in unreferenced]
+        if len(orphans) < len(candidates):
+            logger.info(f"🔗 Kept {len(candidates) - len(orphans)} media assets that content still uses")
+        if not orphans:
+            return 0
+
+        by_bucket: Dict[str, List[str]] = {}
+        for asset in orphans:
+            stem = os.path.splitext(asset["object_path"])[0]
+            by_bucket.setdefault(asset["bucket"], []).extend(
+                [asset["object_path"]] + [
+                    f"derivatives/{stem}/{name}.{fmt}" for name in DERIVATIVE_SPECS for fmt in ENCODERS
+                ]
+            )
+        for bucket, paths in by_bucket.items():
+            for start in range(0, len(paths), 100):
+                supabase.storage.from_(bucket).remove(paths[start:start + 100])
+
+        ids = [asset["id"] for asset in orphans]
+        for start in range(0, len(ids), 100):
+            supabase.table("media_assets").delete().in_("id", ids[start:start + 100]).execute()
+        for key in {(asset["user_id"], asset["bucket"]) for asset in orphans}:
+            self._indexes.pop(key, None)
+
+        self._stats["collected"] += len(orphans)
+        logger.info(f"🧹 Removed {len(orphans)} unreferenced media assets")
+        return len(orphans)
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {**self._stats, "indexed_users": len(self._indexes)}
+
+
+# Create global instance
+asset_registry = AssetRegistry(
+    near_duplicate_distance=int(os.getenv("ASSET_NEAR_DUPLICATE_DISTANCE", "4")),
+    gc_grace_days=int(os.getenv("ASSET_GC_GRACE_DAYS", "7"))
+)
@@ -3,7 +3,7 @@ import re
 import logging
 from typing import Dict, Optional
 
-import requests
+from services.http_clients import http_clients
 
 logger = logging.getLogger(__name__)
 
@@ -46,7 +46,7 @@ class AuthKeyWhatsAppService:
 
         return {"country_code": country_code, "mobile": mobile}
 
-    def send_text(self, phone_number: str, message: str) -> Dict:
+    async def send_text(self, phone_number: str, message: str) -> Dict:
         """
         Send a plain text WhatsApp message using the simple GET API.
         """
@@ -62,14 +62,15 @@ class AuthKeyWhatsAppService:
         }
 
         logger.info(f"Sending AuthKey WhatsApp text to {parts['country_code']}-{parts['mobile']}")
-        resp = requests.get(self.base_get_url, params=params, timeout=15)
-        if not resp.ok:
+        # Not retried: a repeated GET would send the message twice
+        resp = await http_clients.get(self.base_get_url, params=params, timeout=15, retries=0)
+        if not resp.is_success:
             raise ValueError(f"AuthKey API error ({resp.status_code}): {resp.text}")
 
         data = resp.json() if resp.headers.get("content-type", "").startswith("application/json") else {"raw": resp.text}
         return {"success": True, "data": data}
 
-    def send_template(
+    async def send_template(
         self,
         phone_number: str,
         template_id: str,
@@ -110,8 +111,8 @@ class AuthKeyWhatsAppService:
         logger.info(
             f"Sending AuthKey WhatsApp template to {parts['country_code']}-{parts['mobile']} wid={template_id} type={template_type}"
         )
-        resp = requests.post(self.base_post_url, json=payload, headers=headers, timeout=20)
-        if not resp.ok:
+        resp = await http_clients.post(self.base_post_url, json=payload, headers=headers, timeout=20)
+        if not resp.is_success:
             raise ValueError(f"AuthKey template API error ({resp.status_code}): {resp.text}")
 
         data = resp.json() if resp.headers.get("content-type", "").startswith("application/json") else {"raw": resp.text}
@@ -0,0 +1,231 @@
+"""
+Carousel Generator
+Concurrent Gemini image generation for carousel slides
+
+The business logo is downloaded and decoded once per carousel and shared by
+every slide. Slides are generated concurrently, bounded by a process-wide
+Gemini limit and a smaller per-user limit so one large carousel cannot starve
+other users. Each finished image is uploaded to Supabase storage as soon as it
+arrives (outside the Gemini limit, through the asset registry so a slide the
+user already has is not stored twice), and its URL is pushed on the progress
+hub's carousel topic so the client can show slides as they complete without
+touching content-generation progress. Results keep slide order.
+"""
+
+import io
+import os
+import base64
+import asyncio
+import logging
+import uuid
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional
+
+import google.generativeai as genai
+from PIL import Image
+
+from services.asset_registry import asset_registry
+from services.media_asset_cache import media_asset_cache
+from services.progress_hub import progress_hub, CAROUSEL_TOPIC
+
+logger = logging.getLogger(__name__)
+
+GEMINI_IMAGE_MODEL = "gemini-2.5-flash-image"
+CAROUSEL_BUCKET = "ai-generated-images"
+LOGO_REFERENCE_SIZE = (200, 200)
+
+
+class CarouselGenerator:
+    """Generates carousel slide images concurrently under global and per-user limits"""
+
+    def __init__(self, max_concurrency: int = 8, per_user_concurrency: int = 3):
+        self.max_concurrency = max(1, max_concurrency)
+        self.per_user_concurrency = max(1, per_user_concurrency)
+
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._global_limit: Optional[asyncio.Semaphore] = None
+        # user_id -> [semaphore, active carousels]; dropped when the user has none running
+        self._user_limits: Dict[str, List[Any]] = {}
+        self._stats = {"carousels": 0, "slides": 0, "failures": 0}
+
+    # ── Limits ──────────────────────────────────────────────────────────────
+
+    def _bind_loop(self) -> bool:
+        """Bind the shared limits to the running loop on first use; False if called from another loop"""
+        loop = asyncio.get_running_loop()
+        if self._loop is None:
+            self._loop = loop
+            self._global_limit = asyncio.Semaphore(self.max_concurrency)
+        return self._loop is loop
+
+    def _acquire_user_limit(self, user_id: str) -> asyncio.Semaphore:
+        entry = self._user_limits.get(user_id)
+        if entry is None:
+            entry = self._user_limits[user_id] = [asyncio.Semaphore(self.per_user_concurrency), 0]
+        entry[1] += 1
+        return entry[0]
+
+    def _release_user_limit(self, user_id: str) -> None:
+        entry = self._user_limits.get(user_id)
+        if entry is not None:
+            entry[1] -= 1
+            if entry[1] <= 0:
+                del self._user_limits[user_id]
+
+    # ── Logo ────────────────────────────────────────────────────────────────
+
+    @staticmethod
+    def _logo_reference(logo_image: Image.Image) -> Image.Image:
+        logo_image.thumbnail(LOGO_REFERENCE_SIZE)
+        logo_buffer = io.BytesIO()
+        logo_image.save(logo_buffer, format="PNG")
+        logo_buffer.seek(0)
+        reference = Image.open(logo_buffer)
+        reference.load()
+        return reference
+
+    async def _load_logo(self, logo_url: Optional[str]) -> Optional[Image.Image]:
+        """Download and decode the logo once for all slides; None if unavailable"""
+        if not logo_url:
+            return None
+        try:
+            logo_image = await media_asset_cache.get_image(logo_url)
+            reference = await asyncio.to_thread(self._logo_reference, logo_image)
+            logger.info("📎 Logo downloaded for carousel image generation")
+            return reference
+        except Exception as e:
+            logger.warning(f"Could not download logo: {e}")
+            return None
+
+    # ── Slides ──────────────────────────────────────────────────────────────
+
+    @staticmethod
+    def _image_bytes(response) -> Optional[bytes]:
+        """First inline image in a Gemini response, as raw bytes"""
+        if not response or not getattr(response, "candidates", None):
+            return None
+        content = getattr(response.candidates[0], "content", None)
+        for part in getattr(content, "parts", None) or []:
+            inline_data = getattr(part, "inline_data", None)
+            if inline_data and inline_data.data:
+                data = inline_data.data
+                return data if isinstance(data, bytes) else base64.b64decode(data)
+        return None
+
+    async def _generate_slide(self, index: int, prompt: str, logo: Optional[Image.Image],
+                              generation_config, file_path: str, user_id: Optional[str],
+                              global_limit: asyncio.Semaphore, user_limit: asyncio.Semaphore) -> Optional[str]:
+        contents: List[Any] = [prompt]
+        if logo is not None:
+            contents.append(logo)
+
+        async with user_limit:
+            async with global_limit:
+                logger.info(f"🎨 Generating carousel image {index + 1} with Gemini...")
+                model = genai.GenerativeModel(GEMINI_IMAGE_MODEL)
+                response = await model.generate_content_async(contents, generation_config=generation_config)
+
+        image_data = self._image_bytes(response)
+        if not image_data:
+            logger.error(f"❌ No image data received from Gemini for carousel image {index + 1}")
+            return None
+
+        logger.info(f"📤 Uploading carousel image {index + 1} to Supabase: {file_path}")
+        public_url = await asset_registry.upload_bytes(user_id, CAROUSEL_BUCKET, file_path, image_data, "image/png")
+        if public_url:
+            logger.info(f"✅ Carousel image {index + 1} generated and saved to Supabase: {public_url}")
+        return public_url
+
+    async def _notify(self, user_id: Optional[str], carousel_id: str, urls: List[Optional[str]],
+                      done: int) -> None:
+        if not user_id:
+            return
+        try:
+            # Carries every finished slide so a coalesced update never loses one
+            await progress_hub.publish(user_id, {
+                "user_id": user_id,
+                "type": "carousel",
+                "step": "carousel_images",
+                "carousel_id": carousel_id,
+                "percentage": int(done * 100 / len(urls)),
+                "details": f"Generated {done} of {len(urls)} carousel images",
+                "timestamp": datetime.now().isoformat(),
+                "is_generating": done < len(urls),
+                "carousel_images": list(urls),
+            }, topic=CAROUSEL_TOPIC)
+        except Exception as e:
+            logger.error(f"Error pushing carousel progress for user {user_id}: {e}")
+
+    async def generate(self, prompts: List[str], file_path_for: Callable[[int], str],
+                       user_id: Optional[str] = None, logo_url: Optional[str] = None,
+                       generation_config=None) -> List[Optional[str]]:
+        """
+        Generate one image per prompt concurrently.
+
+        Args:
+            prompts: Image prompts, one per slide
+            file_path_for: Storage path for the slide at a given index
+            user_id: Owner of the carousel (per-user limit, storage scope and slide updates)
+            logo_url: Brand logo passed to every slide as a visual reference
+            generation_config: Optional Gemini GenerationConfig
+
+        Returns:
+            List of public URLs in slide order, None for slides that failed
+        """
+        if not prompts:
+            return []
+        if not self._bind_loop():
+            # Called from another event loop: limits cannot be shared, use ones local to this call
+            return await self._generate_with(prompts, file_path_for, user_id, logo_url, generation_config,
+                                             asyncio.Semaphore(self.max_concurrency),
+                                             asyncio.Semaphore(self.per_user_concurrency))
+
+        limit_key = user_id or "anonymous"
+        user_limit = self._acquire_user_limit(limit_key)
+        try:
+            return await self._generate_with(prompts, file_path_for, user_id, logo_url, generation_config,
+                                             self._global_limit, user_limit)
+        finally:
+            self._release_user_limit(limit_key)
+
+    async def _generate_with(self, prompts, file_path_for, user_id, logo_url, generation_config,
+                             global_limit, user_limit) -> List[Optional[str]]:
+        self._stats["carousels"] += 1
+        logo = await self._load_logo(logo_url)
+        urls: List[Optional[str]] = [None] * len(prompts)
+        carousel_id = uuid.uuid4().hex
+        done = 0
+        await self._notify(user_id, carousel_id, urls, done)
+
+        async def run(index: int) -> None:
+            nonlocal done
+            try:
+                urls[index] = await self._generate_slide(index, prompts[index], logo, generation_config,
+                                                         file_path_for(index), user_id, global_limit, user_limit)
+            except Exception as e:
+                logger.error(f"❌ Failed to generate carousel image {index + 1}: {e}")
+            if urls[index]:
+                self._stats["slides"] += 1
+            else:
+                self._stats["failures"] += 1
+            done += 1
+            await self._notify(user_id, carousel_id, urls, done)
+
+        await asyncio.gather(*(run(index) for index in range(len(prompts))))
+        logger.info(f"✅ Generated {sum(1 for url in urls if url)} of {len(prompts)} carousel images")
+        return urls
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            **self._stats,
+            "active_users": len(self._user_limits),
+            "max_concurrency": self.max_concurrency,
+            "per_user_concurrency": self.per_user_concurrency,
+        }
+
+
+# Create global instance
+carousel_generator = CarouselGenerator(
+    max_concurrency=int(os.getenv("CAROUSEL_GEMINI_CONCURRENCY", "8")),
+    per_user_concurrency=int(os.getenv("CAROUSEL_USER_CONCURRENCY", "3"))
+)
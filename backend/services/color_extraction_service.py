@@ -1,178 +1,348 @@
 """
 Color Extraction Service
-Extracts dominant colors from images using PIL/Pillow and color quantization
+Extracts dominant colors from images using NumPy color quantization
+
+Pixels are quantized and packed into 24-bit integers so np.unique builds the
+color histogram in one pass. Candidates are compared in CIE Lab space, where a
+vectorized ΔE keeps near-duplicate shades out of the palette; an optional
+mini-batch k-means over the histogram finds cluster centres instead of bins.
+Results are cached by image content hash, so the same logo is analysed once.
+The async entry points run the analysis on the shared CPU executor.
 """
+import hashlib
 import logging
-import requests
+import os
+import threading
+from collections import OrderedDict
 from io import BytesIO
 from PIL import Image
 import numpy as np
-from typing import List, Tuple
-from collections import Counter
+from typing import Dict, List, Optional, Tuple
+
+from services.cpu_executor import cpu_executor
+from services.http_clients import http_clients
 
 logger = logging.getLogger(__name__)
 
+DEFAULT_COLORS = ['#000000', '#FFFFFF', '#CCCCCC', '#666666']
+
+# Minimum CIE76 ΔE between two palette colors (~10 is a clearly different shade)
+MIN_DELTA_E = 12.0
+
+# sRGB (D65) → XYZ
+_RGB_TO_XYZ = np.array([
+    [0.4124564, 0.3575761, 0.1804375],
+    [0.2126729, 0.7151522, 0.0721750],
+    [0.0193339, 0.1191920, 0.9503041],
+])
+_XYZ_TO_RGB = np.linalg.inv(_RGB_TO_XYZ)
+_D65_WHITE = np.array([0.95047, 1.0, 1.08883])
+
+
+def rgb_to_lab(rgb: np.ndarray) -> np.ndarray:
+    """Convert an (n, 3) array of 0-255 sRGB values to CIE Lab"""
+    srgb = np.asarray(rgb, dtype=np.float64) / 255.0
+    linear = np.where(srgb > 0.04045, ((srgb + 0.055) / 1.055) ** 2.4, srgb / 12.92)
+    xyz = linear @ _RGB_TO_XYZ.T / _D65_WHITE
+    f = np.where(xyz > 216 / 24389, np.cbrt(xyz), (24389 / 27 * xyz + 16) / 116)
+    return np.stack([
+        116 * f[:, 1] - 16,
+        500 * (f[:, 0] - f[:, 1]),
+        200 * (f[:, 1] - f[:, 2]),
+    ], axis=1)
+
+
+def lab_to_rgb(lab: np.ndarray) -> np.ndarray:
+    """Convert an (n, 3) array of CIE Lab values to 0-255 sRGB integers"""
+    lab = np.asarray(lab, dtype=np.float64)
+    fy = (lab[:, 0] + 16) / 116
+    f = np.stack([fy + lab[:, 1] / 500, fy, fy - lab[:, 2] / 200], axis=1)
+    xyz = np.where(f ** 3 > 216 / 24389, f ** 3, (116 * f - 16) / (24389 / 27)) * _D65_WHITE
+    linear = np.clip(xyz @ _XYZ_TO_RGB.T, 0, 1)
+    srgb = np.where(linear > 0.0031308, 1.055 * linear ** (1 / 2.4) - 0.055, 12.92 * linear)
+    return np.clip(np.rint(srgb * 255), 0, 255).astype(np.uint8)
+
 
 class ColorExtractionService:
     """Service for extracting dominant colors from images"""
-    
-    def __init__(self):
-        pass
-    
+
+    def __init__(self, cache_size: int = 512, use_kmeans: bool = False):
+        self.cache_size = cache_size
+        self.use_kmeans = use_kmeans
+        self._cache: "OrderedDict[Tuple[str, int, bool], List[str]]" = OrderedDict()
+        # Public URL → content hash for images whose bytes were already seen (e.g. uploaded logos)
+        self._url_hashes: "OrderedDict[str, str]" = OrderedDict()
+        self._lock = threading.Lock()
+
     def extract_colors_from_url(self, image_url: str, num_colors: int = 4) -> List[str]:
         """
         Extract dominant colors from an image URL
-        
+
         Args:
             image_url: URL of the image
             num_colors: Number of colors to extract (default: 4)
-            
+
         Returns:
             List of hex color codes (e.g., ['#FF0000', '#00FF00', ...])
         """
         try:
+            with self._lock:
+                content_hash = self._url_hashes.get(image_url)
+            if content_hash:
+                cached = self._cache_get((content_hash, num_colors, self.use_kmeans))
+                if cached is not None:
+                    return cached
+
             # Download image from URL
-            response = requests.get(image_url, timeout=10)
+            response = http_clients.sync.get(image_url, timeout=10)
             response.raise_for_status()
-            
-            # Open image from bytes
-            image = Image.open(BytesIO(response.content))
-            
-            return self._extract_colors_from_image(image, num_colors)
-            
+
+            return self.extract_colors_from_bytes(response.content, num_colors)
+
         except Exception as e:
             logger.error(f"Error extracting colors from URL {image_url}: {str(e)}")
             raise
-    
-    def extract_colors_from_bytes(self, image_bytes: bytes, num_colors: int = 4) -> List[str]:
+
+    def extract_colors_from_bytes(self, image_bytes: bytes, num_colors: int = 4,
+                                  source_url: Optional[str] = None) -> List[str]:
         """
         Extract dominant colors from image bytes
-        
+
         Args:
             image_bytes: Image file bytes
             num_colors: Number of colors to extract (default: 4)
-            
+            source_url: Public URL of these bytes, remembered so later URL lookups skip the download
+
         Returns:
             List of hex color codes
         """
         try:
+            content_hash = hashlib.sha256(image_bytes).hexdigest()
+            if source_url:
+                self._remember_url(source_url, content_hash)
+
+            key = (content_hash, num_colors, self.use_kmeans)
+            cached = self._cache_get(key)
+            if cached is not None:
+                return cached
+
             image = Image.open(BytesIO(image_bytes))
-            return self._extract_colors_from_image(image, num_colors)
+            colors = self._extract_colors_from_image(image, num_colors)
+            self._cache_put(key, colors)
+            return list(colors)
         except Exception as e:
             logger.error(f"Error extracting colors from bytes: {str(e)}")
             raise
-    
+
+    async def extract_colors_from_url_async(self, image_url: str, num_colors: int = 4) -> List[str]:
+        """Async extract_colors_from_url: non-blocking download, analysis in a worker process"""
+        try:
+            with self._lock:
+                content_hash = self._url_hashes.get(image_url)
+            if content_hash:
+                cached = self._cache_get((content_hash, num_colors, self.use_kmeans))
+                if cached is not None:
+                    return cached
+
+            response = await http_clients.get(image_url, timeout=10)
+            response.raise_for_status()
+
+            return await self.extract_colors_from_bytes_async(response.content, num_colors, image_url)
+
+        except Exception as e:
+            logger.error(f"Error extracting colors from URL {image_url}: {str(e)}")
+            raise
+
+    async def extract_colors_from_bytes_async(self, image_bytes: bytes, num_colors: int = 4,
+                                              source_url: Optional[str] = None) -> List[str]:
+        """Async extract_colors_from_bytes: the palette is computed on the shared CPU executor"""
+        try:
+            content_hash = hashlib.sha256(image_bytes).hexdigest()
+            if source_url:
+                self._remember_url(source_url, content_hash)
+
+            key = (content_hash, num_colors, self.use_kmeans)
+            cached = self._cache_get(key)
+            if cached is not None:
+                return cached
+
+            colors = await cpu_executor.run(extract_palette, image_bytes, num_colors, self.use_kmeans)
+            self._cache_put(key, colors)
+            return list(colors)
+        except Exception as e:
+            logger.error(f"Error extracting colors from bytes: {str(e)}")
+            raise
+
+    def extract_colors_batch(self, images: List[bytes], num_colors: int = 4) -> List[List[str]]:
+        """
+        Extract dominant colors for several images (identical images are analysed once)
+
+        Args:
+            images: List of image file bytes
+            num_colors: Number of colors to extract per image
+
+        Returns:
+            List of hex color lists, in the order of the input images
+        """
+        results: Dict[str, List[str]] = {}
+        palettes = []
+        for image_bytes in images:
+            content_hash = hashlib.sha256(image_bytes).hexdigest()
+            if content_hash not in results:
+                try:
+                    results[content_hash] = self.extract_colors_from_bytes(image_bytes, num_colors)
+                except Exception:
+                    results[content_hash] = DEFAULT_COLORS[:num_colors]
+            palettes.append(list(results[content_hash]))
+        return palettes
+
+    # ── Cache ────────────────────────────────────────────────────────────────
+
+    def _cache_get(self, key) -> Optional[List[str]]:
+        with self._lock:
+            colors = self._cache.get(key)
+            if colors is None:
+                return None
+            self._cache.move_to_end(key)
+            return list(colors)
+
+    def _cache_put(self, key, colors: List[str]) -> None:
+        with self._lock:
+            self._cache[key] = list(colors)
+            self._cache.move_to_end(key)
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+
+    def _remember_url(self, image_url: str, content_hash: str) -> None:
+        with self._lock:
+            self._url_hashes[image_url] = content_hash
+            self._url_hashes.move_to_end(image_url)
+            while len(self._url_hashes) > self.cache_size:
+                self._url_hashes.popitem(last=False)
+
+    # ── Extraction ───────────────────────────────────────────────────────────
+
     def _extract_colors_from_image(self, image: Image.Image, num_colors: int = 4) -> List[str]:
         """
         Extract dominant colors from a PIL Image
-        
+
         Args:
             image: PIL Image object
             num_colors: Number of colors to extract
-            
+
         Returns:
             List of hex color codes
         """
         try:
-            # Convert image to RGB if necessary
-            if image.mode != 'RGB':
-                image = image.convert('RGB')
-            
             # Resize image for faster processing (max 200x200)
             image.thumbnail((200, 200), Image.Resampling.LANCZOS)
-            
-            # Convert to numpy array
-            img_array = np.array(image)
-            
-            # Reshape to list of pixels
-            pixels = img_array.reshape(-1, 3)
-            
-            # Remove transparent/white background pixels (optional - helps focus on actual colors)
+
+            # Keep the alpha channel so transparent logo backgrounds can be dropped
+            rgba = np.asarray(image.convert('RGBA')).reshape(-1, 4)
+            opaque = rgba[rgba[:, 3] >= 128, :3]
+            all_pixels = opaque if len(opaque) else rgba[:, :3]
+
             # Filter out very light pixels (likely background)
-            pixels = pixels[
-                ~((pixels[:, 0] > 240) & (pixels[:, 1] > 240) & (pixels[:, 2] > 240))
-            ]
-            
+            pixels = all_pixels[~np.all(all_pixels > 240, axis=1)]
             if len(pixels) == 0:
                 # If all pixels were filtered, use original pixels
-                pixels = img_array.reshape(-1, 3)
-            
-            # Use k-means clustering to find dominant colors
-            # For simplicity, we'll use a frequency-based approach
-            # Round colors to reduce color space
-            rounded_pixels = (pixels // 32) * 32  # Round to nearest 32 (reduces to ~8 colors per channel)
-            
-            # Count color frequencies
-            color_counts = Counter(map(tuple, rounded_pixels))
-            
-            # Get most common colors
-            most_common = color_counts.most_common(num_colors * 2)  # Get more to filter
-            
-            # Convert to hex and filter similar colors
-            colors = []
-            for color_tuple, count in most_common:
-                hex_color = self._rgb_to_hex(color_tuple)
-                
-                # Skip if too similar to already selected colors
-                if not self._is_similar_color(hex_color, colors):
-                    colors.append(hex_color)
-                    if len(colors) >= num_colors:
-                        break
-            
-            # If we don't have enough colors, fill with most common remaining
-            while len(colors) < num_colors and len(most_common) > len(colors):
-                for color_tuple, count in most_common:
-                    hex_color = self._rgb_to_hex(color_tuple)
-                    if hex_color not in colors:
-                        colors.append(hex_color)
-                        break
-                else:
-                    break
-            
+                pixels = all_pixels
+
+            if self.use_kmeans:
+                candidates, weights = self._kmeans_candidates(pixels, num_colors)
+            else:
+                candidates, weights = self._histogram_candidates(pixels, bits=3)
+
+            colors = self._select_distinct(candidates, weights, num_colors)
+
             # Ensure we have exactly num_colors
             while len(colors) < num_colors:
                 colors.append('#000000')  # Default black if needed
-            
+
             return colors[:num_colors]
-            
+
         except Exception as e:
             logger.error(f"Error in color extraction: {str(e)}")
             # Return default colors on error
-            return ['#000000', '#FFFFFF', '#CCCCCC', '#666666'][:num_colors]
-    
-    def _rgb_to_hex(self, rgb: Tuple[int, int, int]) -> str:
-        """Convert RGB tuple to hex color code"""
-        return f"#{rgb[0]:02X}{rgb[1]:02X}{rgb[2]:02X}"
-    
-    def _is_similar_color(self, hex_color: str, existing_colors: List[str], threshold: int = 30) -> bool:
+            return DEFAULT_COLORS[:num_colors]
+
+    @staticmethod
+    def _histogram_candidates(pixels: np.ndarray, bits: int) -> Tuple[np.ndarray, np.ndarray]:
         """
-        Check if a color is too similar to existing colors
-        
-        Args:
-            hex_color: Hex color to check
-            existing_colors: List of existing hex colors
-            threshold: Color difference threshold
-            
-        Returns:
-            True if color is similar to any existing color
+        Quantize to `bits` per channel and count colors via packed 24-bit integers.
+
+        Each bin is represented by the mean of its pixels rather than the bin corner,
+        so a shade split across a bin boundary yields two nearly equal colors that the
+        ΔE filter then merges.
         """
-        if not existing_colors:
-            return False
-        
-        def hex_to_rgb(hex_str):
-            hex_str = hex_str.lstrip('#')
-            return tuple(int(hex_str[i:i+2], 16) for i in (0, 2, 4))
-        
-        def color_distance(rgb1, rgb2):
-            return sum((a - b) ** 2 for a, b in zip(rgb1, rgb2)) ** 0.5
-        
-        new_rgb = hex_to_rgb(hex_color)
-        
-        for existing_hex in existing_colors:
-            existing_rgb = hex_to_rgb(existing_hex)
-            distance = color_distance(new_rgb, existing_rgb)
-            if distance < threshold:
-                return True
-        
-        return False
+        shift = 8 - bits
+        pixels = pixels.astype(np.uint32)
+        quantized = pixels >> shift
+        packed = (quantized[:, 0] << 16) | (quantized[:, 1] << 8) | quantized[:, 2]
+        _, inverse, counts = np.unique(packed, return_inverse=True, return_counts=True)
+        means = np.stack([
+            np.bincount(inverse, weights=pixels[:, channel], minlength=len(counts))
+            for channel in range(3)
+        ], axis=1) / counts[:, None]
+        order = np.argsort(-counts, kind='stable')
+        return np.rint(means[order]).astype(np.uint8), counts[order]
+
+    def _kmeans_candidates(self, pixels: np.ndarray, num_colors: int) -> Tuple[np.ndarray, np.ndarray]:
+        """Mini-batch k-means in Lab space over a fine histogram (weighted by pixel counts)"""
+        from sklearn.cluster import MiniBatchKMeans
+
+        rgb, counts = self._histogram_candidates(pixels, bits=5)
+        n_clusters = min(len(rgb), num_colors * 2)
+        if n_clusters <= num_colors:
+            return rgb, counts
+
+        lab = rgb_to_lab(rgb)
+        kmeans = MiniBatchKMeans(n_clusters=n_clusters, random_state=0, n_init=3,
+                                 batch_size=min(1024, len(lab)))
+        labels = kmeans.fit_predict(lab, sample_weight=counts)
+        weights = np.bincount(labels, weights=counts, minlength=n_clusters)
+        order = np.argsort(-weights, kind='stable')
+        return lab_to_rgb(kmeans.cluster_centers_[order]), weights[order]
+
+    def _select_distinct(self, candidates: np.ndarray, weights: np.ndarray, num_colors: int) -> List[str]:
+        """Greedily take the most frequent colors that are at least MIN_DELTA_E apart"""
+        candidates = candidates[:max(num_colors * 8, 32)]
+        lab = rgb_to_lab(candidates)
+        # Pairwise ΔE between all candidates in one shot
+        delta_e = np.linalg.norm(lab[:, None, :] - lab[None, :, :], axis=2)
+        selected: List[int] = []
+        for index in range(len(candidates)):
+            if selected and delta_e[index, selected].min() < MIN_DELTA_E:
+                continue
+            selected.append(index)
+            if len(selected) >= num_colors:
+                break
+
+        colors = [self._rgb_to_hex(candidates[index]) for index in selected]
+
+        # If we don't have enough distinct colors, fill with most common remaining
+        for index in range(len(candidates)):
+            if len(colors) >= num_colors:
+                break
+            hex_color = self._rgb_to_hex(candidates[index])
+            if hex_color not in colors:
+                colors.append(hex_color)
+
+        return colors
+
+    def _rgb_to_hex(self, rgb: Tuple[int, int, int]) -> str:
+        """Convert RGB tuple to hex color code"""
+        return f"#{int(rgb[0]):02X}{int(rgb[1]):02X}{int(rgb[2]):02X}"
+
+
+def extract_palette(image_bytes: bytes, num_colors: int, use_kmeans: bool) -> List[str]:
+    """Uncached palette extraction (runs in a CPU executor worker process)"""
+    extractor = ColorExtractionService(cache_size=0, use_kmeans=use_kmeans)
+    return extractor._extract_colors_from_image(Image.open(BytesIO(image_bytes)), num_colors)
+
 
+# Create global instance
+color_extraction_service = ColorExtractionService(
+    cache_size=int(os.getenv("COLOR_EXTRACTION_CACHE_SIZE", "512")),
+    use_kmeans=os.getenv("COLOR_EXTRACTION_KMEANS", "false").lower() == "true"
+)
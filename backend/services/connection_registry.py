@@ -0,0 +1,243 @@
+"""
+Connection Registry
+Process-wide cache of platform connection rows and decrypted tokens
+
+Integrations used to query platform_connections and build a new Fernet for every
+operation. The registry keeps one cipher, caches connection lookups per
+(user, platform) for a bounded time, and memoizes decrypted tokens in memory
+only (never persisted or logged). Every code path that writes a connection row
+calls invalidate() so the next lookup in this process reads the new row; the
+cache is process-local, so the short TTL bounds how long other workers can
+serve a stale row.
+"""
+
+import os
+import time
+import logging
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+from cryptography.fernet import Fernet
+from supabase import create_client, Client
+
+logger = logging.getLogger(__name__)
+
+# Tables searched in order: OAuth connections first, then token-based connections
+CONNECTION_TABLES = (
+    ("platform_connections", "oauth"),
+    ("social_media_connections", "token"),
+)
+
+# Platform aliases used across the codebase
+PLATFORM_ALIASES = {
+    "gmail": "google",
+    "drive": "google",
+}
+
+
+def normalize_platform(platform: str) -> str:
+    platform = (platform or "").strip().lower()
+    return PLATFORM_ALIASES.get(platform, platform)
+
+
+class ConnectionRegistry:
+    """TTL-bounded cache of active connections and their decrypted credentials"""
+
+    def __init__(self, ttl_seconds: float = 60.0, negative_ttl_seconds: float = 30.0,
+                 max_entries: int = 10000, max_tokens: int = 10000):
+        self.ttl_seconds = ttl_seconds
+        self.negative_ttl_seconds = negative_ttl_seconds
+        self.max_entries = max_entries
+        self.max_tokens = max_tokens
+
+        self._lock = threading.RLock()
+        # (user_id, platform) -> (expires_at, connection row or None)
+        self._connections: "OrderedDict[Tuple[str, str], Tuple[float, Optional[Dict[str, Any]]]]" = OrderedDict()
+        # encrypted token -> plaintext
+        self._tokens: "OrderedDict[str, str]" = OrderedDict()
+        # Lookups in flight per key, and a counter bumped when one of those keys is
+        # invalidated so a lookup that raced with it is not cached. Both are dropped
+        # once the last lookup for the key finishes.
+        self._loading: Dict[Tuple[str, str], int] = {}
+        self._generation: Dict[Tuple[str, str], int] = {}
+
+        self._cipher: Optional[Fernet] = None
+        self._cipher_key: Optional[str] = None
+        self._supabase: Optional[Client] = None
+        self._stats = {"hits": 0, "misses": 0, "token_hits": 0, "token_misses": 0, "invalidations": 0}
+
+    # ── Encryption ──────────────────────────────────────────────────────────
+
+    def _get_cipher(self) -> Fernet:
+        key = os.getenv("ENCRYPTION_KEY")
+        if not key:
+            raise ValueError("ENCRYPTION_KEY not found")
+        with self._lock:
+            if self._cipher is None or key != self._cipher_key:
+                self._cipher = Fernet(key.encode())
+                self._cipher_key = key
+                self._tokens.clear()
+            return self._cipher
+
+    def encrypt_token(self, token: str) -> str:
+        """Encrypt a token for storage"""
+        return self._get_cipher().encrypt(token.encode()).decode()
+
+    def decrypt_token(self, encrypted_token: str) -> str:
+        """Decrypt a stored token; raises on a missing key or an invalid token"""
+        cipher = self._get_cipher()
+        with self._lock:
+            plaintext = self._tokens.get(encrypted_token)
+            if plaintext is not None:
+                self._tokens.move_to_end(encrypted_token)
+                self._stats["token_hits"] += 1
+                return plaintext
+
+        plaintext = cipher.decrypt(encrypted_token.encode()).decode()
+        with self._lock:
+            self._stats["token_misses"] += 1
+            self._tokens[encrypted_token] = plaintext
+            while len(self._tokens) > self.max_tokens:
+                self._tokens.popitem(last=False)
+        return plaintext
+
+    def _decrypt_or_raw(self, value: Optional[str]) -> Optional[str]:
+        """Decrypt a stored token, passing legacy plaintext tokens through"""
+        if not value:
+            return None
+        try:
+            return self.decrypt_token(value)
+        except ValueError:
+            raise
+        except Exception:
+            return value
+
+    # ── Connections ─────────────────────────────────────────────────────────
+
+    def _get_supabase(self) -> Client:
+        if self._supabase is None:
+            supabase_url = os.getenv("SUPABASE_URL")
+            supabase_key = os.getenv("SUPABASE_SERVICE_ROLE_KEY") or os.getenv("SUPABASE_ANON_KEY")
+            if not supabase_url or not supabase_key:
+                raise ValueError("SUPABASE_URL and SUPABASE_SERVICE_ROLE_KEY must be set")
+            self._supabase = create_client(supabase_url, supabase_key)
+        return self._supabase
+
+    def _load_connection(self, user_id: str, platform: str) -> Optional[Dict[str, Any]]:
+        supabase = self._get_supabase()
+        for table, connection_type in CONNECTION_TABLES:
+            try:
+                result = supabase.table(table).select("*").eq(
+                    "user_id", user_id
+                ).eq("platform", platform).eq("is_active", True).limit(1).execute()
+            except Exception as e:
+                logger.error(f"Error loading {platform} connection from {table}: {e}")
+                continue
+            if result.data:
+                return {**result.data[0], "connection_type": connection_type}
+        return None
+
+    def get_connection(self, user_id: str, platform: str) -> Optional[Dict[str, Any]]:
+        """Active connection row for a user's platform (cached), or None"""
+        if not user_id or not platform:
+            return None
+        key = (user_id, normalize_platform(platform))
+        now = time.monotonic()
+
+        with self._lock:
+            cached = self._connections.get(key)
+            if cached is not None and cached[0] > now:
+                self._connections.move_to_end(key)
+                self._stats["hits"] += 1
+                return dict(cached[1]) if cached[1] is not None else None
+            self._stats["misses"] += 1
+            generation = self._generation.get(key, 0)
+            self._loading[key] = self._loading.get(key, 0) + 1
+
+        try:
+            connection = self._load_connection(*key)
+        finally:
+            with self._lock:
+                raced = self._generation.get(key, 0) != generation
+                self._loading[key] -= 1
+                if not self._loading[key]:
+                    del self._loading[key]
+                    self._generation.pop(key, None)
+
+        with self._lock:
+            if not raced:
+                ttl = self.ttl_seconds if connection is not None else self.negative_ttl_seconds
+                self._connections[key] = (time.monotonic() + ttl, connection)
+                self._connections.move_to_end(key)
+                while len(self._connections) > self.max_entries:
+                    self._connections.popitem(last=False)
+        return dict(connection) if connection is not None else None
+
+    def get_credentials(self, user_id: str, platform: str) -> Optional[Dict[str, Any]]:
+        """
+        Decrypted credentials for a user's active platform connection.
+
+        Returns None when the user has no active connection. Tokens stored in
+        plaintext by older connection flows are returned unchanged.
+        """
+        connection = self.get_connection(user_id, platform)
+        if connection is None:
+            return None
+
+        encrypted_access = connection.get("access_token_encrypted") or connection.get("access_token")
+        encrypted_refresh = connection.get("refresh_token_encrypted") or connection.get("refresh_token")
+        return {
+            "platform": normalize_platform(platform),
+            "connection_id": connection.get("id"),
+            "connection_type": connection["connection_type"],
+            "access_token": self._decrypt_or_raw(encrypted_access),
+            "refresh_token": self._decrypt_or_raw(encrypted_refresh),
+            "account_id": connection.get("page_id") or connection.get("account_id"),
+            "account_name": connection.get("page_name") or connection.get("account_name"),
+            "token_expires_at": connection.get("token_expires_at"),
+            "connection": connection,
+        }
+
+    def invalidate(self, user_id: str, platform: Optional[str] = None) -> None:
+        """Drop cached connections for a user (one platform, or all when omitted)"""
+        with self._lock:
+            if platform:
+                keys = [(user_id, normalize_platform(platform))]
+            else:
+                keys = [key for key in self._connections if key[0] == user_id]
+            for key in keys:
+                entry = self._connections.pop(key, None)
+                if key in self._loading:
+                    self._generation[key] = self._generation.get(key, 0) + 1
+                if entry is not None and entry[1] is not None:
+                    self._forget_tokens(entry[1])
+            self._stats["invalidations"] += 1
+
+    def _forget_tokens(self, connection: Dict[str, Any]) -> None:
+        for field in ("access_token_encrypted", "refresh_token_encrypted", "access_token", "refresh_token"):
+            value = connection.get(field)
+            if value:
+                self._tokens.pop(value, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._connections.clear()
+            self._tokens.clear()
+            for key in self._loading:
+                self._generation[key] = self._generation.get(key, 0) + 1
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                **self._stats,
+                "connections_cached": len(self._connections),
+                "tokens_cached": len(self._tokens),
+            }
+
+
+# Create global instance
+connection_registry = ConnectionRegistry(
+    ttl_seconds=float(os.getenv("CONNECTION_CACHE_TTL_SECONDS", "60")),
+    max_entries=int(os.getenv("CONNECTION_CACHE_MAX_ENTRIES", "10000"))
+)
@@ -0,0 +1,266 @@
+"""
+Write-behind persistence for ATSN conversation messages
+Buffers messages per conversation in memory and flushes them to Supabase in batched upserts
+"""
+
+import os
+import asyncio
+import logging
+import threading
+from typing import Dict, Any, List, Optional
+from supabase import create_client, Client
+
+logger = logging.getLogger(__name__)
+
+MESSAGES_TABLE = "atsn_conversation_messages"
+
+
+class ConversationWriter:
+    """
+    Buffers messages per conversation and writes them behind the request.
+
+    Sequence numbers are reserved from the conversation row at flush time
+    (reserve_atsn_message_sequences), so several workers appending to the same
+    conversation never hand out the same number. Rows are upserted on
+    (conversation_id, message_sequence) and keep their sequence when a batch is
+    retried, so retries never create duplicates. A conversation whose flush keeps
+    failing (or that no longer exists) has its rows dropped after max_attempts.
+    """
+
+    def __init__(self, supabase_client: Client, flush_interval: float = 2.0,
+                 max_batch_size: int = 100, max_attempts: int = 5):
+        self.supabase = supabase_client
+        self.flush_interval = flush_interval
+        self.max_batch_size = max_batch_size
+        self.max_attempts = max(1, max_attempts)
+
+        # conversation_id -> appended rows waiting for sequence numbers
+        self._buffers: Dict[str, List[Dict[str, Any]]] = {}
+        # conversation_id -> full message list (sequences 1..n) replacing the stored one
+        self._replacements: Dict[str, List[Dict[str, Any]]] = {}
+        # conversation_id -> rows that already have sequences but failed to write
+        self._retries: Dict[str, List[Dict[str, Any]]] = {}
+        # conversation_id -> consecutive failed flushes
+        self._attempts: Dict[str, int] = {}
+        self._pending_rows = 0
+        self._lock = threading.Lock()
+
+        self._flush_task: Optional[asyncio.Task] = None
+        self._flush_event: Optional[asyncio.Event] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+        self.stats = {"rows_written": 0, "batches_written": 0, "flush_errors": 0, "rows_dropped": 0}
+
+    # ------------------------------------------------------------------
+    # Enqueueing
+    # ------------------------------------------------------------------
+
+    def enqueue(self, conversation_id: str, user_id: str, messages: List[Dict[str, Any]]) -> int:
+        """
+        Buffer messages to append to a conversation.
+        Sequence numbers are assigned when the rows are flushed. Returns the number of rows queued.
+        """
+        if not messages:
+            return 0
+        rows = [
+            {**message, "conversation_id": conversation_id, "user_id": user_id}
+            for message in messages
+        ]
+        with self._lock:
+            self._buffer_rows(self._buffers, conversation_id, rows)
+        return len(rows)
+
+    def replace(self, conversation_id: str, user_id: str, messages: List[Dict[str, Any]]) -> int:
+        """
+        Buffer the full ordered message list of a conversation.
+        Sequences are 1..n; any stored rows beyond n are deleted at flush time,
+        before messages enqueued after this call are written.
+        """
+        rows = [
+            {
+                **message,
+                "conversation_id": conversation_id,
+                "user_id": user_id,
+                "message_sequence": index,
+            }
+            for index, message in enumerate(messages, start=1)
+        ]
+        with self._lock:
+            # Anything still buffered for this conversation is superseded by the full list
+            for superseded in (self._buffers, self._replacements, self._retries):
+                self._pending_rows -= len(superseded.pop(conversation_id, []))
+            self._attempts.pop(conversation_id, None)
+            self._buffer_rows(self._replacements, conversation_id, rows)
+        return len(rows)
+
+    def _buffer_rows(self, buffers: Dict[str, List[Dict[str, Any]]], conversation_id: str,
+                     rows: List[Dict[str, Any]]):
+        buffers.setdefault(conversation_id, []).extend(rows)
+        self._pending_rows += len(rows)
+        if self._pending_rows >= self.max_batch_size:
+            self._wake_flusher()
+
+    def _wake_flusher(self):
+        if not self._flush_event or not self._loop:
+            return
+        try:
+            running_loop = asyncio.get_running_loop()
+        except RuntimeError:
+            running_loop = None
+        if running_loop is self._loop:
+            self._flush_event.set()
+        else:
+            self._loop.call_soon_threadsafe(self._flush_event.set)
+
+    # ------------------------------------------------------------------
+    # Flushing
+    # ------------------------------------------------------------------
+
+    def _drain(self):
+        with self._lock:
+            drained = self._replacements, self._buffers, self._retries
+            self._replacements, self._buffers, self._retries = {}, {}, {}
+            self._pending_rows = 0
+        return drained
+
+    def _requeue(self, conversation_id: str, replacement: Optional[List[Dict[str, Any]]],
+                 rows: List[Dict[str, Any]], sequenced: List[Dict[str, Any]]):
+        with self._lock:
+            if conversation_id in self._replacements:
+                # A newer full list arrived meanwhile and supersedes everything that failed
+                self._attempts.pop(conversation_id, None)
+                return
+            if replacement is not None:
+                self._replacements[conversation_id] = replacement
+            self._buffers[conversation_id] = rows + self._buffers.get(conversation_id, [])
+            self._retries[conversation_id] = sequenced + self._retries.get(conversation_id, [])
+            self._pending_rows += len(rows) + len(sequenced) + len(replacement or [])
+
+    def _reserve_sequences(self, conversation_id: str, count: int, reset_to: Optional[int] = None) -> int:
+        """Reserve count sequence numbers in the database and return the last one"""
+        result = self.supabase.rpc("reserve_atsn_message_sequences", {
+            "p_conversation_id": conversation_id,
+            "p_message_count": count,
+            "p_reset_to": reset_to,
+        }).execute()
+        if result.data is None:
+            raise ValueError(f"Conversation {conversation_id} not found")
+        return result.data
+
+    def _upsert(self, rows: List[Dict[str, Any]]) -> int:
+        for start in range(0, len(rows), self.max_batch_size):
+            batch = rows[start:start + self.max_batch_size]
+            self.supabase.table(MESSAGES_TABLE).upsert(
+                batch, on_conflict="conversation_id,message_sequence"
+            ).execute()
+            self.stats["batches_written"] += 1
+        return len(rows)
+
+    def _flush_conversation(self, conversation_id: str, replacement: Optional[List[Dict[str, Any]]],
+                            rows: List[Dict[str, Any]], sequenced: List[Dict[str, Any]]) -> int:
+        written = 0
+        try:
+            if replacement is not None:
+                # Truncate before writing so rows appended after the replacement survive
+                self.supabase.table(MESSAGES_TABLE).delete().eq(
+                    "conversation_id", conversation_id
+                ).gt("message_sequence", len(replacement)).execute()
+                written += self._upsert(replacement)
+            if replacement is not None or rows:
+                last_sequence = self._reserve_sequences(
+                    conversation_id, len(rows),
+                    reset_to=len(replacement) if replacement is not None else None
+                )
+                for sequence, row in enumerate(rows, start=last_sequence - len(rows) + 1):
+                    row["message_sequence"] = sequence
+                replacement, rows, sequenced = None, [], sequenced + rows
+            written += self._upsert(sequenced)
+        except Exception as e:
+            self.stats["flush_errors"] += 1
+            with self._lock:
+                attempts = self._attempts[conversation_id] = self._attempts.get(conversation_id, 0) + 1
+            # A missing conversation will never accept the rows, so don't retry it
+            if isinstance(e, ValueError) or attempts >= self.max_attempts:
+                dropped = len(rows) + len(sequenced) + len(replacement or [])
+                with self._lock:
+                    self._attempts.pop(conversation_id, None)
+                self.stats["rows_dropped"] += dropped
+                logger.error(f"Dropped {dropped} messages for conversation {conversation_id} "
+                             f"after {attempts} failed flush(es): {e}")
+                return written
+            logger.error(f"Error flushing messages for conversation {conversation_id} "
+                         f"(attempt {attempts}/{self.max_attempts}): {e}")
+            self._requeue(conversation_id, replacement, rows, sequenced)
+            return written
+        with self._lock:
+            self._attempts.pop(conversation_id, None)
+        return written
+
+    def flush_sync(self) -> int:
+        """Write all buffered rows. Returns the number of rows written."""
+        replacements, buffers, retries = self._drain()
+        written = 0
+
+        for conversation_id in set(replacements) | set(buffers) | set(retries):
+            written += self._flush_conversation(
+                conversation_id,
+                replacements.get(conversation_id),
+                buffers.get(conversation_id, []),
+                retries.get(conversation_id, []),
+            )
+
+        self.stats["rows_written"] += written
+        if written:
+            logger.info(f"Flushed {written} ATSN conversation messages")
+        return written
+
+    async def flush(self) -> int:
+        return await asyncio.to_thread(self.flush_sync)
+
+    async def _run(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._flush_event.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._flush_event.clear()
+            try:
+                await self.flush()
+            except Exception as e:
+                logger.error(f"Error in conversation writer flush loop: {e}")
+
+    def start(self):
+        """Start the background flush loop on the running event loop"""
+        if self._flush_task and not self._flush_task.done():
+            return
+        self._loop = asyncio.get_running_loop()
+        self._flush_event = asyncio.Event()
+        self._flush_task = self._loop.create_task(self._run())
+        logger.info(f"Conversation writer started (interval {self.flush_interval}s, batch {self.max_batch_size})")
+
+    async def stop(self):
+        """Stop the flush loop and write out anything still buffered"""
+        if self._flush_task:
+            self._flush_task.cancel()
+            try:
+                await self._flush_task
+            except asyncio.CancelledError:
+                pass
+            self._flush_task = None
+        await self.flush()
+        logger.info("Conversation writer stopped")
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            pending = self._pending_rows
+            conversations = len(set(self._buffers) | set(self._replacements) | set(self._retries))
+        return {**self.stats, "pending_rows": pending, "pending_conversations": conversations}
+
+
+# Create global instance
+conversation_writer = ConversationWriter(
+    create_client(os.getenv("SUPABASE_URL"), os.getenv("SUPABASE_SERVICE_ROLE_KEY")),
+    flush_interval=float(os.getenv("ATSN_WRITE_BEHIND_INTERVAL_SECONDS", "2")),
+    max_batch_size=int(os.getenv("ATSN_WRITE_BEHIND_BATCH_SIZE", "100")),
+    max_attempts=int(os.getenv("ATSN_WRITE_BEHIND_MAX_ATTEMPTS", "5"))
+)
@@ -0,0 +1,221 @@
+"""
+CPU Executor
+Shared process pool for CPU-bound image work
+
+Decoding, resampling and encoding images with PIL holds the GIL,
+so doing it inline in a request handler (or in asyncio.to_thread) stalls every
+other request on the worker. This service owns one warm ProcessPoolExecutor for
+the whole app. Image operations take and return encoded bytes so only
+compressed data crosses the process boundary, and the number of jobs queued at
+once is bounded so a burst of uploads waits instead of piling up in memory.
+Workers are started with forkserver (spawn where unavailable) rather than
+fork, so they never inherit the app's threads, locks or open connections.
+
+Any picklable module-level function can be run with `run()` (async) or
+`run_sync()` (from synchronous code, e.g. the RL agent).
+"""
+
+import io
+import os
+import asyncio
+import logging
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from PIL import Image, ImageOps
+
+logger = logging.getLogger(__name__)
+
+# ── Image operations (run in worker processes) ──────────────────────────────
+
+def _open(data: bytes, max_size: Optional[Tuple[int, int]] = None) -> Image.Image:
+    image = Image.open(io.BytesIO(data))
+    if max_size and image.format == "JPEG":
+        # Let the JPEG decoder skip detail that is about to be thrown away
+        image.draft("RGB", max_size)
+    image = ImageOps.exif_transpose(image)
+    if max_size:
+        image.thumbnail(max_size, Image.Resampling.LANCZOS)
+    return image
+
+
+def _flatten(image: Image.Image, background: Tuple[int, int, int]) -> Image.Image:
+    """Composite transparency onto a solid background (JPEG and friends have no alpha)"""
+    if image.mode in ("RGBA", "LA") or (image.mode == "P" and "transparency" in image.info):
+        rgba = image.convert("RGBA")
+        flat = Image.new("RGBA", rgba.size, background + (255,))
+        return Image.alpha_composite(flat, rgba).convert("RGB")
+    return image.convert("RGB")
+
+
+def _save(image: Image.Image, fmt: str, quality: Optional[int] = None,
+          background: Optional[Tuple[int, int, int]] = None, **options) -> bytes:
+    fmt = fmt.upper()
+    if fmt in ("JPG", "JPEG"):
+        fmt = "JPEG"
+        image = _flatten(image, background or (255, 255, 255))
+    elif background is not None:
+        image = _flatten(image, background)
+    elif image.mode not in ("RGB", "RGBA", "L", "LA", "P"):
+        image = image.convert("RGBA")
+    if quality is not None and fmt != "PNG":
+        options["quality"] = quality
+    buffer = io.BytesIO()
+    image.save(buffer, format=fmt, **options)
+    return buffer.getvalue()
+
+
+def resize_image(data: bytes, max_size: Tuple[int, int], fmt: str = "PNG",
+                 quality: Optional[int] = None, **options) -> bytes:
+    """Downscale to fit within max_size (never upscales) and re-encode"""
+    return _save(_open(data, max_size), fmt, quality, **options)
+
+
+def encode_image(data: bytes, fmt: str, quality: Optional[int] = None,
+                 max_size: Optional[Tuple[int, int]] = None,
+                 background: Optional[Tuple[int, int, int]] = None, **options) -> bytes:
+    """Transcode to another format, flattening transparency onto background if given"""
+    return _save(_open(data, max_size), fmt, quality, background, **options)
+
+
+def _warm_worker() -> int:
+    # Forces the worker to start and import PIL's encoders before the first real job
+    Image.init()
+    return os.getpid()
+
+
+# ── Executor ─────────────────────────────────────────────────────────────────
+
+class CPUExecutor:
+    """Bounded, shared process pool for CPU-heavy work"""
+
+    def __init__(self, max_workers: int = 2, max_pending: int = 32, start_method: str = "forkserver"):
+        self.max_workers = max(1, max_workers)
+        self.max_pending = max(self.max_workers, max_pending)
+        if start_method not in multiprocessing.get_all_start_methods():
+            start_method = "spawn"
+        self.start_method = start_method
+
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._executor_lock = threading.Lock()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._pending: Optional[asyncio.Semaphore] = None
+        self._stats = {"jobs": 0, "failures": 0, "restarts": 0, "waiting": 0}
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        with self._executor_lock:
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.max_workers,
+                    mp_context=multiprocessing.get_context(self.start_method)
+                )
+            return self._executor
+
+    def _reset_executor(self, broken: ProcessPoolExecutor) -> None:
+        """Replace a pool whose worker died (e.g. OOM-killed) so later jobs still run"""
+        with self._executor_lock:
+            if self._executor is broken:
+                self._executor = None
+                self._stats["restarts"] += 1
+        broken.shutdown(wait=False, cancel_futures=True)
+
+    def _bind_loop(self) -> bool:
+        """Bind the pending-job limit to the running loop on first use; False if called from another loop"""
+        loop = asyncio.get_running_loop()
+        if self._loop is None:
+            self._loop = loop
+            self._pending = asyncio.Semaphore(self.max_pending)
+        return self._loop is loop
+
+    async def start(self) -> None:
+        """Start every worker process now instead of on the first request"""
+        executor = self._get_executor()
+        loop = asyncio.get_running_loop()
+        pids = await asyncio.gather(*(
+            loop.run_in_executor(executor, _warm_worker) for _ in range(self.max_workers)
+        ))
+        logger.info(f"CPU executor started with {len(set(pids))} worker processes")
+
+    def shutdown(self) -> None:
+        with self._executor_lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    # ── Running jobs ────────────────────────────────────────────────────────
+
+    async def _submit(self, fn: Callable, *args, **kwargs) -> Any:
+        loop = asyncio.get_running_loop()
+        for attempt in range(2):
+            executor = self._get_executor()
+            try:
+                return await loop.run_in_executor(executor, _call, fn, args, kwargs)
+            except BrokenProcessPool:
+                self._reset_executor(executor)
+                if attempt:
+                    raise
+
+    async def run(self, fn: Callable, *args, **kwargs) -> Any:
+        """Run a picklable module-level function in the pool and await its result"""
+        self._stats["jobs"] += 1
+        try:
+            if not self._bind_loop():
+                return await self._submit(fn, *args, **kwargs)
+            if self._pending.locked():
+                self._stats["waiting"] += 1
+            async with self._pending:
+                return await self._submit(fn, *args, **kwargs)
+        except Exception:
+            self._stats["failures"] += 1
+            raise
+
+    def run_sync(self, fn: Callable, *args, **kwargs) -> Any:
+        """Blocking variant for synchronous callers; the GIL is released while waiting"""
+        self._stats["jobs"] += 1
+        for attempt in range(2):
+            executor = self._get_executor()
+            try:
+                return executor.submit(_call, fn, args, kwargs).result()
+            except BrokenProcessPool:
+                self._reset_executor(executor)
+                if attempt:
+                    self._stats["failures"] += 1
+                    raise
+            except Exception:
+                self._stats["failures"] += 1
+                raise
+
+    # ── Image operations ────────────────────────────────────────────────────
+
+    async def resize(self, data: bytes, max_size: Tuple[int, int], fmt: str = "PNG",
+                     quality: Optional[int] = None, **options) -> bytes:
+        return await self.run(resize_image, data, max_size, fmt, quality, **options)
+
+    async def encode(self, data: bytes, fmt: str, quality: Optional[int] = None,
+                     max_size: Optional[Tuple[int, int]] = None,
+                     background: Optional[Tuple[int, int, int]] = None, **options) -> bytes:
+        return await self.run(encode_image, data, fmt, quality, max_size, background, **options)
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            **self._stats,
+            "max_workers": self.max_workers,
+            "max_pending": self.max_pending,
+            "start_method": self.start_method,
+            "running": self._executor is not None,
+        }
+
+
+def _call(fn: Callable, args: tuple, kwargs: dict) -> Any:
+    return fn(*args, **kwargs)
+
+
+# Create global instance
+cpu_executor = CPUExecutor(
+    max_workers=int(os.getenv("CPU_EXECUTOR_WORKERS", str(min(4, os.cpu_count() or 1)))),
+    max_pending=int(os.getenv("CPU_EXECUTOR_MAX_PENDING", "32")),
+    start_method=os.getenv("CPU_EXECUTOR_START_METHOD", "forkserver")
+)
@@ -0,0 +1,244 @@
+"""
+HTML Renderer
+Warm pool of headless Chromium pages for HTML → PNG rendering
+
+One browser is launched per process and kept alive. Each pooled page lives in its
+own browser context; a render borrows a page, loads the HTML with set_content,
+waits until fonts and every <img> have decoded (instead of a fixed sleep), takes
+the screenshot and resets the page to about:blank before returning it. The pool
+size bounds concurrent renders; pages are recycled after a number of uses and
+replaced whenever a render fails.
+"""
+
+import os
+import asyncio
+import logging
+from typing import Optional, Tuple
+
+try:
+    from playwright.async_api import async_playwright
+    PLAYWRIGHT_AVAILABLE = True
+except ImportError:
+    PLAYWRIGHT_AVAILABLE = False
+
+logger = logging.getLogger(__name__)
+
+BROWSER_ARGS = ["--disable-dev-shm-usage", "--no-sandbox"]
+
+# Resolves once web fonts are loaded and every image has decoded (or failed)
+READY_SCRIPT = """
+async () => {
+    if (document.fonts && document.fonts.ready) {
+        await document.fonts.ready;
+    }
+    const images = Array.from(document.images);
+    await Promise.all(images.map(img => {
+        if (img.complete && img.naturalWidth > 0) {
+            return img.decode ? img.decode().catch(() => null) : null;
+        }
+        return new Promise(resolve => {
+            img.addEventListener('load', () => resolve(null), { once: true });
+            img.addEventListener('error', () => resolve(null), { once: true });
+        }).then(() => img.decode ? img.decode().catch(() => null) : null);
+    }));
+    return images.length;
+}
+"""
+
+
+class HtmlRenderer:
+    """Pool of long-lived browser pages shared by all HTML renders in the process"""
+
+    def __init__(self, pool_size: int = 4, max_page_uses: int = 100,
+                 render_timeout_seconds: float = 30.0, ready_timeout_seconds: float = 10.0):
+        self.pool_size = max(1, pool_size)
+        self.max_page_uses = max_page_uses
+        self.render_timeout_ms = render_timeout_seconds * 1000
+        self.ready_timeout_seconds = ready_timeout_seconds
+
+        self._playwright = None
+        self._browser = None
+        # Bumped on every browser launch; pages from an older browser are recreated
+        self._generation = 0
+        # Fixed set of slots; a slot always goes back to the queue, its page is rebuilt lazily
+        self._slots: Optional[asyncio.Queue] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._browser_lock: Optional[asyncio.Lock] = None
+        self._stats = {"renders": 0, "failures": 0, "pages_created": 0, "browser_launches": 0}
+
+    @property
+    def available(self) -> bool:
+        return PLAYWRIGHT_AVAILABLE
+
+    def _require_playwright(self) -> None:
+        if not PLAYWRIGHT_AVAILABLE:
+            raise Exception(
+                "Playwright is not installed. Please install it with: "
+                "pip install playwright && playwright install chromium"
+            )
+
+    def _bind_loop(self) -> bool:
+        """Bind the pool to the running loop on first use; False if called from another loop"""
+        loop = asyncio.get_running_loop()
+        if self._loop is None or self._slots is None:
+            self._loop = loop
+            self._browser_lock = asyncio.Lock()
+            self._slots = asyncio.Queue()
+            for _ in range(self.pool_size):
+                self._slots.put_nowait({"page": None, "context": None, "uses": 0, "generation": 0})
+        return self._loop is loop
+
+    # ── Lifecycle ───────────────────────────────────────────────────────────
+
+    def _browser_running(self) -> bool:
+        return self._browser is not None and self._browser.is_connected()
+
+    async def _ensure_browser(self) -> None:
+        async with self._browser_lock:
+            if self._browser_running():
+                return
+            await self._close_browser()
+            self._playwright = await async_playwright().start()
+            self._browser = await self._playwright.chromium.launch(headless=True, args=BROWSER_ARGS)
+            self._generation += 1
+            self._stats["browser_launches"] += 1
+            logger.info("HTML renderer browser launched")
+
+    async def start(self) -> None:
+        """Launch the browser and open every pooled page ahead of the first render"""
+        self._require_playwright()
+        if not self._bind_loop():
+            return
+        await self._ensure_browser()
+        slots = [await self._slots.get() for _ in range(self.pool_size)]
+        try:
+            for slot in slots:
+                if not self._slot_ready(slot):
+                    await self._open_page(slot)
+        finally:
+            for slot in slots:
+                self._slots.put_nowait(slot)
+        logger.info(f"HTML renderer ready with {self.pool_size} warm pages")
+
+    async def _close_browser(self) -> None:
+        browser, playwright = self._browser, self._playwright
+        self._browser = None
+        self._playwright = None
+        try:
+            if browser is not None:
+                await browser.close()
+        except Exception as e:
+            logger.warning(f"Error closing renderer browser: {e}")
+        try:
+            if playwright is not None:
+                await playwright.stop()
+        except Exception as e:
+            logger.warning(f"Error stopping Playwright: {e}")
+
+    async def stop(self) -> None:
+        if self._loop is not None and self._loop is not asyncio.get_running_loop():
+            return
+        await self._close_browser()
+
+    # ── Pages ───────────────────────────────────────────────────────────────
+
+    def _slot_ready(self, slot) -> bool:
+        return (
+            slot["page"] is not None
+            and slot["generation"] == self._generation
+            and not slot["page"].is_closed()
+        )
+
+    async def _open_page(self, slot) -> None:
+        context = await self._browser.new_context(viewport={"width": 800, "height": 600})
+        page = await context.new_page()
+        page.set_default_timeout(self.render_timeout_ms)
+        slot.update(page=page, context=context, uses=0, generation=self._generation)
+        self._stats["pages_created"] += 1
+
+    async def _close_page(self, slot) -> None:
+        context = slot["context"]
+        slot.update(page=None, context=None, uses=0)
+        try:
+            if context is not None:
+                await context.close()
+        except Exception:
+            pass
+
+    async def _reset_page(self, slot, healthy: bool) -> None:
+        """Blank a page for reuse, or close it if it failed or is worn out"""
+        if healthy and slot["uses"] < self.max_page_uses:
+            try:
+                await slot["page"].goto("about:blank")
+                return
+            except Exception:
+                pass
+        await self._close_page(slot)
+
+    # ── Rendering ───────────────────────────────────────────────────────────
+
+    async def _render_on(self, page, html_content: str, viewport: Tuple[int, int], full_page: bool) -> bytes:
+        await page.set_viewport_size({"width": viewport[0], "height": viewport[1]})
+        await page.set_content(html_content, wait_until="load")
+        try:
+            await asyncio.wait_for(page.evaluate(READY_SCRIPT), timeout=self.ready_timeout_seconds)
+        except asyncio.TimeoutError:
+            logger.warning("Timed out waiting for images to decode; capturing anyway")
+        return await page.screenshot(full_page=full_page, type="png")
+
+    async def render_png(self, html_content: str, viewport: Tuple[int, int] = (800, 600),
+                         full_page: bool = True) -> bytes:
+        """Render an HTML document to PNG bytes on a pooled page"""
+        self._require_playwright()
+        if not self._bind_loop():
+            # Called from another event loop (e.g. a worker thread): render on a one-off browser
+            return await self._render_once(html_content, viewport, full_page)
+
+        slot = await self._slots.get()
+        healthy = False
+        try:
+            if not self._slot_ready(slot):
+                await self._close_page(slot)
+                await self._ensure_browser()
+                await self._open_page(slot)
+            slot["uses"] += 1
+            png_data = await self._render_on(slot["page"], html_content, viewport, full_page)
+            healthy = True
+            self._stats["renders"] += 1
+            return png_data
+        except Exception:
+            self._stats["failures"] += 1
+            raise
+        finally:
+            try:
+                if slot["page"] is not None:
+                    await self._reset_page(slot, healthy)
+            finally:
+                self._slots.put_nowait(slot)
+
+    async def _render_once(self, html_content: str, viewport: Tuple[int, int], full_page: bool) -> bytes:
+        async with async_playwright() as p:
+            browser = await p.chromium.launch(headless=True, args=BROWSER_ARGS)
+            try:
+                page = await browser.new_page()
+                page.set_default_timeout(self.render_timeout_ms)
+                return await self._render_on(page, html_content, viewport, full_page)
+            finally:
+                await browser.close()
+
+    def get_stats(self) -> dict:
+        return {
+            **self._stats,
+            "running": self._browser_running(),
+            "idle_pages": self._slots.qsize() if self._slots is not None else 0,
+            "pool_size": self.pool_size,
+        }
+
+
+# Create global instance
+html_renderer = HtmlRenderer(
+    pool_size=int(os.getenv("HTML_RENDER_POOL_SIZE", "4")),
+    max_page_uses=int(os.getenv("HTML_RENDER_PAGE_MAX_USES", "100")),
+    render_timeout_seconds=float(os.getenv("HTML_RENDER_TIMEOUT_SECONDS", "30")),
+    ready_timeout_seconds=float(os.getenv("HTML_RENDER_READY_TIMEOUT_SECONDS", "10"))
+)
@@ -0,0 +1,373 @@
+"""
+Shared HTTP Clients
+One managed async HTTP layer for every platform integration (Meta, LinkedIn, Google, WordPress, WhatsApp, ...)
+
+Each provider host gets its own pooled httpx.AsyncClient (keep-alive, HTTP/2 when
+the h2 package is installed), so calls reuse warm TCP/TLS connections instead of
+paying a fresh handshake and blocking the event loop like requests does. Requests
+are retried with exponential backoff on connection errors and 429/502/503/504
+(idempotent methods only, unless asked), and a per-host circuit breaker fails fast
+while a provider is down.
+
+    from services.http_clients import http_clients
+
+    response = await http_clients.get(url, params=params, timeout=10)
+
+    async with http_clients.session(headers=headers) as client:
+        response = await client.post(url, json=payload)
+
+Synchronous code that already runs off the event loop (scheduler threads, helpers
+called via asyncio.to_thread) uses http_clients.sync, a pooled requests.Session with
+the same retry policy.
+"""
+
+import os
+import time
+import random
+import asyncio
+import logging
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from http.cookiejar import CookieJar, DefaultCookiePolicy
+from email.utils import parsedate_to_datetime
+from typing import Any, Dict, Optional, Tuple
+from urllib.parse import urlsplit
+
+import httpx
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+try:
+    import h2  # noqa: F401
+    HTTP2_AVAILABLE = True
+except ImportError:
+    HTTP2_AVAILABLE = False
+
+logger = logging.getLogger(__name__)
+
+RETRY_STATUSES = {429, 502, 503, 504}
+IDEMPOTENT_METHODS = {"GET", "HEAD", "OPTIONS", "PUT", "DELETE"}
+# Failures that mean the request never reached the server, so any method can be retried
+_NOT_SENT_ERRORS = (httpx.ConnectError, httpx.ConnectTimeout, httpx.PoolTimeout)
+
+
+def _no_cookie_jar() -> CookieJar:
+    """Clients are shared by every user, so never keep cookies between requests"""
+    return CookieJar(policy=DefaultCookiePolicy(allowed_domains=[]))
+
+
+class CircuitOpenError(httpx.TransportError):
+    """Raised without calling the provider while its circuit breaker is open"""
+
+
+class CircuitBreaker:
+    """Consecutive-failure breaker: open after N failures, half-open probe after a cool-down"""
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        self._probing = False
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at >= self.reset_timeout:
+            return "half_open"
+        return "open"
+
+    def allow(self) -> bool:
+        state = self.state
+        if state == "closed":
+            return True
+        if state == "half_open" and not self._probing:
+            # Let a single request through to test the provider
+            self._probing = True
+            return True
+        return False
+
+    def end_probe(self) -> None:
+        """Let the next request probe if this one ended without a result (e.g. it was cancelled)"""
+        self._probing = False
+
+    def record_success(self) -> None:
+        self.failures = 0
+        self.opened_at = None
+        self._probing = False
+
+    def record_failure(self) -> None:
+        self.failures += 1
+        self._probing = False
+        if self.opened_at is not None or self.failures >= self.failure_threshold:
+            self.opened_at = time.monotonic()
+
+
+class HttpSession:
+    """Client-like view over the pool with default request options (headers, timeout, ...)"""
+
+    def __init__(self, pool: "HttpClientPool", defaults: Dict[str, Any]):
+        self._pool = pool
+        self._defaults = defaults
+
+    async def request(self, method: str, url: str, **kwargs) -> httpx.Response:
+        options = dict(self._defaults)
+        if "headers" in options and "headers" in kwargs:
+            kwargs["headers"] = {**options.pop("headers"), **(kwargs["headers"] or {})}
+        options.update(kwargs)
+        return await self._pool.request(method, url, **options)
+
+    async def get(self, url: str, **kwargs) -> httpx.Response:
+        return await self.request("GET", url, **kwargs)
+
+    async def post(self, url: str, **kwargs) -> httpx.Response:
+        return await self.request("POST", url, **kwargs)
+
+    async def put(self, url: str, **kwargs) -> httpx.Response:
+        return await self.request("PUT", url, **kwargs)
+
+    async def patch(self, url: str, **kwargs) -> httpx.Response:
+        return await self.request("PATCH", url, **kwargs)
+
+    async def delete(self, url: str, **kwargs) -> httpx.Response:
+        return await self.request("DELETE", url, **kwargs)
+
+    async def head(self, url: str, **kwargs) -> httpx.Response:
+        return await self.request("HEAD", url, **kwargs)
+
+
+class HttpClientPool:
+    """Per-host pooled async clients with retry/backoff and circuit breaking"""
+
+    def __init__(self, timeout: float = 30.0, connect_timeout: float = 10.0,
+                 max_connections_per_host: int = 20, max_keepalive_per_host: int = 10,
+                 keepalive_expiry: float = 60.0, max_retries: int = 2,
+                 backoff_base: float = 0.5, backoff_max: float = 8.0,
+                 failure_threshold: int = 5, reset_timeout: float = 30.0, max_hosts: int = 64):
+        self.timeout = httpx.Timeout(timeout, connect=connect_timeout)
+        self.request_timeout = timeout
+        self.limits = httpx.Limits(
+            max_connections=max_connections_per_host,
+            max_keepalive_connections=max_keepalive_per_host,
+            keepalive_expiry=keepalive_expiry,
+        )
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.max_hosts = max_hosts
+
+        # host -> client, least recently used first (arbitrary hosts, e.g. website analysis, are bounded)
+        self._clients: "OrderedDict[str, httpx.AsyncClient]" = OrderedDict()
+        self._sync_session: Optional[requests.Session] = None
+        self._breakers: Dict[str, CircuitBreaker] = {}
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self.stats = {"requests": 0, "retries": 0, "failures": 0, "short_circuited": 0, "one_off_clients": 0}
+
+    # ------------------------------------------------------------------
+    # Lifecycle
+    # ------------------------------------------------------------------
+
+    async def start(self) -> None:
+        """Bind the pool to the application event loop"""
+        self._loop = asyncio.get_running_loop()
+        logger.info(f"HTTP client pool started (http2={'on' if HTTP2_AVAILABLE else 'off'})")
+
+    async def aclose(self) -> None:
+        if self._sync_session is not None:
+            self._sync_session.close()
+            self._sync_session = None
+        clients, self._clients = self._clients, {}
+        for client in clients.values():
+            try:
+                await client.aclose()
+            except Exception as e:
+                logger.error(f"Error closing HTTP client: {e}")
+        logger.info(f"HTTP client pool closed ({len(clients)} host clients)")
+
+    def _new_client(self) -> httpx.AsyncClient:
+        return httpx.AsyncClient(
+            http2=HTTP2_AVAILABLE,
+            timeout=self.timeout,
+            limits=self.limits,
+            follow_redirects=True,
+            cookies=_no_cookie_jar(),
+        )
+
+    def _client_for(self, host: str) -> Tuple[httpx.AsyncClient, bool]:
+        """Return (client, owned). Owned clients are one-offs the caller must close."""
+        running_loop = asyncio.get_running_loop()
+        if self._loop is None:
+            self._loop = running_loop
+        if running_loop is not self._loop:
+            # Called from a worker thread's own loop: pooled clients can't cross loops
+            self.stats["one_off_clients"] += 1
+            return self._new_client(), True
+        client = self._clients.get(host)
+        if client is None or client.is_closed:
+            client = self._clients[host] = self._new_client()
+            while len(self._clients) > self.max_hosts:
+                _, evicted = self._clients.popitem(last=False)
+                running_loop.create_task(self._close_later(evicted))
+        self._clients.move_to_end(host)
+        return client, False
+
+    async def _close_later(self, client: httpx.AsyncClient) -> None:
+        # Give requests still using an evicted client time to finish
+        await asyncio.sleep(self.request_timeout + 5)
+        await client.aclose()
+
+    def _breaker_for(self, host: str) -> CircuitBreaker:
+        breaker = self._breakers.get(host)
+        if breaker is None:
+            breaker = self._breakers[host] = CircuitBreaker(self.failure_threshold, self.reset_timeout)
+        return breaker
+
+    # ------------------------------------------------------------------
+    # Requests
+    # ------------------------------------------------------------------
+
+    def _backoff(self, attempt: int, response: Optional[httpx.Response] = None) -> float:
+        if response is not None:
+            retry_after = response.headers.get("retry-after")
+            if retry_after:
+                try:
+                    return min(float(retry_after), self.backoff_max)
+                except ValueError:
+                    try:
+                        return min(max(parsedate_to_datetime(retry_after).timestamp() - time.time(), 0), self.backoff_max)
+                    except (TypeError, ValueError):
+                        pass
+        delay = min(self.backoff_base * (2 ** attempt), self.backoff_max)
+        return delay * random.uniform(0.5, 1.0)
+
+    async def request(self, method: str, url: str, *, retries: Optional[int] = None,
+                      retry_non_idempotent: bool = False, **kwargs) -> httpx.Response:
+        """
+        Send a request through the host's pooled client.
+
+        Accepts the requests-style allow_redirects and raw-body data= used by
+        older call sites. Returns the final response (including 4xx/5xx); raises
+        httpx.HTTPError subclasses on transport failure or CircuitOpenError.
+        """
+        method = method.upper()
+        if "allow_redirects" in kwargs:
+            kwargs["follow_redirects"] = kwargs.pop("allow_redirects")
+        if isinstance(kwargs.get("data"), (str, bytes)):
+            kwargs["content"] = kwargs.pop("data")
+
+        host = urlsplit(url).netloc.lower()
+        breaker = self._breaker_for(host)
+        max_retries = self.max_retries if retries is None else retries
+        can_retry = method in IDEMPOTENT_METHODS or retry_non_idempotent
+        self.stats["requests"] += 1
+
+        client, owned = self._client_for(host)
+        try:
+            attempt = 0
+            while True:
+                probing = breaker.state == "half_open"
+                if not breaker.allow():
+                    self.stats["short_circuited"] += 1
+                    raise CircuitOpenError(f"Circuit open for {host}; skipping {method} {url.split('?')[0]}")
+                try:
+                    response = await client.request(method, url, **kwargs)
+                except httpx.TransportError as e:
+                    breaker.record_failure()
+                    self.stats["failures"] += 1
+                    if attempt < max_retries and (can_retry or isinstance(e, _NOT_SENT_ERRORS)):
+                        await asyncio.sleep(self._backoff(attempt))
+                        attempt += 1
+                        self.stats["retries"] += 1
+                        continue
+                    raise
+                finally:
+                    if probing:
+                        # A cancelled probe records no outcome and would otherwise block every later probe
+                        breaker.end_probe()
+
+                if response.status_code in RETRY_STATUSES:
+                    if response.status_code != 429:
+                        breaker.record_failure()
+                        self.stats["failures"] += 1
+                    if attempt < max_retries and can_retry:
+                        await response.aclose()
+                        await asyncio.sleep(self._backoff(attempt, response))
+                        attempt += 1
+                        self.stats["retries"] += 1
+                        continue
+                    return response
+
+                breaker.record_success()
+                return response
+        finally:
+            if owned:
+                await client.aclose()
+
+    async def get(self, url: str, **kwargs) -> httpx.Response:
+        return await self.request("GET", url, **kwargs)
+
+    async def post(self, url: str, **kwargs) -> httpx.Response:
+        return await self.request("POST", url, **kwargs)
+
+    async def put(self, url: str, **kwargs) -> httpx.Response:
+        return await self.request("PUT", url, **kwargs)
+
+    async def patch(self, url: str, **kwargs) -> httpx.Response:
+        return await self.request("PATCH", url, **kwargs)
+
+    async def delete(self, url: str, **kwargs) -> httpx.Response:
+        return await self.request("DELETE", url, **kwargs)
+
+    async def head(self, url: str, **kwargs) -> httpx.Response:
+        return await self.request("HEAD", url, **kwargs)
+
+    @asynccontextmanager
+    async def session(self, **defaults):
+        """Drop-in replacement for `async with httpx.AsyncClient(...) as client` blocks"""
+        yield HttpSession(self, defaults)
+
+    @property
+    def sync(self) -> requests.Session:
+        """Shared keep-alive requests.Session for blocking call sites running in worker threads"""
+        if self._sync_session is None:
+            retry = Retry(
+                total=self.max_retries,
+                backoff_factor=self.backoff_base,
+                status_forcelist=sorted(RETRY_STATUSES),
+                allowed_methods=sorted(IDEMPOTENT_METHODS),
+                respect_retry_after_header=True,
+                raise_on_status=False,
+            )
+            adapter = HTTPAdapter(
+                pool_connections=self.limits.max_connections or 20,
+                pool_maxsize=self.limits.max_connections or 20,
+                max_retries=retry,
+            )
+            session = requests.Session()
+            session.cookies.set_policy(DefaultCookiePolicy(allowed_domains=[]))
+            session.mount("https://", adapter)
+            session.mount("http://", adapter)
+            self._sync_session = session
+        return self._sync_session
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            **self.stats,
+            "http2": HTTP2_AVAILABLE,
+            "hosts": len(self._clients),
+            "open_circuits": [host for host, breaker in self._breakers.items() if breaker.state != "closed"],
+        }
+
+
+# Create global instance
+http_clients = HttpClientPool(
+    timeout=float(os.getenv("HTTP_CLIENT_TIMEOUT_SECONDS", "30")),
+    max_connections_per_host=int(os.getenv("HTTP_CLIENT_MAX_CONNECTIONS_PER_HOST", "20")),
+    max_retries=int(os.getenv("HTTP_CLIENT_MAX_RETRIES", "2")),
+    failure_threshold=int(os.getenv("HTTP_CIRCUIT_FAILURE_THRESHOLD", "5")),
+    reset_timeout=float(os.getenv("HTTP_CIRCUIT_RESET_SECONDS", "30"))
+)
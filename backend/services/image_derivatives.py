@@ -0,0 +1,322 @@
+"""
+Image Derivatives
+Thumbnails, medium and platform-sized WebP/AVIF variants of content images
+
+Generated and uploaded images were stored once at full size and dashboards
+loaded the full PNGs into grid cells. When an image is uploaded or a content
+row is saved, this service decodes the image once on the shared CPU executor,
+downscales it to each configured size (never upscaling), encodes WebP (and
+AVIF when enabled and supported by Pillow), uploads the variants next to the
+source object and records a manifest on the created_content row:
+
+    media_derivatives = {
+        "<source url>": {
+            "thumbnail": {"url": ..., "width": 320, "height": 320, "bytes": ..., "urls": {"webp": ..., "avif": ...}},
+            "medium": {...}, "instagram": {...}, "linkedin": {...}
+        }
+    }
+
+An image that could not be processed gets a marker instead,
+{"_meta": {"failed_at": ..., "reason": ..., "retryable": ...}}, so backfills
+skip it; transient failures are retried once retry_after has passed. List
+endpoints read the thumbnail from the manifest via thumbnail_for().
+"""
+
+import os
+import io
+import asyncio
+import hashlib
+import logging
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+from urllib.parse import unquote, urlsplit
+
+from PIL import Image, ImageOps, features
+from supabase import create_client, Client
+
+from services.cpu_executor import cpu_executor
+from services.media_asset_cache import media_asset_cache
+from services.streaming_upload import streaming_uploader
+
+logger = logging.getLogger(__name__)
+
+# name -> (max width, encoder quality)
+DERIVATIVE_SPECS: Dict[str, Tuple[int, int]] = {
+    "thumbnail": (320, 70),
+    "medium": (768, 78),
+    "instagram": (1080, 82),
+    "linkedin": (1200, 82),
+}
+
+DEFAULT_BUCKET = "ai-generated-images"
+PUBLIC_PATH_MARKER = "/storage/v1/object/public/"
+VIDEO_EXTENSIONS = ('.mp4', '.mov', '.avi', '.webm', '.mpeg', '.mpg', '.wmv', '.m4v')
+
+ENCODERS = {
+    "webp": ("WEBP", "image/webp", {"method": 4}),
+    "avif": ("AVIF", "image/avif", {"speed": 8}),
+}
+
+
+def render_derivatives(image_data: bytes, specs: Dict[str, Tuple[int, int]],
+                       formats: Tuple[str, ...]) -> Dict[str, Dict[str, Any]]:
+    """
+    Decode once and encode every variant (runs in a worker process).
+
+    Variants are produced largest first, each downscaled from the previous one,
+    so the expensive full-resolution resample happens only once.
+    """
+    image = Image.open(io.BytesIO(image_data))
+    largest = max(width for width, _ in specs.values())
+    if image.format == "JPEG":
+        # Let the JPEG decoder skip detail we are about to throw away
+        image.draft("RGB", (largest, largest))
+    image = ImageOps.exif_transpose(image)
+    if image.mode not in ("RGB", "RGBA"):
+        image = image.convert("RGBA" if "A" in image.getbands() or image.mode == "P" else "RGB")
+
+    variants = {}
+    current = image
+    for name, (width, quality) in sorted(specs.items(), key=lambda item: -item[1][0]):
+        if current.width > width:
+            height = max(1, round(current.height * width / current.width))
+            current = current.resize((width, height), Image.Resampling.LANCZOS)
+        encoded = {}
+        for fmt in formats:
+            pil_format, _, options = ENCODERS[fmt]
+            buffer = io.BytesIO()
+            current.save(buffer, format=pil_format, quality=quality, **options)
+            encoded[fmt] = buffer.getvalue()
+        variants[name] = {"width": current.width, "height": current.height, "encoded": encoded}
+    return variants
+
+
+def _is_probably_video(url: str) -> bool:
+    return urlsplit(url).path.lower().endswith(VIDEO_EXTENSIONS)
+
+
+def content_image_urls(row: Dict[str, Any], include_videos: bool = False) -> List[str]:
+    """Image (optionally also video) URLs on a created_content row, in display order and without duplicates"""
+    urls: List[str] = []
+    for candidate in [row.get("media_url"), *(row.get("images") or []), *(row.get("carousel_images") or [])]:
+        if isinstance(candidate, str) and candidate.startswith("http") and candidate not in urls \
+                and (include_videos or not _is_probably_video(candidate)):
+            urls.append(candidate)
+    return urls
+
+
+def thumbnail_for(row: Dict[str, Any], size: str = "thumbnail") -> Optional[str]:
+    """URL of a derivative for the row's primary image, or None if not generated yet"""
+    manifests = row.get("media_derivatives") or {}
+    for url in content_image_urls(row):
+        variant = (manifests.get(url) or {}).get(size)
+        if variant:
+            return variant.get("url")
+    return None
+
+
+class ImageDerivativeService:
+    """Generates and records resized WebP/AVIF variants of content images"""
+
+    def __init__(self, formats: Tuple[str, ...] = ("webp",),
+                 max_source_bytes: int = 25 * 1024 * 1024, max_manifests: int = 2000,
+                 retry_after_seconds: float = 24 * 3600):
+        self.formats = tuple(fmt for fmt in formats if fmt in ENCODERS and features.check(fmt)) or ("webp",)
+        self.max_source_bytes = max_source_bytes
+        self.max_manifests = max_manifests
+        self.retry_after = timedelta(seconds=retry_after_seconds)
+
+        self._supabase: Optional[Client] = None
+        # source url -> manifest for recently processed images
+        self._manifests: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._inflight: Dict[str, asyncio.Task] = {}
+        self._tasks: Set[asyncio.Task] = set()
+        self._stats = {"images": 0, "variants": 0, "bytes_in": 0, "bytes_out": 0, "failures": 0}
+
+    def _get_supabase(self) -> Client:
+        if self._supabase is None:
+            supabase_url = os.getenv("SUPABASE_URL")
+            supabase_key = os.getenv("SUPABASE_SERVICE_ROLE_KEY") or os.getenv("SUPABASE_ANON_KEY")
+            if not supabase_url or not supabase_key:
+                raise ValueError("SUPABASE_URL and SUPABASE_SERVICE_ROLE_KEY must be set")
+            self._supabase = create_client(supabase_url, supabase_key)
+        return self._supabase
+
+    # ── Locations ───────────────────────────────────────────────────────────
+
+    @staticmethod
+    def _derivative_prefix(source_url: str) -> Tuple[str, str]:
+        """(bucket, path prefix) for a source image's variants, next to the source object when possible"""
+        path = urlsplit(source_url).path
+        if PUBLIC_PATH_MARKER in path:
+            bucket, _, object_path = unquote(path.split(PUBLIC_PATH_MARKER, 1)[1]).partition("/")
+            if bucket and object_path:
+                return bucket, f"derivatives/{os.path.splitext(object_path)[0]}"
+        digest = hashlib.sha256(source_url.encode()).hexdigest()[:24]
+        return DEFAULT_BUCKET, f"derivatives/external/{digest}"
+
+    # ── Failures ────────────────────────────────────────────────────────────
+
+    @staticmethod
+    def _failure(reason: str, retryable: bool) -> Dict[str, Any]:
+        """Manifest recording a failed attempt, so the image is not re-queued on every load"""
+        return {"_meta": {"failed_at": datetime.now().isoformat(), "reason": reason, "retryable": retryable}}
+
+    def _is_pending(self, manifest: Optional[Dict[str, Any]]) -> bool:
+        """True when an image has no manifest yet, or its last failed attempt may be retried"""
+        if not manifest:
+            return True
+        meta = manifest.get("_meta") or {}
+        if "failed_at" not in meta:
+            return False
+        if not meta.get("retryable"):
+            return False
+        try:
+            return datetime.now() - datetime.fromisoformat(meta["failed_at"]) >= self.retry_after
+        except (TypeError, ValueError):
+            return True
+
+    def needs_derivatives(self, row: Dict[str, Any]) -> bool:
+        """Whether any image on a created_content row still needs variants generated"""
+        manifests = row.get("media_derivatives") or {}
+        return any(self._is_pending(manifests.get(url)) for url in content_image_urls(row))
+
+    # ── Generation ──────────────────────────────────────────────────────────
+
+    async def generate(self, source_url: str) -> Optional[Dict[str, Any]]:
+        """
+        Manifest of variants for an image URL, generating and uploading them if needed.
+
+        Concurrent calls for the same URL share one generation. Returns None for
+        videos and a failure marker (see _failure) when the image could not be processed.
+        """
+        manifest = self._manifests.get(source_url)
+        if manifest is not None:
+            self._manifests.move_to_end(source_url)
+            return manifest
+        task = self._inflight.get(source_url)
+        if task is None:
+            task = asyncio.get_running_loop().create_task(self._generate(source_url))
+            self._inflight[source_url] = task
+            task.add_done_callback(lambda _: self._inflight.pop(source_url, None))
+        return await asyncio.shield(task)
+
+    async def _generate(self, source_url: str) -> Optional[Dict[str, Any]]:
+        if _is_probably_video(source_url):
+            return None
+        try:
+            image_data = await media_asset_cache.get_bytes(source_url)
+            if len(image_data) > self.max_source_bytes:
+                logger.info(f"Skipping derivatives for {source_url}: source is {len(image_data)} bytes")
+                return self._failure("source too large", retryable=False)
+
+            try:
+                variants = await cpu_executor.run(render_derivatives, image_data, DERIVATIVE_SPECS, self.formats)
+            except (Image.UnidentifiedImageError, OSError) as e:
+                logger.info(f"Skipping derivatives for {source_url}: not a decodable image ({e})")
+                return self._failure("not a decodable image", retryable=False)
+
+            bucket, prefix = self._derivative_prefix(source_url)
+            uploads = []
+            for name, variant in variants.items():
+                for fmt, data in variant["encoded"].items():
+                    _, media_type, _ = ENCODERS[fmt]
+                    uploads.append((name, fmt, streaming_uploader.upload_bytes(
+                        bucket, f"{prefix}/{name}.{fmt}", data, media_type, upsert=True
+                    )))
+            urls = await asyncio.gather(*(upload for _, _, upload in uploads))
+
+            manifest: Dict[str, Any] = {}
+            for (name, fmt, _), url in zip(uploads, urls):
+                variant = variants[name]
+                entry = manifest.setdefault(name, {
+                    "width": variant["width"],
+                    "height": variant["height"],
+                    "bytes": len(variant["encoded"][self.formats[0]]),
+                    "urls": {},
+                })
+                entry["urls"][fmt] = url
+                entry["url"] = entry["urls"].get(self.formats[0], url)
+            manifest_meta = {"generated_at": datetime.now().isoformat(), "source_bytes": len(image_data)}
+            manifest = {**manifest, "_meta": manifest_meta}
+
+            self._stats["images"] += 1
+            self._stats["variants"] += len(uploads)
+            self._stats["bytes_in"] += len(image_data)
+            self._stats["bytes_out"] += sum(len(data) for v in variants.values() for data in v["encoded"].values())
+            self._manifests[source_url] = manifest
+            while len(self._manifests) > self.max_manifests:
+                self._manifests.popitem(last=False)
+            logger.info(f"Created {len(uploads)} derivatives for {source_url}")
+            return manifest
+        except Exception as e:
+            self._stats["failures"] += 1
+            logger.error(f"Error creating derivatives for {source_url}: {e}")
+            return self._failure(str(e)[:200], retryable=True)
+
+    # ── Content rows ────────────────────────────────────────────────────────
+
+    async def attach_to_content(self, content_id: str, image_urls: Optional[Iterable[str]] = None) -> Dict[str, Any]:
+        """Generate variants for a created_content row's images and store the manifest on the row"""
+        supabase = self._get_supabase()
+        result = await asyncio.to_thread(
+            lambda: supabase.table("created_content").select(
+                "id, media_url, images, carousel_images, media_derivatives"
+            ).eq("id", content_id).limit(1).execute()
+        )
+        if not result.data:
+            return {}
+        row = result.data[0]
+        urls = list(image_urls) if image_urls is not None else content_image_urls(row)
+        existing = row.get("media_derivatives") or {}
+
+        missing = [url for url in urls if self._is_pending(existing.get(url))]
+        manifests = await asyncio.gather(*(self.generate(url) for url in missing))
+
+        current = set(content_image_urls(row)) | set(urls)
+        derivatives = {url: manifest for url, manifest in existing.items() if url in current}
+        derivatives.update({url: manifest for url, manifest in zip(missing, manifests) if manifest})
+        if derivatives != existing:
+            await asyncio.to_thread(
+                lambda: supabase.table("created_content").update(
+                    {"media_derivatives": derivatives}
+                ).eq("id", content_id).execute()
+            )
+        return derivatives
+
+    def schedule_for_content(self, content_id: str, image_urls: Optional[Iterable[str]] = None) -> None:
+        """Attach derivatives to a content row in the background"""
+        self._spawn(self.attach_to_content(content_id, image_urls), f"content {content_id}")
+
+    def schedule(self, source_url: str, size_bytes: Optional[int] = None) -> None:
+        """Generate derivatives for a freshly uploaded image in the background (read back from storage)"""
+        if size_bytes is not None and size_bytes > self.max_source_bytes:
+            logger.info(f"Skipping derivatives for {source_url}: source is {size_bytes} bytes")
+            return
+        self._spawn(self.generate(source_url), source_url)
+
+    def _spawn(self, coro, label: str) -> None:
+        try:
+            task = asyncio.get_running_loop().create_task(coro)
+        except RuntimeError:
+            coro.close()
+            logger.warning(f"No running event loop; skipping derivatives for {label}")
+            return
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            **self._stats,
+            "formats": list(self.formats),
+            "pending": len(self._tasks),
+            "manifests_cached": len(self._manifests),
+        }
+
+
+# Create global instance
+image_derivatives = ImageDerivativeService(
+    formats=tuple(fmt.strip().lower() for fmt in os.getenv("IMAGE_DERIVATIVE_FORMATS", "webp").split(",") if fmt.strip()),
+    retry_after_seconds=float(os.getenv("IMAGE_DERIVATIVE_RETRY_HOURS", "24")) * 3600
+)
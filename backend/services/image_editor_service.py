@@ -7,10 +7,10 @@ import base64
 import logging
 from typing import Optional, Dict, Any
 from datetime import datetime
-import httpx
 from google import genai
 from supabase import create_client, Client
 from services.token_usage_service import TokenUsageService
+from services.media_asset_cache import media_asset_cache
 
 logger = logging.getLogger(__name__)
 
@@ -239,10 +239,7 @@ class ImageEditorService:
     async def _download_image(self, image_url: str) -> bytes:
         """Download image from URL"""
         try:
-            async with httpx.AsyncClient(follow_redirects=True) as client:
-                response = await client.get(image_url)
-                response.raise_for_status()
-                return response.content
+            return await media_asset_cache.get_bytes(image_url)
         except Exception as e:
             logger.error(f"Error downloading image: {e}")
             raise e
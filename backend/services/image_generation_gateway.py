@@ -0,0 +1,208 @@
+"""
+Image Generation Gateway
+Coalesces identical image generation requests and caches their results
+
+A generation is identified by (model, prompt, hashes of the reference images
+such as the brand logo, size). Concurrent identical requests share a single
+upstream call, and its result (normally the public URL of the stored image)
+is kept for a TTL within the requesting user's scope. Retries, double-clicks
+and regenerations with an unchanged prompt therefore reuse the image instead
+of paying for a new one. Requests without a user scope bypass the gateway, so
+one user's image is never served to another. Works from async code (generate) and from
+synchronous agents (generate_sync); hit, miss and cost-saved counters are
+exposed through get_stats().
+"""
+
+import os
+import time
+import base64
+import asyncio
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future
+from typing import Any, Awaitable, Callable, Dict, Iterable, Optional, Tuple, TypeVar, Union
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+Reference = Union[bytes, str, None]
+
+
+def _reference_hash(reference: Reference) -> str:
+    """Hash of a reference image given as raw bytes or base64 text"""
+    if isinstance(reference, str):
+        try:
+            reference = base64.b64decode(reference, validate=True)
+        except ValueError:
+            reference = reference.encode()
+    return hashlib.sha256(reference or b"").hexdigest()
+
+
+def _cacheable(result: Any) -> bool:
+    # Failures are never cached, and inline data URLs are too large to keep around
+    return bool(result) and not (isinstance(result, str) and result.startswith("data:"))
+
+
+class ImageGenerationGateway:
+    """Single-flight and TTL result cache in front of image generation calls"""
+
+    def __init__(self, ttl_seconds: int = 900, max_entries: int = 2000, cost_per_image: float = 0.039):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.cost_per_image = cost_per_image
+
+        self._lock = threading.Lock()
+        # (scope, request key) -> (expires_at, result)
+        self._cache: "OrderedDict[Tuple[str, str], Tuple[float, Any]]" = OrderedDict()
+        self._inflight: Dict[Tuple[str, str], Future] = {}
+        self._stats = {"hits": 0, "misses": 0, "coalesced": 0, "failures": 0, "unscoped": 0, "cost_saved_usd": 0.0}
+
+    @staticmethod
+    def request_key(model: str, prompt: str, references: Iterable[Reference] = (),
+                    size: Optional[str] = None) -> str:
+        digest = hashlib.sha256()
+        for part in (model, prompt, size or "", *(_reference_hash(ref) for ref in references)):
+            digest.update(part.encode())
+            digest.update(b"\x00")
+        return digest.hexdigest()
+
+    # ── Single flight ───────────────────────────────────────────────────────
+
+    def _begin(self, cache_key: Tuple[str, str], refresh: bool) -> Tuple[bool, Any, Optional[Future], bool]:
+        """(cache hit, cached result, shared future, whether the caller must produce the result)"""
+        with self._lock:
+            if not refresh:
+                entry = self._cache.get(cache_key)
+                if entry is not None and entry[0] > time.monotonic():
+                    self._cache.move_to_end(cache_key)
+                    self._stats["hits"] += 1
+                    self._stats["cost_saved_usd"] += self.cost_per_image
+                    return True, entry[1], None, False
+                self._cache.pop(cache_key, None)
+
+            future = self._inflight.get(cache_key)
+            if future is not None:
+                self._stats["coalesced"] += 1
+                self._stats["cost_saved_usd"] += self.cost_per_image
+                return False, None, future, False
+
+            future = Future()
+            self._inflight[cache_key] = future
+            self._stats["misses"] += 1
+            return False, None, future, True
+
+    def _finish(self, cache_key: Tuple[str, str], future: Future, result: Any = None,
+                error: Optional[BaseException] = None) -> None:
+        with self._lock:
+            self._inflight.pop(cache_key, None)
+            if error is not None or not _cacheable(result):
+                self._stats["failures"] += 1
+            else:
+                self._cache[cache_key] = (time.monotonic() + self.ttl_seconds, result)
+                self._cache.move_to_end(cache_key)
+                while len(self._cache) > self.max_entries:
+                    self._cache.popitem(last=False)
+        if not future.done():
+            if error is not None:
+                future.set_exception(error)
+            else:
+                future.set_result(result)
+
+    # ── Generation ──────────────────────────────────────────────────────────
+
+    def _count_unscoped(self) -> None:
+        with self._lock:
+            self._stats["unscoped"] += 1
+
+    async def generate(self, producer: Callable[[], Awaitable[T]], *, model: str, prompt: str,
+                       user_id: Optional[str] = None, references: Iterable[Reference] = (),
+                       size: Optional[str] = None, refresh: bool = False) -> T:
+        """
+        Return a cached or in-flight result for this request, or run producer to create it.
+
+        Args:
+            producer: Coroutine function that generates (and stores) the image
+            model: Image model name
+            prompt: Full prompt sent to the model
+            user_id: Cache scope; results are never shared between users, and nothing is
+                cached or shared without one
+            references: Reference images sent with the prompt (raw bytes or base64)
+            size: Requested size or aspect ratio, if the call sets one
+            refresh: Skip the cached result (an identical in-flight request is still shared)
+        """
+        if not user_id:
+            self._count_unscoped()
+            return await producer()
+
+        cache_key = (user_id, self.request_key(model, prompt, references, size))
+        hit, result, future, owner = self._begin(cache_key, refresh)
+        if hit:
+            logger.info(f"♻️ Reusing cached {model} image for an identical request")
+            return result
+        if not owner:
+            logger.info(f"⏳ Waiting for identical in-flight {model} image request")
+            return await asyncio.shield(asyncio.wrap_future(future))
+
+        try:
+            result = await producer()
+        except BaseException as e:
+            self._finish(cache_key, future, error=e)
+            raise
+        self._finish(cache_key, future, result)
+        return result
+
+    def generate_sync(self, producer: Callable[[], T], *, model: str, prompt: str,
+                      user_id: Optional[str] = None, references: Iterable[Reference] = (),
+                      size: Optional[str] = None, refresh: bool = False) -> T:
+        """Blocking variant of generate() for synchronous callers"""
+        if not user_id:
+            self._count_unscoped()
+            return producer()
+
+        cache_key = (user_id, self.request_key(model, prompt, references, size))
+        hit, result, future, owner = self._begin(cache_key, refresh)
+        if hit:
+            logger.info(f"♻️ Reusing cached {model} image for an identical request")
+            return result
+        if not owner:
+            logger.info(f"⏳ Waiting for identical in-flight {model} image request")
+            return future.result()
+
+        try:
+            result = producer()
+        except BaseException as e:
+            self._finish(cache_key, future, error=e)
+            raise
+        self._finish(cache_key, future, result)
+        return result
+
+    def invalidate(self, user_id: Optional[str] = None) -> None:
+        """Drop cached results for one user, or all of them"""
+        with self._lock:
+            if user_id is None:
+                self._cache.clear()
+            else:
+                for cache_key in [key for key in self._cache if key[0] == user_id]:
+                    del self._cache[cache_key]
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self._stats["hits"] + self._stats["coalesced"] + self._stats["misses"]
+            return {
+                **self._stats,
+                "cost_saved_usd": round(self._stats["cost_saved_usd"], 4),
+                "hit_rate": round((self._stats["hits"] + self._stats["coalesced"]) / lookups, 4) if lookups else 0.0,
+                "cached": len(self._cache),
+                "inflight": len(self._inflight),
+            }
+
+
+# Create global instance
+image_generation_gateway = ImageGenerationGateway(
+    ttl_seconds=int(os.getenv("IMAGE_GENERATION_CACHE_TTL_SECONDS", "900")),
+    max_entries=int(os.getenv("IMAGE_GENERATION_CACHE_MAX_ENTRIES", "2000")),
+    cost_per_image=float(os.getenv("IMAGE_GENERATION_COST_USD", "0.039"))
+)
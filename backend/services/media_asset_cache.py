@@ -0,0 +1,387 @@
+"""
+Media Asset Cache
+Shared cache for logos and reference images fetched by URL
+
+Assets are stored on local disk by content hash (identical files at different
+URLs share one blob) under an LRU byte budget, with a small per-URL index
+holding the ETag / Last-Modified validators. After the freshness window an
+entry is revalidated with a conditional GET, so an unchanged logo costs a 304
+instead of a full download. Recently used assets are also kept in memory,
+together with their decoded PIL image and base64 encoding, so repeated
+generations for the same brand neither refetch nor re-decode the logo.
+"""
+
+import os
+import io
+import json
+import time
+import base64
+import hashlib
+import asyncio
+import logging
+import tempfile
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+from PIL import Image
+
+from services.http_clients import http_clients
+
+logger = logging.getLogger(__name__)
+
+# Striped locks: concurrent fetches of the same URL wait for one download
+LOCK_STRIPES = 64
+
+MAGIC_MEDIA_TYPES = (
+    (b"\x89PNG", "image/png"),
+    (b"\xff\xd8", "image/jpeg"),
+    (b"GIF8", "image/gif"),
+)
+
+
+def sniff_media_type(data: bytes, default: str = "image/jpeg") -> str:
+    for magic, media_type in MAGIC_MEDIA_TYPES:
+        if data.startswith(magic):
+            return media_type
+    if data[:4] == b"RIFF" and data[8:12] == b"WEBP":
+        return "image/webp"
+    return default
+
+
+class MediaAssetCache:
+    """Two-tier (memory + disk) cache of remote media assets keyed by URL and ETag"""
+
+    def __init__(self, cache_dir: str, disk_budget_bytes: int = 512 * 1024 * 1024,
+                 memory_budget_bytes: int = 64 * 1024 * 1024, fresh_seconds: float = 3600.0,
+                 max_asset_bytes: int = 25 * 1024 * 1024, timeout_seconds: float = 30.0):
+        self.cache_dir = cache_dir
+        self.disk_budget_bytes = disk_budget_bytes
+        self.memory_budget_bytes = memory_budget_bytes
+        self.fresh_seconds = fresh_seconds
+        self.max_asset_bytes = max_asset_bytes
+        self.timeout_seconds = timeout_seconds
+
+        self._lock = threading.RLock()
+        self._url_locks = [threading.Lock() for _ in range(LOCK_STRIPES)]
+        # url -> index entry (content_hash, media_type, etag, last_modified, validated_at)
+        self._index: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        # content_hash -> blob size on disk, least recently used first
+        self._blobs: "OrderedDict[str, int]" = OrderedDict()
+        self._disk_bytes = 0
+        # content_hash -> {"data", "image", "base64", "size"}
+        self._memory: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._memory_bytes = 0
+        self._disk_loaded = False
+        self._stats = {
+            "memory_hits": 0, "disk_hits": 0, "revalidated": 0,
+            "downloads": 0, "download_bytes": 0, "stale_served": 0, "evictions": 0,
+        }
+
+    # ── Disk tier ───────────────────────────────────────────────────────────
+
+    def _blob_path(self, content_hash: str) -> str:
+        return os.path.join(self.cache_dir, "blobs", content_hash)
+
+    def _index_path(self, url: str) -> str:
+        return os.path.join(self.cache_dir, "index", hashlib.sha256(url.encode()).hexdigest() + ".json")
+
+    def _ensure_disk(self) -> None:
+        """Create the cache directories and pick up blobs left by a previous process"""
+        with self._lock:
+            if self._disk_loaded:
+                return
+            os.makedirs(os.path.join(self.cache_dir, "blobs"), exist_ok=True)
+            os.makedirs(os.path.join(self.cache_dir, "index"), exist_ok=True)
+            blobs = []
+            with os.scandir(os.path.join(self.cache_dir, "blobs")) as entries:
+                for entry in entries:
+                    if entry.is_file() and not entry.name.endswith(".tmp"):
+                        stat = entry.stat()
+                        blobs.append((stat.st_mtime, entry.name, stat.st_size))
+            for _, content_hash, size in sorted(blobs):
+                self._blobs[content_hash] = size
+                self._disk_bytes += size
+            self._disk_loaded = True
+            self._evict_disk()
+
+    def _evict_disk(self) -> None:
+        while self._disk_bytes > self.disk_budget_bytes and len(self._blobs) > 1:
+            content_hash, size = self._blobs.popitem(last=False)
+            self._disk_bytes -= size
+            self._stats["evictions"] += 1
+            try:
+                os.remove(self._blob_path(content_hash))
+            except OSError:
+                pass
+
+    def _read_blob(self, content_hash: str) -> Optional[bytes]:
+        try:
+            with open(self._blob_path(content_hash), "rb") as f:
+                data = f.read()
+        except OSError:
+            with self._lock:
+                size = self._blobs.pop(content_hash, None)
+                if size is not None:
+                    self._disk_bytes -= size
+            return None
+        with self._lock:
+            if content_hash in self._blobs:
+                self._blobs.move_to_end(content_hash)
+        try:
+            os.utime(self._blob_path(content_hash))
+        except OSError:
+            pass
+        return data
+
+    def _write_blob(self, content_hash: str, data: bytes) -> None:
+        with self._lock:
+            if content_hash in self._blobs:
+                self._blobs.move_to_end(content_hash)
+                return
+        path = self._blob_path(content_hash)
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+        with self._lock:
+            if content_hash not in self._blobs:
+                self._blobs[content_hash] = len(data)
+                self._disk_bytes += len(data)
+            self._evict_disk()
+
+    def _load_entry(self, url: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            entry = self._index.get(url)
+            if entry is not None:
+                self._index.move_to_end(url)
+                return entry
+        try:
+            with open(self._index_path(url), "r") as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            return None
+        with self._lock:
+            self._remember_entry(url, entry)
+        return entry
+
+    def _save_entry(self, url: str, entry: Dict[str, Any]) -> None:
+        with self._lock:
+            self._remember_entry(url, entry)
+        path = self._index_path(url)
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        try:
+            with open(tmp_path, "w") as f:
+                json.dump(entry, f)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            logger.warning(f"Could not persist media cache index for {url}: {e}")
+
+    def _remember_entry(self, url: str, entry: Dict[str, Any]) -> None:
+        self._index[url] = entry
+        self._index.move_to_end(url)
+        while len(self._index) > 10000:
+            self._index.popitem(last=False)
+
+    # ── Memory tier ─────────────────────────────────────────────────────────
+
+    def _memory_get(self, content_hash: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            item = self._memory.get(content_hash)
+            if item is not None:
+                self._memory.move_to_end(content_hash)
+            return item
+
+    def _memory_put(self, content_hash: str, data: bytes) -> Dict[str, Any]:
+        with self._lock:
+            item = self._memory.get(content_hash)
+            if item is None:
+                item = {"data": data, "image": None, "base64": None, "size": len(data)}
+                self._memory[content_hash] = item
+                self._memory_bytes += item["size"]
+                self._evict_memory()
+            else:
+                self._memory.move_to_end(content_hash)
+            return item
+
+    def _memory_grow(self, content_hash: str, item: Dict[str, Any], extra: int) -> None:
+        with self._lock:
+            if self._memory.get(content_hash) is item:
+                item["size"] += extra
+                self._memory_bytes += extra
+                self._evict_memory()
+
+    def _evict_memory(self) -> None:
+        while self._memory_bytes > self.memory_budget_bytes and len(self._memory) > 1:
+            _, item = self._memory.popitem(last=False)
+            self._memory_bytes -= item["size"]
+
+    # ── Fetching ────────────────────────────────────────────────────────────
+
+    def _fresh_item(self, url: str) -> Optional[Tuple[Dict[str, Any], Dict[str, Any]]]:
+        """In-memory asset for a URL that needs no revalidation, without touching disk"""
+        with self._lock:
+            entry = self._index.get(url)
+            if entry is None or time.time() - entry["validated_at"] >= self.fresh_seconds:
+                return None
+            item = self._memory.get(entry["content_hash"])
+            if item is None:
+                return None
+            self._index.move_to_end(url)
+            self._memory.move_to_end(entry["content_hash"])
+            self._stats["memory_hits"] += 1
+            return entry, item
+
+    def _fetch(self, url: str) -> Tuple[Dict[str, Any], Dict[str, Any]]:
+        """Resolve a URL to (index entry, memory item), downloading or revalidating as needed"""
+        cached = self._fresh_item(url)
+        if cached is not None:
+            return cached
+
+        self._ensure_disk()
+        stripe = int(hashlib.md5(url.encode()).hexdigest(), 16) % LOCK_STRIPES
+        with self._url_locks[stripe]:
+            # Another thread may have fetched it while we waited
+            cached = self._fresh_item(url)
+            if cached is not None:
+                return cached
+
+            entry = self._load_entry(url)
+            data = None
+            if entry is not None:
+                item = self._memory_get(entry["content_hash"])
+                data = item["data"] if item is not None else self._read_blob(entry["content_hash"])
+                if data is None:
+                    entry = None
+
+            if entry is not None and time.time() - entry["validated_at"] < self.fresh_seconds:
+                with self._lock:
+                    self._stats["disk_hits"] += 1
+                return entry, self._memory_put(entry["content_hash"], data)
+
+            headers = {}
+            if entry is not None:
+                if entry.get("etag"):
+                    headers["If-None-Match"] = entry["etag"]
+                if entry.get("last_modified"):
+                    headers["If-Modified-Since"] = entry["last_modified"]
+
+            try:
+                response = http_clients.sync.get(url, headers=headers, timeout=self.timeout_seconds)
+                if response.status_code == 304 and entry is not None:
+                    entry = {**entry, "validated_at": time.time()}
+                    self._save_entry(url, entry)
+                    with self._lock:
+                        self._stats["revalidated"] += 1
+                    return entry, self._memory_put(entry["content_hash"], data)
+                response.raise_for_status()
+            except Exception as e:
+                if entry is None:
+                    raise
+                # Serve the stale copy rather than failing a generation on a flaky origin
+                logger.warning(f"Revalidation failed for {url}, serving cached copy: {e}")
+                with self._lock:
+                    self._stats["stale_served"] += 1
+                return entry, self._memory_put(entry["content_hash"], data)
+
+            data = response.content
+            if len(data) > self.max_asset_bytes:
+                raise ValueError(f"Asset at {url} is {len(data)} bytes, above the media cache limit")
+
+            content_hash = hashlib.sha256(data).hexdigest()
+            content_type = (response.headers.get("content-type") or "").split(";")[0].strip().lower()
+            entry = {
+                "content_hash": content_hash,
+                "media_type": content_type if content_type.startswith("image/") else sniff_media_type(data),
+                "etag": response.headers.get("etag"),
+                "last_modified": response.headers.get("last-modified"),
+                "validated_at": time.time(),
+            }
+            try:
+                self._write_blob(content_hash, data)
+            except OSError as e:
+                logger.warning(f"Could not write media cache blob for {url}: {e}")
+            self._save_entry(url, entry)
+            with self._lock:
+                self._stats["downloads"] += 1
+                self._stats["download_bytes"] += len(data)
+            return entry, self._memory_put(content_hash, data)
+
+    def _image(self, entry: Dict[str, Any], item: Dict[str, Any]) -> Image.Image:
+        image = item["image"]
+        if image is None:
+            image = Image.open(io.BytesIO(item["data"]))
+            image.load()
+            item["image"] = image
+            self._memory_grow(entry["content_hash"], item, image.width * image.height * len(image.getbands()))
+        # Callers may resize or paste into the image, so never hand out the cached one
+        return image.copy()
+
+    def _base64(self, entry: Dict[str, Any], item: Dict[str, Any]) -> Dict[str, str]:
+        encoded = item["base64"]
+        if encoded is None:
+            encoded = base64.b64encode(item["data"]).decode("utf-8")
+            item["base64"] = encoded
+            self._memory_grow(entry["content_hash"], item, len(encoded))
+        return {"base64": encoded, "media_type": entry["media_type"]}
+
+    # ── Public API ──────────────────────────────────────────────────────────
+
+    def get_bytes_sync(self, url: str) -> bytes:
+        """Asset bytes for a URL (blocking; for worker threads and sync call sites)"""
+        return self._fetch(url)[1]["data"]
+
+    def get_image_sync(self, url: str) -> Image.Image:
+        """Decoded PIL image for a URL (blocking); the caller owns the returned copy"""
+        return self._image(*self._fetch(url))
+
+    async def get_bytes(self, url: str) -> bytes:
+        """Asset bytes for a URL; raises if the asset cannot be downloaded"""
+        cached = self._fresh_item(url)
+        if cached is not None:
+            return cached[1]["data"]
+        return await asyncio.to_thread(self.get_bytes_sync, url)
+
+    async def get_image(self, url: str) -> Image.Image:
+        """Decoded PIL image for a URL; the caller owns the returned copy"""
+        return await asyncio.to_thread(self.get_image_sync, url)
+
+    async def get_base64(self, url: str) -> Dict[str, str]:
+        """{"base64", "media_type"} for a URL, encoded once per cached asset"""
+        cached = self._fresh_item(url)
+        if cached is None:
+            cached = await asyncio.to_thread(self._fetch, url)
+        return self._base64(*cached)
+
+    async def get_data_url(self, url: str) -> str:
+        encoded = await self.get_base64(url)
+        return f"data:{encoded['media_type']};base64,{encoded['base64']}"
+
+    def invalidate(self, url: str) -> None:
+        """Forget a URL so the next lookup downloads it again"""
+        with self._lock:
+            self._index.pop(url, None)
+        try:
+            os.remove(self._index_path(url))
+        except OSError:
+            pass
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                **self._stats,
+                "urls_indexed": len(self._index),
+                "disk_blobs": len(self._blobs),
+                "disk_bytes": self._disk_bytes,
+                "memory_assets": len(self._memory),
+                "memory_bytes": self._memory_bytes,
+            }
+
+
+# Create global instance
+media_asset_cache = MediaAssetCache(
+    cache_dir=os.getenv("MEDIA_CACHE_DIR") or os.path.join(tempfile.gettempdir(), "emily-media-cache"),
+    disk_budget_bytes=int(float(os.getenv("MEDIA_CACHE_DISK_MB", "512")) * 1024 * 1024),
+    memory_budget_bytes=int(float(os.getenv("MEDIA_CACHE_MEMORY_MB", "64")) * 1024 * 1024),
+    fresh_seconds=float(os.getenv("MEDIA_CACHE_FRESH_SECONDS", "3600"))
+)
@@ -0,0 +1,399 @@
+"""
+Media Publish Jobs
+Background publishing of media containers that need server-side processing (Instagram reels)
+
+The request that creates the container returns a job handle straight away. A
+background task polls the container status with exponential backoff and
+publishes once it is FINISHED. Job state is kept in the media_publish_jobs
+table, so GET job status answers from any worker, and every state change is
+pushed on its own progress topic (media_publish).
+
+The worker polling a job holds a lease on its row and renews it on every
+update; an update only applies while the worker still owns the lease, and a
+worker whose lease was taken over stops polling that job. A periodic sweep on every worker claims processing jobs whose lease
+ran out (the worker was stopped or crashed) and resumes them through the
+handler factory registered for the platform.
+"""
+
+import os
+import time
+import uuid
+import asyncio
+import logging
+from datetime import datetime, timedelta, timezone
+from typing import Any, Awaitable, Callable, Dict, Optional, Set, Tuple
+
+from supabase import create_client, Client
+
+from services.progress_hub import progress_hub, MEDIA_PUBLISH_TOPIC
+
+logger = logging.getLogger(__name__)
+
+JOBS_TABLE = "media_publish_jobs"
+
+# Container states reported by the Graph API status_code field
+STATUS_FINISHED = "FINISHED"
+STATUS_FAILED = {"ERROR", "EXPIRED"}
+
+# Fields returned by the job status endpoint
+PUBLIC_FIELDS = ("platform", "container_id", "content_id", "status", "container_status",
+                 "percentage", "details", "result", "error", "created_at", "updated_at")
+
+StatusCheck = Callable[[], Awaitable[Optional[str]]]
+Publish = Callable[[], Awaitable[Dict[str, Any]]]
+# Rebuilds (check_status, publish) from a stored job row when another worker resumes it
+HandlerFactory = Callable[[Dict[str, Any]], Awaitable[Tuple[StatusCheck, Publish]]]
+
+
+class _LeaseLost(Exception):
+    """Another worker took over the job after this worker's lease expired"""
+
+
+def _utcnow() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+def _parse_time(value: Optional[str]) -> Optional[datetime]:
+    if not value:
+        return None
+    try:
+        parsed = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    except ValueError:
+        return None
+    return parsed if parsed.tzinfo else parsed.replace(tzinfo=timezone.utc)
+
+
+class MediaPublishJobs:
+    """Tracks container-processing jobs in Supabase and drives them to publication"""
+
+    def __init__(self, initial_delay: float = 2.0, max_delay: float = 30.0,
+                 backoff_factor: float = 1.6, timeout_seconds: float = 900.0,
+                 max_status_errors: int = 5, lease_seconds: float = 120.0,
+                 sweep_interval: float = 60.0):
+        self.initial_delay = initial_delay
+        self.max_delay = max_delay
+        self.backoff_factor = backoff_factor
+        self.timeout_seconds = timeout_seconds
+        self.max_status_errors = max_status_errors
+        # Must comfortably exceed max_delay: the lease is renewed once per poll
+        self.lease_seconds = max(lease_seconds, max_delay * 3)
+        self.sweep_interval = sweep_interval
+        self.worker_id = uuid.uuid4().hex
+
+        self._supabase: Optional[Client] = None
+        self._factories: Dict[str, HandlerFactory] = {}
+        # job id -> job row, for jobs polled by this worker
+        self._running: Dict[str, Dict[str, Any]] = {}
+        # Jobs whose row could not be stored; there is no lease to check for them
+        self._unstored: Set[str] = set()
+        self._tasks: Set[asyncio.Task] = set()
+        self._sweep_task: Optional[asyncio.Task] = None
+        self.stats = {"submitted": 0, "resumed": 0, "published": 0, "failed": 0, "store_errors": 0,
+                      "leases_lost": 0}
+
+    def _get_supabase(self) -> Client:
+        if self._supabase is None:
+            supabase_url = os.getenv("SUPABASE_URL")
+            supabase_key = os.getenv("SUPABASE_SERVICE_ROLE_KEY")
+            if not supabase_url or not supabase_key:
+                raise ValueError("SUPABASE_URL and SUPABASE_SERVICE_ROLE_KEY must be set")
+            self._supabase = create_client(supabase_url, supabase_key)
+        return self._supabase
+
+    def register(self, platform: str, factory: HandlerFactory) -> None:
+        """Register how to rebuild the status check and publish calls for a platform's jobs"""
+        self._factories[platform] = factory
+
+    # ── Submitting and reading jobs ─────────────────────────────────────────
+
+    async def submit(self, user_id: str, platform: str, container_id: str,
+                     check_status: StatusCheck, publish: Publish,
+                     account_id: Optional[str] = None, content_id: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Record a job, start polling its container in the background and return the job.
+
+        check_status returns the container status_code (None if it could not be read);
+        publish performs the final publish and returns the response payload.
+        """
+        now = _utcnow()
+        job = {
+            "id": str(uuid.uuid4()),
+            "user_id": user_id,
+            "platform": platform,
+            "container_id": container_id,
+            "account_id": account_id,
+            "content_id": str(content_id) if content_id else None,
+            "status": "processing",
+            "container_status": None,
+            "percentage": 0,
+            "details": None,
+            "result": None,
+            "error": None,
+            "lease_owner": self.worker_id,
+            "lease_expires_at": (now + timedelta(seconds=self.lease_seconds)).isoformat(),
+            "created_at": now.isoformat(),
+            "updated_at": now.isoformat(),
+        }
+        try:
+            await asyncio.to_thread(lambda: self._get_supabase().table(JOBS_TABLE).insert(job).execute())
+        except Exception as e:
+            # Still publish; the job is only visible to this worker
+            self._unstored.add(job["id"])
+            self.stats["store_errors"] += 1
+            logger.error(f"Error storing {platform} publish job for container {container_id}: {e}")
+
+        self.stats["submitted"] += 1
+        self._start(job, check_status, publish)
+        return self._public(job)
+
+    async def get(self, job_id: str, user_id: str) -> Optional[Dict[str, Any]]:
+        """Job state for its owner, from the shared table (falls back to this worker's copy)"""
+        try:
+            result = await asyncio.to_thread(
+                lambda: self._get_supabase().table(JOBS_TABLE).select("*").eq(
+                    "id", job_id
+                ).eq("user_id", user_id).limit(1).execute()
+            )
+            if result.data:
+                return self._public(result.data[0])
+        except Exception as e:
+            self.stats["store_errors"] += 1
+            logger.error(f"Error reading publish job {job_id}: {e}")
+        job = self._running.get(job_id)
+        if job is None or job["user_id"] != user_id:
+            return None
+        return self._public(job)
+
+    @staticmethod
+    def _public(job: Dict[str, Any]) -> Dict[str, Any]:
+        return {"job_id": job["id"], **{field: job.get(field) for field in PUBLIC_FIELDS}}
+
+    # ── Persisting state ────────────────────────────────────────────────────
+
+    async def _save(self, job: Dict[str, Any], **changes) -> None:
+        """
+        Apply changes to the job, renew (or drop) the lease and write the row.
+
+        Raises _LeaseLost when the row is no longer leased to this worker.
+        """
+        now = _utcnow()
+        job.update(changes, updated_at=now.isoformat())
+        if job["status"] == "processing" and job.get("lease_owner") == self.worker_id:
+            job["lease_expires_at"] = (now + timedelta(seconds=self.lease_seconds)).isoformat()
+        elif job["status"] != "processing":
+            job["lease_owner"] = None
+            job["lease_expires_at"] = None
+        row = {key: job[key] for key in ("status", "container_status", "percentage", "details", "result",
+                                          "error", "lease_owner", "lease_expires_at", "updated_at")}
+        if job["id"] in self._unstored:
+            return
+        try:
+            result = await asyncio.to_thread(
+                lambda: self._get_supabase().table(JOBS_TABLE).update(row).eq(
+                    "id", job["id"]
+                ).eq("lease_owner", self.worker_id).execute()
+            )
+        except Exception as e:
+            self.stats["store_errors"] += 1
+            logger.error(f"Error saving publish job {job['id']}: {e}")
+            return
+        if not result.data:
+            raise _LeaseLost(job["id"])
+
+    async def _notify(self, job: Dict[str, Any], percentage: int, details: str, **changes) -> None:
+        await self._save(job, percentage=percentage, details=details, **changes)
+        try:
+            await progress_hub.publish(job["user_id"], {
+                "type": "media_publish",
+                "step": "media_publish",
+                "percentage": percentage,
+                "details": details,
+                "current_platform": job["platform"],
+                "timestamp": job["updated_at"],
+                "is_generating": job["status"] == "processing",
+                "job_id": job["id"],
+                "content_id": job.get("content_id"),
+                "job_status": job["status"],
+                "result": job["result"],
+                "error": job["error"],
+            }, topic=MEDIA_PUBLISH_TOPIC)
+        except Exception as e:
+            logger.error(f"Error pushing publish progress for job {job['id']}: {e}")
+
+    # ── Polling ─────────────────────────────────────────────────────────────
+
+    def _start(self, job: Dict[str, Any], check_status: StatusCheck, publish: Publish) -> None:
+        self._running[job["id"]] = job
+        task = asyncio.get_running_loop().create_task(self._run(job, check_status, publish))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        task.add_done_callback(lambda _: self._running.pop(job["id"], None))
+        task.add_done_callback(lambda _: self._unstored.discard(job["id"]))
+
+    async def _run(self, job: Dict[str, Any], check_status: StatusCheck, publish: Publish) -> None:
+        try:
+            await self._poll(job, check_status, publish)
+        except _LeaseLost:
+            # The lease ran out (e.g. a long stall) and another worker resumed the job
+            self.stats["leases_lost"] += 1
+            logger.warning(f"Lost the lease on publish job {job['id']}; leaving it to the worker that claimed it")
+
+    async def _poll(self, job: Dict[str, Any], check_status: StatusCheck, publish: Publish) -> None:
+        # Resumed jobs keep counting from when the container was created
+        created_at = _parse_time(job.get("created_at")) or _utcnow()
+        started = time.monotonic() - max(0.0, (_utcnow() - created_at).total_seconds())
+        delay = self.initial_delay
+        status_errors = 0
+        platform = job["platform"].capitalize()
+        await self._notify(job, max(10, job.get("percentage") or 0), f"Processing {job['platform']} video...")
+
+        try:
+            while True:
+                await asyncio.sleep(delay)
+                delay = min(delay * self.backoff_factor, self.max_delay)
+                elapsed = time.monotonic() - started
+
+                try:
+                    container_status = await check_status()
+                except Exception as e:
+                    logger.warning(f"Status check failed for {job['platform']} container {job['container_id']}: {e}")
+                    container_status = None
+
+                if container_status is None:
+                    status_errors += 1
+                    if status_errors >= self.max_status_errors:
+                        # Status unreadable: try to publish anyway (it may be ready)
+                        logger.warning(f"Could not read status of container {job['container_id']}, attempting to publish")
+                        break
+                    await self._save(job)
+                    continue
+
+                status_errors = 0
+                job["container_status"] = container_status
+                if container_status == STATUS_FINISHED:
+                    break
+                if container_status in STATUS_FAILED:
+                    raise RuntimeError("Video processing failed. Please check your video file and try again.")
+                if elapsed >= self.timeout_seconds:
+                    logger.warning(f"Container {job['container_id']} still {container_status} after {int(elapsed)}s, attempting to publish")
+                    break
+
+                # Processing time is unknown; creep towards 80% as polling continues
+                percentage = min(80, 10 + int(70 * elapsed / self.timeout_seconds))
+                await self._notify(job, percentage, f"{platform} is processing the video ({container_status})...")
+
+            await self._notify(job, 90, f"Publishing to {platform}...")
+            result = await publish()
+            self.stats["published"] += 1
+            logger.info(f"Published {job['platform']} container {job['container_id']} (job {job['id']})")
+            await self._notify(job, 100, f"Published to {platform}!", status="published", result=result)
+
+        except asyncio.CancelledError:
+            # Worker shutting down: hand the job back so another worker's sweep resumes it
+            await self._release(job)
+            raise
+        except _LeaseLost:
+            raise
+        except Exception as e:
+            self.stats["failed"] += 1
+            error = getattr(e, "detail", None) or str(e)
+            logger.error(f"Publishing job {job['id']} for {job['platform']} failed: {error}")
+            await self._notify(job, 100, f"Publishing to {platform} failed", status="failed", error=error)
+
+    async def _release(self, job: Dict[str, Any]) -> None:
+        try:
+            await asyncio.to_thread(
+                lambda: self._get_supabase().table(JOBS_TABLE).update({
+                    "lease_owner": None,
+                    "lease_expires_at": None,
+                }).eq("id", job["id"]).eq("lease_owner", self.worker_id).execute()
+            )
+        except Exception as e:
+            self.stats["store_errors"] += 1
+            logger.error(f"Error releasing publish job {job['id']}: {e}")
+
+    # ── Resuming orphaned jobs ──────────────────────────────────────────────
+
+    def _claim_orphans(self):
+        """Atomically take over processing jobs whose lease expired or was released"""
+        now = _utcnow()
+        return self._get_supabase().table(JOBS_TABLE).update({
+            "lease_owner": self.worker_id,
+            "lease_expires_at": (now + timedelta(seconds=self.lease_seconds)).isoformat(),
+        }).eq("status", "processing").or_(
+            f"lease_expires_at.is.null,lease_expires_at.lt.{now.strftime('%Y-%m-%dT%H:%M:%SZ')}"
+        ).execute().data or []
+
+    async def resume_orphaned(self) -> int:
+        """Claim and resume jobs no worker is polling. Returns the number resumed."""
+        try:
+            claimed = await asyncio.to_thread(self._claim_orphans)
+        except Exception as e:
+            self.stats["store_errors"] += 1
+            logger.error(f"Error claiming orphaned publish jobs: {e}")
+            return 0
+
+        resumed = 0
+        for job in claimed:
+            if job["id"] in self._running:
+                continue
+            factory = self._factories.get(job["platform"])
+            if factory is None:
+                logger.warning(f"No publish handler registered for {job['platform']}, leaving job {job['id']}")
+                continue
+            try:
+                check_status, publish = await factory(job)
+            except Exception as e:
+                logger.error(f"Cannot resume publish job {job['id']}: {e}")
+                try:
+                    await self._save(job, status="failed", percentage=100, error=str(e))
+                except _LeaseLost:
+                    self.stats["leases_lost"] += 1
+                continue
+            logger.info(f"Resuming {job['platform']} publish job {job['id']} for container {job['container_id']}")
+            self._start(job, check_status, publish)
+            resumed += 1
+        self.stats["resumed"] += resumed
+        return resumed
+
+    async def _sweep(self) -> None:
+        while True:
+            try:
+                await self.resume_orphaned()
+            except Exception as e:
+                logger.error(f"Error in publish job sweep: {e}")
+            await asyncio.sleep(self.sweep_interval)
+
+    # ── Lifecycle ───────────────────────────────────────────────────────────
+
+    def start(self) -> None:
+        """Start the sweep that resumes jobs left behind by stopped workers"""
+        if self._sweep_task and not self._sweep_task.done():
+            return
+        self._sweep_task = asyncio.get_running_loop().create_task(self._sweep())
+
+    async def stop(self) -> None:
+        """Stop polling; jobs still processing are released for another worker to resume"""
+        if self._sweep_task:
+            self._sweep_task.cancel()
+            try:
+                await self._sweep_task
+            except asyncio.CancelledError:
+                pass
+            self._sweep_task = None
+        for task in list(self._tasks):
+            task.cancel()
+        if self._tasks:
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {**self.stats, "running": len(self._running)}
+
+
+# Create global instance
+media_publish_jobs = MediaPublishJobs(
+    timeout_seconds=float(os.getenv("MEDIA_PUBLISH_TIMEOUT_SECONDS", "900")),
+    max_delay=float(os.getenv("MEDIA_PUBLISH_MAX_POLL_INTERVAL_SECONDS", "30")),
+    lease_seconds=float(os.getenv("MEDIA_PUBLISH_LEASE_SECONDS", "120")),
+    sweep_interval=float(os.getenv("MEDIA_PUBLISH_SWEEP_INTERVAL_SECONDS", "60"))
+)
@@ -0,0 +1,240 @@
+"""
+Progress Hub
+Pub/sub fan-out of per-user progress updates to SSE subscribers
+
+Each subscriber gets a small bounded buffer. Publishing never awaits a
+subscriber: when a buffer is full the oldest update is dropped, and rapid
+updates for the same step replace the pending one instead of queueing behind
+it. Updates are grouped by topic (content generation, media publishing, ...)
+so one kind of progress never overwrites another's latest state. With
+PROGRESS_BROKER_URL pointing at a Redis-compatible server, updates and the
+latest state per user are shared across worker processes and hosts.
+"""
+
+import os
+import json
+import asyncio
+import logging
+import threading
+import uuid
+from collections import deque
+from typing import Any, Dict, Optional, Set, Tuple
+
+try:
+    import redis.asyncio as redis_asyncio
+    REDIS_AVAILABLE = True
+except ImportError:
+    redis_asyncio = None
+    REDIS_AVAILABLE = False
+
+logger = logging.getLogger(__name__)
+
+PROGRESS_CHANNEL = "emily:progress"
+PROGRESS_STATE_KEY = "emily:progress:state"
+
+# Content generation progress (what /content/progress-stream has always carried)
+DEFAULT_TOPIC = "content"
+# Background publishing of processed media (Instagram reels)
+MEDIA_PUBLISH_TOPIC = "media_publish"
+# Carousel slide URLs as each slide finishes
+CAROUSEL_TOPIC = "carousel"
+PROGRESS_TOPICS = (DEFAULT_TOPIC, MEDIA_PUBLISH_TOPIC, CAROUSEL_TOPIC)
+
+
+class ProgressSubscription:
+    """Bounded, coalescing buffer of progress updates for one SSE connection"""
+
+    def __init__(self, user_id: str, max_pending: int = 16, topic: str = DEFAULT_TOPIC):
+        self.user_id = user_id
+        self.topic = topic
+        self._pending: deque = deque(maxlen=max_pending)
+        self._event = asyncio.Event()
+        self.dropped = 0
+
+    def push(self, progress_data: Dict[str, Any]) -> None:
+        """Non-blocking enqueue (must run on the hub's event loop)"""
+        if self._pending:
+            last = self._pending[-1]
+            # Coalesce: a newer update for the same step supersedes the pending one
+            if (last.get("step") == progress_data.get("step")
+                    and last.get("is_generating", True) and progress_data.get("is_generating", True)):
+                self._pending[-1] = progress_data
+                self._event.set()
+                return
+        if len(self._pending) == self._pending.maxlen:
+            self.dropped += 1
+        self._pending.append(progress_data)
+        self._event.set()
+
+    async def get(self, timeout: Optional[float] = None) -> Dict[str, Any]:
+        """Wait for the next update; raises asyncio.TimeoutError after timeout"""
+        while not self._pending:
+            self._event.clear()
+            await asyncio.wait_for(self._event.wait(), timeout=timeout)
+        return self._pending.popleft()
+
+
+class ProgressHub:
+    """Fan-out hub for progress updates with an optional cross-process broker"""
+
+    def __init__(self, broker_url: Optional[str] = None, max_pending: int = 16):
+        self.broker_url = broker_url
+        self.max_pending = max_pending
+        self.instance_id = uuid.uuid4().hex
+
+        # (topic, user_id) -> latest update / local subscribers
+        self._latest: Dict[Tuple[str, str], Dict[str, Any]] = {}
+        self._subscribers: Dict[Tuple[str, str], Set[ProgressSubscription]] = {}
+        self._lock = threading.Lock()
+
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._redis = None
+        self._listener_task: Optional[asyncio.Task] = None
+        self.stats = {"published": 0, "delivered": 0, "broker_errors": 0}
+
+    # ------------------------------------------------------------------
+    # Lifecycle
+    # ------------------------------------------------------------------
+
+    async def start(self) -> None:
+        """Bind to the running loop and connect the broker, if configured"""
+        self._loop = asyncio.get_running_loop()
+        if not self.broker_url:
+            logger.info("Progress hub started (in-process)")
+            return
+        if not REDIS_AVAILABLE:
+            logger.warning("PROGRESS_BROKER_URL is set but redis is not installed; progress stays in-process")
+            return
+        try:
+            self._redis = redis_asyncio.from_url(self.broker_url, decode_responses=True)
+            self._listener_task = self._loop.create_task(self._listen())
+            logger.info("Progress hub started with cross-process broker")
+        except Exception as e:
+            self._redis = None
+            logger.error(f"Failed to connect progress broker, staying in-process: {e}")
+
+    async def stop(self) -> None:
+        if self._listener_task:
+            self._listener_task.cancel()
+            try:
+                await self._listener_task
+            except asyncio.CancelledError:
+                pass
+            self._listener_task = None
+        if self._redis:
+            await self._redis.aclose()
+            self._redis = None
+
+    async def _listen(self) -> None:
+        """Relay updates published by other processes to local subscribers"""
+        while True:
+            try:
+                pubsub = self._redis.pubsub()
+                await pubsub.subscribe(PROGRESS_CHANNEL)
+                async for message in pubsub.listen():
+                    if message.get("type") != "message":
+                        continue
+                    envelope = json.loads(message["data"])
+                    if envelope.get("origin") == self.instance_id:
+                        continue
+                    progress_data = envelope["data"]
+                    self._deliver_local(
+                        progress_data["user_id"], progress_data, progress_data.get("topic", DEFAULT_TOPIC)
+                    )
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.stats["broker_errors"] += 1
+                logger.error(f"Progress broker listener error, reconnecting: {e}")
+                await asyncio.sleep(2)
+
+    # ------------------------------------------------------------------
+    # Publish / subscribe
+    # ------------------------------------------------------------------
+
+    @staticmethod
+    def _state_field(user_id: str, topic: str) -> str:
+        # Content progress keeps its original field name in the shared state hash
+        return user_id if topic == DEFAULT_TOPIC else f"{topic}:{user_id}"
+
+    def _deliver_local(self, user_id: str, progress_data: Dict[str, Any], topic: str = DEFAULT_TOPIC) -> None:
+        with self._lock:
+            self._latest[(topic, user_id)] = progress_data
+            subscribers = list(self._subscribers.get((topic, user_id), ()))
+        for subscription in subscribers:
+            subscription.push(progress_data)
+        self.stats["delivered"] += len(subscribers)
+
+    async def publish(self, user_id: str, progress_data: Dict[str, Any], topic: str = DEFAULT_TOPIC) -> None:
+        """Record the latest progress for a user and fan it out without blocking on subscribers"""
+        progress_data = {**progress_data, "user_id": user_id, "topic": topic}
+        self.stats["published"] += 1
+
+        running_loop = asyncio.get_running_loop()
+        if self._loop is None or running_loop is self._loop:
+            self._deliver_local(user_id, progress_data, topic)
+            if self._redis:
+                await self._publish_to_broker(user_id, progress_data, topic)
+        else:
+            # Called from a background thread's loop: hand off to the hub's loop
+            self._loop.call_soon_threadsafe(self._deliver_local, user_id, progress_data, topic)
+            if self._redis:
+                asyncio.run_coroutine_threadsafe(self._publish_to_broker(user_id, progress_data, topic), self._loop)
+
+    async def _publish_to_broker(self, user_id: str, progress_data: Dict[str, Any], topic: str) -> None:
+        try:
+            payload = json.dumps(progress_data, default=str)
+            await self._redis.hset(PROGRESS_STATE_KEY, self._state_field(user_id, topic), payload)
+            await self._redis.publish(
+                PROGRESS_CHANNEL,
+                json.dumps({"origin": self.instance_id, "data": progress_data}, default=str)
+            )
+        except Exception as e:
+            self.stats["broker_errors"] += 1
+            logger.error(f"Error publishing progress for user {user_id} to broker: {e}")
+
+    async def get_latest(self, user_id: str, topic: str = DEFAULT_TOPIC) -> Optional[Dict[str, Any]]:
+        """Latest progress for a user, from this process or the shared broker"""
+        with self._lock:
+            latest = self._latest.get((topic, user_id))
+        if latest is None and self._redis:
+            try:
+                payload = await self._redis.hget(PROGRESS_STATE_KEY, self._state_field(user_id, topic))
+                latest = json.loads(payload) if payload else None
+            except Exception as e:
+                self.stats["broker_errors"] += 1
+                logger.error(f"Error reading progress for user {user_id} from broker: {e}")
+        return latest
+
+    def subscribe(self, user_id: str, topic: str = DEFAULT_TOPIC) -> ProgressSubscription:
+        subscription = ProgressSubscription(user_id, self.max_pending, topic)
+        with self._lock:
+            self._subscribers.setdefault((topic, user_id), set()).add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: ProgressSubscription) -> None:
+        key = (subscription.topic, subscription.user_id)
+        with self._lock:
+            subscribers = self._subscribers.get(key)
+            if subscribers is not None:
+                subscribers.discard(subscription)
+                if not subscribers:
+                    del self._subscribers[key]
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            subscriber_count = sum(len(subs) for subs in self._subscribers.values())
+            users = len({user_id for _, user_id in self._subscribers})
+        return {
+            **self.stats,
+            "subscribers": subscriber_count,
+            "subscribed_users": users,
+            "broker": bool(self._redis),
+        }
+
+
+# Create global instance
+progress_hub = ProgressHub(
+    broker_url=os.getenv("PROGRESS_BROKER_URL") or None,
+    max_pending=int(os.getenv("PROGRESS_SUBSCRIBER_BUFFER", "16"))
+)
@@ -0,0 +1,266 @@
+"""
+Streaming Upload
+Validate and stream media files to Supabase storage without buffering them whole
+
+Starlette already spools multipart uploads to a temporary file, so the upload
+endpoints only need to stop calling `await file.read()` on the whole body. The
+first chunk is checked against known magic bytes and the size is taken from the
+spooled file before anything is sent. Files up to one TUS chunk go through the
+regular storage upload; larger files use Supabase's resumable (TUS) endpoint in
+fixed-size chunks, resuming from the server's offset after a failed chunk. Worker
+memory per upload stays at one chunk regardless of the file size.
+"""
+
+import io
+import os
+import base64
+import asyncio
+import logging
+from typing import BinaryIO, Dict, Iterable, Optional, Tuple
+
+import httpx
+from supabase import create_client, Client
+
+from services.http_clients import http_clients
+
+logger = logging.getLogger(__name__)
+
+# Supabase's resumable endpoint requires 6 MB chunks (except the last one)
+TUS_CHUNK_SIZE = 6 * 1024 * 1024
+SNIFF_BYTES = 64 * 1024
+
+
+class UploadValidationError(ValueError):
+    """The upload was rejected (size or content); the message is safe to show to the user"""
+
+
+def detect_media_type(head: bytes) -> Optional[str]:
+    """Media type from a file's leading bytes, or None if unrecognised"""
+    if head.startswith(b"\xff\xd8\xff"):
+        return "image/jpeg"
+    if head.startswith(b"\x89PNG\r\n\x1a\n"):
+        return "image/png"
+    if head[:6] in (b"GIF87a", b"GIF89a"):
+        return "image/gif"
+    if head[:4] == b"RIFF" and head[8:12] == b"WEBP":
+        return "image/webp"
+    if head[:4] == b"RIFF" and head[8:12] == b"AVI ":
+        return "video/x-msvideo"
+    if head[4:8] == b"ftyp":
+        return "video/quicktime" if head[8:12] == b"qt  " else "video/mp4"
+    if head[4:8] in (b"wide", b"mdat", b"moov"):
+        # Legacy QuickTime files start straight with an atom instead of ftyp
+        return "video/quicktime"
+    if head.startswith(b"\x1a\x45\xdf\xa3"):
+        return "video/webm"
+    if head[:4] in (b"\x00\x00\x01\xba", b"\x00\x00\x01\xb3"):
+        return "video/mpeg"
+    return None
+
+
+def _media_kind(media_type: Optional[str]) -> Optional[str]:
+    return media_type.split("/")[0] if media_type else None
+
+
+def _file_size(fileobj: BinaryIO) -> int:
+    position = fileobj.tell()
+    fileobj.seek(0, os.SEEK_END)
+    size = fileobj.tell()
+    fileobj.seek(position)
+    return size
+
+
+def _read_at(fileobj: BinaryIO, offset: int, size: int) -> bytes:
+    fileobj.seek(offset)
+    return fileobj.read(size)
+
+
+class StreamingUploader:
+    """Uploads file objects to Supabase storage in bounded memory"""
+
+    def __init__(self, chunk_size: int = TUS_CHUNK_SIZE, max_chunk_retries: int = 3):
+        self.chunk_size = chunk_size
+        self.max_chunk_retries = max_chunk_retries
+        self._supabase: Optional[Client] = None
+        self._stats = {"uploads": 0, "resumable_uploads": 0, "bytes": 0, "resumed_chunks": 0, "rejected": 0}
+
+    def _credentials(self) -> Tuple[str, str]:
+        supabase_url = os.getenv("SUPABASE_URL")
+        supabase_key = os.getenv("SUPABASE_SERVICE_ROLE_KEY") or os.getenv("SUPABASE_ANON_KEY")
+        if not supabase_url or not supabase_key:
+            raise ValueError("SUPABASE_URL and SUPABASE_SERVICE_ROLE_KEY must be set")
+        return supabase_url.rstrip("/"), supabase_key
+
+    def _get_supabase(self) -> Client:
+        if self._supabase is None:
+            self._supabase = create_client(*self._credentials())
+        return self._supabase
+
+    # ── Validation ──────────────────────────────────────────────────────────
+
+    async def inspect(self, fileobj: BinaryIO, declared_type: Optional[str],
+                      max_sizes: Dict[str, int]) -> Tuple[int, str]:
+        """
+        Check an upload's size and leading bytes before it is sent anywhere.
+
+        Args:
+            fileobj: Seekable binary file (e.g. UploadFile.file)
+            declared_type: Content type sent by the client
+            max_sizes: Maximum size in bytes per media kind, e.g. {"image": ..., "video": ...}
+
+        Returns:
+            (size in bytes, detected media type)
+
+        Raises:
+            UploadValidationError: unknown content, a kind mismatch, or a file that is too large
+        """
+        size, head = await asyncio.to_thread(self._size_and_head, fileobj)
+        detected = detect_media_type(head)
+        declared_kind = _media_kind(declared_type)
+
+        if detected is None or _media_kind(detected) not in max_sizes:
+            self._stats["rejected"] += 1
+            raise UploadValidationError("File content does not match a supported image or video format.")
+        if declared_kind and declared_kind != _media_kind(detected):
+            self._stats["rejected"] += 1
+            raise UploadValidationError(f"File content is {detected}, which does not match the declared type {declared_type}.")
+
+        max_size = max_sizes[_media_kind(detected)]
+        if size > max_size:
+            self._stats["rejected"] += 1
+            noun = "videos" if _media_kind(detected) == "video" else "images"
+            raise UploadValidationError(f"File size too large. Maximum size is {max_size // (1024 * 1024)}MB for {noun}.")
+        return size, detected
+
+    @staticmethod
+    def _size_and_head(fileobj: BinaryIO) -> Tuple[int, bytes]:
+        size = _file_size(fileobj)
+        head = _read_at(fileobj, 0, SNIFF_BYTES)
+        fileobj.seek(0)
+        return size, head
+
+    # ── Upload ──────────────────────────────────────────────────────────────
+
+    async def upload(self, bucket: str, object_path: str, fileobj: BinaryIO, content_type: str,
+                     size: Optional[int] = None, upsert: bool = False) -> str:
+        """
+        Upload a seekable file object to storage and return its public URL.
+
+        Files no larger than one chunk use the regular upload endpoint; anything
+        bigger is sent through the resumable endpoint one chunk at a time.
+        """
+        if size is None:
+            size = await asyncio.to_thread(_file_size, fileobj)
+
+        if size <= self.chunk_size:
+            data = await asyncio.to_thread(_read_at, fileobj, 0, size)
+            await asyncio.to_thread(self._upload_small, bucket, object_path, data, content_type, upsert)
+        else:
+            await self._upload_resumable(bucket, object_path, fileobj, content_type, size, upsert)
+            self._stats["resumable_uploads"] += 1
+
+        self._stats["uploads"] += 1
+        self._stats["bytes"] += size
+        return self._get_supabase().storage.from_(bucket).get_public_url(object_path)
+
+    async def upload_bytes(self, bucket: str, object_path: str, data: bytes, content_type: str,
+                           upsert: bool = False) -> str:
+        return await self.upload(bucket, object_path, io.BytesIO(data), content_type, len(data), upsert)
+
+    async def upload_path(self, bucket: str, object_path: str, file_path: str, content_type: str) -> str:
+        with open(file_path, "rb") as fileobj:
+            return await self.upload(bucket, object_path, fileobj, content_type)
+
+    def _upload_small(self, bucket: str, object_path: str, data: bytes, content_type: str, upsert: bool) -> None:
+        file_options = {"content-type": content_type}
+        if upsert:
+            file_options["upsert"] = "true"
+        storage_response = self._get_supabase().storage.from_(bucket).upload(
+            object_path,
+            data,
+            file_options=file_options
+        )
+        if hasattr(storage_response, 'error') and storage_response.error:
+            raise Exception(f"Storage upload failed: {storage_response.error}")
+
+    @staticmethod
+    def _tus_metadata(items: Iterable[Tuple[str, str]]) -> str:
+        return ",".join(f"{key} {base64.b64encode(value.encode()).decode()}" for key, value in items)
+
+    async def _upload_resumable(self, bucket: str, object_path: str, fileobj: BinaryIO,
+                                content_type: str, size: int, upsert: bool = False) -> None:
+        supabase_url, supabase_key = self._credentials()
+        headers = {
+            "Authorization": f"Bearer {supabase_key}",
+            "apikey": supabase_key,
+            "Tus-Resumable": "1.0.0",
+        }
+
+        create = await http_clients.post(
+            f"{supabase_url}/storage/v1/upload/resumable",
+            headers={
+                **headers,
+                "Upload-Length": str(size),
+                "Upload-Metadata": self._tus_metadata([
+                    ("bucketName", bucket),
+                    ("objectName", object_path),
+                    ("contentType", content_type),
+                    ("cacheControl", "3600"),
+                ]),
+                "x-upsert": "true" if upsert else "false",
+            },
+            retries=0,
+        )
+        if create.status_code != 201 or "location" not in create.headers:
+            raise Exception(f"Storage upload failed: could not start resumable upload (HTTP {create.status_code}): {create.text}")
+        location = create.headers["location"]
+        if location.startswith("/"):
+            location = f"{supabase_url}{location}"
+
+        offset = 0
+        failures = 0
+        while offset < size:
+            chunk = await asyncio.to_thread(_read_at, fileobj, offset, self.chunk_size)
+            try:
+                response = await http_clients.patch(
+                    location,
+                    headers={
+                        **headers,
+                        "Upload-Offset": str(offset),
+                        "Content-Type": "application/offset+octet-stream",
+                    },
+                    content=chunk,
+                    retries=0,
+                    timeout=httpx.Timeout(120.0, connect=10.0),
+                )
+                if response.status_code == 204:
+                    offset = int(response.headers.get("upload-offset", offset + len(chunk)))
+                    failures = 0
+                    continue
+                error = f"HTTP {response.status_code}: {response.text}"
+            except httpx.HTTPError as e:
+                error = str(e)
+
+            failures += 1
+            if failures > self.max_chunk_retries:
+                raise Exception(f"Storage upload failed at byte {offset} of {object_path}: {error}")
+            # Ask the server how much it kept and continue from there
+            self._stats["resumed_chunks"] += 1
+            logger.warning(f"Resumable upload chunk failed for {object_path} at {offset} ({error}); resuming")
+            await asyncio.sleep(min(2 ** failures, 10))
+            status = await http_clients.head(location, headers=headers, retries=1)
+            if status.status_code == 200 and status.headers.get("upload-offset"):
+                offset = int(status.headers["upload-offset"])
+            elif status.status_code in (404, 410):
+                raise Exception(f"Storage upload failed: resumable upload for {object_path} expired")
+
+        logger.info(f"Resumable upload complete: {bucket}/{object_path} ({size} bytes)")
+
+    def get_stats(self) -> Dict[str, int]:
+        return dict(self._stats)
+
+
+# Create global instance
+streaming_uploader = StreamingUploader(
+    max_chunk_retries=int(os.getenv("STORAGE_UPLOAD_CHUNK_RETRIES", "3"))
+)
@@ -4,23 +4,18 @@ Handles HTML template processing, content generation, and PNG conversion
 """
 
 import os
-import base64
 import asyncio
 import json
 from typing import Dict, Any, Optional
-from pathlib import Path
 from bs4 import BeautifulSoup
-import httpx
 import openai
 from supabase import create_client, Client
 from datetime import datetime
 
-# Import playwright with error handling
-try:
-    from playwright.async_api import async_playwright
-    PLAYWRIGHT_AVAILABLE = True
-except ImportError:
-    PLAYWRIGHT_AVAILABLE = False
+from services.html_renderer import html_renderer
+from services.media_asset_cache import media_asset_cache
+
+if not html_renderer.available:
     print("⚠️ Warning: Playwright not installed. PNG conversion will not work.")
     print("   Install with: pip install playwright && playwright install chromium")
 
@@ -247,26 +242,8 @@ class TemplateProcessor:
     async def _download_image_to_base64(self, image_url: str) -> str:
         """Download image from URL and convert to base64 for OpenAI Vision API"""
         try:
-            async with httpx.AsyncClient() as client:
-                response = await client.get(image_url)
-                response.raise_for_status()
-                image_data = response.content
-                
-                # Convert to base64
-                image_base64 = base64.b64encode(image_data).decode('utf-8')
-                
-                # Determine image format
-                content_type = response.headers.get('content-type', 'image/jpeg')
-                if 'png' in content_type.lower():
-                    mime_type = 'image/png'
-                elif 'jpeg' in content_type.lower() or 'jpg' in content_type.lower():
-                    mime_type = 'image/jpeg'
-                elif 'webp' in content_type.lower():
-                    mime_type = 'image/webp'
-                else:
-                    mime_type = 'image/jpeg'
-                
-                return f"data:{mime_type};base64,{image_base64}"
+            # Cached by URL, so repeated renders for the same brand reuse the encoding
+            return await media_asset_cache.get_data_url(image_url)
                 
         except Exception as e:
             print(f"❌ Error downloading image: {e}")
@@ -402,49 +379,9 @@ IMPORTANT:
             raise
     
     async def _html_to_png(self, html_content: str) -> bytes:
-        """Convert HTML content to PNG using Playwright"""
-        if not PLAYWRIGHT_AVAILABLE:
-            raise Exception(
-                "Playwright is not installed. Please install it with: "
-                "pip install playwright && playwright install chromium"
-            )
-        
+        """Convert HTML content to PNG on the shared warm browser pool"""
         try:
-            # Create temporary HTML file
-            import tempfile
-            with tempfile.NamedTemporaryFile(mode='w', suffix='.html', delete=False, encoding='utf-8') as tmp_file:
-                tmp_file.write(html_content)
-                tmp_file_path = tmp_file.name
-            
-            try:
-                async with async_playwright() as p:
-                    browser = await p.chromium.launch(headless=True)
-                    page = await browser.new_page()
-                    
-                    # Set viewport size
-                    await page.set_viewport_size({"width": 800, "height": 600})
-                    
-                    # Load HTML from file
-                    html_url = Path(tmp_file_path).as_uri()
-                    await page.goto(html_url, wait_until='networkidle')
-                    
-                    # Wait for images to load
-                    await page.wait_for_timeout(2000)
-                    
-                    # Take screenshot
-                    png_data = await page.screenshot(full_page=True, type='png')
-                    
-                    await browser.close()
-                    
-                    return png_data
-                    
-            finally:
-                # Clean up temporary file
-                try:
-                    os.unlink(tmp_file_path)
-                except:
-                    pass
-                    
+            return await html_renderer.render_png(html_content, viewport=(800, 600), full_page=True)
         except Exception as e:
             print(f"❌ Error converting HTML to PNG: {e}")
             raise
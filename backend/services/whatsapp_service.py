@@ -4,7 +4,7 @@ Handles sending messages, webhook verification, and connection management
 """
 
 import os
-import requests
+import httpx
 import hmac
 import hashlib
 import json
@@ -12,7 +12,8 @@ import logging
 from typing import Dict, Any, Optional, List
 from datetime import datetime
 from supabase import create_client
-from cryptography.fernet import Fernet
+from services.http_clients import http_clients
+from services.connection_registry import connection_registry
 
 logger = logging.getLogger(__name__)
 
@@ -29,21 +30,11 @@ class WhatsAppService:
     
     def encrypt_token(self, token: str) -> str:
         """Encrypt token for storage"""
-        key = os.getenv('ENCRYPTION_KEY')
-        if not key:
-            raise ValueError("ENCRYPTION_KEY not found")
-        
-        f = Fernet(key.encode())
-        return f.encrypt(token.encode()).decode()
+        return connection_registry.encrypt_token(token)
     
     def decrypt_token(self, encrypted_token: str) -> str:
         """Decrypt token for use"""
-        key = os.getenv('ENCRYPTION_KEY')
-        if not key:
-            raise ValueError("ENCRYPTION_KEY not found")
-        
-        f = Fernet(key.encode())
-        return f.decrypt(encrypted_token.encode()).decode()
+        return connection_registry.decrypt_token(encrypted_token)
     
     def get_whatsapp_connection(self, user_id: str) -> Optional[Dict[str, Any]]:
         """Get active WhatsApp connection for user"""
@@ -164,10 +155,10 @@ class WhatsAppService:
                 }
             
             # Send message
-            response = requests.post(url, headers=headers, json=payload, timeout=30)
+            response = await http_clients.post(url, headers=headers, json=payload, timeout=30)
             
             # Check response for errors
-            if not response.ok:
+            if not response.is_success:
                 error_data = response.json() if response.content else {}
                 error_message = error_data.get("error", {}).get("message", "Unknown error")
                 error_code = error_data.get("error", {}).get("code", 0)
@@ -213,7 +204,7 @@ class WhatsAppService:
                         "For first messages, use a template message."
             }
             
-        except requests.exceptions.RequestException as e:
+        except httpx.HTTPError as e:
             logger.error(f"Error sending WhatsApp message: {e}")
             if hasattr(e, 'response') and e.response is not None:
                 try:
@@ -372,8 +363,8 @@ class WhatsAppService:
                 # First, try to get the WABA ID from the phone number
                 try:
                     phone_info_url = f"https://graph.facebook.com/{self.api_version}/{phone_number_id}"
-                    phone_response = requests.get(phone_info_url, headers={"Authorization": f"Bearer {access_token}"}, timeout=10)
-                    if phone_response.ok:
+                    phone_response = await http_clients.get(phone_info_url, headers={"Authorization": f"Bearer {access_token}"}, timeout=10)
+                    if phone_response.is_success:
                         phone_data = phone_response.json()
                         waba_id = phone_data.get("whatsapp_business_account_id")
                         if waba_id:
@@ -392,7 +383,7 @@ class WhatsAppService:
             }
             
             # Fetch templates
-            response = requests.get(url, headers=headers, timeout=30)
+            response = await http_clients.get(url, headers=headers, timeout=30)
             response.raise_for_status()
             
             result = response.json()
@@ -413,7 +404,7 @@ class WhatsAppService:
             logger.info(f"Retrieved {len(formatted_templates)} WhatsApp templates for user {user_id}")
             return formatted_templates
             
-        except requests.exceptions.RequestException as e:
+        except httpx.HTTPError as e:
             logger.error(f"Error fetching WhatsApp templates: {e}")
             if hasattr(e, 'response') and e.response is not None:
                 logger.error(f"Response: {e.response.text}")
@@ -513,10 +504,10 @@ class WhatsAppService:
             }
             
             # Send message
-            response = requests.post(url, headers=headers, json=payload, timeout=30)
+            response = await http_clients.post(url, headers=headers, json=payload, timeout=30)
             
             # Check response for errors
-            if not response.ok:
+            if not response.is_success:
                 error_data = response.json() if response.content else {}
                 error_message = error_data.get("error", {}).get("message", "Unknown error")
                 error_code = error_data.get("error", {}).get("code", 0)
@@ -536,7 +527,7 @@ class WhatsAppService:
                 "template_name": template_name
             }
             
-        except requests.exceptions.RequestException as e:
+        except httpx.HTTPError as e:
             logger.error(f"Error sending WhatsApp template message: {e}")
             if hasattr(e, 'response') and e.response is not None:
                 try:
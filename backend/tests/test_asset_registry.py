@@ -0,0 +1,131 @@
+"""Shared uploads must survive deleting one of the posts that use them"""
+
+import asyncio
+
+import pytest
+
+pytest.importorskip("supabase")
+
+from services import asset_registry as registry_module  # noqa: E402
+from services.asset_registry import AssetRegistry  # noqa: E402
+
+
+class _Result:
+    def __init__(self, data):
+        self.data = data
+
+
+class _Query:
+    def __init__(self, db, table):
+        self.db = db
+        self.table = table
+        self.filters = {}
+        self.row = None
+
+    def select(self, *_):
+        return self
+
+    def insert(self, row):
+        self.row = row
+        return self
+
+    def eq(self, column, value):
+        self.filters[column] = value
+        return self
+
+    def limit(self, _):
+        return self
+
+    def execute(self):
+        rows = self.db.tables.setdefault(self.table, [])
+        if self.row is not None:
+            stored = {"id": f"asset-{len(rows) + 1}", "ref_count": 1, **self.row}
+            rows.append(stored)
+            return _Result([stored])
+        return _Result([row for row in rows if all(row.get(k) == v for k, v in self.filters.items())])
+
+
+class _Bucket:
+    def __init__(self, db, name):
+        self.db = db
+        self.name = name
+
+    def remove(self, paths):
+        self.db.removed.extend((self.name, path) for path in paths)
+
+
+class _Storage:
+    def __init__(self, db):
+        self.db = db
+
+    def from_(self, name):
+        return _Bucket(self.db, name)
+
+
+class _Rpc:
+    def __init__(self, db, name, params):
+        self.db = db
+        self.name = name
+        self.params = params
+
+    def execute(self):
+        assets = self.db.tables.get("media_assets", [])
+        if self.name == "reference_media_asset":
+            for asset in assets:
+                if asset["id"] == self.params["asset_id"]:
+                    asset["ref_count"] += 1
+            return _Result(None)
+        if self.name == "release_media_assets":
+            released = 0
+            for asset in assets:
+                uses = self.params["urls"].count(asset["public_url"])
+                if uses:
+                    asset["ref_count"] -= uses
+                    released += 1
+            return _Result(released)
+        raise AssertionError(f"unexpected rpc {self.name}")
+
+
+class FakeSupabase:
+    def __init__(self):
+        self.tables = {}
+        self.removed = []
+        self.storage = _Storage(self)
+
+    def table(self, name):
+        return _Query(self, name)
+
+    def rpc(self, name, params):
+        return _Rpc(self, name, params)
+
+
+@pytest.fixture
+def registry(monkeypatch):
+    async def fake_upload(bucket, object_path, fileobj, content_type, size=None):
+        return f"https://example.supabase.co/storage/v1/object/public/{bucket}/{object_path}"
+
+    monkeypatch.setattr(registry_module.streaming_uploader, "upload", fake_upload)
+    registry = AssetRegistry()
+    registry._supabase = FakeSupabase()
+    return registry
+
+
+def test_deleting_one_of_two_posts_keeps_the_shared_upload(registry):
+    data = b"same photo bytes"
+    first = asyncio.run(registry.upload_bytes("user-1", "user-uploads", "a.jpg", data, "image/jpeg"))
+    second = asyncio.run(registry.upload_bytes("user-1", "user-uploads", "b.jpg", data, "image/jpeg"))
+    assert first == second
+
+    removed = registry.discard("user-uploads", "a.jpg", first)
+
+    assert removed is False
+    assert registry._supabase.removed == []
+    asset = registry._supabase.tables["media_assets"][0]
+    assert asset["ref_count"] == 1
+
+
+def test_unregistered_objects_are_still_removed(registry):
+    url = "https://example.supabase.co/storage/v1/object/public/user-uploads/legacy.jpg"
+
+    assert registry.discard("user-uploads", "legacy.jpg", url) is True
+    assert registry._supabase.removed == [("user-uploads", "legacy.jpg")]
@@ -0,0 +1,201 @@
+"""
+Conversation Context Manager
+Keeps the ATSN clarification context bounded instead of resending the whole conversation every turn
+
+The last K turns are kept verbatim. Older turns are folded into a compressed
+summary (the opening request is always kept first), and once turns have been
+folded the partial payload extracted so far is included so no detail is lost.
+The rendered context is held under a per-request token budget; a single turn
+that does not fit is cut in the middle with an explicit truncation marker.
+The stored turn list itself is capped (append_turn) so long clarification
+loops do not grow the agent state without bound.
+"""
+
+import os
+import json
+import logging
+import threading
+from typing import Any, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Rough characters-per-token ratio for Gemini/GPT style tokenizers on English text
+CHARS_PER_TOKEN = 4
+
+# Payload keys that carry media/blob references rather than user-provided details
+_PAYLOAD_SKIP_KEYS = {"media_file", "media_url", "media_urls", "images", "image_urls"}
+
+
+def estimate_tokens(text: Optional[str]) -> int:
+    """Cheap token estimate used for budgeting and metrics"""
+    if not text:
+        return 0
+    return max(1, (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN)
+
+
+def _shorten(text: str, max_chars: int) -> str:
+    text = " ".join(text.split())
+    if len(text) <= max_chars:
+        return text
+    return text[:max_chars - 1].rstrip() + "…"
+
+
+def _truncate_with_marker(text: str, max_chars: int) -> str:
+    """Keep the beginning and end of an oversized message and say how much was cut"""
+    text = " ".join(text.split())
+    if len(text) <= max_chars:
+        return text
+    marker = f" [... message truncated, {len(text) - max_chars} characters omitted ...] "
+    keep = max(max_chars - len(marker), 0)
+    head = (keep * 2) // 3
+    tail = keep - head
+    return text[:head].rstrip() + marker + (text[-tail:].lstrip() if tail else "")
+
+
+class ConversationContextManager:
+    """Builds a bounded conversation context from clarification turns"""
+
+    def __init__(self, max_verbatim_turns: int = 6, token_budget: int = 1500,
+                 summary_token_budget: int = 300, payload_token_budget: int = 250,
+                 turn_summary_chars: int = 160, max_stored_turns: int = 20):
+        self.max_verbatim_turns = max_verbatim_turns
+        self.max_stored_turns = max(2, max_stored_turns)
+        self.token_budget = token_budget
+        self.summary_token_budget = summary_token_budget
+        self.payload_token_budget = payload_token_budget
+        self.turn_summary_chars = turn_summary_chars
+
+        self._lock = threading.Lock()
+        self.metrics = {
+            "requests": 0,
+            "compressed_requests": 0,
+            "raw_tokens": 0,
+            "sent_tokens": 0,
+            "tokens_saved": 0,
+        }
+
+    def append_turn(self, turns: List[str], turn: str) -> List[str]:
+        """
+        Return turns with turn appended, bounded to max_stored_turns.
+
+        The opening request is always kept; the oldest follow-ups are dropped
+        first (they are the first to fall out of the summary anyway), and each
+        stored turn is capped at the whole context budget.
+        """
+        max_chars = self.token_budget * CHARS_PER_TOKEN
+        turns = [t for t in turns if t and t.strip()]
+        if turn and turn.strip():
+            turns.append(_truncate_with_marker(turn, max_chars))
+        if len(turns) > self.max_stored_turns:
+            dropped = len(turns) - self.max_stored_turns
+            turns = turns[:1] + turns[dropped + 1:]
+            logger.debug(f"Dropped {dropped} old clarification turn(s) from the conversation context")
+        return turns
+
+    def _summarize(self, older_turns: List[str]) -> str:
+        """Fold older turns into a compact summary, always keeping the opening request"""
+        if not older_turns:
+            return ""
+        first = _shorten(older_turns[0], self.turn_summary_chars * 2)
+        rest = [_shorten(turn, self.turn_summary_chars) for turn in older_turns[1:]]
+
+        budget_chars = self.summary_token_budget * CHARS_PER_TOKEN
+        # Drop the oldest follow-ups first; the opening request and the latest folded turns matter most
+        while rest and len(first) + sum(len(turn) + 3 for turn in rest) > budget_chars:
+            rest.pop(0)
+        summary = " | ".join([first] + rest)
+        return _shorten(summary, budget_chars)
+
+    def _payload_line(self, payload: Optional[Dict[str, Any]]) -> str:
+        if not payload:
+            return ""
+        known = {
+            key: value for key, value in payload.items()
+            if key not in _PAYLOAD_SKIP_KEYS and value not in (None, "", [], {})
+        }
+        if not known:
+            return ""
+        try:
+            text = json.dumps(known, separators=(",", ":"), default=str, ensure_ascii=False)
+        except (TypeError, ValueError):
+            text = str(known)
+        return _shorten(text, self.payload_token_budget * CHARS_PER_TOKEN)
+
+    def build(self, turns: List[str], payload: Optional[Dict[str, Any]] = None) -> Tuple[str, int, int]:
+        """
+        Render the context for the given turns.
+
+        Returns (context, raw_tokens, sent_tokens), where raw_tokens is what the
+        unbounded space-joined conversation would have cost.
+        """
+        turns = [turn.strip() for turn in turns if turn and turn.strip()]
+        if not turns:
+            return "", 0, 0
+        raw_context = " ".join(turns)
+        raw_tokens = estimate_tokens(raw_context)
+
+        recent = turns[-self.max_verbatim_turns:] if self.max_verbatim_turns > 0 else turns[-1:]
+        older = turns[:len(turns) - len(recent)]
+
+        # Move turns out of the verbatim window until the whole context fits the budget
+        while True:
+            summary = self._summarize(older)
+            payload_line = self._payload_line(payload) if older else ""
+            recent_text = " ".join(recent)
+            lines = []
+            if summary:
+                lines.append(f"Earlier in this conversation (summarized): {summary}")
+            if payload_line:
+                lines.append(f"Details already provided: {payload_line}")
+            lines.append(recent_text)
+            context = "\n".join(lines)
+            if estimate_tokens(context) <= self.token_budget or len(recent) <= 1:
+                break
+            older.append(recent.pop(0))
+
+        if estimate_tokens(context) > self.token_budget:
+            # A single oversized message: keep its start and end, marking what was cut
+            header = "\n".join(lines[:-1])
+            remaining_chars = max(
+                self.token_budget * CHARS_PER_TOKEN - len(header) - 1,
+                self.turn_summary_chars
+            )
+            lines[-1] = _truncate_with_marker(recent_text, remaining_chars)
+            context = "\n".join(lines)
+
+        sent_tokens = estimate_tokens(context)
+        if raw_tokens <= min(sent_tokens, self.token_budget):
+            # Short turns: summarizing would cost more than sending them as-is
+            return raw_context, raw_tokens, raw_tokens
+        return context, raw_tokens, sent_tokens
+
+    def record_request(self, raw_tokens: int, sent_tokens: int) -> None:
+        """Record one LLM request that used a bounded context"""
+        with self._lock:
+            self.metrics["requests"] += 1
+            self.metrics["raw_tokens"] += raw_tokens
+            self.metrics["sent_tokens"] += sent_tokens
+            if raw_tokens > sent_tokens:
+                self.metrics["compressed_requests"] += 1
+                self.metrics["tokens_saved"] += raw_tokens - sent_tokens
+
+    def get_metrics(self) -> Dict[str, Any]:
+        with self._lock:
+            metrics = dict(self.metrics)
+        metrics["savings_ratio"] = (
+            metrics["tokens_saved"] / metrics["raw_tokens"] if metrics["raw_tokens"] else 0.0
+        )
+        metrics.update({
+            "max_verbatim_turns": self.max_verbatim_turns,
+            "token_budget": self.token_budget,
+        })
+        return metrics
+
+
+# Global context manager instance
+conversation_context = ConversationContextManager(
+    max_verbatim_turns=int(os.getenv("ATSN_CONTEXT_VERBATIM_TURNS", "6")),
+    token_budget=int(os.getenv("ATSN_CONTEXT_TOKEN_BUDGET", "1500")),
+    summary_token_budget=int(os.getenv("ATSN_CONTEXT_SUMMARY_TOKENS", "300")),
+    max_stored_turns=int(os.getenv("ATSN_CONTEXT_MAX_STORED_TURNS", "20"))
+)
@@ -1,25 +1,203 @@
 """
 Daily Conversation Cache Manager
 Manages day-wise conversation caching with automatic cleanup
+
+Messages are kept in compact per-session ring buffers. The cache tracks its
+own size incrementally, evicts the least recently used sessions once the
+memory cap is reached and writes dirty sessions behind to a spill directory
+so conversations survive restarts and evictions. Evicted sessions wait in
+memory as snapshots until the next flush, so no disk write happens on the
+request path, and every snapshot carries a version so an older snapshot never
+replaces a newer spill file.
 """
 
+from collections import OrderedDict, deque
 from datetime import datetime, timezone
+import hashlib
+import json
 import logging
-from typing import Dict, Any, Optional
-import time
+import os
+import re
+import shutil
+import tempfile
+import threading
+from typing import Dict, Any, Optional, List, Tuple
+import asyncio
 
 logger = logging.getLogger(__name__)
 
+# Fields copied from incoming message data onto a cached message record
+MESSAGE_FIELDS = (
+    "message_type",
+    "content",
+    "agent_name",
+    "intent",
+    "current_step",
+    "clarification_question",
+    "clarification_options",
+    "content_items",
+    "lead_items",
+    "calendar_entries",
+    "created_at",
+)
+
+# Fixed per-record overhead (slots object, deque slot, bookkeeping)
+_RECORD_OVERHEAD_BYTES = 200
+# Fixed per-session overhead (session object, deque, LRU entry)
+_SESSION_OVERHEAD_BYTES = 1024
+# User ids (UUIDs) that can be used as a spill directory name as-is
+_SAFE_PATH_COMPONENT = re.compile(r"[A-Za-z0-9_-]{1,64}")
+
+
+def _estimate_value_size(value: Any) -> int:
+    """Estimate the in-memory footprint of a message field"""
+    if value is None:
+        return 0
+    if isinstance(value, str):
+        return len(value.encode("utf-8", errors="ignore"))
+    if isinstance(value, (int, float, bool)):
+        return 8
+    try:
+        return len(json.dumps(value, default=str))
+    except (TypeError, ValueError):
+        return len(str(value))
+
+
+class MessageRecord:
+    """A single cached chat message"""
+
+    __slots__ = MESSAGE_FIELDS + ("size",)
+
+    def __init__(self, **fields):
+        for name in MESSAGE_FIELDS:
+            setattr(self, name, fields.get(name))
+        if self.agent_name is None:
+            self.agent_name = "atsn"
+        if self.created_at is None:
+            self.created_at = datetime.now(timezone.utc).isoformat()
+        self.size = _RECORD_OVERHEAD_BYTES + sum(
+            _estimate_value_size(getattr(self, name)) for name in MESSAGE_FIELDS
+        )
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {name: getattr(self, name) for name in MESSAGE_FIELDS}
+
+
+class ConversationSession:
+    """Ring buffer of messages for one chat session"""
+
+    __slots__ = ("session_id", "agent_name", "started_at", "last_activity",
+                 "messages", "size", "dirty", "dropped_messages", "version")
+
+    def __init__(self, session_id: str, agent_name: str, max_messages: int,
+                 started_at: Optional[str] = None, last_activity: Optional[str] = None):
+        now = datetime.now(timezone.utc).isoformat()
+        self.session_id = session_id
+        self.agent_name = agent_name or "atsn"
+        self.started_at = started_at or now
+        self.last_activity = last_activity or now
+        self.messages: deque = deque(maxlen=max_messages)
+        self.size = _SESSION_OVERHEAD_BYTES
+        self.dirty = False
+        # Oldest messages pushed out of the ring (or trimmed to fit the memory cap)
+        self.dropped_messages = 0
+        # Bumped on every change; spill files are only replaced by newer snapshots
+        self.version = 0
+
+    def append(self, record: MessageRecord) -> int:
+        """Append a message, dropping the oldest when full. Returns the size delta."""
+        delta = record.size
+        if self.messages.maxlen and len(self.messages) == self.messages.maxlen:
+            delta -= self.messages.popleft().size
+            self._record_drop("ring buffer full")
+        self.messages.append(record)
+        self.size += delta
+        self.last_activity = record.created_at
+        self.dirty = True
+        self.version += 1
+        return delta
+
+    def trim_oldest(self) -> int:
+        """Drop the oldest message. Returns the number of bytes released."""
+        if not self.messages:
+            return 0
+        released = self.messages.popleft().size
+        self.size -= released
+        self.dirty = True
+        self.version += 1
+        self._record_drop("memory limit reached")
+        return released
+
+    def _record_drop(self, reason: str):
+        self.dropped_messages += 1
+        # Warn on the first drop and then periodically rather than once per message
+        if self.dropped_messages == 1 or self.dropped_messages % 100 == 0:
+            logger.warning(
+                f"Dropped {self.dropped_messages} oldest message(s) from cached session "
+                f"{self.session_id} ({reason})"
+            )
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "session_id": self.session_id,
+            "agent_name": self.agent_name,
+            "started_at": self.started_at,
+            "last_activity": self.last_activity,
+            "dropped_messages": self.dropped_messages,
+            "version": self.version,
+            "messages": [message.to_dict() for message in self.messages],
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any], max_messages: int) -> "ConversationSession":
+        session = cls(
+            data["session_id"],
+            data.get("agent_name", "atsn"),
+            max_messages,
+            started_at=data.get("started_at"),
+            last_activity=data.get("last_activity"),
+        )
+        for message in data.get("messages", []):
+            session.append(MessageRecord(**message))
+        session.last_activity = data.get("last_activity") or session.last_activity
+        session.dropped_messages = data.get("dropped_messages", 0)
+        session.version = data.get("version", 0)
+        session.dirty = False
+        return session
+
+
 class DailyConversationCache:
     """
     Manages day-wise conversation caching.
     Conversations are stored in memory for the current day and automatically flushed at midnight.
+    Memory use is capped at max_memory_mb; idle sessions beyond the cap are spilled to disk.
     """
 
-    def __init__(self, max_memory_mb: int = 500):
+    def __init__(self, max_memory_mb: int = 500, max_messages_per_session: int = 200,
+                 spill_dir: Optional[str] = None):
+        # user_id -> {"current_day", "conversations": OrderedDict[session_id, ConversationSession], "day_stats"}
         self.cache: Dict[str, Dict[str, Any]] = {}
         self.max_memory_mb = max_memory_mb
-        logger.info(f"Initialized DailyConversationCache with {max_memory_mb}MB limit")
+        self.max_bytes = max_memory_mb * 1024 * 1024
+        self.max_messages_per_session = max_messages_per_session
+        self.spill_dir = spill_dir
+        self.total_bytes = 0
+        self.evicted_sessions = 0
+        self.spilled_sessions = 0
+        # Global LRU of (user_id, session_id) across all users
+        self._lru: "OrderedDict[Tuple[str, str], None]" = OrderedDict()
+        self._lock = threading.RLock()
+        # (user_id, session_id) -> (day, snapshot) of evicted sessions not yet written to disk
+        self._pending_spills: Dict[Tuple[str, str], Tuple[str, Dict[str, Any]]] = {}
+        # Spill file path -> version of the snapshot it holds; guarded by _spill_lock
+        self._spilled_versions: Dict[str, int] = {}
+        self._spill_lock = threading.Lock()
+        if self.spill_dir:
+            os.makedirs(self.spill_dir, exist_ok=True)
+        logger.info(
+            f"Initialized DailyConversationCache with {max_memory_mb}MB limit, "
+            f"{max_messages_per_session} messages per session, spill dir: {spill_dir or 'disabled'}"
+        )
 
     def get_user_cache(self, user_id: str) -> Dict[str, Any]:
         """
@@ -28,22 +206,24 @@ class DailyConversationCache:
         """
         today = datetime.now(timezone.utc).date().isoformat()
 
-        if user_id not in self.cache:
-            self.cache[user_id] = self._create_empty_cache(today)
-            logger.debug(f"Created new cache for user {user_id}")
+        with self._lock:
+            if user_id not in self.cache:
+                self.cache[user_id] = self._create_empty_cache(today)
+                self._restore_user_from_disk(user_id, today)
+                logger.debug(f"Created new cache for user {user_id}")
 
-        # Check if day changed - flush old data
-        if self.cache[user_id]["current_day"] != today:
-            logger.info(f"Day changed for user {user_id}, flushing old conversations")
-            self._flush_day(user_id, today)
+            # Check if day changed - flush old data
+            if self.cache[user_id]["current_day"] != today:
+                logger.info(f"Day changed for user {user_id}, flushing old conversations")
+                self._flush_day(user_id, today)
 
-        return self.cache[user_id]
+            return self.cache[user_id]
 
     def _create_empty_cache(self, day: str) -> Dict[str, Any]:
         """Create empty cache structure for a user"""
         return {
             "current_day": day,
-            "conversations": {},
+            "conversations": OrderedDict(),
             "day_stats": {
                 "total_conversations": 0,
                 "total_messages": 0,
@@ -58,71 +238,153 @@ class DailyConversationCache:
         old_conversations = len(self.cache[user_id]["conversations"])
         old_messages = self.cache[user_id]["day_stats"]["total_messages"]
 
+        self._drop_user(user_id)
         # Reset cache for new day
         self.cache[user_id] = self._create_empty_cache(new_day)
 
         logger.info(f"Flushed {old_conversations} conversations ({old_messages} messages) for user {user_id} (day: {old_day} -> {new_day})")
 
+    def _drop_user(self, user_id: str):
+        """Remove a user's sessions from memory and release their bytes"""
+        user_cache = self.cache.pop(user_id, None)
+        if not user_cache:
+            return
+        for session_id, session in user_cache["conversations"].items():
+            self.total_bytes -= session.size
+            self._lru.pop((user_id, session_id), None)
+        for key in [key for key in self._pending_spills if key[0] == user_id]:
+            del self._pending_spills[key]
+
+    def _touch(self, user_id: str, session_id: str):
+        key = (user_id, session_id)
+        self._lru[key] = None
+        self._lru.move_to_end(key)
+
+    def _load_session(self, user_id: str, session_id: str) -> Optional[ConversationSession]:
+        """Return an in-memory session, reloading it from the spill dir if it was evicted"""
+        user_cache = self.get_user_cache(user_id)
+        session = user_cache["conversations"].get(session_id)
+        if session is None:
+            pending = self._pending_spills.pop((user_id, session_id), None)
+            if pending is not None and pending[0] == user_cache["current_day"]:
+                # Evicted but not flushed yet: the snapshot is newer than the spill file
+                session = ConversationSession.from_dict(pending[1], self.max_messages_per_session)
+                session.dirty = True
+            else:
+                data = self._read_spilled_session(user_id, user_cache["current_day"], session_id)
+                if data is None:
+                    return None
+                session = ConversationSession.from_dict(data, self.max_messages_per_session)
+            user_cache["conversations"][session_id] = session
+            self.total_bytes += session.size
+            logger.debug(f"Reloaded spilled session {session_id} for user {user_id}")
+        self._touch(user_id, session_id)
+        return session
+
     def add_message_to_session(self, user_id: str, session_id: str, message_data: Dict[str, Any]) -> str:
         """
         Add a message to a conversation session.
         Creates session if it doesn't exist.
         """
-        user_cache = self.get_user_cache(user_id)
-        conversations = user_cache["conversations"]
-
-        # Create session if it doesn't exist
-        if session_id not in conversations:
-            conversations[session_id] = {
-                "messages": [],
-                "agent_name": message_data.get("agent_name", "atsn"),
-                "started_at": datetime.now(timezone.utc).isoformat(),
-                "last_activity": datetime.now(timezone.utc).isoformat()
-            }
-            user_cache["day_stats"]["total_conversations"] += 1
-            logger.debug(f"Created new session {session_id} for user {user_id}")
-        else:
-            # Update agent_name if this message has a different agent (e.g., bot response)
-            current_agent = conversations[session_id].get("agent_name", "atsn")
-            new_agent = message_data.get("agent_name", "atsn")
-            if new_agent != "atsn" and current_agent == "atsn":
-                conversations[session_id]["agent_name"] = new_agent
-
-        session = conversations[session_id]
-
-        # Add message
-        message_entry = {
-            "message_type": message_data["message_type"],
-            "content": message_data["content"],
-            "agent_name": message_data.get("agent_name", "atsn"),
-            "intent": message_data.get("intent"),
-            "current_step": message_data.get("current_step"),
-            "clarification_question": message_data.get("clarification_question"),
-            "clarification_options": message_data.get("clarification_options"),
-            "content_items": message_data.get("content_items"),
-            "lead_items": message_data.get("lead_items"),
-            "created_at": datetime.now(timezone.utc).isoformat()
-        }
+        with self._lock:
+            user_cache = self.get_user_cache(user_id)
+            conversations = user_cache["conversations"]
+            session = self._load_session(user_id, session_id)
+
+            # Create session if it doesn't exist
+            if session is None:
+                session = ConversationSession(
+                    session_id,
+                    message_data.get("agent_name", "atsn"),
+                    self.max_messages_per_session
+                )
+                conversations[session_id] = session
+                self.total_bytes += session.size
+                self._touch(user_id, session_id)
+                user_cache["day_stats"]["total_conversations"] += 1
+                logger.debug(f"Created new session {session_id} for user {user_id}")
+            else:
+                # Update agent_name if this message has a different agent (e.g., bot response)
+                new_agent = message_data.get("agent_name", "atsn")
+                if new_agent != "atsn" and session.agent_name == "atsn":
+                    session.agent_name = new_agent
+
+            record = MessageRecord(**{
+                name: message_data.get(name) for name in MESSAGE_FIELDS if name != "created_at"
+            })
+            self.total_bytes += session.append(record)
+            user_cache["day_stats"]["total_messages"] += 1
+            user_cache["day_stats"]["last_updated"] = record.created_at
 
-        session["messages"].append(message_entry)
-        session["last_activity"] = datetime.now(timezone.utc).isoformat()
-        user_cache["day_stats"]["total_messages"] += 1
-        user_cache["day_stats"]["last_updated"] = datetime.now(timezone.utc).isoformat()
+            self._enforce_memory_limit(protected=(user_id, session_id))
 
         return session_id
 
+    def _enforce_memory_limit(self, protected: Optional[Tuple[str, str]] = None):
+        """Evict least recently used sessions until the cache fits under max_bytes"""
+        if self.total_bytes <= self.max_bytes:
+            return
+
+        for key in list(self._lru.keys()):
+            if self.total_bytes <= self.max_bytes:
+                break
+            if key == protected:
+                continue
+            self._evict_session(*key)
+
+        # A single session larger than the whole budget: trim its oldest messages
+        if self.total_bytes > self.max_bytes and protected:
+            user_id, session_id = protected
+            session = self.cache.get(user_id, {}).get("conversations", {}).get(session_id)
+            while session is not None and self.total_bytes > self.max_bytes and len(session.messages) > 1:
+                self.total_bytes -= session.trim_oldest()
+
+    def _evict_session(self, user_id: str, session_id: str):
+        """Drop a session from memory, queueing a snapshot for the next flush if it changed"""
+        self._lru.pop((user_id, session_id), None)
+        user_cache = self.cache.get(user_id)
+        if not user_cache:
+            return
+        session = user_cache["conversations"].pop(session_id, None)
+        if session is None:
+            return
+        if session.dirty and self.spill_dir:
+            self._pending_spills[(user_id, session_id)] = (user_cache["current_day"], session.to_dict())
+        self.total_bytes -= session.size
+        self.evicted_sessions += 1
+        logger.debug(f"Evicted session {session_id} for user {user_id} from daily cache")
+
     def get_user_conversations(self, user_id: str) -> Dict[str, Any]:
-        """Get all conversations for a user (today only)"""
-        user_cache = self.get_user_cache(user_id)
+        """
+        Get all conversations for a user (today only).
+        Reads spilled sessions from disk, so call it off the event loop.
+        """
+        with self._lock:
+            user_cache = self.get_user_cache(user_id)
+            sessions = {
+                session_id: session.to_dict()
+                for session_id, session in user_cache["conversations"].items()
+            }
+            current_day = user_cache["current_day"]
+            day_stats = dict(user_cache["day_stats"])
+            for (pending_user, session_id), (day, data) in self._pending_spills.items():
+                if pending_user == user_id and day == current_day:
+                    sessions.setdefault(session_id, data)
+
+        # Include sessions that were evicted to disk without pulling them back into memory.
+        # Spill files are replaced atomically, so they can be read without holding the lock.
+        for data in self._iter_spilled_sessions(user_id, current_day):
+            sessions.setdefault(data["session_id"], data)
 
         conversations_list = []
-        for session_id, session_data in user_cache["conversations"].items():
+        for session_id, session_data in sorted(sessions.items(), key=lambda item: item[1]["started_at"]):
             conversations_list.append({
                 "id": session_id,
                 "session_id": session_id,
-                "conversation_date": user_cache["current_day"],
+                "conversation_date": current_day,
                 "primary_agent_name": session_data.get("agent_name", "atsn"),
                 "total_messages": len(session_data["messages"]),
+                "dropped_messages": session_data.get("dropped_messages", 0),
                 "messages": session_data["messages"],
                 "created_at": session_data["started_at"],
                 "updated_at": session_data["last_activity"]
@@ -131,74 +393,234 @@ class DailyConversationCache:
         return {
             "conversations": conversations_list,
             "count": len(conversations_list),
-            "current_day": user_cache["current_day"],
-            "day_stats": user_cache["day_stats"]
+            "current_day": current_day,
+            "day_stats": day_stats
         }
 
     def get_session_messages(self, user_id: str, session_id: str) -> Optional[Dict[str, Any]]:
         """Get messages for a specific session"""
-        user_cache = self.get_user_cache(user_id)
-        session = user_cache["conversations"].get(session_id)
-
-        if not session:
-            return None
-
-        return {
-            "session_id": session_id,
-            "messages": session["messages"],
-            "agent_name": session["agent_name"],
-            "started_at": session["started_at"],
-            "last_activity": session["last_activity"]
-        }
+        with self._lock:
+            session = self._load_session(user_id, session_id)
+            if not session:
+                return None
+            return session.to_dict()
 
     async def cleanup_old_caches(self):
         """Clean up caches for users who haven't been active today"""
         today = datetime.now(timezone.utc).date().isoformat()
-        users_to_cleanup = []
-
-        for user_id, user_cache in self.cache.items():
-            if user_cache["current_day"] != today:
-                users_to_cleanup.append(user_id)
 
-        for user_id in users_to_cleanup:
-            logger.info(f"Cleaning up old cache for user {user_id}")
-            del self.cache[user_id]
+        with self._lock:
+            users_to_cleanup = [
+                user_id for user_id, user_cache in self.cache.items()
+                if user_cache["current_day"] != today
+            ]
+            for user_id in users_to_cleanup:
+                logger.info(f"Cleaning up old cache for user {user_id}")
+                self._drop_user(user_id)
 
         if users_to_cleanup:
             logger.info(f"Cleaned up {len(users_to_cleanup)} old user caches")
 
+        await asyncio.to_thread(self._remove_old_spill_days, today)
+
     def get_cache_stats(self) -> Dict[str, Any]:
         """Get cache statistics for monitoring"""
-        total_users = len(self.cache)
-        total_conversations = sum(
-            len(user_cache["conversations"])
-            for user_cache in self.cache.values()
-        )
-        total_messages = sum(
-            user_cache["day_stats"]["total_messages"]
-            for user_cache in self.cache.values()
-        )
-
-        return {
-            "total_users": total_users,
-            "total_conversations": total_conversations,
-            "total_messages": total_messages,
-            "average_conversations_per_user": total_conversations / max(total_users, 1),
-            "average_messages_per_user": total_messages / max(total_users, 1),
-            "cache_size_mb": len(str(self.cache)) / (1024 * 1024)  # Rough estimate
-        }
+        with self._lock:
+            total_users = len(self.cache)
+            total_conversations = sum(
+                len(user_cache["conversations"])
+                for user_cache in self.cache.values()
+            )
+            total_messages = sum(
+                user_cache["day_stats"]["total_messages"]
+                for user_cache in self.cache.values()
+            )
+            cached_messages = sum(
+                len(session.messages)
+                for user_cache in self.cache.values()
+                for session in user_cache["conversations"].values()
+            )
+
+            return {
+                "total_users": total_users,
+                "total_conversations": total_conversations,
+                "total_messages": total_messages,
+                "cached_messages": cached_messages,
+                "average_conversations_per_user": total_conversations / max(total_users, 1),
+                "average_messages_per_user": total_messages / max(total_users, 1),
+                "cache_size_mb": self.total_bytes / (1024 * 1024),
+                "max_memory_mb": self.max_memory_mb,
+                "evicted_sessions": self.evicted_sessions,
+                "pending_spills": len(self._pending_spills),
+                "spilled_sessions": self.spilled_sessions
+            }
 
     def clear_user_cache(self, user_id: str):
         """Manually clear a user's cache"""
-        if user_id in self.cache:
-            del self.cache[user_id]
-            logger.info(f"Manually cleared cache for user {user_id}")
+        with self._lock:
+            if user_id in self.cache:
+                self._drop_user(user_id)
+                logger.info(f"Manually cleared cache for user {user_id}")
+            self._remove_user_spill(user_id)
 
     def clear_all_cache(self):
         """Clear all cache data (for debugging/emergency)"""
-        user_count = len(self.cache)
-        self.cache.clear()
+        with self._lock:
+            user_count = len(self.cache)
+            self.cache.clear()
+            self._lru.clear()
+            self._pending_spills.clear()
+            self.total_bytes = 0
+            if self.spill_dir and os.path.isdir(self.spill_dir):
+                shutil.rmtree(self.spill_dir, ignore_errors=True)
+                os.makedirs(self.spill_dir, exist_ok=True)
+            with self._spill_lock:
+                self._spilled_versions.clear()
         logger.info(f"Cleared all cache data for {user_count} users")
 
+    # ------------------------------------------------------------------
+    # Write-behind spill
+    # ------------------------------------------------------------------
+
+    def _collect_dirty_sessions(self) -> List[Tuple[str, str, Dict[str, Any]]]:
+        dirty = []
+        with self._lock:
+            for user_id, user_cache in self.cache.items():
+                for session in user_cache["conversations"].values():
+                    if session.dirty:
+                        dirty.append((user_id, user_cache["current_day"], session.to_dict()))
+                        session.dirty = False
+            # Evicted snapshots stay queued until written, so a reload in between still finds them
+            for (user_id, _), (day, session_data) in self._pending_spills.items():
+                dirty.append((user_id, day, session_data))
+        return dirty
+
+    def flush_dirty_sessions_sync(self) -> int:
+        """Write every modified session to the spill dir. Returns the number of sessions written."""
+        if not self.spill_dir:
+            return 0
+        dirty = self._collect_dirty_sessions()
+        for user_id, day, session_data in dirty:
+            if not self._write_spilled_session(user_id, day, session_data):
+                continue
+            key = (user_id, session_data["session_id"])
+            with self._lock:
+                pending = self._pending_spills.get(key)
+                if pending is not None and pending[1] is session_data:
+                    del self._pending_spills[key]
+        if dirty:
+            logger.debug(f"Flushed {len(dirty)} dirty sessions to {self.spill_dir}")
+        return len(dirty)
+
+    async def flush_dirty_sessions(self) -> int:
+        """Write-behind flush of modified sessions, run off the event loop"""
+        return await asyncio.to_thread(self.flush_dirty_sessions_sync)
+
+    def _user_dir(self, user_id: str, day: str) -> str:
+        # Anything that is not a plain id is hashed so it cannot escape the spill dir
+        if not _SAFE_PATH_COMPONENT.fullmatch(user_id):
+            user_id = hashlib.sha256(user_id.encode("utf-8")).hexdigest()
+        return os.path.join(self.spill_dir, day, user_id)
+
+    def _session_path(self, user_id: str, day: str, session_id: str) -> str:
+        safe_session = "".join(c if c.isalnum() or c in "-_." else "_" for c in session_id)
+        return os.path.join(self._user_dir(user_id, day), f"{safe_session}.json")
+
+    def _write_spilled_session(self, user_id: str, day: str, session_data: Dict[str, Any]) -> bool:
+        """Atomically replace a session's spill file. Returns False if the write failed."""
+        if not self.spill_dir:
+            return False
+        path = self._session_path(user_id, day, session_data["session_id"])
+        version = session_data.get("version", 0)
+        tmp_path = None
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            # A unique temp file per writer: the flush thread and shutdown can spill the same session
+            fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump(session_data, f, default=str)
+            with self._spill_lock:
+                if version < self._spilled_versions.get(path, -1):
+                    logger.debug(f"Skipped stale snapshot of session {session_data['session_id']} (v{version})")
+                    return True
+                os.replace(tmp_path, path)
+                tmp_path = None
+                self._spilled_versions[path] = version
+            self.spilled_sessions += 1
+            return True
+        except Exception as e:
+            logger.error(f"Error spilling session {session_data.get('session_id')} for user {user_id}: {e}")
+            return False
+        finally:
+            if tmp_path is not None:
+                try:
+                    os.remove(tmp_path)
+                except OSError:
+                    pass
+
+    def _read_spilled_session(self, user_id: str, day: str, session_id: str) -> Optional[Dict[str, Any]]:
+        if not self.spill_dir:
+            return None
+        path = self._session_path(user_id, day, session_id)
+        if not os.path.exists(path):
+            return None
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except Exception as e:
+            logger.error(f"Error reading spilled session {session_id} for user {user_id}: {e}")
+            return None
+
+    def _iter_spilled_sessions(self, user_id: str, day: str):
+        if not self.spill_dir:
+            return
+        user_dir = self._user_dir(user_id, day)
+        if not os.path.isdir(user_dir):
+            return
+        for filename in os.listdir(user_dir):
+            if not filename.endswith(".json"):
+                continue
+            try:
+                with open(os.path.join(user_dir, filename), "r", encoding="utf-8") as f:
+                    yield json.load(f)
+            except Exception as e:
+                logger.error(f"Error reading spilled session file {filename} for user {user_id}: {e}")
+
+    def _restore_user_from_disk(self, user_id: str, day: str):
+        """Rebuild today's day_stats for a user from spilled sessions after a restart"""
+        user_cache = self.cache[user_id]
+        for data in self._iter_spilled_sessions(user_id, day):
+            user_cache["day_stats"]["total_conversations"] += 1
+            user_cache["day_stats"]["total_messages"] += len(data.get("messages", []))
+
+    def _remove_user_spill(self, user_id: str):
+        if not self.spill_dir or not os.path.isdir(self.spill_dir):
+            return
+        for day in os.listdir(self.spill_dir):
+            user_dir = self._user_dir(user_id, day)
+            shutil.rmtree(user_dir, ignore_errors=True)
+            self._forget_spilled_versions(user_dir)
+
+    def _remove_old_spill_days(self, today: str):
+        if not self.spill_dir or not os.path.isdir(self.spill_dir):
+            return
+        for day in os.listdir(self.spill_dir):
+            if day != today:
+                day_dir = os.path.join(self.spill_dir, day)
+                shutil.rmtree(day_dir, ignore_errors=True)
+                self._forget_spilled_versions(day_dir)
+                logger.info(f"Removed spilled conversations for {day}")
+
+    def _forget_spilled_versions(self, directory: str):
+        prefix = directory + os.sep
+        with self._spill_lock:
+            for path in [path for path in self._spilled_versions if path.startswith(prefix)]:
+                del self._spilled_versions[path]
+
+
 # Global cache instance
-daily_cache = DailyConversationCache()
+daily_cache = DailyConversationCache(
+    max_memory_mb=int(os.getenv("DAILY_CACHE_MAX_MEMORY_MB", "500")),
+    max_messages_per_session=int(os.getenv("DAILY_CACHE_MAX_MESSAGES_PER_SESSION", "200")),
+    spill_dir=os.getenv("DAILY_CACHE_SPILL_DIR", os.path.join(tempfile.gettempdir(), "emily_daily_cache"))
+)
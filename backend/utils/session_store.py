@@ -0,0 +1,307 @@
+"""
+Session State Store
+Shares per-user session state (e.g. the ATSN AgentState) across uvicorn workers and nodes
+
+Backends are selected with SESSION_STORE_URL:
+    memory://                      in-process (single worker only)
+    sqlite:///path/to/sessions.db  local file shared by every worker on one host
+    redis://host:6379/0            any Redis-compatible server, shared across hosts
+
+Every record carries a version. Writes pass the version they read and fail with
+SessionVersionConflict if another worker committed in between (version 0 = absent).
+"""
+
+import os
+import json
+import time
+import zlib
+import sqlite3
+import asyncio
+import logging
+import tempfile
+import threading
+from abc import ABC, abstractmethod
+from typing import Dict, Optional, Tuple, Type, TypeVar
+from urllib.parse import urlparse
+
+from pydantic import BaseModel
+
+try:
+    import redis.asyncio as redis_asyncio
+    REDIS_AVAILABLE = True
+except ImportError:
+    redis_asyncio = None
+    REDIS_AVAILABLE = False
+
+logger = logging.getLogger(__name__)
+
+ModelT = TypeVar("ModelT", bound=BaseModel)
+
+# Serialization format marker, bumped if the encoding ever changes
+_FORMAT_V1 = b"\x01"
+
+
+class SessionVersionConflict(Exception):
+    """Raised when a session was modified by another worker since it was read"""
+
+
+def dump_model(model: BaseModel) -> bytes:
+    """Encode a pydantic model as compact compressed bytes (only non-default fields)"""
+    data = model.dict(exclude_defaults=True)
+    raw = json.dumps(data, separators=(",", ":"), default=str).encode("utf-8")
+    return _FORMAT_V1 + zlib.compress(raw, 6)
+
+
+def load_model(model_cls: Type[ModelT], blob: bytes) -> ModelT:
+    """Decode bytes produced by dump_model"""
+    if not blob.startswith(_FORMAT_V1):
+        raise ValueError("Unknown session state encoding")
+    return model_cls(**json.loads(zlib.decompress(blob[1:]).decode("utf-8")))
+
+
+class SessionStore(ABC):
+    """Base class for versioned key/value session backends"""
+
+    backend_name = "base"
+
+    def __init__(self, ttl_seconds: int = 86400):
+        self.ttl_seconds = ttl_seconds
+
+    @abstractmethod
+    async def get(self, namespace: str, key: str) -> Optional[Tuple[int, bytes]]:
+        """Return (version, value) or None if the key does not exist"""
+
+    @abstractmethod
+    async def put(self, namespace: str, key: str, value: bytes, expected_version: int) -> int:
+        """Store value if the current version equals expected_version. Returns the new version."""
+
+    @abstractmethod
+    async def delete(self, namespace: str, key: str) -> None:
+        """Remove a key (no-op if it does not exist)"""
+
+    async def close(self) -> None:
+        pass
+
+
+class InMemorySessionStore(SessionStore):
+    """Process-local backend (default; only correct with a single worker)"""
+
+    backend_name = "memory"
+
+    def __init__(self, ttl_seconds: int = 86400):
+        super().__init__(ttl_seconds)
+        self._data: Dict[Tuple[str, str], Tuple[int, bytes, float]] = {}
+        self._lock = threading.Lock()
+
+    async def get(self, namespace: str, key: str) -> Optional[Tuple[int, bytes]]:
+        with self._lock:
+            record = self._data.get((namespace, key))
+            if record is None:
+                return None
+            version, value, expires_at = record
+            if expires_at and expires_at < time.time():
+                del self._data[(namespace, key)]
+                return None
+            return version, value
+
+    async def put(self, namespace: str, key: str, value: bytes, expected_version: int) -> int:
+        with self._lock:
+            record = self._data.get((namespace, key))
+            current = record[0] if record and (not record[2] or record[2] >= time.time()) else 0
+            if current != expected_version:
+                raise SessionVersionConflict(f"{namespace}:{key} is at version {current}, expected {expected_version}")
+            new_version = current + 1
+            expires_at = time.time() + self.ttl_seconds if self.ttl_seconds else 0
+            self._data[(namespace, key)] = (new_version, value, expires_at)
+            return new_version
+
+    async def delete(self, namespace: str, key: str) -> None:
+        with self._lock:
+            self._data.pop((namespace, key), None)
+
+
+class SQLiteSessionStore(SessionStore):
+    """Local file backend shared by all worker processes on one host"""
+
+    backend_name = "sqlite"
+
+    def __init__(self, path: str, ttl_seconds: int = 86400):
+        super().__init__(ttl_seconds)
+        self.path = path
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, timeout=10, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS session_state ("
+            " namespace TEXT NOT NULL,"
+            " key TEXT NOT NULL,"
+            " version INTEGER NOT NULL,"
+            " value BLOB NOT NULL,"
+            " expires_at REAL NOT NULL,"
+            " PRIMARY KEY (namespace, key))"
+        )
+
+    def _get_sync(self, namespace: str, key: str) -> Optional[Tuple[int, bytes]]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT version, value, expires_at FROM session_state WHERE namespace = ? AND key = ?",
+                (namespace, key)
+            ).fetchone()
+        if row is None or (row[2] and row[2] < time.time()):
+            return None
+        return row[0], bytes(row[1])
+
+    def _put_sync(self, namespace: str, key: str, value: bytes, expected_version: int) -> int:
+        expires_at = time.time() + self.ttl_seconds if self.ttl_seconds else 0
+        with self._lock:
+            if expected_version == 0:
+                # Insert, or take over an expired row
+                cursor = self._conn.execute(
+                    "INSERT INTO session_state (namespace, key, version, value, expires_at) VALUES (?, ?, 1, ?, ?) "
+                    "ON CONFLICT (namespace, key) DO UPDATE SET version = 1, value = excluded.value, "
+                    "expires_at = excluded.expires_at "
+                    "WHERE session_state.expires_at > 0 AND session_state.expires_at < ?",
+                    (namespace, key, value, expires_at, time.time())
+                )
+            else:
+                cursor = self._conn.execute(
+                    "UPDATE session_state SET version = version + 1, value = ?, expires_at = ? "
+                    "WHERE namespace = ? AND key = ? AND version = ?",
+                    (value, expires_at, namespace, key, expected_version)
+                )
+        if cursor.rowcount != 1:
+            raise SessionVersionConflict(f"{namespace}:{key} changed since version {expected_version}")
+        return expected_version + 1
+
+    def _delete_sync(self, namespace: str, key: str) -> None:
+        with self._lock:
+            self._conn.execute("DELETE FROM session_state WHERE namespace = ? AND key = ?", (namespace, key))
+
+    def purge_expired(self) -> int:
+        with self._lock:
+            cursor = self._conn.execute(
+                "DELETE FROM session_state WHERE expires_at > 0 AND expires_at < ?", (time.time(),)
+            )
+        return cursor.rowcount
+
+    async def get(self, namespace: str, key: str) -> Optional[Tuple[int, bytes]]:
+        return await asyncio.to_thread(self._get_sync, namespace, key)
+
+    async def put(self, namespace: str, key: str, value: bytes, expected_version: int) -> int:
+        return await asyncio.to_thread(self._put_sync, namespace, key, value, expected_version)
+
+    async def delete(self, namespace: str, key: str) -> None:
+        await asyncio.to_thread(self._delete_sync, namespace, key)
+
+    async def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+# Compare-and-set: KEYS[1] = hash key, ARGV = expected version, value, ttl
+_REDIS_CAS_SCRIPT = """
+local current = redis.call('HGET', KEYS[1], 'v')
+if (current or '0') ~= ARGV[1] then
+    return -1
+end
+local new_version = tonumber(ARGV[1]) + 1
+redis.call('HSET', KEYS[1], 'v', new_version, 'd', ARGV[2])
+if tonumber(ARGV[3]) > 0 then
+    redis.call('EXPIRE', KEYS[1], ARGV[3])
+end
+return new_version
+"""
+
+
+class RedisSessionStore(SessionStore):
+    """Redis-compatible backend shared across hosts"""
+
+    backend_name = "redis"
+
+    def __init__(self, url: str, ttl_seconds: int = 86400, key_prefix: str = "emily:session"):
+        super().__init__(ttl_seconds)
+        if not REDIS_AVAILABLE:
+            raise RuntimeError("redis package is not installed. Install with: pip install redis")
+        self.key_prefix = key_prefix
+        self._client = redis_asyncio.from_url(url, decode_responses=False)
+        self._cas = self._client.register_script(_REDIS_CAS_SCRIPT)
+
+    def _key(self, namespace: str, key: str) -> str:
+        return f"{self.key_prefix}:{namespace}:{key}"
+
+    async def get(self, namespace: str, key: str) -> Optional[Tuple[int, bytes]]:
+        version, value = await self._client.hmget(self._key(namespace, key), "v", "d")
+        if version is None or value is None:
+            return None
+        return int(version), value
+
+    async def put(self, namespace: str, key: str, value: bytes, expected_version: int) -> int:
+        new_version = await self._cas(
+            keys=[self._key(namespace, key)],
+            args=[str(expected_version), value, int(self.ttl_seconds or 0)]
+        )
+        if int(new_version) < 0:
+            raise SessionVersionConflict(f"{namespace}:{key} changed since version {expected_version}")
+        return int(new_version)
+
+    async def delete(self, namespace: str, key: str) -> None:
+        await self._client.delete(self._key(namespace, key))
+
+    async def close(self) -> None:
+        await self._client.aclose()
+
+
+def create_session_store(url: Optional[str] = None, ttl_seconds: Optional[int] = None) -> SessionStore:
+    """Build a session store from a URL (defaults to SESSION_STORE_URL)"""
+    url = url or os.getenv("SESSION_STORE_URL", "memory://")
+    ttl_seconds = ttl_seconds if ttl_seconds is not None else int(os.getenv("SESSION_STORE_TTL_SECONDS", "86400"))
+    parsed = urlparse(url)
+
+    if parsed.scheme in ("redis", "rediss", "unix"):
+        store = RedisSessionStore(url, ttl_seconds=ttl_seconds)
+    elif parsed.scheme == "sqlite":
+        path = url[len("sqlite:///"):] if url.startswith("sqlite:///") else ""
+        store = SQLiteSessionStore(path or os.path.join(tempfile.gettempdir(), "emily_sessions.db"), ttl_seconds=ttl_seconds)
+    else:
+        if parsed.scheme not in ("", "memory"):
+            logger.warning(f"Unknown SESSION_STORE_URL scheme '{parsed.scheme}', using in-memory store")
+        store = InMemorySessionStore(ttl_seconds=ttl_seconds)
+
+    logger.info(f"Session store backend: {store.backend_name}")
+    return store
+
+
+class ModelSessionStore:
+    """Typed view over a SessionStore namespace holding one pydantic model per key"""
+
+    def __init__(self, store: SessionStore, namespace: str, model_cls: Type[ModelT]):
+        self.store = store
+        self.namespace = namespace
+        self.model_cls = model_cls
+
+    async def load(self, key: str) -> Tuple[int, Optional[ModelT]]:
+        """Return (version, model). Version 0 means there is no stored state."""
+        record = await self.store.get(self.namespace, key)
+        if record is None:
+            return 0, None
+        version, blob = record
+        try:
+            return version, load_model(self.model_cls, blob)
+        except Exception as e:
+            logger.error(f"Discarding unreadable {self.namespace} state for {key}: {e}")
+            return version, None
+
+    async def save(self, key: str, model: Optional[ModelT], expected_version: int) -> int:
+        """Persist a model (or clear it when None) if nobody else wrote since expected_version"""
+        if model is None:
+            await self.store.delete(self.namespace, key)
+            return 0
+        return await self.store.put(self.namespace, key, dump_model(model), expected_version)
+
+
+# Global store instance shared by routers
+session_store = create_session_store()
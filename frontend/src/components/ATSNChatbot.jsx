@@ -15,6 +15,8 @@ import CharacterCard from './CharacterCard'
 import { leadsAPI } from '../services/leads'
 import { connectionsAPI } from '../services/connections'
 import { mediaAPI } from '../services/api'
+import { waitForPublishJob } from '../utils/contentPublishing'
+import { subscribeToProgress } from '../utils/progressStream'
 
 // Get dark mode state from localStorage or default to dark mode
 const getDarkModePreference = () => {
@@ -106,6 +108,7 @@ const ATSNChatbot = ({ externalConversations = null, onMinimize = null }) => {
   const [selectedSingleDate, setSelectedSingleDate] = useState('')
   const [thinkingPhase, setThinkingPhase] = useState(0) // 0: assigning, 1: contacting, 2: invoking, 3: working
   const [isFirstMessage, setIsFirstMessage] = useState(true) // Track if this is the first message in session
+  const [carouselSlides, setCarouselSlides] = useState([]) // Carousel slide URLs streamed while a reply is generated
   const [showMediaUploadModal, setShowMediaUploadModal] = useState(false)
   const [showPublishSuccessModal, setShowPublishSuccessModal] = useState(false)
   const [publishSuccessData, setPublishSuccessData] = useState(null)
@@ -257,6 +260,30 @@ const ATSNChatbot = ({ externalConversations = null, onMinimize = null }) => {
     }
   }, [isLoading, isFirstMessage, messages])
 
+  // Show carousel slides as they finish while a reply is being generated
+  useEffect(() => {
+    if (!isLoading) {
+      setCarouselSlides([])
+      return
+    }
+
+    let close = () => {}
+    let cancelled = false
+    getAuthToken().then(token => {
+      if (cancelled) return
+      close = subscribeToProgress({
+        apiBaseUrl: API_BASE_URL,
+        token,
+        topic: 'carousel',
+        onUpdate: (update) => setCarouselSlides(update.carousel_images || [])
+      })
+    })
+    return () => {
+      cancelled = true
+      close()
+    }
+  }, [isLoading])
+
   // Auto-select content for created_content messages
   useEffect(() => {
     const latestMessage = messages[messages.length - 1]
@@ -2851,9 +2878,16 @@ const ATSNChatbot = ({ externalConversations = null, onMinimize = null }) => {
         throw new Error(`HTTP error! status: ${response.status}: ${errorText}`)
       }
 
-      const result = await response.json()
+      let result = await response.json()
       console.log('Instagram post result:', result)
 
+      // Reels are published in the background once Instagram has processed the video
+      result = await waitForPublishJob(result, {
+        apiBaseUrl: API_BASE_URL,
+        getToken: getAuthToken,
+        platform: 'instagram'
+      })
+
       // Update the content status in database
       await updateContentStatus(content.id, 'published')
 
@@ -4679,6 +4713,25 @@ const ATSNChatbot = ({ externalConversations = null, onMinimize = null }) => {
                   <span className={`text-sm italic animate-pulse ${isDarkMode ? 'text-white' : 'text-gray-600'}`}>
                     {getThinkingMessage()}
                   </span>
+                  {carouselSlides.length > 0 && (
+                    <div className="mt-2 flex gap-2">
+                      {carouselSlides.map((url, slideIndex) => (
+                        url ? (
+                          <img
+                            key={slideIndex}
+                            src={url}
+                            alt={`Carousel slide ${slideIndex + 1}`}
+                            className="w-16 h-16 rounded-md object-cover"
+                          />
+                        ) : (
+                          <div
+                            key={slideIndex}
+                            className={`w-16 h-16 rounded-md animate-pulse ${isDarkMode ? 'bg-gray-700' : 'bg-gray-200'}`}
+                          />
+                        )
+                      ))}
+                    </div>
+                  )}
                 </div>
               )}
             </div>
@@ -5,6 +5,7 @@ const ContentCreateIndicator = ({
   isOpen,
   isDarkMode,
   currentStep = 0,
+  slideImages = [],
   steps = [
     { label: 'Analyzing your content', icon: FileText },
     { label: 'Generating text content', icon: Sparkles },
@@ -109,6 +110,27 @@ const ContentCreateIndicator = ({
             })}
           </div>
 
+          {/* Carousel slides as they finish */}
+          {slideImages.length > 0 && (
+            <div className="mt-6 flex justify-center gap-2">
+              {slideImages.map((url, index) => (
+                url ? (
+                  <img
+                    key={index}
+                    src={url}
+                    alt={`Carousel slide ${index + 1}`}
+                    className="w-14 h-14 rounded-md object-cover"
+                  />
+                ) : (
+                  <div
+                    key={index}
+                    className={`w-14 h-14 rounded-md animate-pulse ${isDarkMode ? 'bg-gray-700' : 'bg-gray-200'}`}
+                  />
+                )
+              ))}
+            </div>
+          )}
+
           {/* Additional Info */}
           <div className={`mt-8 p-3 rounded-lg ${
             isDarkMode ? 'bg-gray-700/50' : 'bg-gray-50'
@@ -69,6 +69,7 @@ import {
 } from 'lucide-react'
 
 import { supabase } from '../lib/supabase'
+import { waitForPublishJob } from '../utils/contentPublishing'
 
 // Helper function to check if media is a video
 const checkIfVideoMedia = (contentItem) => {
@@ -1017,9 +1018,20 @@ function CreatedContentDashboard() {
         throw new Error(`HTTP error! status: ${response.status}: ${errorText}`)
       }
 
-      const result = await response.json()
+      let result = await response.json()
       console.log('Post result:', result)
 
+      if (result.status === 'processing' && result.job_id) {
+        // Reel still being processed by the platform: only mark published once the job succeeds
+        showInfo(`Your video is being processed by ${itemToPublish.platform} and will be published shortly...`)
+        result = await waitForPublishJob(result, {
+          apiBaseUrl: API_BASE_URL,
+          getToken: getAuthToken,
+          platform
+        })
+        console.log('Publish job result:', result)
+      }
+
       // Update content status to published
       const { error: updateError } = await supabase
         .from('created_content')
@@ -1698,7 +1710,8 @@ function CreatedContentDashboard() {
                 {Array.isArray(filteredContent) && filteredContent.map((contentItem) => {
                   const { mediaUrl, isVideo } = getMediaInfo(contentItem)
                   const hasMedia = mediaUrl && mediaUrl.trim()
-                  const thumbnailUrl = getThumbnailUrl(mediaUrl)
+                  // Server-generated WebP thumbnail when available
+                  const thumbnailUrl = contentItem.thumbnail_url || getThumbnailUrl(mediaUrl)
 
                   // Check if this is reel or video content that should show video
                   const isReelOrVideoContent = contentItem.content_type?.toLowerCase() === 'reel' ||
@@ -8,6 +8,7 @@ import { onboardingAPI } from '../services/onboarding'
 import { socialMediaService } from '../services/socialMedia'
 import { supabase } from '../lib/supabase'
 import { loadTauriAPI } from '../utils/tauri'
+import { subscribeToProgress } from '../utils/progressStream'
 import SideNavbar from './SideNavbar'
 
 
@@ -239,6 +240,7 @@ function EmilyDashboard() {
   const [showAddLeadModal, setShowAddLeadModal] = useState(false)
   const [showContentCreateIndicator, setShowContentCreateIndicator] = useState(false)
   const [contentCreationStep, setContentCreationStep] = useState(0)
+  const [carouselSlides, setCarouselSlides] = useState([])
   const [showGeneratedContentModal, setShowGeneratedContentModal] = useState(false)
   const [showGeneratedReelModal, setShowGeneratedReelModal] = useState(false)
   const [generatedContent, setGeneratedContent] = useState(null)
@@ -892,6 +894,20 @@ function EmilyDashboard() {
     }
   }
 
+  // Stream carousel slide URLs into the creation indicator as each slide finishes
+  useEffect(() => {
+    if (!showContentCreateIndicator) {
+      setCarouselSlides([])
+      return
+    }
+    return subscribeToProgress({
+      apiBaseUrl: API_BASE_URL,
+      token: localStorage.getItem('authToken'),
+      topic: 'carousel',
+      onUpdate: (update) => setCarouselSlides(update.carousel_images || [])
+    })
+  }, [showContentCreateIndicator])
+
   useEffect(() => {
     const fetchProfile = async () => {
       try {
@@ -1885,6 +1901,7 @@ function EmilyDashboard() {
         isOpen={showContentCreateIndicator}
         isDarkMode={isDarkMode}
         currentStep={contentCreationStep}
+        slideImages={carouselSlides}
       />
 
       {/* Generated Content Modal */}
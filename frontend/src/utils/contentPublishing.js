@@ -205,3 +205,54 @@ export const validateContentForPublishing = (content, platform, isCarousel = fal
 
 
 
+
+/**
+ * Wait for a background publish job to finish
+ *
+ * Instagram reels are published after Instagram has processed the video, so the
+ * post endpoint answers { status: 'processing', job_id } instead of the post.
+ * This polls the job until it is published (resolving with the post result) or
+ * failed (rejecting). Any other response is returned unchanged.
+ *
+ * @param {Object} result - Response body of the post endpoint
+ * @param {Object} options - { apiBaseUrl, getToken, platform, intervalMs, timeoutMs }
+ * @returns {Promise<Object>} - Post result with post_id / post_url
+ */
+export const waitForPublishJob = async (result, {
+  apiBaseUrl,
+  getToken,
+  platform = 'instagram',
+  intervalMs = 5000,
+  timeoutMs = 20 * 60 * 1000
+} = {}) => {
+  if (!result || result.status !== 'processing' || !result.job_id) {
+    return result
+  }
+
+  const deadline = Date.now() + timeoutMs
+  while (Date.now() < deadline) {
+    await new Promise(resolve => setTimeout(resolve, intervalMs))
+
+    const token = await getToken()
+    const response = await fetch(`${apiBaseUrl}/connections/${platform}/publish-jobs/${result.job_id}`, {
+      headers: { 'Authorization': `Bearer ${token}` }
+    })
+    if (response.status === 404) {
+      throw new Error('Publish job not found')
+    }
+    if (!response.ok) {
+      // Transient server error: keep polling until the deadline
+      continue
+    }
+
+    const job = await response.json()
+    if (job.status === 'published') {
+      return { ...(job.result || {}), job_id: job.job_id }
+    }
+    if (job.status === 'failed') {
+      throw new Error(job.error || 'Publishing failed')
+    }
+  }
+
+  throw new Error('Timed out waiting for the post to be published')
+}
@@ -0,0 +1,46 @@
+/**
+ * Progress Stream Utilities
+ *
+ * Subscribe to one topic of the backend progress stream (/content/progress-stream)
+ */
+
+/**
+ * Listen for progress updates on a topic until generation finishes or close() is called
+ *
+ * Keepalives are filtered out. The stream closes itself after the first update
+ * with is_generating: false.
+ *
+ * @param {Object} options - { apiBaseUrl, token, topic, onUpdate }
+ * @returns {Function} - close() to stop listening
+ */
+export const subscribeToProgress = ({ apiBaseUrl, token, topic = 'content', onUpdate }) => {
+  if (!token || typeof EventSource === 'undefined') {
+    return () => {}
+  }
+
+  const params = new URLSearchParams({ token, topic })
+  const source = new EventSource(`${apiBaseUrl}/content/progress-stream?${params.toString()}`)
+
+  source.onmessage = (event) => {
+    let data
+    try {
+      data = JSON.parse(event.data)
+    } catch (error) {
+      return
+    }
+    if (data.type === 'keepalive') {
+      return
+    }
+    onUpdate(data)
+    if (data.is_generating === false) {
+      source.close()
+    }
+  }
+
+  source.onerror = () => {
+    // The server ends the stream once nothing is generating; don't reconnect
+    source.close()
+  }
+
+  return () => source.close()
+}
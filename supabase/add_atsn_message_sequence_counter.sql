@@ -0,0 +1,39 @@
+-- ATSN Message Sequence Counter Migration
+-- Hands out message_sequence numbers from the database so that several backend
+-- workers writing to the same conversation never reuse a sequence (see
+-- backend/services/conversation_writer.py)
+
+ALTER TABLE atsn_conversations
+ADD COLUMN IF NOT EXISTS last_message_sequence INTEGER NOT NULL DEFAULT 0;
+
+-- Start existing conversations after their highest stored message
+UPDATE atsn_conversations c
+SET last_message_sequence = m.max_sequence
+FROM (
+  SELECT conversation_id, MAX(message_sequence) AS max_sequence
+  FROM atsn_conversation_messages
+  GROUP BY conversation_id
+) AS m
+WHERE m.conversation_id = c.id
+  AND c.last_message_sequence < m.max_sequence;
+
+-- Reserve message_count sequences for a conversation and return the last one.
+-- reset_to restarts the counter first (used when the full message list is rewritten).
+CREATE OR REPLACE FUNCTION reserve_atsn_message_sequences(
+  p_conversation_id UUID,
+  p_message_count INTEGER,
+  p_reset_to INTEGER DEFAULT NULL
+)
+RETURNS INTEGER AS $$
+DECLARE
+  last_sequence INTEGER;
+BEGIN
+  UPDATE atsn_conversations
+  SET last_message_sequence = COALESCE(p_reset_to, last_message_sequence) + p_message_count
+  WHERE id = p_conversation_id
+  RETURNING last_message_sequence INTO last_sequence;
+  RETURN last_sequence;
+END;
+$$ LANGUAGE plpgsql;
+
+COMMENT ON COLUMN atsn_conversations.last_message_sequence IS 'Highest message_sequence handed out for this conversation';
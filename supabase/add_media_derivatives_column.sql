@@ -0,0 +1,8 @@
+-- Add media_derivatives column to created_content table
+-- Maps each source image URL to its resized WebP/AVIF variants (thumbnail, medium, instagram, linkedin)
+
+ALTER TABLE created_content
+ADD COLUMN IF NOT EXISTS media_derivatives JSONB DEFAULT '{}'::jsonb;
+
+-- Add comment to document the column purpose
+COMMENT ON COLUMN created_content.media_derivatives IS 'Per-image manifest of generated derivatives: {source_url: {size: {url, urls, width, height, bytes}}}, or {source_url: {_meta: {failed_at, reason, retryable}}} after a failed attempt';
@@ -0,0 +1,97 @@
+-- Media Assets Table Migration
+-- Registry of stored uploads used to deduplicate files per user (see backend/services/asset_registry.py)
+
+CREATE TABLE IF NOT EXISTS media_assets (
+  id UUID DEFAULT gen_random_uuid() PRIMARY KEY,
+  user_id UUID REFERENCES auth.users(id) ON DELETE CASCADE,
+  bucket VARCHAR(100) NOT NULL,
+  object_path TEXT NOT NULL,
+  public_url TEXT NOT NULL,
+  content_hash CHAR(64) NOT NULL,
+  phash CHAR(16),
+  dhash CHAR(16),
+  media_type VARCHAR(100),
+  size_bytes BIGINT,
+  width INTEGER,
+  height INTEGER,
+  near_duplicate_of UUID REFERENCES media_assets(id) ON DELETE SET NULL,
+  ref_count INTEGER NOT NULL DEFAULT 1,
+  created_at TIMESTAMP WITH TIME ZONE DEFAULT NOW(),
+  last_referenced_at TIMESTAMP WITH TIME ZONE DEFAULT NOW()
+);
+
+ALTER TABLE media_assets ADD COLUMN IF NOT EXISTS near_duplicate_of UUID REFERENCES media_assets(id) ON DELETE SET NULL;
+
+-- One stored copy of each file per user and bucket (replaces the per-user key of earlier versions)
+ALTER TABLE media_assets DROP CONSTRAINT IF EXISTS media_assets_user_id_content_hash_key;
+CREATE UNIQUE INDEX IF NOT EXISTS idx_media_assets_user_bucket_hash ON media_assets(user_id, bucket, content_hash);
+
+-- Indexes for better performance
+CREATE INDEX IF NOT EXISTS idx_media_assets_user_id ON media_assets(user_id);
+CREATE INDEX IF NOT EXISTS idx_media_assets_public_url ON media_assets(public_url);
+CREATE INDEX IF NOT EXISTS idx_media_assets_unreferenced ON media_assets(last_referenced_at) WHERE ref_count <= 0;
+
+-- RLS (Row Level Security) policies
+ALTER TABLE media_assets ENABLE ROW LEVEL SECURITY;
+
+-- Policy: Users can only see their own assets (writes go through the service role)
+CREATE POLICY "Users can view own media assets" ON media_assets
+  FOR SELECT USING (auth.uid() = user_id);
+
+-- Add one reference to an asset that was reused for a new upload
+CREATE OR REPLACE FUNCTION reference_media_asset(asset_id UUID)
+RETURNS VOID AS $$
+BEGIN
+  UPDATE media_assets
+  SET ref_count = GREATEST(ref_count, 0) + 1,
+      last_referenced_at = NOW()
+  WHERE id = asset_id;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Drop one reference per URL occurrence (called when content using the URLs is deleted)
+CREATE OR REPLACE FUNCTION release_media_assets(urls TEXT[])
+RETURNS INTEGER AS $$
+DECLARE
+  released_count INTEGER;
+BEGIN
+  UPDATE media_assets m
+  SET ref_count = m.ref_count - released.uses
+  FROM (
+    SELECT url, COUNT(*)::INTEGER AS uses FROM unnest(urls) AS url GROUP BY url
+  ) AS released
+  WHERE m.public_url = released.url;
+  GET DIAGNOSTICS released_count = ROW_COUNT;
+  RETURN released_count;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Recount live created_content and content_images references of the given assets and return the
+-- ones nothing uses (ref_count counts uploads, and one upload can back several content rows)
+CREATE OR REPLACE FUNCTION recount_media_asset_references(asset_ids UUID[])
+RETURNS TABLE(id UUID) AS $$
+BEGIN
+  UPDATE media_assets m
+  SET ref_count = live.uses,
+      last_referenced_at = CASE WHEN live.uses > 0 THEN NOW() ELSE m.last_referenced_at END
+  FROM (
+    SELECT a.id AS asset_id, (
+      SELECT COUNT(*)::INTEGER FROM created_content c
+      WHERE c.media_url = a.public_url
+         OR a.public_url = ANY(c.images)
+         OR a.public_url = ANY(c.carousel_images)
+    ) + (
+      SELECT COUNT(*)::INTEGER FROM content_images i WHERE i.image_url = a.public_url
+    ) AS uses
+    FROM media_assets a
+    WHERE a.id = ANY(asset_ids)
+  ) AS live
+  WHERE m.id = live.asset_id;
+
+  RETURN QUERY SELECT m.id FROM media_assets m WHERE m.id = ANY(asset_ids) AND m.ref_count <= 0;
+END;
+$$ LANGUAGE plpgsql;
+
+COMMENT ON COLUMN media_assets.phash IS '64-bit DCT perceptual hash (hex); only set for uploads that opted in to near-duplicate detection';
+COMMENT ON COLUMN media_assets.near_duplicate_of IS 'Closest earlier near-identical image; recorded only, the new bytes are stored separately';
+COMMENT ON COLUMN media_assets.ref_count IS 'Uploads resolved to this asset minus releases from deleted content; recounted from created_content and content_images before cleanup';
@@ -0,0 +1,35 @@
+-- Media Publish Jobs Table Migration
+-- State of background publishes of processed media such as Instagram reels (see backend/services/media_publish_jobs.py)
+
+CREATE TABLE IF NOT EXISTS media_publish_jobs (
+  id UUID PRIMARY KEY,
+  user_id UUID REFERENCES auth.users(id) ON DELETE CASCADE,
+  platform VARCHAR(50) NOT NULL,
+  container_id TEXT NOT NULL,
+  account_id TEXT,
+  content_id TEXT,
+  status VARCHAR(20) NOT NULL DEFAULT 'processing' CHECK (status IN ('processing', 'published', 'failed')),
+  container_status VARCHAR(50),
+  percentage INTEGER DEFAULT 0,
+  details TEXT,
+  result JSONB,
+  error TEXT,
+
+  -- Worker currently polling the job; an expired lease lets another worker resume it
+  lease_owner VARCHAR(64),
+  lease_expires_at TIMESTAMP WITH TIME ZONE,
+
+  created_at TIMESTAMP WITH TIME ZONE DEFAULT NOW(),
+  updated_at TIMESTAMP WITH TIME ZONE DEFAULT NOW()
+);
+
+-- Indexes for better performance
+CREATE INDEX IF NOT EXISTS idx_media_publish_jobs_user_id ON media_publish_jobs(user_id);
+CREATE INDEX IF NOT EXISTS idx_media_publish_jobs_processing ON media_publish_jobs(lease_expires_at) WHERE status = 'processing';
+
+-- RLS (Row Level Security) policies
+ALTER TABLE media_publish_jobs ENABLE ROW LEVEL SECURITY;
+
+-- Policy: Users can only see their own jobs (writes go through the service role)
+CREATE POLICY "Users can view own media publish jobs" ON media_publish_jobs
+  FOR SELECT USING (auth.uid() = user_id);